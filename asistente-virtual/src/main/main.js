@@ -15,7 +15,8 @@ let systemMonitorInterval;
 // Configuración por defecto
 const defaultConfig = {
   apiUrl: process.env.API_URL || 'http://localhost:8000/api',
-  authToken: null,
+  authToken: null, // Token JWT de acceso
+  refreshToken: null,
   userId: null,
   theme: 'dark',
   opacity: 0.9,
@@ -35,6 +36,57 @@ class SaraAsistenteVirtual {
     this.currentApp = null;
     // Detectar si estamos en modo headless (Docker)
     this.isHeadless = process.env.DOCKER_CONTAINER === 'true' || process.env.NODE_ENV === 'docker';
+    // Hasta cuándo no llamar a cada endpoint tras un 429 (ms desde epoch)
+    this.backoffUntil = {};
+  }
+
+  // El servidor responde 429 con Retry-After (segundos) al superar el límite
+  isBackingOff(endpoint) {
+    return Date.now() < (this.backoffUntil[endpoint] || 0);
+  }
+
+  handleRateLimit(endpoint, response) {
+    if (response.status !== 429) return false;
+    const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 60;
+    this.backoffUntil[endpoint] = Date.now() + retryAfter * 1000;
+    console.log(`⏳ Límite de peticiones en ${endpoint}, reintentando en ${retryAfter}s`);
+    return true;
+  }
+
+  // Renovar el token de acceso con el refresh token
+  async refreshAccessToken() {
+    if (!this.config.refreshToken) return false;
+    try {
+      const response = await fetch(`${this.config.apiUrl}/token/refresh/`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh: this.config.refreshToken })
+      });
+      if (!response.ok) return false;
+      const data = await response.json();
+      this.config.authToken = data.access;
+      if (data.refresh) {
+        this.config.refreshToken = data.refresh;
+      }
+      store.set('config', this.config);
+      return true;
+    } catch (error) {
+      console.error('Error renovando el token:', error);
+      return false;
+    }
+  }
+
+  // fetch autenticado con JWT; si el acceso expiró se renueva una vez y se reintenta
+  async apiFetch(path, options = {}) {
+    const request = () => fetch(`${this.config.apiUrl}${path}`, {
+      ...options,
+      headers: { ...(options.headers || {}), 'Authorization': `Bearer ${this.config.authToken}` }
+    });
+    let response = await request();
+    if (response.status === 401 && await this.refreshAccessToken()) {
+      response = await request();
+    }
+    return response;
   }
 
   init() {
@@ -292,7 +344,8 @@ class SaraAsistenteVirtual {
 
       if (response.ok && data.user) {
         this.isAuthenticated = true;
-        this.config.authToken = `Bearer ${data.user.id}`; // Simplificado
+        this.config.authToken = data.access;
+        this.config.refreshToken = data.refresh;
         this.config.userId = data.user.id;
         store.set('config', this.config);
 
@@ -315,6 +368,7 @@ class SaraAsistenteVirtual {
   logout() {
     this.isAuthenticated = false;
     this.config.authToken = null;
+    this.config.refreshToken = null;
     this.config.userId = null;
     store.set('config', this.config);
 
@@ -332,17 +386,22 @@ class SaraAsistenteVirtual {
     if (!this.isAuthenticated) {
       return { error: 'No autenticado' };
     }
+    if (this.isBackingOff('chat')) {
+      return { error: 'Demasiados mensajes, espera unos segundos' };
+    }
 
     try {
-      const response = await fetch(`${this.config.apiUrl}/asistente/chat/`, {
+      const response = await this.apiFetch('/asistente/chat/', {
         method: 'POST',
         headers: {
-          'Content-Type': 'application/json',
-          'Authorization': this.config.authToken
+          'Content-Type': 'application/json'
         },
         body: JSON.stringify({ mensaje: message })
       });
 
+      if (this.handleRateLimit('chat', response)) {
+        return { error: 'Demasiados mensajes, espera unos segundos' };
+      }
       const data = await response.json();
       return data;
     } catch (error) {
@@ -352,17 +411,16 @@ class SaraAsistenteVirtual {
   }
 
   async getProactiveAdvice() {
-    if (!this.isAuthenticated) {
+    if (!this.isAuthenticated || this.isBackingOff('consejos')) {
       return null;
     }
 
     try {
-      const response = await fetch(`${this.config.apiUrl}/consejos-proactivos/`, {
-        headers: {
-          'Authorization': this.config.authToken
-        }
-      });
+      const response = await this.apiFetch('/consejos-proactivos/');
 
+      if (this.handleRateLimit('consejos', response)) {
+        return null;
+      }
       const data = await response.json();
       return data.consejos;
     } catch (error) {
@@ -468,17 +526,17 @@ class SaraAsistenteVirtual {
   }
 
   async sendActivity(activityData) {
-    if (!this.isAuthenticated) return;
+    if (!this.isAuthenticated || this.isBackingOff('activity')) return;
 
     try {
-      await fetch(`${this.config.apiUrl}/activity/`, {
+      const response = await this.apiFetch('/activity/', {
         method: 'POST',
         headers: {
-          'Content-Type': 'application/json',
-          'Authorization': this.config.authToken
+          'Content-Type': 'application/json'
         },
         body: JSON.stringify(activityData)
       });
+      this.handleRateLimit('activity', response);
     } catch (error) {
       console.error('Error enviando actividad:', error);
     }
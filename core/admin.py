@@ -1,5 +1,19 @@
 from django.contrib import admin
-from .models import Usuario, Registro, Estadistica, IAAnalisis
+from .busqueda import filtro_coincidentes
+from .models import Usuario, Registro, Estadistica, IAAnalisis, MetaUsuario, MensajeChat
+
+
+class BusquedaTextoMixin:
+    """Búsqueda del admin: search_fields más el índice de texto completo del tipo"""
+    tipo_busqueda = None
+
+    def get_search_results(self, request, queryset, search_term):
+        resultado, duplicados = super().get_search_results(request, queryset, search_term)
+        filtro = filtro_coincidentes(self.tipo_busqueda, search_term) if search_term else None
+        if filtro is not None:
+            # Subconsulta: todas las coincidencias, no sólo las primeras
+            resultado |= queryset.filter(filtro)
+        return resultado, duplicados
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -8,10 +22,12 @@ class UsuarioAdmin(admin.ModelAdmin):
     search_fields = ('username', 'first_name', 'last_name')
 
 @admin.register(Registro)
-class RegistroAdmin(admin.ModelAdmin):
+class RegistroAdmin(BusquedaTextoMixin, admin.ModelAdmin):
     list_display = ('usuario', 'fecha', 'id')
     list_filter = ('fecha', 'usuario')
-    search_fields = ('usuario__username', 'contenido')
+    # contenido se busca en el índice de texto, no con icontains sobre el JSON
+    search_fields = ('usuario__username',)
+    tipo_busqueda = 'registros'
     date_hierarchy = 'fecha'
 
 @admin.register(Estadistica)
@@ -21,7 +37,21 @@ class EstadisticaAdmin(admin.ModelAdmin):
     search_fields = ('usuario__username',)
 
 @admin.register(IAAnalisis)
-class IAAnalisisAdmin(admin.ModelAdmin):
-    list_display = ('usuario', 'fecha_analisis', 'recomendacion')
-    list_filter = ('fecha_analisis',)
-    search_fields = ('usuario__username', 'recomendacion')
+class IAAnalisisAdmin(BusquedaTextoMixin, admin.ModelAdmin):
+    list_display = ('usuario', 'fecha_analisis', 'tipo', 'recomendacion')
+    list_filter = ('fecha_analisis', 'tipo')
+    search_fields = ('usuario__username',)
+    tipo_busqueda = 'analisis'
+
+@admin.register(MetaUsuario)
+class MetaUsuarioAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'tipo', 'objetivo', 'activa', 'fecha_creacion')
+    list_filter = ('tipo', 'activa')
+    search_fields = ('usuario__username',)
+
+@admin.register(MensajeChat)
+class MensajeChatAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'usuario', 'intencion', 'manejador', 'latencia_ms', 'consultas')
+    list_filter = ('intencion', 'fecha')
+    search_fields = ('usuario__username', 'hash_mensaje')
+    date_hierarchy = 'fecha'
@@ -0,0 +1,144 @@
+"""
+Analítica comparativa del equipo.
+
+Para una ventana de N días, cada empleado se compara con el resto: horas
+trabajadas y productivas, porcentaje productivo, percentil dentro del equipo,
+z-score y variación respecto de los N días anteriores. Los tiempos salen de
+IntervaloActividad en una sola consulta agrupada por (usuario, día,
+productividad) que cubre las dos ventanas; el cálculo se hace de una vez con
+pandas sobre todas las filas, no empleado por empleado. El resultado se cachea
+por equipo y ventana en el bucket de tiempo de `obtener_agregado`.
+
+No hay un modelo de equipos: el equipo son los empleados activos.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+
+from .cache_agregados import obtener_agregado
+
+EQUIPO = 'empleados'
+
+
+def ventanas():
+    """Ventanas en días que se pueden consultar; la primera es la predeterminada"""
+    return list(getattr(settings, 'ANALITICA_EQUIPO_VENTANAS', [7, 14, 30]))
+
+
+def _filas(desde, hasta):
+    """[(usuario_id, fecha, productividad, segundos)] de los empleados en [desde, hasta]"""
+    from django.db.models import Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+    from .models import IntervaloActividad
+
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    return list(
+        IntervaloActividad.objects.filter(
+            usuario__rol='empleado', usuario__is_active=True, inicio__gte=inicio, inicio__lt=fin
+        )
+        .annotate(fecha=TruncDate('inicio'))
+        .values_list('usuario_id', 'fecha', 'productividad')
+        .annotate(segundos=Sum('duracion'))
+        .order_by()
+    )
+
+
+def _zscore(serie):
+    desviacion = serie.std(ddof=0)
+    if not desviacion:
+        return serie * 0.0
+    return (serie - serie.mean()) / desviacion
+
+
+def _porcentaje(parte, total):
+    return (100 * parte / total.where(total > 0)).fillna(0.0)
+
+
+def _percentiles(serie):
+    """Cuartiles, p90 y media de la serie (ceros para un equipo vacío)"""
+    import numpy as np
+
+    if serie.empty:
+        return {'p25': 0.0, 'p50': 0.0, 'p75': 0.0, 'p90': 0.0, 'media': 0.0}
+    valores = np.percentile(serie.to_numpy(), [25, 50, 75, 90])
+    return {
+        **{nombre: round(float(valor), 2) for nombre, valor in zip(('p25', 'p50', 'p75', 'p90'), valores)},
+        'media': round(float(serie.mean()), 2),
+    }
+
+
+def calcular_analitica(dias, hoy=None):
+    """Métricas del equipo y de cada empleado para los últimos `dias` días, incluido hoy"""
+    import numpy as np
+    import pandas as pd
+    from django.utils import timezone
+    from .directorio import obtener_directorio
+
+    hoy = hoy or timezone.localdate()
+    desde = hoy - timedelta(days=dias - 1)
+    desde_anterior = desde - timedelta(days=dias)
+
+    empleados = [u for u in obtener_directorio().usuarios if u['rol'] == 'empleado' and u['is_active']]
+    ids = [u['id'] for u in empleados]
+
+    filas = pd.DataFrame(_filas(desde_anterior, hoy), columns=['usuario', 'fecha', 'productividad', 'segundos'])
+    filas['actual'] = pd.to_datetime(filas['fecha']) >= pd.Timestamp(desde)
+    filas['productivo'] = np.where(filas['productividad'] == 'productive', filas['segundos'], 0.0)
+
+    # Una fila por empleado, también los que no tienen actividad
+    tabla = filas.pivot_table(
+        index='usuario', columns='actual', values=['segundos', 'productivo'], aggfunc='sum', fill_value=0.0
+    ).reindex(index=ids, columns=pd.MultiIndex.from_product([['segundos', 'productivo'], [True, False]]), fill_value=0.0)
+
+    horas = tabla[('segundos', True)] / 3600
+    horas_productivas = tabla[('productivo', True)] / 3600
+    horas_anteriores = tabla[('segundos', False)] / 3600
+    porcentaje = _porcentaje(tabla[('productivo', True)], tabla[('segundos', True)])
+    delta_porcentaje = porcentaje - _porcentaje(tabla[('productivo', False)], tabla[('segundos', False)])
+
+    metricas = pd.DataFrame({
+        'horas': horas,
+        'horas_productivas': horas_productivas,
+        'porcentaje_productivo': porcentaje,
+        'percentil': porcentaje.rank(method='max', pct=True) * 100,
+        'z_porcentaje': _zscore(porcentaje),
+        'z_horas': _zscore(horas_productivas),
+        'delta_porcentaje': delta_porcentaje,
+        'delta_horas': horas - horas_anteriores,
+    }).round(2).sort_values(['percentil', 'horas_productivas'], ascending=False)
+
+    por_id = {u['id']: u for u in empleados}
+    resultado_empleados = [
+        {
+            'usuario_id': int(usuario_id),
+            'username': por_id[usuario_id]['username'],
+            'nombre': por_id[usuario_id]['nombre'] or por_id[usuario_id]['username'],
+            **{clave: float(valor) for clave, valor in fila.items()},
+        }
+        for usuario_id, fila in metricas.iterrows()
+    ]
+
+    return {
+        'equipo': EQUIPO,
+        'dias': dias,
+        'desde': desde.isoformat(),
+        'hasta': hoy.isoformat(),
+        'miembros': len(ids),
+        'resumen': {
+            'horas': _percentiles(horas),
+            'horas_productivas': _percentiles(horas_productivas),
+            'porcentaje_productivo': _percentiles(porcentaje),
+            'delta_porcentaje_medio': round(float(delta_porcentaje.mean()), 2) if ids else 0.0,
+        },
+        'empleados': resultado_empleados,
+    }
+
+
+def analitica_equipo(dias=None):
+    """Analítica de la ventana pedida (o la predeterminada), calculada una vez por bucket de tiempo"""
+    dias = dias or ventanas()[0]
+    if dias not in ventanas():
+        raise ValueError(f'Ventana no permitida: {dias}. Opciones: {ventanas()}')
+    return obtener_agregado(f'analitica_equipo:{dias}', EQUIPO, lambda: calcular_analitica(dias))
@@ -0,0 +1,233 @@
+"""
+Detección de anomalías en línea sobre la actividad que llega.
+
+Por cada usuario y hora de la semana (lunes de 9 a 10, lunes de 10 a 11, ...)
+PerfilHorario guarda la media y la varianza acumuladas con el algoritmo de
+Welford de dos métricas de cada hora trabajada: la proporción de muestras
+productivas y la cantidad de muestras improductivas o de juego (ráfagas).
+Incorporar una hora cuesta O(1), sin volver a leer muestras.
+
+Cada muestra suma a los contadores de la hora en curso de EstadoAnomalias.
+Cuando llega una muestra de una hora posterior, la hora anterior se compara
+con su perfil y se incorpora a él:
+
+- productividad: la proporción de la hora queda más de ANOMALIAS_UMBRAL_Z
+  desviaciones por debajo de la media de esa franja;
+- ráfagas: se evalúan en cada muestra improductiva, para alertar mientras
+  ocurren, cuando el conteo de la hora supera la media en más de
+  ANOMALIAS_UMBRAL_Z desviaciones.
+
+Sólo se compara contra perfiles con ANOMALIAS_MINIMO_HISTORIA horas observadas,
+sólo cuentan las horas con ANOMALIAS_MINIMO_MUESTRAS muestras y las horas
+anómalas no se incorporan al perfil. Cada alerta es
+un IAAnalisis; el incidente queda abierto y no vuelve a alertar hasta que
+cierra una hora normal.
+
+El detector no corre en la ingesta: como el sesionizador, la pasada periódica
+(`manage.py sesionizar --cada N`) lee por usuario las muestras guardadas
+después de EstadoAnomalias.actividad_id, en lote y con un solo bloqueo del
+estado por pasada. Las muestras de los últimos SESIONES_RETRASO segundos
+quedan para la siguiente.
+"""
+import logging
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TIPO_PRODUCTIVIDAD = 'anomalia_productividad'
+TIPO_RAFAGAS = 'anomalia_rafagas'
+CLASES_RAFAGA = ('unproductive', 'gaming')
+LOTE_LECTURA = 2000
+DIAS = ('lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo')
+
+# Desviación mínima: con un historial muy parejo cualquier diferencia sería anómala
+DESVIACION_MINIMA_PRODUCTIVA = 0.05
+DESVIACION_MINIMA_RAFAGAS = 12.0
+
+
+def hora_semana(momento):
+    """0 para el lunes de 00 a 01 h ... 167 para el domingo de 23 a 24 h (hora local)"""
+    local = timezone.localtime(momento)
+    return local.weekday() * 24 + local.hour
+
+
+def actualizar_welford(n, media, m2, valor):
+    """(n, media, m2) tras incorporar `valor`"""
+    n += 1
+    delta = valor - media
+    media += delta / n
+    m2 += delta * (valor - media)
+    return n, media, m2
+
+
+def desviacion(n, m2, minima=0.0):
+    """Desviación estándar muestral, nunca menor que `minima`"""
+    return max(math.sqrt(m2 / (n - 1)) if n > 1 else 0.0, minima)
+
+
+class _Detector:
+    """Estado de un usuario durante una pasada de observar_usuario"""
+
+    def __init__(self, estado):
+        self.estado = estado
+        self.umbral_z = getattr(settings, 'ANOMALIAS_UMBRAL_Z', 3.0)
+        self.minimo_historia = getattr(settings, 'ANOMALIAS_MINIMO_HISTORIA', 4)
+        self.minimo_muestras = getattr(settings, 'ANOMALIAS_MINIMO_MUESTRAS', 60)
+        self.perfiles = {}
+        self.modificados = set()
+        self.alertas = []
+
+    def perfil(self, hora):
+        """PerfilHorario de la franja, leído una vez por pasada"""
+        from .models import PerfilHorario
+
+        if hora not in self.perfiles:
+            self.perfiles[hora] = (
+                PerfilHorario.objects.filter(usuario_id=self.estado.usuario_id, hora_semana=hora).first()
+                or PerfilHorario(usuario_id=self.estado.usuario_id, hora_semana=hora)
+            )
+        return self.perfiles[hora]
+
+    def observar(self, momento, productividad):
+        estado = self.estado
+        inicio = timezone.localtime(momento).replace(minute=0, second=0, microsecond=0)
+        if estado.hora is not None and inicio < estado.hora:
+            # Muestra atrasada de una hora ya incorporada a su perfil
+            return
+        if estado.hora is None or inicio > estado.hora:
+            if estado.hora is not None:
+                self.cerrar_hora()
+            estado.hora, estado.muestras, estado.productivas, estado.rafagas = inicio, 0, 0, 0
+
+        estado.muestras += 1
+        if productividad == 'productive':
+            estado.productivas += 1
+        elif productividad in CLASES_RAFAGA:
+            estado.rafagas += 1
+            perfil = self.perfil(hora_semana(estado.hora))
+            if not estado.incidente_rafagas and self._z_rafagas(perfil, estado.rafagas) > self.umbral_z:
+                estado.incidente_rafagas = True
+                self.alertar(TIPO_RAFAGAS, perfil, estado.rafagas, perfil.media_rafagas, (
+                    f'Ráfaga de actividad improductiva el {self._franja()}: {estado.rafagas} muestras '
+                    f'improductivas o de juego frente a {perfil.media_rafagas:.0f} habituales en esa franja.'
+                ))
+
+    def cerrar_hora(self):
+        """Compara la hora terminada con su perfil y, si fue normal, la incorpora"""
+        estado = self.estado
+        if estado.muestras < self.minimo_muestras:
+            # Hora con muy poca actividad: no describe el trabajo habitual
+            return
+        perfil = self.perfil(hora_semana(estado.hora))
+        proporcion = estado.productivas / estado.muestras
+
+        baja = self._z_productiva(perfil, proporcion) > self.umbral_z
+        if baja and not estado.incidente_productividad:
+            self.alertar(TIPO_PRODUCTIVIDAD, perfil, proporcion, perfil.media_productiva, (
+                f'Productividad inusualmente baja el {self._franja()}: {proporcion:.0%} de muestras productivas '
+                f'frente a {perfil.media_productiva:.0%} habitual en esa franja.'
+            ))
+        estado.incidente_productividad = baja
+        estado.incidente_rafagas = self._z_rafagas(perfil, estado.rafagas) > self.umbral_z
+        if estado.incidente_productividad or estado.incidente_rafagas:
+            # La referencia describe las horas normales: un incidente no la desplaza
+            return
+
+        n = perfil.horas
+        _, perfil.media_productiva, perfil.m2_productiva = actualizar_welford(
+            n, perfil.media_productiva, perfil.m2_productiva, proporcion
+        )
+        perfil.horas, perfil.media_rafagas, perfil.m2_rafagas = actualizar_welford(
+            n, perfil.media_rafagas, perfil.m2_rafagas, estado.rafagas
+        )
+        self.modificados.add(perfil.hora_semana)
+
+    def _z_productiva(self, perfil, proporcion):
+        """Desviaciones por debajo de la media (0 sin historia suficiente)"""
+        if perfil.horas < self.minimo_historia:
+            return 0.0
+        return (perfil.media_productiva - proporcion) / desviacion(
+            perfil.horas, perfil.m2_productiva, DESVIACION_MINIMA_PRODUCTIVA
+        )
+
+    def _z_rafagas(self, perfil, rafagas):
+        """Desviaciones por encima de la media (0 sin historia suficiente)"""
+        if perfil.horas < self.minimo_historia:
+            return 0.0
+        return (rafagas - perfil.media_rafagas) / desviacion(perfil.horas, perfil.m2_rafagas, DESVIACION_MINIMA_RAFAGAS)
+
+    def _franja(self):
+        hora = timezone.localtime(self.estado.hora)
+        return f'{DIAS[hora.weekday()]} {hora:%d/%m} de {hora:%H}:00 a {hora.hour + 1:02d}:00'
+
+    def alertar(self, tipo, perfil, valor, media, recomendacion):
+        self.alertas.append({
+            'usuario_id': self.estado.usuario_id,
+            'recomendacion': recomendacion,
+            'patrones_detectados': {
+                'tipo': tipo,
+                'hora': self.estado.hora.isoformat(),
+                'hora_semana': perfil.hora_semana,
+                'valor': round(valor, 4),
+                'media': round(media, 4),
+                'horas_observadas': perfil.horas,
+            },
+        })
+
+    def guardar(self):
+        self.estado.save()
+        for hora in self.modificados:
+            self.perfiles[hora].save()
+
+
+def observar_usuario(usuario_id, hasta=None):
+    """Pasa por el detector las muestras del usuario guardadas después de su marca; devuelve las alertas creadas.
+
+    `hasta` es el último momento de recepción que se procesa (por defecto, ahora menos SESIONES_RETRASO).
+    """
+    from .models import ActividadUsuario, EstadoAnomalias, IAAnalisis
+
+    if hasta is None:
+        hasta = timezone.now() - timedelta(seconds=getattr(settings, 'SESIONES_RETRASO', 30))
+
+    with transaction.atomic():
+        # Dos pasadas simultáneas del mismo usuario se serializan en el estado
+        estado = EstadoAnomalias.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        desde_id = estado.actividad_id if estado is not None else 0
+        nuevas = ActividadUsuario.objects.filter(usuario_id=usuario_id, id__gt=desde_id)
+        hasta_id = nuevas.filter(fecha_creacion__lte=hasta).aggregate(maximo=Max('id'))['maximo']
+        if hasta_id is None:
+            return []
+        if estado is None:
+            estado = EstadoAnomalias(usuario_id=usuario_id)
+
+        detector = _Detector(estado)
+        filas = nuevas.filter(id__lte=hasta_id).order_by('timestamp', 'id').values_list('timestamp', 'productividad')
+        for momento, productividad in filas.iterator(chunk_size=LOTE_LECTURA):
+            detector.observar(momento, productividad)
+        estado.actividad_id = hasta_id
+        detector.guardar()
+        return [IAAnalisis.objects.create(**alerta) for alerta in detector.alertas]
+
+
+def observar_todos(hasta=None):
+    """Pasada del detector para todos los usuarios; devuelve {usuario_id: alertas creadas} de los que alertaron"""
+    from .models import Usuario
+
+    resultado = {}
+    for usuario_id in Usuario.objects.order_by('pk').values_list('pk', flat=True):
+        try:
+            alertas = observar_usuario(usuario_id, hasta)
+        except Exception:
+            # Un usuario con datos problemáticos no frena la pasada de los demás
+            logger.exception('No se pudieron observar las muestras del usuario %s', usuario_id)
+            continue
+        if alertas:
+            resultado[usuario_id] = alertas
+    return resultado
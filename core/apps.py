@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.core import checks
+        from . import signals  # noqa: F401
+        from .cache_backends import revisar_caches_compartidas
+
+        checks.register(revisar_caches_compartidas, checks.Tags.caches, deploy=True)
@@ -0,0 +1,94 @@
+"""
+Autenticación JWT sin consultas a la base.
+
+SimpleJWT valida la firma y la expiración del token sin estado, pero su
+JWTAuthentication carga el usuario de la base en cada petición. Aquí el
+usuario se arma a partir del directorio en memoria (core.directorio), así que
+autenticar un heartbeat de un agente no cuesta consultas.
+
+El estado activo no se toma del directorio, que puede ir atrasado en otros
+workers: se lee de la base por clave primaria y cada worker lo reutiliza
+durante JWT_ESTADO_SEGUNDOS, así que un usuario desactivado o borrado deja de
+autenticarse como mucho en ese tiempo. El usuario armado no tiene contraseña
+ni fechas: guardarlo o borrarlo lanza NotImplementedError.
+"""
+import time
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .directorio import CAMPOS, obtener_directorio
+
+
+# usuario_id -> (is_active o None si no existe, momento de la lectura)
+_estados = {}
+
+
+def _solo_lectura(*args, **kwargs):
+    raise NotImplementedError(
+        'El usuario del directorio no tiene todos los campos; para modificarlo hay que leerlo de la base'
+    )
+
+
+def usuario_desde_directorio(usuario_id):
+    """Instancia de Usuario con los datos del directorio (sin contraseña), o None; no se puede guardar"""
+    from .models import Usuario
+
+    datos = obtener_directorio().obtener(usuario_id)
+    if datos is None:
+        return None
+    usuario = Usuario(**{campo: datos[campo] for campo in CAMPOS})
+    # Se comporta como una fila ya guardada (p. ej. para asignarla en una ForeignKey),
+    # pero guardarla pisaría la contraseña y las fechas de la fila real
+    usuario._state.adding = False
+    usuario._state.db = 'default'
+    usuario.save = usuario.delete = _solo_lectura
+    return usuario
+
+
+def estado_usuario(usuario_id):
+    """is_active del usuario en la base (None si no existe), leído como mucho una vez por JWT_ESTADO_SEGUNDOS"""
+    from .models import Usuario
+
+    ahora = time.monotonic()
+    guardado = _estados.get(usuario_id)
+    if guardado is not None and 0 <= ahora - guardado[1] < getattr(settings, 'JWT_ESTADO_SEGUNDOS', 30):
+        return guardado[0]
+    activo = Usuario.objects.filter(pk=usuario_id).values_list('is_active', flat=True).first()
+    _estados[usuario_id] = (activo, ahora)
+    return activo
+
+
+def olvidar_estado(usuario_id):
+    """Descarta el estado leído del usuario en este worker"""
+    _estados.pop(usuario_id, None)
+
+
+class JWTAutenticacionDirectorio(JWTAuthentication):
+    """JWTAuthentication que resuelve el usuario del token con el directorio en memoria"""
+
+    def get_user(self, validated_token):
+        try:
+            usuario_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        activo = estado_usuario(usuario_id)
+        usuario = usuario_desde_directorio(usuario_id) if activo is not None else None
+        if usuario is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not activo:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        # El directorio puede no haber visto todavía el cambio de estado
+        usuario.is_active = activo
+        return usuario
+
+
+def emitir_tokens(usuario):
+    """Par refresh/access de SimpleJWT para el usuario"""
+    refresh = RefreshToken.for_user(usuario)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
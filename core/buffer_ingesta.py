@@ -0,0 +1,373 @@
+"""
+Buffer de escritura diferida (write-behind) para las muestras de actividad.
+
+Con INGESTA_BUFFER activo, `activity_api` valida y deduplica las muestras en
+la petición pero no las inserta: las encola en un buffer compartido por todas
+las peticiones del worker. Un hilo las inserta en lotes cuando el
+buffer llega a INGESTA_BUFFER_TAMANO muestras o cuando la más antigua lleva
+INGESTA_BUFFER_INTERVALO segundos esperando.
+
+Durabilidad opcional: con INGESTA_BUFFER_SPOOL (un directorio), cada envío se
+anexa antes de encolarse a un archivo JSONL propio del proceso. Al vaciar el
+buffer, el archivo se rota y se borra cuando la transacción confirma. Al
+arrancar, cada worker reprocesa los archivos de procesos que ya no existen.
+La entrega es al menos una vez: las muestras con `seq` no se duplican gracias
+a la restricción única (machine_id, epoca, seq).
+
+Si un vaciado falla, el lote vuelve al frente de la cola. Tras
+INGESTA_BUFFER_REINTENTOS fallos seguidos se escribe por partes (bisección):
+las filas que fallan solas se apartan en `descartadas-<pid>.jsonl` del spool
+(o en el log si no hay spool) para que no bloqueen al resto. Una caída de la
+base no aparta nada: el lote se conserva. La cola admite hasta
+INGESTA_BUFFER_MAXIMO actividades; con la cola llena `encolar` lanza
+BufferLleno y la API responde 503 para que el agente reintente más tarde.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, connections, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ('usuario_id', 'machine_id', 'ventana_activa', 'procesos_activos', 'carga_sistema', 'productividad', 'seq', 'epoca')
+
+
+def serializar(actividad):
+    fila = {campo: getattr(actividad, campo) for campo in CAMPOS}
+    fila['timestamp'] = actividad.timestamp.isoformat()
+    return fila
+
+
+def deserializar(fila):
+    from .models import ActividadUsuario
+    datos = {campo: fila.get(campo) for campo in CAMPOS}
+    # Los archivos escritos antes de que existiera la época no la traen
+    datos['epoca'] = datos['epoca'] or ''
+    return ActividadUsuario(timestamp=parse_datetime(fila['timestamp']), **datos)
+
+
+class BufferLleno(Exception):
+    """La cola del buffer llegó a su capacidad"""
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BufferIngesta:
+    """Cola de actividades pendientes de escribir, compartida por las peticiones del worker"""
+
+    def __init__(self, tamano=500, intervalo=2.0, directorio_spool=None, iniciar_hilo=True,
+                 capacidad=50000, reintentos=3):
+        self.tamano = tamano
+        self.intervalo = intervalo
+        self.directorio_spool = directorio_spool
+        self.capacidad = capacidad
+        self.reintentos = reintentos
+        # Vaciados fallidos seguidos del lote que está al frente de la cola
+        self._fallos = 0
+        self._cola = deque()
+        self._lock = threading.Lock()
+        # Serializa los vaciados (hilo de fondo, vaciado por tamaño y atexit)
+        self._lock_vaciado = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._primera_encolada = None
+        self._metricas = {'vaciados': 0, 'escritas': 0, 'errores': 0, 'latencia_ultima_ms': 0.0,
+                          'latencia_max_ms': 0.0, 'latencia_total_ms': 0.0, 'profundidad_max': 0,
+                          'rechazadas': 0, 'descartadas': 0}
+        self._spool = None
+        self._rotaciones = 0
+        # Archivos rotados cuyas actividades todavía no se confirmaron en la base
+        self._rotados = []
+        if directorio_spool:
+            os.makedirs(directorio_spool, exist_ok=True)
+            self._ruta_spool = os.path.join(directorio_spool, f'actividad-{os.getpid()}.jsonl')
+            self.reprocesar_spool()
+            self._spool = open(self._ruta_spool, 'a', encoding='utf-8')
+        self._hilo = None
+        if iniciar_hilo:
+            self._hilo = threading.Thread(target=self._bucle, name='buffer-ingesta', daemon=True)
+            self._hilo.start()
+
+    def encolar(self, actividades):
+        """Agrega actividades ya validadas; se escriben en el próximo vaciado"""
+        if not actividades:
+            return
+        with self._lock:
+            if len(self._cola) + len(actividades) > self.capacidad:
+                self._metricas['rechazadas'] += len(actividades)
+                raise BufferLleno(f'El buffer de ingesta tiene {len(self._cola)} actividades pendientes')
+            if self._spool is not None:
+                self._spool.write(''.join(
+                    json.dumps(serializar(actividad), separators=(',', ':')) + '\n' for actividad in actividades
+                ))
+                self._spool.flush()
+                os.fsync(self._spool.fileno())
+            if not self._cola:
+                self._primera_encolada = time.monotonic()
+            self._cola.extend(actividades)
+            profundidad = len(self._cola)
+            self._metricas['profundidad_max'] = max(self._metricas['profundidad_max'], profundidad)
+        if profundidad >= self.tamano:
+            self._despertar.set()
+
+    def vaciar(self):
+        """Escribe todo lo pendiente; devuelve cuántas actividades insertó (sin las que ya estaban guardadas)"""
+        from .ingesta import olvidar_ultima_actividad
+
+        with self._lock_vaciado:
+            with self._lock:
+                if not self._cola:
+                    return 0
+                pendientes = list(self._cola)
+                self._cola.clear()
+                self._primera_encolada = None
+                self._rotar_spool()
+
+            inicio = time.perf_counter()
+            apartadas = []
+            try:
+                escritas = self._escribir(pendientes)
+            except Exception:
+                self._fallos += 1
+                if self._fallos < self.reintentos:
+                    logger.exception('Error vaciando el buffer de ingesta (%s actividades, intento %s de %s)',
+                                     len(pendientes), self._fallos, self.reintentos)
+                    self._devolver(pendientes)
+                    raise
+                logger.exception('El buffer de ingesta falló %s veces seguidas: se escribe por partes', self._fallos)
+                apartadas, restantes, escritas = self._escribir_por_partes(pendientes)
+                if restantes:
+                    self._devolver(restantes)
+                    raise
+                self._apartar(apartadas)
+            self._fallos = 0
+            usuarios = {actividad.usuario_id for actividad in pendientes}
+            olvidar_ultima_actividad(usuarios)
+            with self._lock:
+                rotados, self._rotados = self._rotados, []
+            for rotado in rotados:
+                os.remove(rotado)
+
+            latencia = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                self._metricas['vaciados'] += 1
+                self._metricas['escritas'] += escritas
+                self._metricas['latencia_ultima_ms'] = latencia
+                self._metricas['latencia_total_ms'] += latencia
+                self._metricas['latencia_max_ms'] = max(self._metricas['latencia_max_ms'], latencia)
+            return escritas
+
+    def _escribir(self, actividades):
+        """Inserta las actividades y acumula los agregados de las insertadas en una transacción; devuelve cuántas"""
+        from .ingesta import TAMANO_LOTE_INSERCION, insertar_nuevas
+        from .uso_aplicaciones import acumular_uso
+
+        with transaction.atomic():
+            insertadas = []
+            for i in range(0, len(actividades), TAMANO_LOTE_INSERCION):
+                insertadas.extend(insertar_nuevas(actividades[i:i + TAMANO_LOTE_INSERCION]))
+            # Un reenvío del spool o de otro worker no vuelve a sumar tiempo
+            acumular_uso(insertadas)
+        return len(insertadas)
+
+    def _escribir_por_partes(self, actividades):
+        """Bisección de un lote que no se pudo escribir entero.
+
+        Devuelve (apartadas, restantes, insertadas): las filas que fallan
+        solas, las que quedaron sin intentar si se cortó por un error de
+        conexión y cuántas se insertaron.
+        """
+        partes = [actividades]
+        apartadas = []
+        insertadas = 0
+        while partes:
+            parte = partes.pop()
+            try:
+                insertadas += self._escribir(parte)
+            except (OperationalError, InterfaceError):
+                # La base no está disponible: no es culpa de las filas
+                logger.exception('Se interrumpe la escritura por partes del buffer de ingesta')
+                return apartadas, [actividad for resto in [parte, *reversed(partes)] for actividad in resto], insertadas
+            except Exception:
+                if len(parte) == 1:
+                    logger.exception('No se pudo escribir la actividad de %s', parte[0].machine_id)
+                    apartadas.extend(parte)
+                else:
+                    mitad = len(parte) // 2
+                    partes.extend([parte[mitad:], parte[:mitad]])
+        return apartadas, [], insertadas
+
+    def _devolver(self, actividades):
+        """Devuelve las actividades al frente de la cola; el archivo rotado se conserva hasta que se escriban"""
+        with self._lock:
+            self._cola.extendleft(reversed(actividades))
+            self._primera_encolada = time.monotonic()
+            self._metricas['errores'] += 1
+
+    def _apartar(self, actividades):
+        """Guarda en el archivo de descartadas las actividades que no se pueden escribir"""
+        if not actividades:
+            return
+        lineas = ''.join(
+            json.dumps(serializar(actividad), separators=(',', ':'), default=str) + '\n' for actividad in actividades
+        )
+        with self._lock:
+            self._metricas['descartadas'] += len(actividades)
+        if not self.directorio_spool:
+            logger.error('Se descartan %s actividades que no se pudieron escribir:\n%s', len(actividades), lineas)
+            return
+        ruta = os.path.join(self.directorio_spool, f'descartadas-{os.getpid()}.jsonl')
+        with open(ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write(lineas)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        logger.error('Se apartaron %s actividades que no se pudieron escribir en %s', len(actividades), ruta)
+
+    def _rotar_spool(self):
+        """Cierra el archivo actual para vaciarlo y abre uno nuevo (con self._lock tomado)"""
+        if self._spool is None:
+            return
+        self._spool.close()
+        self._rotaciones += 1
+        rotado = f'{self._ruta_spool}.{self._rotaciones}'
+        os.replace(self._ruta_spool, rotado)
+        self._rotados.append(rotado)
+        self._spool = open(self._ruta_spool, 'a', encoding='utf-8')
+
+    def reprocesar_spool(self):
+        """Escribe las actividades de los archivos que dejaron procesos terminados"""
+        for ruta in sorted(glob.glob(os.path.join(self.directorio_spool, 'actividad-*.jsonl*'))):
+            nombre = os.path.basename(ruta)
+            try:
+                # El dueño es el proceso que lo escribía o el que lo estaba reprocesando
+                if '.reproceso-' in nombre:
+                    pid = int(nombre.rsplit('.reproceso-', 1)[1])
+                else:
+                    pid = int(nombre.split('-', 1)[1].split('.', 1)[0])
+            except ValueError:
+                continue
+            if pid != os.getpid() and _proceso_vivo(pid):
+                continue
+            # Reclamar el archivo con un rename atómico para que otro worker no lo reprocese
+            reclamado = f"{ruta.split('.reproceso-', 1)[0]}.reproceso-{os.getpid()}"
+            try:
+                os.replace(ruta, reclamado)
+            except FileNotFoundError:
+                continue
+            actividades = []
+            with open(reclamado, encoding='utf-8') as archivo:
+                for linea in archivo:
+                    try:
+                        actividades.append(deserializar(json.loads(linea)))
+                    except (ValueError, KeyError, TypeError):
+                        # Última línea cortada por la caída del proceso
+                        logger.warning('Línea inválida en el spool %s', ruta)
+            try:
+                self._escribir(actividades)
+            except Exception:
+                logger.exception('No se pudo reprocesar el spool %s entero: se escribe por partes', ruta)
+                apartadas, restantes, _ = self._escribir_por_partes(actividades)
+                if restantes:
+                    # El archivo reclamado queda para el próximo arranque
+                    raise
+                self._apartar(apartadas)
+            os.remove(reclamado)
+            logger.info('Reprocesadas %s actividades del spool %s', len(actividades), ruta)
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self._despertar.wait(self.intervalo / 2)
+            self._despertar.clear()
+            with self._lock:
+                profundidad = len(self._cola)
+                edad = time.monotonic() - self._primera_encolada if self._primera_encolada else 0
+            if profundidad >= self.tamano or (profundidad and edad >= self.intervalo):
+                close_old_connections()
+                try:
+                    self.vaciar()
+                except Exception:
+                    time.sleep(self.intervalo)
+        connections.close_all()
+
+    def detener(self):
+        """Detiene el hilo y escribe lo pendiente (al terminar el proceso)"""
+        self._detener.set()
+        self._despertar.set()
+        try:
+            self.vaciar()
+        except Exception:
+            logger.exception('No se pudo vaciar el buffer de ingesta al terminar')
+
+    def metricas(self):
+        """Profundidad de la cola, reintentos, descartes y latencias de vaciado"""
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas['profundidad'] = len(self._cola)
+            metricas['capacidad'] = self.capacidad
+            metricas['fallos_seguidos'] = self._fallos
+            # Archivos del spool que esperan a que su lote se confirme
+            metricas['spool_pendientes'] = len(self._rotados)
+            metricas['edad_ms'] = round((time.monotonic() - self._primera_encolada) * 1000, 1) if self._primera_encolada else 0
+        metricas['latencia_media_ms'] = metricas['latencia_total_ms'] / metricas['vaciados'] if metricas['vaciados'] else 0.0
+        return {clave: round(valor, 3) if isinstance(valor, float) else valor for clave, valor in metricas.items()}
+
+
+_buffer = None
+_lock_buffer = threading.Lock()
+
+
+def buffer_activo():
+    return getattr(settings, 'INGESTA_BUFFER', False)
+
+
+def obtener_buffer():
+    """Buffer del worker, creado en el primer uso"""
+    global _buffer
+    with _lock_buffer:
+        if _buffer is None:
+            _buffer = BufferIngesta(
+                tamano=getattr(settings, 'INGESTA_BUFFER_TAMANO', 500),
+                intervalo=getattr(settings, 'INGESTA_BUFFER_INTERVALO', 2.0),
+                directorio_spool=getattr(settings, 'INGESTA_BUFFER_SPOOL', '') or None,
+                capacidad=getattr(settings, 'INGESTA_BUFFER_MAXIMO', 50000),
+                reintentos=getattr(settings, 'INGESTA_BUFFER_REINTENTOS', 3),
+            )
+            atexit.register(_buffer.detener)
+        return _buffer
+
+
+def encolar_muestras(muestras, usuario):
+    """Valida y deduplica las muestras y las encola; devuelve {'encoladas', 'duplicadas'}.
+
+    Lanza BufferLleno si la cola no tiene lugar; las marcas de agua no avanzan.
+    """
+    from django.utils import timezone
+    from .ingesta import avanzar_marcas_agua, construir_actividad, filtrar_nuevas
+
+    ahora = timezone.now()
+    resultado = {'encoladas': 0, 'duplicadas': 0}
+    marcas = {}
+    actividades = list(filtrar_nuevas(
+        (construir_actividad(muestra, usuario, ahora) for muestra in muestras), resultado, marcas
+    ))
+    obtener_buffer().encolar(actividades)
+    # La marca avanza al encolar: un reintento mientras la muestra está en el buffer también es duplicado
+    avanzar_marcas_agua(marcas)
+    resultado['encoladas'] = len(actividades)
+    return resultado
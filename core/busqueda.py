@@ -0,0 +1,197 @@
+"""
+Búsqueda de texto completo en Registro.contenido e IAAnalisis.recomendacion.
+
+Buscar con icontains sobre el JSON de los registros recorre y convierte toda
+la tabla en cada consulta. En su lugar cada fila tiene su texto indexado:
+
+- PostgreSQL: columna `busqueda` (tsvector, configuración
+  BUSQUEDA_CONFIGURACION) con índice GIN en core_registro y core_iaanalisis;
+  el orden es ts_rank_cd.
+- SQLite: tablas virtuales FTS5 (core_registro_fts, core_iaanalisis_fts) con
+  el id de la fila como rowid; el orden es bm25.
+
+Las señales de post_save y post_delete mantienen el índice al día; las
+escrituras con bulk_create llaman a `indexar` y `reindexar_busqueda`
+reconstruye todo. Las estructuras las crea la migración 0012 según el motor
+de la base; cambiarlas requiere una migración nueva.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+
+# tipo -> (modelo, tabla, columna de fecha, expresión SQL del texto para los fragmentos de PostgreSQL)
+TIPOS = {
+    'registros': ('Registro', 'core_registro', 'fecha', 'contenido::text'),
+    'analisis': ('IAAnalisis', 'core_iaanalisis', 'fecha_analisis', 'recomendacion'),
+}
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+LARGO_FRAGMENTO = 12
+
+
+def texto_contenido(valor):
+    """Texto de los valores de un JSON (las claves son los nombres de campo, no contenido)"""
+    if isinstance(valor, dict):
+        valor = list(valor.values())
+    if isinstance(valor, (list, tuple)):
+        return ' '.join(filter(None, (texto_contenido(v) for v in valor)))
+    if valor is None or isinstance(valor, bool):
+        return ''
+    return str(valor)
+
+
+def texto_documento(tipo, objeto):
+    """Texto que se indexa para una fila del tipo"""
+    if tipo == 'registros':
+        return texto_contenido(objeto.contenido)
+    return objeto.recomendacion or ''
+
+
+def palabras(consulta):
+    """Palabras de la consulta del usuario; los operadores de cada motor no se interpretan"""
+    return _PALABRA.findall(consulta or '')[:10]
+
+
+class _Postgres:
+    """tsvector con índice GIN en la misma tabla"""
+
+    @staticmethod
+    def configuracion():
+        return getattr(settings, 'BUSQUEDA_CONFIGURACION', 'spanish')
+
+    @staticmethod
+    def consulta(terminos):
+        return ' & '.join(f"{termino}:*" for termino in terminos)
+
+    def indexar(self, cursor, tabla, filas):
+        cursor.executemany(
+            f'UPDATE {tabla} SET busqueda = to_tsvector(%s, %s) WHERE id = %s',
+            [(self.configuracion(), texto, pk) for pk, texto in filas],
+        )
+
+    def desindexar(self, cursor, tabla, ids):
+        # La columna se borra con la fila
+        pass
+
+    def coincidentes(self, tipo, terminos):
+        tabla = TIPOS[tipo][1]
+        return f'SELECT id FROM {tabla} WHERE busqueda @@ to_tsquery(%s, %s)', [self.configuracion(), self.consulta(terminos)]
+
+    def buscar(self, cursor, tipo, terminos, usuario_id, limite, desplazamiento):
+        _, tabla, fecha, texto = TIPOS[tipo]
+        consulta = self.consulta(terminos)
+        filtro, parametros = ('AND usuario_id = %s', [usuario_id]) if usuario_id else ('', [])
+        base = f"FROM {tabla}, to_tsquery(%s, %s) AS q WHERE busqueda @@ q {filtro}"
+        cursor.execute(f'SELECT count(*) {base}', [self.configuracion(), consulta, *parametros])
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT id, ts_rank_cd(busqueda, q) AS rango, "
+            f"ts_headline(%s, {texto}, q, 'MaxWords={LARGO_FRAGMENTO}, MinWords=4, StartSel=[, StopSel=]') "
+            f"{base} ORDER BY rango DESC, {fecha} DESC, id DESC LIMIT %s OFFSET %s",
+            [self.configuracion(), self.configuracion(), consulta, *parametros, limite, desplazamiento],
+        )
+        return total, cursor.fetchall()
+
+
+class _SQLite:
+    """Tablas FTS5 aparte con el id de la fila como rowid"""
+
+    @staticmethod
+    def consulta(terminos):
+        # Cada palabra entre comillas y como prefijo: sin operadores de FTS5 en la entrada
+        return ' '.join('"{}"*'.format(termino.replace('"', '')) for termino in terminos)
+
+    def indexar(self, cursor, tabla, filas):
+        self.desindexar(cursor, tabla, [pk for pk, _ in filas])
+        cursor.executemany(f'INSERT INTO {tabla}_fts (rowid, texto) VALUES (%s, %s)', filas)
+
+    def desindexar(self, cursor, tabla, ids):
+        cursor.executemany(f'DELETE FROM {tabla}_fts WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def coincidentes(self, tipo, terminos):
+        tabla = TIPOS[tipo][1]
+        return f'SELECT rowid FROM {tabla}_fts WHERE {tabla}_fts MATCH %s', [self.consulta(terminos)]
+
+    def buscar(self, cursor, tipo, terminos, usuario_id, limite, desplazamiento):
+        _, tabla, fecha, _ = TIPOS[tipo]
+        consulta = self.consulta(terminos)
+        filtro, parametros = ('AND t.usuario_id = %s', [usuario_id]) if usuario_id else ('', [])
+        base = f'FROM {tabla}_fts JOIN {tabla} t ON t.id = {tabla}_fts.rowid WHERE {tabla}_fts MATCH %s {filtro}'
+        cursor.execute(f'SELECT count(*) {base}', [consulta, *parametros])
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT t.id, -bm25({tabla}_fts) AS rango, snippet({tabla}_fts, 0, '[', ']', '…', {LARGO_FRAGMENTO}) "
+            f'{base} ORDER BY rango DESC, t.{fecha} DESC, t.id DESC LIMIT %s OFFSET %s',
+            [consulta, *parametros, limite, desplazamiento],
+        )
+        return total, cursor.fetchall()
+
+
+MOTORES = {'postgresql': _Postgres, 'sqlite': _SQLite}
+
+
+def motor_busqueda(conexion=None):
+    """Implementación para el motor de la base; None si no tiene búsqueda de texto"""
+    clase = MOTORES.get((conexion or connection).vendor)
+    return clase() if clase else None
+
+
+def indexar(tipo, objetos):
+    """Guarda en el índice el texto de los objetos del tipo"""
+    motor = motor_busqueda()
+    if motor is None or not objetos:
+        return
+    with connection.cursor() as cursor:
+        motor.indexar(cursor, TIPOS[tipo][1], [(objeto.pk, texto_documento(tipo, objeto)) for objeto in objetos])
+
+
+def desindexar(tipo, ids):
+    motor = motor_busqueda()
+    if motor is None or not ids:
+        return
+    with connection.cursor() as cursor:
+        motor.desindexar(cursor, TIPOS[tipo][1], list(ids))
+
+
+def reindexar(tipo, modelo=None, lote=1000):
+    """Vuelve a indexar todas las filas del tipo; devuelve cuántas"""
+    from django.apps import apps
+
+    modelo = modelo or apps.get_model('core', TIPOS[tipo][0])
+    campo = 'contenido' if tipo == 'registros' else 'recomendacion'
+    pendientes = []
+    total = 0
+    for objeto in modelo.objects.only('pk', campo).order_by('pk').iterator(chunk_size=lote):
+        pendientes.append(objeto)
+        if len(pendientes) >= lote:
+            indexar(tipo, pendientes)
+            total += len(pendientes)
+            pendientes = []
+    indexar(tipo, pendientes)
+    return total + len(pendientes)
+
+
+def buscar(tipo, consulta, usuario_id=None, pagina=1, por_pagina=20):
+    """(total, [(id, rango, fragmento)]) de la página pedida, de mayor a menor relevancia.
+
+    Con `usuario_id` sólo se buscan las filas de ese usuario.
+    """
+    terminos = palabras(consulta)
+    motor = motor_busqueda()
+    if not terminos or motor is None:
+        return 0, []
+    with connection.cursor() as cursor:
+        return motor.buscar(cursor, tipo, terminos, usuario_id, por_pagina, (pagina - 1) * por_pagina)
+
+
+def filtro_coincidentes(tipo, consulta):
+    """Q con las filas que coinciden, como subconsulta y sin límite (búsqueda del admin); None sin índice"""
+    from django.db.models import Q
+    from django.db.models.expressions import RawSQL
+
+    terminos = palabras(consulta)
+    motor = motor_busqueda()
+    if not terminos or motor is None:
+        return None
+    return Q(pk__in=RawSQL(*motor.coincidentes(tipo, terminos)))
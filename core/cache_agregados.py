@@ -0,0 +1,110 @@
+"""
+Cache de agregados con coalescencia de peticiones (single-flight).
+
+Las vistas de supervisión calculan los mismos agregados de 24 horas para todos
+los supervisores que las abren a la vez. Cada agregado se identifica por
+(vista, alcance de rol, bucket de tiempo): dentro de un worker, las peticiones
+concurrentes para la misma clave esperan un único cálculo, y cuando el bucket
+actual todavía no está calculado se sirve el del bucket anterior mientras se
+refresca en segundo plano (stale-while-revalidate).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections
+
+from .cache_backends import cache_nombrada
+
+logger = logging.getLogger(__name__)
+
+cache = cache_nombrada('dashboard')
+
+# Cálculos en curso en este worker: clave -> Future con el resultado
+_en_vuelo = {}
+_lock_en_vuelo = threading.Lock()
+
+
+def segundos_bucket():
+    """Duración en segundos de cada bucket de tiempo"""
+    return getattr(settings, 'DASHBOARD_CACHE_BUCKET', 60)
+
+
+def clave_agregado(vista, alcance, bucket):
+    return f'agregado:{vista}:{alcance}:{bucket}'
+
+
+def obtener_agregado(vista, alcance, calcular):
+    """Devuelve el agregado de la vista para el alcance dado, calculándolo una sola vez por bucket.
+
+    `calcular` no recibe argumentos y debe devolver un valor serializable
+    (listas y diccionarios, no querysets perezosos).
+    """
+    duracion = segundos_bucket()
+    bucket = int(time.time() // duracion)
+    clave = clave_agregado(vista, alcance, bucket)
+
+    valor = cache.get(clave)
+    if valor is not None:
+        return valor
+
+    # Stale-while-revalidate: servir el bucket anterior y refrescar en segundo plano
+    anterior = cache.get(clave_agregado(vista, alcance, bucket - 1))
+    if anterior is not None:
+        _calcular_una_vez(clave, calcular, duracion, en_segundo_plano=True)
+        return anterior
+
+    return _calcular_una_vez(clave, calcular, duracion)
+
+
+def _calcular_una_vez(clave, calcular, duracion, en_segundo_plano=False):
+    """Ejecuta `calcular` sólo si no hay otro cálculo en curso para la misma clave"""
+    with _lock_en_vuelo:
+        futuro = _en_vuelo.get(clave)
+        es_lider = futuro is None
+        if es_lider:
+            futuro = Future()
+            _en_vuelo[clave] = futuro
+
+    if not es_lider:
+        # Otro hilo ya está calculando: esperar su resultado
+        return None if en_segundo_plano else futuro.result()
+
+    if en_segundo_plano:
+        hilo = threading.Thread(
+            target=_refrescar,
+            args=(clave, calcular, duracion, futuro),
+            daemon=True,
+        )
+        hilo.start()
+        return None
+
+    return _ejecutar(clave, calcular, duracion, futuro)
+
+
+def _ejecutar(clave, calcular, duracion, futuro):
+    try:
+        valor = calcular()
+    except Exception as e:
+        futuro.set_exception(e)
+        raise
+    else:
+        # Dos buckets de vida: el actual y el siguiente, donde se sirve como stale
+        cache.set(clave, valor, duracion * 2)
+        futuro.set_result(valor)
+        return valor
+    finally:
+        with _lock_en_vuelo:
+            _en_vuelo.pop(clave, None)
+
+
+def _refrescar(clave, calcular, duracion, futuro):
+    """Refresco en segundo plano; las conexiones del hilo se cierran al terminar"""
+    try:
+        _ejecutar(clave, calcular, duracion, futuro)
+    except Exception:
+        logger.exception('Error refrescando el agregado %s', clave)
+    finally:
+        connections.close_all()
@@ -0,0 +1,132 @@
+"""
+Backends de cache con contadores de aciertos y fallos.
+
+Cada cache con nombre de CACHES (ver sara/settings.py) usa una de estas
+clases según su backend: memoria local, archivos o Redis (este último requiere
+el paquete `redis`). Los contadores son por proceso y se exponen en
+/api/cache/metricas/.
+
+Las caches 'default' (directorio de usuarios, marcas de agua de la ingesta,
+cálculo único de los agregados) y 'limites' (limitación de tasa) sólo
+funcionan como se espera si todos los workers ven la misma: con 'locmem' cada
+proceso tiene la suya. `caches_por_proceso` las detecta: el check de deploy
+core.W001 avisa y sara/gunicorn_conf.py no arranca con más de un worker.
+"""
+import threading
+
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.utils.connection import ConnectionProxy
+
+_FALTA = object()
+# Caches cuyo contenido tienen que compartir todos los workers
+CACHES_COMPARTIDAS = ('default', 'limites')
+_contadores = {}
+_lock_contadores = threading.Lock()
+
+
+def cache_nombrada(alias):
+    """Proxy a la cache `alias` que resuelve la conexión del hilo actual, como django.core.cache.cache"""
+    return ConnectionProxy(caches, alias)
+
+
+class MetricasCacheMixin:
+    """Cuenta aciertos y fallos de get por nombre de cache (get_many de locmem y archivos usa get)"""
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        # NOMBRE es una clave propia de CACHES; los backends de Django la ignoran
+        self.nombre = params.get('NOMBRE', location or 'default')
+
+    def _registrar(self, aciertos, fallos):
+        with _lock_contadores:
+            contador = _contadores.setdefault(self.nombre, {'aciertos': 0, 'fallos': 0})
+            contador['aciertos'] += aciertos
+            contador['fallos'] += fallos
+
+    def get(self, key, default=None, version=None):
+        valor = super().get(key, _FALTA, version)
+        if valor is _FALTA:
+            self._registrar(0, 1)
+            return default
+        self._registrar(1, 0)
+        return valor
+
+
+class LocMemCacheMedida(MetricasCacheMixin, LocMemCache):
+    """Memoria del proceso; desaloja por LRU al llegar a MAX_ENTRIES"""
+
+    def entradas(self):
+        return len(self._cache)
+
+
+class FileBasedCacheMedida(MetricasCacheMixin, FileBasedCache):
+    """Archivos compartidos entre procesos; al llegar a MAX_ENTRIES borra 1/CULL_FREQUENCY al azar"""
+
+    def entradas(self):
+        return len(self._list_cache_files())
+
+
+class RedisCacheMedida(MetricasCacheMixin, RedisCache):
+    """Redis (o compatible); el desalojo lo define maxmemory-policy del servidor"""
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        valores = super().get_many(keys, version)
+        self._registrar(len(valores), len(keys) - len(valores))
+        return valores
+
+    def entradas(self):
+        return None
+
+
+def caches_por_proceso():
+    """Alias de CACHES_COMPARTIDAS configurados con un backend de memoria del proceso"""
+    from django.conf import settings
+    from django.utils.module_loading import import_string
+
+    return [
+        alias for alias in CACHES_COMPARTIDAS
+        if alias in settings.CACHES and issubclass(import_string(settings.CACHES[alias]['BACKEND']), LocMemCache)
+    ]
+
+
+def revisar_caches_compartidas(app_configs, **kwargs):
+    """Check de deploy: con locmem los límites, el directorio y las marcas de agua son por worker"""
+    return [
+        checks.Warning(
+            f"La cache '{alias}' es locmem: con más de un worker cada proceso tiene la suya",
+            hint=f'Usar CACHE_BACKEND=redis (o CACHE_{alias.upper()}_BACKEND=redis) en producción.',
+            id='core.W001',
+        )
+        for alias in caches_por_proceso()
+    ]
+
+
+def metricas_caches():
+    """Aciertos, fallos, tasa de aciertos y entradas de cada cache configurada"""
+    from django.conf import settings
+
+    resultado = {}
+    for alias, configuracion in settings.CACHES.items():
+        backend = caches[alias]
+        nombre = getattr(backend, 'nombre', alias)
+        with _lock_contadores:
+            contador = dict(_contadores.get(nombre, {'aciertos': 0, 'fallos': 0}))
+        total = contador['aciertos'] + contador['fallos']
+        resultado[alias] = {
+            'backend': configuracion['BACKEND'].rsplit('.', 1)[-1],
+            **contador,
+            'tasa_aciertos': round(contador['aciertos'] / total, 3) if total else None,
+            'entradas': backend.entradas() if hasattr(backend, 'entradas') else None,
+            'max_entradas': getattr(backend, '_max_entries', None),
+        }
+    return resultado
+
+
+def reiniciar_metricas():
+    with _lock_contadores:
+        _contadores.clear()
@@ -0,0 +1,128 @@
+"""
+Directorio de usuarios en memoria (id -> username, nombre, rol, estado).
+
+Los filtros de administración, el conteo de empleados del asistente y las
+búsquedas por rol leen el directorio en lugar de consultar la tabla de
+usuarios en cada petición. El directorio está versionado: la versión vive en
+la cache compartida y cada proceso guarda su copia junto con la versión con
+la que la construyó, así que comprobar que sigue al día cuesta una lectura de
+cache. Los signals de Usuario incrementan la versión al crear, modificar o
+borrar un usuario.
+
+Además cada copia local vence a los DIRECTORIO_EDAD_MAXIMA segundos y se
+reconstruye desde la base aunque la versión no haya cambiado: si un
+incremento de versión se pierde (cache reiniciada o desalojada, o una cache
+que no es compartida entre procesos) el directorio queda desactualizado como
+mucho ese tiempo.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CLAVE_VERSION = 'directorio:version'
+CAMPOS = ('id', 'username', 'first_name', 'last_name', 'email', 'rol', 'is_active', 'is_staff', 'is_superuser')
+
+_local = {'version': None, 'directorio': None, 'construido': 0.0}
+_lock_local = threading.Lock()
+
+
+class Directorio:
+    """Instantánea inmutable de los usuarios con índices por id, rol y prefijo"""
+
+    def __init__(self, usuarios):
+        self.usuarios = usuarios
+        self.por_id = {usuario['id']: usuario for usuario in usuarios}
+        # Índice ordenado de (término, id) para autocompletar por prefijo con bisect
+        terminos = set()
+        for usuario in usuarios:
+            for termino in (usuario['username'], usuario['first_name'], usuario['last_name'], usuario['nombre']):
+                if termino:
+                    terminos.add((termino.lower(), usuario['id']))
+        self._terminos = sorted(terminos)
+
+    def obtener(self, usuario_id):
+        return self.por_id.get(usuario_id)
+
+    def contar(self, rol=None, activos=None):
+        return sum(
+            1 for usuario in self.usuarios
+            if (rol is None or usuario['rol'] == rol) and (activos is None or usuario['is_active'] == activos)
+        )
+
+    def buscar(self, texto, limite=20):
+        """Usuarios cuyo username, nombre o apellido empieza por `texto`, ordenados por username"""
+        texto = (texto or '').strip().lower()
+        if not texto:
+            return self.usuarios[:limite]
+        encontrados = set()
+        inicio = bisect.bisect_left(self._terminos, (texto, 0))
+        for termino, usuario_id in self._terminos[inicio:]:
+            if not termino.startswith(texto):
+                break
+            encontrados.add(usuario_id)
+        return sorted((self.por_id[i] for i in encontrados), key=lambda usuario: usuario['username'])[:limite]
+
+
+def _version():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Una versión nueva nunca coincide con copias locales construidas antes
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def _construir():
+    from .models import Usuario
+
+    usuarios = []
+    for fila in Usuario.objects.order_by('username').values(*CAMPOS):
+        fila['nombre'] = f"{fila['first_name']} {fila['last_name']}".strip()
+        usuarios.append(fila)
+    return usuarios
+
+
+def edad_maxima():
+    return getattr(settings, 'DIRECTORIO_EDAD_MAXIMA', 300)
+
+
+def obtener_directorio():
+    """Directorio al día; se reconstruye si cambió la versión o si la copia local venció"""
+    version = _version()
+    ahora = time.monotonic()
+    vigente = 0 <= ahora - _local['construido'] < edad_maxima()
+    if _local['version'] == version and vigente:
+        return _local['directorio']
+
+    clave_datos = f'directorio:datos:{version}'
+    # Con la misma versión la copia compartida puede estar tan vieja como la local
+    usuarios = cache.get(clave_datos) if _local['version'] != version else None
+    if usuarios is None:
+        # La versión se leyó antes de consultar: si cambia durante la consulta,
+        # esta copia queda asociada a la versión vieja y se descarta
+        usuarios = _construir()
+        cache.set(clave_datos, usuarios, edad_maxima())
+
+    directorio = Directorio(usuarios)
+    with _lock_local:
+        _local['version'] = version
+        _local['directorio'] = directorio
+        _local['construido'] = ahora
+    return directorio
+
+
+def _incrementar_version():
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, time.time_ns(), None)
+
+
+def invalidar_directorio():
+    """Nueva versión ya (para esta transacción) y otra al confirmar (para los demás procesos)"""
+    _incrementar_version()
+    transaction.on_commit(_incrementar_version)
@@ -0,0 +1,79 @@
+"""
+Lecturas en la réplica para las vistas de sólo lectura.
+
+Con DATABASE_REPLICA_URL configurada existe el alias `replica`. Las vistas
+marcadas con `solo_lectura` (dashboards, listados, contexto del chat) leen de
+ella; todo lo demás, y todas las escrituras, van a `default`, que queda libre
+para el flujo de INSERT de la ingesta.
+
+Dentro de una vista de sólo lectura las lecturas vuelven a `default` en cuanto
+la vista escribe algo (un resumen diario recalculado) o si hay
+una transacción abierta, para no leer datos que la réplica todavía no tiene.
+Sin réplica configurada el enrutador no interviene.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_REPLICA = 'replica'
+
+# Estado de la vista de sólo lectura en curso: None fuera de ellas
+_lectura = ContextVar('lectura_replica', default=None)
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in connections.settings
+
+
+def transaccion_abierta():
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def en_replica():
+    """Las lecturas del bloque van a la réplica hasta la primera escritura"""
+    token = _lectura.set({'escribio': False})
+    try:
+        yield
+    finally:
+        _lectura.reset(token)
+
+
+def solo_lectura(vista):
+    """Decorador de vistas cuyas lecturas pueden servirse desde la réplica"""
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        with en_replica():
+            return vista(*args, **kwargs)
+    return envoltura
+
+
+class EnrutadorReplica:
+    """Router de DATABASE_ROUTERS: réplica para lecturas de sólo lectura, default para el resto"""
+
+    def db_for_read(self, model, **hints):
+        if not replica_configurada():
+            return None
+        estado = _lectura.get()
+        # default explícito: si no, Django leería los relacionados de la base de la instancia
+        if estado is None or estado['escribio'] or transaccion_abierta():
+            return DEFAULT_DB_ALIAS
+        return ALIAS_REPLICA
+
+    def db_for_write(self, model, **hints):
+        estado = _lectura.get()
+        if estado is not None:
+            estado['escribio'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las dos bases tienen los mismos datos
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS_REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db != ALIAS_REPLICA
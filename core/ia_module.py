@@ -1,14 +1,13 @@
 
-import joblib
-from sklearn.linear_model import LogisticRegression
-import pandas as pd
-import os
-
 _modelo = None
 
 def obtener_modelo():
     global _modelo
     if _modelo is None:
+        # scikit-learn y pandas tardan más de un segundo en importarse: sólo al entrenar
+        import pandas as pd
+        from sklearn.linear_model import LogisticRegression
+
         datos_entrenamiento = pd.DataFrame({
             'tipo_error': ['fecha', 'monto', 'duplicado', 'formato', 'fecha', 'monto'],
             'frecuencia': [10, 5, 3, 2, 8, 4],
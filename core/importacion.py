@@ -0,0 +1,227 @@
+"""
+Importación masiva de registros desde archivos CSV o JSONL.
+
+El archivo se lee en streaming y se divide en lotes. Cada lote se valida
+(opcionalmente en un pool de procesos) parseando las fechas de forma
+vectorizada con pandas y pasando el contenido por el motor de validación;
+los duplicados se buscan en el índice de hashes y las filas válidas se
+escriben con un único `bulk_create` por lote.
+
+Formato de cada fila:
+- `fecha`: fecha del registro en formato DD/MM/AAAA (obligatoria).
+- `usuario`: username del propietario (opcional; por defecto el que importa).
+- `contenido`: objeto JSON en JSONL; en CSV, el resto de las columnas.
+"""
+import csv
+import io
+import itertools
+import json
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+
+FORMATO_FECHA = '%d/%m/%Y'
+TAMANO_LOTE = 5000
+MAX_RECHAZOS_DETALLADOS = 100
+FORMATOS = ('csv', 'jsonl')
+
+
+def detectar_formato(nombre, formato=None):
+    """Formato explícito o deducido de la extensión del archivo"""
+    if formato:
+        formato = formato.lower()
+    elif nombre and nombre.lower().endswith('.csv'):
+        formato = 'csv'
+    elif nombre and nombre.lower().endswith(('.jsonl', '.ndjson')):
+        formato = 'jsonl'
+    if formato not in FORMATOS:
+        raise ValueError('Formato no soportado: use csv o jsonl')
+    return formato
+
+
+def leer_filas(archivo, formato):
+    """Itera las filas del archivo de texto como (línea, fila) sin cargarlo completo"""
+    if formato == 'csv':
+        for linea, fila in enumerate(csv.DictReader(archivo), start=2):
+            usuario = fila.pop('usuario', None)
+            yield linea, {
+                'fecha': fila.pop('fecha', None),
+                'usuario': usuario,
+                'contenido': fila,
+            }
+        return
+
+    for linea, texto in enumerate(archivo, start=1):
+        texto = texto.strip()
+        if not texto:
+            continue
+        try:
+            fila = json.loads(texto)
+        except json.JSONDecodeError:
+            yield linea, None
+            continue
+        if not isinstance(fila, dict):
+            yield linea, None
+            continue
+        yield linea, {
+            'fecha': fila.get('fecha'),
+            'usuario': fila.get('usuario'),
+            'contenido': fila.get('contenido', {}),
+        }
+
+
+def validar_lote(lote):
+    """Valida un lote de filas; se ejecuta en los procesos del pool, sin acceso a la base.
+
+    Devuelve (validas, rechazadas, tiempos): las válidas con la fecha ya
+    convertida a `date`, el hash del contenido y sus errores; las rechazadas
+    como (línea, motivo); y los tiempos por regla del motor de validación.
+    """
+    import pandas as pd
+    from .validacion import hash_contenido, obtener_motor
+
+    validas, rechazadas, tiempos = [], [], {}
+    filas = []
+    for linea, fila in lote:
+        if fila is None:
+            rechazadas.append((linea, 'Línea no es un objeto JSON válido'))
+        elif not isinstance(fila['contenido'], dict):
+            rechazadas.append((linea, 'El contenido debe ser un objeto JSON'))
+        else:
+            filas.append((linea, fila))
+
+    if not filas:
+        return validas, rechazadas, tiempos
+
+    fechas = pd.to_datetime(
+        pd.Series([fila['fecha'] for _, fila in filas], dtype=object).astype(str),
+        format=FORMATO_FECHA, errors='coerce'
+    )
+    errores_contenido = obtener_motor().validar_lote([fila['contenido'] for _, fila in filas], tiempos)
+
+    for (linea, fila), fecha, errores in zip(filas, fechas, errores_contenido):
+        if pd.isna(fecha):
+            rechazadas.append((linea, 'Fecha del registro inválida (DD/MM/AAAA)'))
+            continue
+        validas.append({
+            'linea': linea,
+            'usuario': fila['usuario'],
+            'fecha': fecha.date(),
+            'contenido': fila['contenido'],
+            'contenido_hash': hash_contenido(fila['contenido']),
+            'errores': errores,
+        })
+    return validas, rechazadas, tiempos
+
+
+def _lotes(filas, tamano):
+    iterador = iter(filas)
+    while True:
+        lote = list(itertools.islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _validar_en_pool(lotes, procesos):
+    """Valida los lotes en paralelo conservando el orden y acotando los lotes en vuelo"""
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo = deque()
+        for lote in lotes:
+            en_vuelo.append(pool.submit(validar_lote, lote))
+            if len(en_vuelo) >= procesos * 2:
+                yield en_vuelo.popleft().result()
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+
+
+def importar_registros(archivo, formato, usuario, tamano_lote=TAMANO_LOTE, procesos=0):
+    """Importa los registros del archivo de texto y devuelve un resumen del resultado.
+
+    Sólo admin y supervisor pueden importar registros a nombre de otros usuarios.
+    Con `procesos` > 0 la validación se reparte en un pool de procesos.
+    """
+    from .busqueda import indexar
+    from .metas import invalidar_progreso
+    from .models import Registro, Usuario
+    from .validacion import error_duplicado, obtener_motor
+
+    motor = obtener_motor()
+    hashes_importados = defaultdict(set)
+    puede_asignar = usuario.rol in ['admin', 'supervisor']
+    usuarios = {usuario.username: usuario.pk}
+    resultado = {'creados': 0, 'con_errores': 0, 'rechazados': 0, 'detalle_rechazos': []}
+    usuarios_con_errores = set()
+
+    def rechazar(linea, motivo):
+        resultado['rechazados'] += 1
+        if len(resultado['detalle_rechazos']) < MAX_RECHAZOS_DETALLADOS:
+            resultado['detalle_rechazos'].append({'linea': linea, 'motivo': motivo})
+
+    lotes = _lotes(leer_filas(archivo, formato), tamano_lote)
+    validados = _validar_en_pool(lotes, procesos) if procesos else map(validar_lote, lotes)
+
+    for validas, rechazadas, tiempos in validados:
+        motor.acumular_tiempos(tiempos)
+        for linea, motivo in rechazadas:
+            rechazar(linea, motivo)
+
+        # Resolver los usernames nuevos del lote con una sola consulta
+        nuevos = {fila['usuario'] for fila in validas if fila['usuario'] and fila['usuario'] not in usuarios}
+        if nuevos and puede_asignar:
+            usuarios.update(Usuario.objects.filter(username__in=nuevos).values_list('username', 'pk'))
+
+        filas_por_usuario = defaultdict(list)
+        for fila in validas:
+            username = fila['usuario'] or usuario.username
+            usuario_id = usuarios.get(username) if puede_asignar or username == usuario.username else None
+            if usuario_id is None:
+                rechazar(fila['linea'], f'Usuario no permitido o inexistente: {username}')
+                continue
+            filas_por_usuario[usuario_id].append(fila)
+
+        registros = []
+        for usuario_id, filas in filas_por_usuario.items():
+            # Duplicados contra la base (por índice) y contra lo ya importado
+            existentes = motor.duplicados(usuario_id, [fila['contenido_hash'] for fila in filas])
+            vistos = hashes_importados[usuario_id]
+            for fila in filas:
+                if fila['contenido_hash'] in existentes or fila['contenido_hash'] in vistos:
+                    fila['errores'].append(error_duplicado())
+                vistos.add(fila['contenido_hash'])
+                if fila['errores']:
+                    resultado['con_errores'] += 1
+                    usuarios_con_errores.add(usuario_id)
+                registros.append(Registro(
+                    usuario_id=usuario_id,
+                    fecha=fila['fecha'],
+                    contenido=fila['contenido'],
+                    contenido_hash=fila['contenido_hash'],
+                    errores=fila['errores'],
+                ))
+
+        if registros:
+            with transaction.atomic():
+                Registro.objects.bulk_create(registros)
+                # bulk_create no dispara señales: índice de texto y progreso de metas a mano
+                indexar('registros', registros)
+            resultado['creados'] += len(registros)
+            for usuario_id, fecha in {(registro.usuario_id, registro.fecha) for registro in registros}:
+                invalidar_progreso(usuario_id, fecha)
+
+    # Un análisis IA por usuario afectado, no uno por registro
+    try:
+        from .ia_module import analizar_errores
+    except ImportError:
+        analizar_errores = None
+    if analizar_errores:
+        for usuario_id in usuarios_con_errores:
+            analizar_errores(Usuario(pk=usuario_id))
+
+    return resultado
+
+
+def abrir_texto(archivo_binario):
+    """Envuelve un archivo binario (p. ej. un UploadedFile) como texto UTF-8"""
+    return io.TextIOWrapper(archivo_binario, encoding='utf-8-sig', newline='')
@@ -0,0 +1,360 @@
+"""
+Ingesta de muestras de actividad enviadas por los agentes de monitoreo.
+
+Además del JSON de siempre (una muestra, o el lote `{"activities": [...]}` de
+sara-monitor), `activity_api` acepta un formato compacto:
+
+    Content-Type: application/x-ndjson
+    Content-Encoding: gzip            (opcional)
+
+Una muestra JSON por línea, codificada en delta contra la muestra anterior de
+la misma máquina: la primera línea trae todos los campos y `ts` (epoch en
+milisegundos); las siguientes sólo los campos que cambiaron y `dt`
+(milisegundos desde la muestra anterior). El servidor lo decodifica en
+streaming, sin cargar el cuerpo completo en memoria.
+
+Cada muestra puede traer `seq`, un número de secuencia creciente por máquina
+(en el formato delta se omite cuando es el anterior + 1), y `epoca`, el
+identificador que el agente genera cuando empieza una secuencia nueva (por
+ejemplo si perdió el archivo donde la guardaba). Los reintentos de un agente
+tras un timeout reenvían secuencias ya guardadas: se descartan contra la marca
+de agua de la máquina y época guardada en cache, sin consultar la base, y la
+restricción única (machine_id, epoca, seq) cubre los casos que la cache no
+conoce. Las respuestas cuentan como registradas sólo las filas insertadas.
+"""
+import gzip
+import json
+import logging
+import math
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+logger = logging.getLogger(__name__)
+
+PRODUCTIVIDADES = {'productive', 'unproductive', 'gaming', 'neutral'}
+TAMANO_LOTE_INSERCION = 500
+# Tolerancia para relojes de clientes adelantados
+MARGEN_FUTURO = timedelta(minutes=5)
+# Vida de la marca de agua de secuencia por máquina en cache
+DURACION_MARCA_AGUA = 60 * 60 * 24
+# Retroceso de secuencia a partir del cual se asume que el agente la reinició
+# (un agente sin época que perdió su archivo) y no que reenvía muestras viejas
+SALTO_REINICIO = 10000
+
+# Nombres de campo del cliente sara-monitor -> nombres del modelo
+ALIAS_CAMPOS = {
+    'machineId': 'machine_id',
+    'activeWindow': 'ventana_activa',
+    'topProcesses': 'procesos_activos',
+    'systemLoad': 'carga_sistema',
+    'productivity': 'productividad',
+    'epoch': 'epoca',
+}
+
+
+def _leer_lineas(lineas):
+    """Las líneas del cuerpo; un gzip corrupto o cortado es un error del cliente, no del servidor"""
+    try:
+        yield from lineas
+    except (OSError, EOFError, zlib.error) as e:
+        # gzip.BadGzipFile es un OSError; EOFError si el cuerpo termina a mitad
+        raise ParseError(f'Cuerpo comprimido inválido: {e}')
+
+
+def _numero_finito(valor):
+    # bool es un int para Python, pero no es un instante; json.loads acepta NaN e Infinity
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and math.isfinite(valor)
+
+
+def decodificar_delta(lineas):
+    """Reconstruye las muestras completas de un flujo NDJSON codificado en delta"""
+    anteriores = {}
+    machine_id = None
+    for numero, linea in enumerate(_leer_lineas(lineas), start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            delta = json.loads(linea)
+        except ValueError:
+            raise ParseError(f'Línea {numero}: JSON inválido')
+        if not isinstance(delta, dict):
+            raise ParseError(f'Línea {numero}: se esperaba un objeto JSON')
+        # Un lote con valores imposibles es un 400: reintentarlo no lo arregla
+        for campo in ('ts', 'dt'):
+            if campo in delta and not _numero_finito(delta[campo]):
+                raise ParseError(f'Línea {numero}: {campo} debe ser un número finito')
+
+        machine_id = delta.get('machine_id', machine_id)
+        previa = anteriores.get(machine_id, {})
+        muestra = {**previa, **delta}
+        if 'ts' not in delta and 'dt' in delta and 'ts' in previa:
+            muestra['ts'] = previa['ts'] + delta['dt']
+        if 'seq' not in delta and isinstance(previa.get('seq'), int):
+            muestra['seq'] = previa['seq'] + 1
+        muestra.pop('dt', None)
+        muestra['machine_id'] = machine_id
+        anteriores[machine_id] = muestra
+        yield muestra
+
+
+class MuestrasNDJSONParser(BaseParser):
+    """Parser del formato NDJSON delta (opcionalmente gzip) de los agentes"""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return {'muestras': iter(())}
+        request = parser_context['request'] if parser_context else None
+        codificacion = request.META.get('HTTP_CONTENT_ENCODING', '').lower() if request else ''
+        if codificacion == 'gzip':
+            stream = gzip.GzipFile(fileobj=stream, mode='rb')
+        elif codificacion not in ('', 'identity'):
+            raise ParseError(f'Content-Encoding no soportado: {codificacion}')
+        return {'muestras': decodificar_delta(stream)}
+
+
+def extraer_muestras(data):
+    """Muestras de la petición sin importar el formato de envío"""
+    if 'muestras' in data:
+        return data['muestras']
+    if isinstance(data.get('activities'), list):
+        machine_id = data.get('machineId') or data.get('machine_id')
+        return ({'machine_id': machine_id, **muestra} for muestra in data['activities'])
+    return [data]
+
+
+def _timestamp(muestra, ahora):
+    valor = muestra.get('ts')
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        try:
+            momento = datetime.fromtimestamp(valor / 1000, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            raise ParseError(f'ts fuera de rango: {valor}')
+    elif isinstance(muestra.get('timestamp'), str):
+        try:
+            momento = parse_datetime(muestra['timestamp'])
+        except ValueError:
+            # Bien formado pero imposible, como el mes 13
+            raise ParseError(f"timestamp inválido: {muestra['timestamp'][:40]}")
+        if momento is not None and timezone.is_naive(momento):
+            momento = timezone.make_aware(momento, dt_timezone.utc)
+    else:
+        momento = None
+    if momento is None or momento > ahora + MARGEN_FUTURO:
+        return ahora
+    return momento
+
+
+def _secuencia(muestra):
+    valor = muestra.get('seq')
+    if isinstance(valor, bool) or not isinstance(valor, int) or valor < 0:
+        return None
+    return valor
+
+
+def construir_actividad(muestra, usuario, ahora=None):
+    """ActividadUsuario (sin guardar) a partir de una muestra en cualquiera de los formatos"""
+    from .models import ActividadUsuario
+
+    ahora = ahora or timezone.now()
+    muestra = {ALIAS_CAMPOS.get(clave, clave): valor for clave, valor in muestra.items()}
+    productividad = muestra.get('productividad', 'unproductive')
+    return ActividadUsuario(
+        usuario=usuario,
+        machine_id=str(muestra.get('machine_id') or 'unknown')[:100],
+        timestamp=_timestamp(muestra, ahora),
+        ventana_activa=str(muestra.get('ventana_activa') or '')[:200],
+        procesos_activos=muestra.get('procesos_activos') or [],
+        carga_sistema=muestra.get('carga_sistema') or {},
+        productividad=productividad if productividad in PRODUCTIVIDADES else 'neutral',
+        seq=_secuencia(muestra),
+        epoca=str(muestra.get('epoca') or '')[:36],
+    )
+
+
+def clave_marca_agua(machine_id, epoca=''):
+    return f'ingesta:hwm:{machine_id}:{epoca}' if epoca else f'ingesta:hwm:{machine_id}'
+
+
+def marca_agua(machine_id, epoca=''):
+    """Mayor secuencia guardada para la máquina y época; si la cache no la tiene se lee del índice una vez"""
+    from .models import ActividadUsuario
+
+    clave = clave_marca_agua(machine_id, epoca)
+    valor = cache.get(clave)
+    if valor is None:
+        valor = ActividadUsuario.objects.filter(
+            machine_id=machine_id, epoca=epoca,
+        ).aggregate(maximo=Max('seq'))['maximo']
+        valor = -1 if valor is None else valor
+        cache.set(clave, valor, DURACION_MARCA_AGUA)
+    return valor
+
+
+def _reinicio(seq, marca):
+    return marca - seq > SALTO_REINICIO
+
+
+def avanzar_marcas_agua(marcas):
+    for (machine_id, epoca), seq in marcas.items():
+        actual = marca_agua(machine_id, epoca)
+        if seq > actual or _reinicio(seq, actual):
+            cache.set(clave_marca_agua(machine_id, epoca), seq, DURACION_MARCA_AGUA)
+
+
+def filtrar_nuevas(actividades, resultado, marcas):
+    """Descarta las actividades cuya secuencia no supera la marca de agua de su máquina y época.
+
+    Cuenta las descartadas en resultado['duplicadas'] y va avanzando `marcas`
+    ((machine_id, epoca) -> secuencia) con las aceptadas. Un retroceso mayor
+    que SALTO_REINICIO reinicia la marca en lugar de descartar la muestra; si
+    eran reenvíos, la restricción única los descarta al insertar.
+    """
+    for actividad in actividades:
+        if actividad.seq is not None:
+            clave = (actividad.machine_id, actividad.epoca)
+            if clave not in marcas:
+                marcas[clave] = marca_agua(*clave)
+            if actividad.seq <= marcas[clave]:
+                if not _reinicio(actividad.seq, marcas[clave]):
+                    resultado['duplicadas'] += 1
+                    continue
+                logger.warning('La secuencia de %s volvió de %s a %s: se reinicia su marca de agua',
+                               actividad.machine_id, marcas[clave], actividad.seq)
+            marcas[clave] = actividad.seq
+        yield actividad
+
+
+def insertar_nuevas(actividades):
+    """Inserta las actividades ignorando las secuencias ya guardadas; devuelve las que se insertaron.
+
+    bulk_create con ignore_conflicts no dice qué filas escribió, y contar el
+    lote completo sumaría los reenvíos. Después del INSERT se leen las filas
+    con esas claves (machine_id, epoca, seq): son de este lote las que tienen
+    su fecha_creacion, que auto_now_add fija en cada objeto al insertarlo. Una
+    fila ya guardada (un reenvío del spool) o escrita por un envío concurrente
+    tiene otra.
+    """
+    from django.db import router
+    from .models import ActividadUsuario
+
+    if not actividades:
+        return []
+    alias = router.db_for_write(ActividadUsuario)
+    ActividadUsuario.objects.using(alias).bulk_create(actividades, ignore_conflicts=True)
+
+    guardadas = {}
+    for machine_id, epoca in {(a.machine_id, a.epoca) for a in actividades if a.seq is not None}:
+        filas = ActividadUsuario.objects.using(alias).filter(
+            machine_id=machine_id, epoca=epoca,
+            seq__in=[a.seq for a in actividades if a.seq is not None and (a.machine_id, a.epoca) == (machine_id, epoca)],
+        ).values_list('seq', 'pk', 'fecha_creacion')
+        guardadas.update(((machine_id, epoca, seq), (pk, creada)) for seq, pk, creada in filas)
+
+    insertadas = []
+    for actividad in actividades:
+        # Sin secuencia no hay restricción única: siempre se insertan
+        if actividad.seq is not None:
+            pk, creada = guardadas.get((actividad.machine_id, actividad.epoca, actividad.seq), (None, None))
+            if creada != actividad.fecha_creacion:
+                continue
+            actividad.pk = pk
+            actividad._state.adding = False
+            actividad._state.db = alias
+        insertadas.append(actividad)
+    return insertadas
+
+
+def guardar_muestras(muestras, usuario):
+    """Inserta las muestras nuevas en lotes con bulk_create.
+
+    Todo el envío se guarda en una transacción: si una línea está mal formada
+    no queda nada a medias y el agente puede reintentar el envío completo.
+    Devuelve {'registradas', 'duplicadas'}; son duplicadas las muestras cuya
+    secuencia no supera la marca de agua de su máquina o que ya estaban
+    guardadas (un envío concurrente de la misma máquina).
+    """
+    from .uso_aplicaciones import acumular_uso
+
+    ahora = timezone.now()
+    resultado = {'registradas': 0, 'duplicadas': 0}
+    marcas = {}
+    lote = []
+
+    def insertar():
+        insertadas = insertar_nuevas(lote)
+        acumular_uso(insertadas)
+        resultado['registradas'] += len(insertadas)
+        resultado['duplicadas'] += len(lote) - len(insertadas)
+        lote.clear()
+
+    with transaction.atomic():
+        actividades = (construir_actividad(muestra, usuario, ahora) for muestra in muestras)
+        for actividad in filtrar_nuevas(actividades, resultado, marcas):
+            lote.append(actividad)
+            if len(lote) >= TAMANO_LOTE_INSERCION:
+                insertar()
+        if lote:
+            insertar()
+        transaction.on_commit(lambda: avanzar_marcas_agua(marcas))
+        transaction.on_commit(lambda: olvidar_ultima_actividad([usuario.pk]))
+    return resultado
+
+
+def _clave_ultima_actividad(usuario_id):
+    return f'chat:ultima_actividad:{usuario_id}'
+
+
+def ultima_actividad(usuario):
+    """Última ActividadUsuario del usuario (o None), guardada en la cache 'chat' del asistente"""
+    from .cache_backends import cache_nombrada
+    from .models import ActividadUsuario
+
+    cache_chat = cache_nombrada('chat')
+    guardada = cache_chat.get(_clave_ultima_actividad(usuario.pk))
+    if guardada is not None:
+        return guardada[0]
+    actividad = ActividadUsuario.objects.filter(usuario=usuario).order_by('-timestamp').first()
+    # Tupla para distinguir "sin actividad" de un fallo de cache
+    cache_chat.set(_clave_ultima_actividad(usuario.pk), (actividad,))
+    return actividad
+
+
+def olvidar_ultima_actividad(usuarios_ids):
+    """Invalida la última actividad cacheada de los usuarios que enviaron muestras"""
+    from .cache_backends import cache_nombrada
+
+    cache_nombrada('chat').delete_many([_clave_ultima_actividad(usuario_id) for usuario_id in usuarios_ids])
+
+
+def codificar_delta(muestras):
+    """Codifica muestras completas (con `ts` en ms) como líneas NDJSON delta; lo usan tests y benchmarks"""
+    anteriores = {}
+    ultima_maquina = None
+    for muestra in muestras:
+        machine_id = muestra.get('machine_id')
+        previa = anteriores.get(machine_id)
+        if previa is None:
+            delta = dict(muestra)
+        else:
+            delta = {
+                clave: valor for clave, valor in muestra.items()
+                if clave not in ('ts', 'seq', 'machine_id') and previa.get(clave) != valor
+            }
+            delta['dt'] = muestra['ts'] - previa['ts']
+            if 'seq' in muestra and muestra['seq'] != previa.get('seq', -2) + 1:
+                delta['seq'] = muestra['seq']
+            if machine_id != ultima_maquina:
+                delta['machine_id'] = machine_id
+        anteriores[machine_id] = muestra
+        ultima_maquina = machine_id
+        yield json.dumps(delta, separators=(',', ':')) + '\n'
@@ -0,0 +1,172 @@
+"""
+Intención de los mensajes del chat del asistente.
+
+Un clasificador lineal (TF-IDF de n-gramas de caracteres + regresión
+logística) entrenado fuera de línea por `entrenar_intenciones` con mensajes
+etiquetados se guarda como un artefacto joblib comprimido en
+INTENCIONES_MODELO. La imagen Docker lo entrena al construirse y el arranque
+de docker-compose lo entrena si falta (`--si-falta`). Cada worker lo carga una
+sola vez, la primera vez que clasifica (scikit-learn no se importa al
+arrancar); después de reentrenar hay que reiniciar los workers.
+
+Si no hay artefacto, o la probabilidad de la intención elegida es menor que
+INTENCIONES_UMBRAL, decide `intencion_por_reglas` con las palabras clave.
+"""
+import csv
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DATOS_SEMILLA = Path(__file__).resolve().parent / 'datos' / 'intenciones.csv'
+
+# None: sin cargar; False: no hay modelo utilizable en este worker
+_modelo = None
+_bloqueo = threading.Lock()
+
+# Reglas en orden de prioridad: gana la primera lista con alguna palabra contenida en el mensaje
+REGLAS = [
+    ('saludo', ['hola', 'buenos', 'buenas', 'saludos', 'hey', 'hi', 'hello', 'buen dia', 'buenas tardes', 'buenas noches']),
+    ('pregunta_personal', ['como te llamas', 'quien eres', 'qué eres', 'que eres', 'tu nombre']),
+    ('ayuda', ['ayuda', 'help', 'ayudame', 'necesito ayuda', 'puedes ayudarme']),
+    ('productividad', ['productividad', 'productivo', 'eficiencia', 'rendimiento']),
+    ('errores', ['error', 'problema', 'issue', 'bug', 'falla', 'no funciona']),
+    ('excel', ['excel', 'formula', 'fórmula', 'hoja', 'spreadsheet', 'calcul']),
+    # Antes que 'tiempo', que también contiene 'trabajo'
+    ('equipo', ['trabajo en equipo']),
+    ('tiempo', ['tiempo', 'horas', 'trabajo', 'horario', 'agenda', 'calendario']),
+    ('consejos', ['consejo', 'tip', 'recomendacion', 'sugerencia', 'mejorar']),
+    ('ortografia', ['escribir', 'escribe', 'ortografía', 'ortografia', 'palabra', 'palabras', 'se escribe', 'como se escribe']),
+    ('estado', ['estado', 'status', 'situación', 'situacion', 'como estas', 'que haces']),
+    ('matematicas', ['+', '-', '*', '/', '=', 'mas', 'menos', 'por', 'entre']),
+]
+
+REGLAS_FINALES = [
+    ('documentacion', ['manual', 'documentacion', 'documentación', 'guia', 'guía', 'tutorial', 'como usar', 'instrucciones', 'ayuda con']),
+    ('configuracion', ['configurar', 'configuracion', 'configuración', 'instalar', 'setup', 'set up', 'como configurar']),
+    ('reportes', ['reporte', 'estadistica', 'estadística', 'grafico', 'gráfico', 'analisis', 'análisis', 'dashboard']),
+    ('equipo', ['equipo', 'compañeros', 'colaboracion', 'colaboración']),
+    ('salud', ['salud', 'bienestar', 'estres', 'estrés', 'cansado', 'agotado', 'descanso', 'pausa']),
+    ('metas', ['meta', 'objetivo', 'goal', 'logro', 'progreso', 'avance', 'mejora']),
+]
+
+INICIOS_PREGUNTA = ('como', 'qué', 'que', 'cuando', 'donde', 'por qué', 'porque', 'para qué', 'quién', 'quien')
+
+
+def intencion_por_reglas(mensaje):
+    """Intención por palabras clave"""
+    mensaje_lower = mensaje.lower()
+    for intencion, palabras in REGLAS:
+        if any(palabra in mensaje_lower for palabra in palabras):
+            return intencion
+    if '?' in mensaje or mensaje_lower.startswith(INICIOS_PREGUNTA):
+        return 'pregunta_general'
+    for intencion, palabras in REGLAS_FINALES:
+        if any(palabra in mensaje_lower for palabra in palabras):
+            return intencion
+    return 'general'
+
+
+def ruta_modelo():
+    return Path(getattr(settings, 'INTENCIONES_MODELO', Path(settings.BASE_DIR) / 'modelos' / 'intenciones.joblib'))
+
+
+def leer_ejemplos(ruta=DATOS_SEMILLA):
+    """(mensajes, intenciones) de un CSV o JSONL con los campos mensaje e intencion"""
+    ruta = Path(ruta)
+    with open(ruta, encoding='utf-8', newline='') as archivo:
+        if ruta.suffix == '.jsonl':
+            filas = [json.loads(linea) for linea in archivo if linea.strip()]
+        else:
+            filas = list(csv.DictReader(archivo))
+    pares = [
+        (fila['mensaje'].strip(), fila['intencion'].strip())
+        for fila in filas
+        if (fila.get('mensaje') or '').strip() and (fila.get('intencion') or '').strip()
+    ]
+    return [mensaje for mensaje, _ in pares], [intencion for _, intencion in pares]
+
+
+def crear_pipeline():
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    # N-gramas de caracteres dentro de cada palabra: toleran errores de tipeo y conjugaciones
+    return make_pipeline(
+        TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 4), strip_accents='unicode', sublinear_tf=True),
+        LogisticRegression(C=10.0, max_iter=2000),
+    )
+
+
+def entrenar(mensajes, intenciones):
+    return crear_pipeline().fit(mensajes, intenciones)
+
+
+def guardar_modelo(pipeline, ruta=None):
+    """Escribe el artefacto comprimido de forma atómica; devuelve su tamaño en bytes"""
+    import joblib
+
+    ruta = Path(ruta or ruta_modelo())
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    vectorizador = pipeline[0]
+    # stop_words_ guarda los términos descartados y sólo sirve para inspección
+    if hasattr(vectorizador, 'stop_words_'):
+        del vectorizador.stop_words_
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    joblib.dump(pipeline, temporal, compress=3)
+    os.replace(temporal, ruta)
+    return ruta.stat().st_size
+
+
+def obtener_modelo():
+    """Pipeline entrenado, cargado una vez por proceso; None si no hay artefacto utilizable"""
+    global _modelo
+    if _modelo is None:
+        with _bloqueo:
+            if _modelo is None:
+                ruta = ruta_modelo()
+                try:
+                    import joblib
+                    _modelo = joblib.load(ruta)
+                except FileNotFoundError:
+                    # Una vez por worker: el despliegue debería haber corrido entrenar_intenciones
+                    logger.warning('No hay modelo de intenciones en %s; se usan las reglas. '
+                                   'Entrenarlo con `python manage.py entrenar_intenciones`', ruta)
+                    _modelo = False
+                except Exception:
+                    logger.warning('No se pudo cargar el modelo de intenciones %s; se usan las reglas', ruta, exc_info=True)
+                    _modelo = False
+    return _modelo if _modelo is not False else None
+
+
+def descartar_modelo():
+    """Olvida el modelo cargado: la próxima clasificación vuelve a leer el artefacto"""
+    global _modelo
+    _modelo = None
+
+
+def predecir(mensajes, modelo=None):
+    """[(intencion, probabilidad)] de cada mensaje en una sola pasada; None sin modelo"""
+    modelo = modelo if modelo is not None else obtener_modelo()
+    if modelo is None or not mensajes:
+        return None if modelo is None else []
+    probabilidades = modelo.predict_proba(mensajes)
+    mejores = probabilidades.argmax(axis=1)
+    clases = modelo.classes_
+    return [(str(clases[i]), float(probabilidades[fila, i])) for fila, i in enumerate(mejores)]
+
+
+def clasificar(mensajes):
+    """Intención de cada mensaje: la del modelo si tiene confianza suficiente, si no la de las reglas"""
+    umbral = getattr(settings, 'INTENCIONES_UMBRAL', 0.5)
+    predicciones = predecir(mensajes) or [(None, 0.0)] * len(mensajes)
+    return [
+        intencion if intencion and probabilidad >= umbral else intencion_por_reglas(mensaje)
+        for mensaje, (intencion, probabilidad) in zip(mensajes, predicciones)
+    ]
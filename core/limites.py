@@ -0,0 +1,128 @@
+"""
+Limitación de tasa (throttling) para las APIs de chat, consejos e ingesta.
+
+Cada identidad (usuario o máquina) puede hacer `N` peticiones por período,
+según la tasa 'N/período' de REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], medidas
+en una ventana deslizante: se cuentan las peticiones de la ventana actual
+(alineada al reloj) y, de la anterior, la parte proporcional que todavía cae
+dentro del último período. Así en el borde entre dos ventanas no pasan 2N
+peticiones seguidas, como con ventanas fijas.
+
+Los contadores están en la cache 'limites' y se actualizan sólo con
+`add`/`incr`/`decr`, que son atómicos en los backends de cache de Django:
+comprobar el límite cuesta tres operaciones de cache y ninguna consulta a la
+base. Una petición rechazada no consume.
+
+Al superar el límite DRF responde 429 con Retry-After: los segundos hasta que
+la estimación baja lo suficiente para admitir otra petición. Los agentes de
+escritorio esperan ese tiempo antes de volver a enviar.
+"""
+import math
+import time
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache_backends import cache_nombrada
+
+
+class LimiteVentanaDeslizante(SimpleRateThrottle):
+    """Límite por identidad en una ventana deslizante estimada con los contadores de dos ventanas fijas"""
+    cache = cache_nombrada('limites')
+
+    def get_rate(self):
+        # Se lee en cada petición (no al importar) y un scope sin tasa no se limita
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        ventana, transcurrido = divmod(time.time(), self.duration)
+        ventana = int(ventana)
+        fraccion = transcurrido / self.duration
+        clave = f'{self.key}:{ventana}'
+
+        actuales = self._incrementar(clave)
+        anteriores = self.cache.get(f'{self.key}:{ventana - 1}', 0)
+        # Se supone que las peticiones de la ventana anterior se repartieron de forma pareja
+        if anteriores * (1 - fraccion) + actuales <= self.num_requests:
+            return True
+
+        try:
+            self.cache.decr(clave)
+        except ValueError:
+            pass
+        self.espera = self._espera(anteriores, actuales - 1, fraccion)
+        return False
+
+    def _incrementar(self, clave):
+        # El contador se sigue leyendo como ventana anterior durante la ventana siguiente
+        vida = 2 * self.duration + 1
+        # add() sólo crea el contador si no existe; incr() es atómico
+        if self.cache.add(clave, 1, vida):
+            return 1
+        try:
+            return self.cache.incr(clave)
+        except ValueError:
+            # El contador expiró entre add() e incr()
+            self.cache.add(clave, 1, vida)
+            return 1
+
+    def _espera(self, anteriores, actuales, fraccion):
+        """Segundos hasta que la estimación admite una petición más"""
+        limite, duracion = self.num_requests, self.duration
+        if actuales + 1 <= limite:
+            # Alcanza con que salga del período una parte mayor de la ventana anterior
+            return duracion * (anteriores * (1 - fraccion) + actuales + 1 - limite) / anteriores
+        # La ventana actual ya está llena: hay que esperar a que sea la anterior y se descuente
+        return duracion * (1 - fraccion) + duracion * (1 - (limite - 1) / actuales)
+
+    def wait(self):
+        # Redondeo a milisegundos: 4.9999999 s son 5 s, no 6
+        return max(1, math.ceil(round(self.espera, 3)))
+
+
+class LimiteUsuario(LimiteVentanaDeslizante):
+    """Límite por usuario autenticado (o por IP si es anónimo); las subclases fijan el scope"""
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'limite:{self.scope}:usuario:{ident}'
+
+
+class LimiteChat(LimiteUsuario):
+    scope = 'chat'
+
+
+class LimiteConsejos(LimiteUsuario):
+    scope = 'consejos'
+
+
+class LimiteActividad(LimiteUsuario):
+    scope = 'actividad'
+
+
+class LimiteMaquina(LimiteVentanaDeslizante):
+    """Límite por machine_id del agente (cabecera X-Machine-Id o campo del JSON)"""
+    scope = 'actividad_maquina'
+
+    def get_cache_key(self, request, view):
+        machine_id = request.META.get('HTTP_X_MACHINE_ID')
+        if not machine_id and (request.content_type or '').startswith('application/json'):
+            # JSON pequeño: DRF ya lo tiene que parsear para la vista
+            data = request.data
+            if isinstance(data, dict):
+                machine_id = data.get('machine_id') or data.get('machineId')
+        if not machine_id:
+            return None
+        return f'limite:{self.scope}:maquina:{str(machine_id)[:100]}'
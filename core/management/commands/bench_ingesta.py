@@ -0,0 +1,96 @@
+import gzip
+import io
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+
+from core.ingesta import MuestrasNDJSONParser, codificar_delta, construir_actividad, extraer_muestras
+
+
+class _PeticionFalsa:
+    def __init__(self, meta):
+        self.META = meta
+
+
+class Command(BaseCommand):
+    help = 'Compara bytes y CPU por muestra del JSON de sara-monitor contra el NDJSON delta comprimido'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--muestras', type=int, default=6000, help='Muestras sintéticas a generar')
+        parser.add_argument('--por-envio', type=int, default=6, help='Muestras por envío (sara-monitor manda 6 cada 30 s)')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['semilla'])
+        muestras = self.generar_muestras(options['muestras'])
+        envios = [muestras[i:i + options['por_envio']] for i in range(0, len(muestras), options['por_envio'])]
+
+        # Formato actual: JSON detallado de sara-monitor
+        cuerpos_json = [self.cuerpo_json(envio) for envio in envios]
+        # Formato nuevo: NDJSON delta + gzip
+        cuerpos_delta = [gzip.compress(''.join(codificar_delta(envio)).encode('utf-8')) for envio in envios]
+
+        total = len(muestras)
+        self.stdout.write(f'{total} muestras en {len(envios)} envíos de {options["por_envio"]}')
+        self.reportar('JSON (actual)', cuerpos_json, total, self.decodificar_json)
+        self.reportar('NDJSON delta + gzip', cuerpos_delta, total, self.decodificar_delta)
+
+    def reportar(self, nombre, cuerpos, total, decodificar):
+        bytes_totales = sum(len(cuerpo) for cuerpo in cuerpos)
+        inicio = time.process_time()
+        decodificadas = sum(decodificar(cuerpo) for cuerpo in cuerpos)
+        cpu = time.process_time() - inicio
+        assert decodificadas == total
+        self.stdout.write(
+            f'{nombre:22s} {bytes_totales / total:8.1f} bytes/muestra   '
+            f'{cpu / total * 1e6:8.1f} µs CPU/muestra'
+        )
+
+    def decodificar_json(self, cuerpo):
+        data = JSONParser().parse(io.BytesIO(cuerpo))
+        return self.construir(extraer_muestras(data))
+
+    def decodificar_delta(self, cuerpo):
+        parser_context = {'request': _PeticionFalsa({'HTTP_CONTENT_ENCODING': 'gzip'})}
+        data = MuestrasNDJSONParser().parse(io.BytesIO(cuerpo), parser_context=parser_context)
+        return self.construir(extraer_muestras(data))
+
+    def construir(self, muestras):
+        # Decodificación + construcción de los objetos a insertar, sin tocar la base
+        return sum(1 for muestra in muestras if construir_actividad(muestra, None) is not None)
+
+    def cuerpo_json(self, envio):
+        return json.dumps({
+            'machineId': envio[0]['machine_id'],
+            'activities': [{
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(muestra['ts'] / 1000)) + '.000Z',
+                'machineId': muestra['machine_id'],
+                'activeWindow': muestra['ventana_activa'],
+                'topProcesses': muestra['procesos_activos'],
+                'systemLoad': muestra['carga_sistema'],
+                'productivity': muestra['productividad'],
+            } for muestra in envio],
+        }, indent=2).encode('utf-8')
+
+    def generar_muestras(self, cantidad):
+        """Muestras cada 5 s con la misma forma que captureActivity() de sara-monitor"""
+        procesos = ['chrome.exe', 'code.exe', 'excel.exe', 'teams.exe', 'outlook.exe', 'explorer.exe']
+        ts = int(time.time() * 1000)
+        top = random.sample(procesos, 5)
+        muestras = []
+        for _ in range(cantidad):
+            ts += 5000
+            if random.random() < 0.2:
+                top = random.sample(procesos, 5)
+            muestras.append({
+                'machine_id': 'bench-machine-0001',
+                'ts': ts,
+                'ventana_activa': top[0],
+                'procesos_activos': [{'name': nombre, 'cpu': 1.5, 'memory': 2.25} for nombre in top],
+                'carga_sistema': {'cpu': round(random.uniform(5, 60), 1), 'cpus': 8},
+                'productividad': 'productive',
+            })
+        return muestras
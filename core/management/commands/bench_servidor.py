@@ -0,0 +1,151 @@
+import importlib.util
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.autenticacion import emitir_tokens
+from core.models import Usuario
+
+USUARIO_BENCH = 'bench_servidor'
+PERFILES = ('sync', 'gthread', 'uvicorn')
+
+
+class Command(BaseCommand):
+    help = 'Levanta gunicorn con cada perfil de sara/gunicorn_conf.py y mide el rendimiento de los endpoints más usados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--perfiles', default=','.join(PERFILES), help='Perfiles separados por coma')
+        parser.add_argument('--duracion', type=float, default=10.0, help='Segundos de carga por endpoint')
+        parser.add_argument('--concurrencia', type=int, default=16, help='Clientes simultáneos')
+        parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY para todos los perfiles')
+        parser.add_argument('--puerto', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        perfiles = [perfil.strip() for perfil in options['perfiles'].split(',') if perfil.strip()]
+        invalidos = set(perfiles) - set(PERFILES)
+        if invalidos:
+            raise CommandError(f'Perfiles inválidos: {", ".join(sorted(invalidos))}')
+
+        usuario, _ = Usuario.objects.get_or_create(username=USUARIO_BENCH, defaults={'rol': 'empleado'})
+        token = emitir_tokens(usuario)['access']
+        base = f'http://127.0.0.1:{options["puerto"]}'
+        endpoints = self.endpoints(token)
+
+        self.stdout.write(
+            f'{options["concurrencia"]} clientes, {options["duracion"]:.0f} s por endpoint, '
+            f'base de datos {settings.DATABASES["default"]["ENGINE"].rsplit(".", 1)[-1]}'
+        )
+        try:
+            for perfil in perfiles:
+                if perfil == 'uvicorn' and importlib.util.find_spec('uvicorn') is None:
+                    self.stdout.write(self.style.WARNING('uvicorn: omitido (paquete uvicorn no instalado)'))
+                    continue
+                servidor = self.iniciar(perfil, options)
+                try:
+                    self.esperar_listo(base, servidor)
+                    for nombre, metodo, ruta, cuerpo, cabeceras in endpoints:
+                        resultado = self.cargar(base + ruta, metodo, cuerpo, cabeceras,
+                                                options['concurrencia'], options['duracion'])
+                        self.reportar(perfil, nombre, resultado, options['duracion'])
+                finally:
+                    servidor.send_signal(signal.SIGTERM)
+                    servidor.wait(timeout=30)
+        finally:
+            # Borra también las actividades generadas (cascade)
+            usuario.delete()
+
+    def endpoints(self, token):
+        autenticado = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+        muestra = {
+            'machine_id': 'bench-servidor',
+            'ventana_activa': 'code.exe',
+            'procesos_activos': [{'name': 'code.exe', 'cpu': 3.5, 'memory': 4.0}],
+            'carga_sistema': {'cpu': 20.0},
+            'productividad': 'productive',
+        }
+        return [
+            ('health', 'GET', '/api/health/', None, {}),
+            ('actividad', 'POST', '/api/activity/', json.dumps(muestra).encode(), autenticado),
+            ('chat', 'POST', '/api/asistente/chat/', json.dumps({'mensaje': '¿Cómo va mi productividad hoy?'}).encode(), autenticado),
+            ('consejos', 'GET', '/api/consejos-proactivos/', None, autenticado),
+        ]
+
+    def iniciar(self, perfil, options):
+        entorno = {
+            **os.environ,
+            'SERVIDOR_PERFIL': perfil,
+            'PORT': str(options['puerto']),
+            'GUNICORN_ACCESSLOG': '',
+            'GUNICORN_LOGLEVEL': 'warning',
+            # Sin limitación de tasa: se mide el servidor, no el throttling
+            'LIMITE_CHAT': '1000000/s',
+            'LIMITE_CONSEJOS': '1000000/s',
+            'LIMITE_ACTIVIDAD': '1000000/s',
+            'LIMITE_ACTIVIDAD_MAQUINA': '1000000/s',
+        }
+        if options['workers']:
+            entorno['WEB_CONCURRENCY'] = str(options['workers'])
+        conf = os.path.join(settings.BASE_DIR, 'sara', 'gunicorn_conf.py')
+        return subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', conf], cwd=settings.BASE_DIR, env=entorno)
+
+    def esperar_listo(self, base, servidor, limite=60):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            if servidor.poll() is not None:
+                raise CommandError(f'gunicorn terminó al arrancar (código {servidor.returncode})')
+            try:
+                with urllib.request.urlopen(base + '/api/health/', timeout=2):
+                    return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.5)
+        raise CommandError('gunicorn no respondió a /api/health/ a tiempo')
+
+    def cargar(self, url, metodo, cuerpo, cabeceras, concurrencia, duracion):
+        latencias = []
+        errores = []
+        lock = threading.Lock()
+        fin = time.monotonic() + duracion
+
+        def cliente():
+            propias, fallidas = [], 0
+            while time.monotonic() < fin:
+                peticion = urllib.request.Request(url, data=cuerpo, headers=cabeceras, method=metodo)
+                inicio = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+                        respuesta.read()
+                    propias.append(time.perf_counter() - inicio)
+                except (urllib.error.URLError, ConnectionError, TimeoutError):
+                    fallidas += 1
+            with lock:
+                latencias.extend(propias)
+                errores.append(fallidas)
+
+        hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return latencias, sum(errores)
+
+    def reportar(self, perfil, endpoint, resultado, duracion):
+        latencias, errores = resultado
+        if latencias:
+            cuantiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+            p50, p99 = cuantiles[49] * 1000, cuantiles[98] * 1000
+        else:
+            p50 = p99 = 0.0
+        self.stdout.write(
+            f'{perfil:8s} {endpoint:10s} {len(latencias) / duracion:9.1f} req/s   '
+            f'p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   errores {errores}'
+        )
@@ -0,0 +1,60 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from core.intenciones import DATOS_SEMILLA, crear_pipeline, guardar_modelo, leer_ejemplos, predecir, ruta_modelo
+
+
+class Command(BaseCommand):
+    help = 'Entrena el clasificador de intenciones del chat con mensajes etiquetados y guarda el artefacto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--datos', default=str(DATOS_SEMILLA),
+                            help='CSV o JSONL con los campos mensaje e intencion')
+        parser.add_argument('--salida', help='Ruta del artefacto (por defecto INTENCIONES_MODELO)')
+        parser.add_argument('--validacion', type=int, default=5,
+                            help='Particiones de la validación cruzada (0 para omitirla)')
+        parser.add_argument('--si-falta', action='store_true',
+                            help='No hace nada si el artefacto ya existe (para el arranque del contenedor)')
+
+    def handle(self, *args, **options):
+        ruta = options['salida'] or ruta_modelo()
+        if options['si_falta'] and Path(ruta).exists():
+            self.stdout.write(f'El modelo {ruta} ya existe; no se reentrena')
+            return
+        try:
+            mensajes, intenciones = leer_ejemplos(options['datos'])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'No se pudieron leer los ejemplos de {options["datos"]}: {e}')
+        clases = sorted(set(intenciones))
+        if len(clases) < 2:
+            raise CommandError('Se necesitan ejemplos de al menos dos intenciones')
+        self.stdout.write(f'{len(mensajes)} mensajes, {len(clases)} intenciones')
+
+        minimo_por_clase = min(intenciones.count(clase) for clase in clases)
+        particiones = min(options['validacion'], minimo_por_clase)
+        if particiones >= 2:
+            from sklearn.model_selection import StratifiedKFold, cross_val_score
+
+            exactitud = cross_val_score(
+                crear_pipeline(), mensajes, intenciones,
+                cv=StratifiedKFold(particiones, shuffle=True, random_state=0),
+            )
+            self.stdout.write(f'Exactitud en validación cruzada ({particiones} particiones): {exactitud.mean():.1%}')
+
+        inicio = time.perf_counter()
+        pipeline = crear_pipeline().fit(mensajes, intenciones)
+        self.stdout.write(f'Entrenado en {time.perf_counter() - inicio:.2f} s')
+
+        tamano = guardar_modelo(pipeline, ruta)
+
+        # Latencia de predicción en lote con el artefacto tal como lo cargará un worker
+        import joblib
+
+        cargado = joblib.load(ruta)
+        inicio = time.perf_counter()
+        predecir(mensajes, cargado)
+        por_mensaje = (time.perf_counter() - inicio) / len(mensajes) * 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f'Modelo guardado en {ruta} ({tamano / 1024:.0f} KB); predicción en lote: {por_mensaje:.0f} µs por mensaje'
+        ))
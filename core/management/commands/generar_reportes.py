@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.directorio import obtener_directorio
+from core.models import Usuario
+from core.reportes import FORMATOS, PERIODOS, fecha_reporte, generar_reporte
+from core.sesiones import sesionizar_todos
+
+
+class Command(BaseCommand):
+    help = 'Genera por adelantado los reportes del período para los empleados activos (las descargas leen la cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('periodo', choices=PERIODOS)
+        parser.add_argument('--fecha', help='Día dentro del período, AAAA-MM-DD (por defecto hoy)')
+        parser.add_argument('--formatos', default='pdf,xlsx', help=f'Separados por coma: {", ".join(FORMATOS)}')
+
+    def handle(self, *args, **options):
+        formatos = [formato.strip() for formato in options['formatos'].split(',') if formato.strip()]
+        invalidos = set(formatos) - set(FORMATOS)
+        if invalidos:
+            raise CommandError(f'Formatos no soportados: {", ".join(sorted(invalidos))}')
+        try:
+            fecha = fecha_reporte(options['fecha'])
+        except ValueError:
+            raise CommandError('Fecha inválida, use AAAA-MM-DD')
+
+        inicio = time.perf_counter()
+        # Incluye las últimas muestras de los agentes que ya dejaron de enviar
+        sesionizar_todos()
+        ids = [usuario['id'] for usuario in obtener_directorio().usuarios
+               if usuario['rol'] == 'empleado' and usuario['is_active']]
+        generados = 0
+        for usuario in Usuario.objects.filter(pk__in=ids).order_by('username'):
+            for formato in formatos:
+                generar_reporte(usuario, options['periodo'], fecha, formato)
+                generados += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{generados} reportes {options["periodo"]} de {len(ids)} empleados en {time.perf_counter() - inicio:.1f} s'
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.importacion import TAMANO_LOTE, detectar_formato, importar_registros
+from core.models import Usuario
+from core.validacion import obtener_motor
+
+
+class Command(BaseCommand):
+    help = 'Importa registros en masa desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo CSV o JSONL')
+        parser.add_argument('--usuario', required=True, help='Username que realiza la importación')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Formato del archivo (por defecto según la extensión)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas por lote')
+        parser.add_argument('--procesos', type=int, default=0, help='Procesos para validar en paralelo (0 = en este proceso)')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f"El usuario {options['usuario']} no existe")
+
+        try:
+            formato = detectar_formato(options['archivo'], options['formato'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+            resultado = importar_registros(
+                archivo, formato, usuario,
+                tamano_lote=options['lote'],
+                procesos=options['procesos'],
+            )
+
+        for rechazo in resultado['detalle_rechazos']:
+            self.stdout.write(f"Línea {rechazo['linea']}: {rechazo['motivo']}")
+
+        if options['verbosity'] >= 2:
+            for nombre, contador in obtener_motor().estadisticas().items():
+                self.stdout.write(
+                    f"Regla {nombre}: {contador['valores']} valores en {contador['lotes']} lotes, "
+                    f"{contador['ms_total']} ms ({contador['us_por_valor']} µs/valor)"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación completada: {resultado['creados']} creados "
+            f"({resultado['con_errores']} con errores), {resultado['rechazados']} rechazados"
+        ))
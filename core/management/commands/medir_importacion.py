@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Arranque en frío de un worker: settings, apps, modelos, signals y URLs (que importan las vistas)
+CODIGO_ARRANQUE = 'import django; django.setup(); import sara.urls'
+
+
+def medir(codigo=CODIGO_ARRANQUE):
+    """Ejecuta `codigo` con `python -X importtime` en un proceso nuevo; devuelve [(profundidad, propio_us, acumulado_us, modulo)]"""
+    entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'sara.settings')}
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise CommandError(f'El arranque falló:\n{proceso.stderr[-2000:]}')
+
+    modulos = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        # La profundidad de la importación es la sangría del nombre (2 espacios por nivel)
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        modulos.append((profundidad, int(propio), int(acumulado), nombre.strip()))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = 'Mide con python -X importtime el arranque en frío y falla si supera el presupuesto o importa módulos prohibidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--presupuesto-ms', type=float, default=1000.0,
+                            help='Tiempo máximo de importación del arranque')
+        parser.add_argument('--prohibidos', default='sklearn,pandas,joblib',
+                            help='Paquetes que no deben importarse al arrancar, separados por coma')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Se toma la medición más rápida')
+        parser.add_argument('--top', type=int, default=15, help='Paquetes más pesados a listar')
+
+    def handle(self, *args, **options):
+        mediciones = [medir() for _ in range(max(1, options['repeticiones']))]
+        modulos = min(mediciones, key=lambda m: sum(acumulado for profundidad, _, acumulado, _ in m if profundidad == 0))
+        total_ms = sum(acumulado for profundidad, _, acumulado, _ in modulos if profundidad == 0) / 1000
+
+        self.stdout.write(f'Importación en arranque en frío: {total_ms:.0f} ms ({len(modulos)} módulos)')
+        raices = sorted((m for m in modulos if m[0] == 0), key=lambda m: m[2], reverse=True)
+        for _, _, acumulado, nombre in raices[:options['top']]:
+            self.stdout.write(f'  {acumulado / 1000:8.1f} ms  {nombre}')
+
+        prohibidos = [p.strip() for p in options['prohibidos'].split(',') if p.strip()]
+        nombres = {nombre for _, _, _, nombre in modulos}
+        importados = [paquete for paquete in prohibidos if paquete in nombres]
+        errores = []
+        if importados:
+            errores.append(f'el arranque importa {", ".join(importados)}')
+        if total_ms > options['presupuesto_ms']:
+            errores.append(f'{total_ms:.0f} ms supera el presupuesto de {options["presupuesto_ms"]:.0f} ms')
+        if errores:
+            raise CommandError('; '.join(errores))
+        self.stdout.write(self.style.SUCCESS(f'Dentro del presupuesto de {options["presupuesto_ms"]:.0f} ms'))
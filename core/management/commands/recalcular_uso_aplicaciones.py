@@ -0,0 +1,40 @@
+import itertools
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import ActividadUsuario, UsoAplicacionDiario
+from core.uso_aplicaciones import acumular_uso
+
+LOTE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye UsoAplicacionDiario desde las muestras guardadas (datos anteriores a la acumulación al ingerir)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Días hacia atrás a reconstruir, incluido hoy')
+
+    def handle(self, *args, **options):
+        desde = timezone.localdate() - timedelta(days=options['dias'] - 1)
+        inicio = timezone.make_aware(datetime.combine(desde, time.min))
+        muestras = (
+            ActividadUsuario.objects.filter(usuario__isnull=False, timestamp__gte=inicio)
+            .only('usuario_id', 'machine_id', 'timestamp', 'ventana_activa', 'procesos_activos')
+            # Cada lote sigue al anterior de la misma máquina: acumular_uso mide el hueco con la muestra previa
+            .order_by('usuario_id', 'machine_id', 'timestamp')
+            .iterator(chunk_size=LOTE)
+        )
+        total = 0
+        with transaction.atomic():
+            UsoAplicacionDiario.objects.filter(fecha__gte=desde).delete()
+            while lote := list(itertools.islice(muestras, LOTE)):
+                acumular_uso(lote)
+                total += len(lote)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} muestras acumuladas en {UsoAplicacionDiario.objects.filter(fecha__gte=desde).count()} '
+            f'filas desde {desde}'
+        ))
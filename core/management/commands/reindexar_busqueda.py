@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.busqueda import TIPOS, motor_busqueda, reindexar
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de texto completo de registros y análisis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', choices=sorted(TIPOS), help='Sólo este tipo (por defecto todos)')
+
+    def handle(self, *args, **options):
+        if motor_busqueda() is None:
+            raise CommandError('La base de datos no tiene búsqueda de texto completo (PostgreSQL o SQLite)')
+        for tipo in [options['tipo']] if options['tipo'] else TIPOS:
+            inicio = time.perf_counter()
+            total = reindexar(tipo)
+            self.stdout.write(self.style.SUCCESS(f'{total} {tipo} indexados en {time.perf_counter() - inicio:.2f} s'))
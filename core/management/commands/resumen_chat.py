@@ -0,0 +1,33 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.registro_chat import resumir
+
+COLUMNAS = ('mensajes', 'usuarios', 'repetidos', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'consultas_media')
+
+
+class Command(BaseCommand):
+    help = 'Volumen y percentiles de latencia por intención de los mensajes del chat registrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=7, help='Días hacia atrás desde ahora')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON en lugar de tabla')
+
+    def handle(self, *args, **options):
+        desde = timezone.now() - timedelta(days=options['dias'])
+        filas = resumir(desde)
+        if options['json']:
+            self.stdout.write(json.dumps({'desde': desde.isoformat(), 'intenciones': filas}, ensure_ascii=False))
+            return
+        if not filas:
+            self.stdout.write(f'No hay mensajes registrados desde {desde:%d/%m/%Y %H:%M}')
+            return
+
+        self.stdout.write(f'Mensajes del chat desde {desde:%d/%m/%Y %H:%M}')
+        self.stdout.write(f'{"intención":<20}' + ''.join(f'{columna:>16}' for columna in COLUMNAS))
+        for fila in filas:
+            self.stdout.write(f'{fila["intencion"]:<20}' + ''.join(f'{fila[columna]:>16}' for columna in COLUMNAS))
+        total = sum(fila['mensajes'] for fila in filas)
+        self.stdout.write(self.style.SUCCESS(f'{total} mensajes en {len(filas)} intenciones'))
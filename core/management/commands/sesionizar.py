@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from core.anomalias import observar_todos, observar_usuario
+from core.models import Usuario
+from core.sesiones import sesionizar_todos, sesionizar_usuario
+
+
+class Command(BaseCommand):
+    help = ('Convierte las muestras de actividad nuevas en intervalos y las pasa por el detector de anomalías '
+            '(incremental desde las marcas de cada usuario)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help='Username a procesar (por defecto todos)')
+        parser.add_argument('--cada', type=int, default=0,
+                            help='Repetir la pasada cada N segundos sin terminar (proceso sesionizador)')
+
+    def handle(self, *args, **options):
+        if options['usuario'] and options['cada']:
+            raise CommandError('--cada procesa a todos los usuarios; no se combina con --usuario')
+        while True:
+            self.pasada(options['usuario'])
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
+            # Un proceso que no termina: la conexión no la cierra el ciclo de una petición
+            close_old_connections()
+
+    def pasada(self, username):
+        inicio = time.perf_counter()
+        if username:
+            try:
+                usuario = Usuario.objects.get(username=username)
+            except Usuario.DoesNotExist:
+                raise CommandError(f'El usuario {username} no existe')
+            procesadas = sesionizar_usuario(usuario.pk)
+            resultado = {usuario.pk: procesadas} if procesadas else {}
+            alertas = observar_usuario(usuario.pk)
+        else:
+            resultado = sesionizar_todos()
+            alertas = [alerta for del_usuario in observar_todos().values() for alerta in del_usuario]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(resultado.values())} muestras de {len(resultado)} usuarios procesadas, '
+            f'{len(alertas)} alertas de anomalías en {time.perf_counter() - inicio:.2f} s'
+        ))
@@ -0,0 +1,99 @@
+"""
+Progreso diario de las metas de cada usuario (MetaUsuario).
+
+Cada tipo de meta se mide sobre tablas ya agregadas, nunca sobre las muestras
+de actividad:
+
+- minutos_productivos: suma de IntervaloActividad productivos del día, que el
+  sesionizador mantiene al día después de cada ingesta;
+- registros_sin_errores: registros del día con la lista de errores vacía;
+- pausas: huecos de al menos METAS_PAUSA_MINIMA segundos entre intervalos
+  consecutivos del día.
+
+El progreso se cachea por usuario y día durante METAS_CACHE_SEGUNDOS; las
+señales de MetaUsuario y Registro lo invalidan para que el chat y el dashboard
+muestren el cambio enseguida.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache_backends import cache_nombrada
+
+cache = cache_nombrada('dashboard')
+
+
+def clave_progreso(usuario_id, fecha):
+    return f'metas:progreso:{usuario_id}:{fecha.isoformat()}'
+
+
+def _rango_dia(fecha):
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def minutos_productivos(usuario_id, fecha):
+    from .sesiones import tiempo_por_productividad
+
+    return int(tiempo_por_productividad(usuario_id, *_rango_dia(fecha)).get('productive', 0) // 60)
+
+
+def registros_sin_errores(usuario_id, fecha):
+    from .models import Registro
+
+    return Registro.objects.filter(usuario_id=usuario_id, fecha=fecha, errores=[]).count()
+
+
+def pausas(usuario_id, fecha):
+    from .sesiones import intervalos_en_rango
+
+    minima = timedelta(seconds=getattr(settings, 'METAS_PAUSA_MINIMA', 300))
+    cantidad = 0
+    fin_anterior = None
+    for inicio, fin in intervalos_en_rango(usuario_id, *_rango_dia(fecha)).order_by('inicio').values_list('inicio', 'fin'):
+        if fin_anterior is not None and inicio - fin_anterior >= minima:
+            cantidad += 1
+        fin_anterior = max(fin, fin_anterior) if fin_anterior else fin
+    return cantidad
+
+
+EVALUADORES = {
+    'minutos_productivos': minutos_productivos,
+    'registros_sin_errores': registros_sin_errores,
+    'pausas': pausas,
+}
+
+
+def calcular_progreso(usuario_id, fecha):
+    """[{'id', 'tipo', 'nombre', 'objetivo', 'valor', 'porcentaje', 'cumplida'}] de las metas activas"""
+    from .models import MetaUsuario
+
+    progreso = []
+    for meta in MetaUsuario.objects.filter(usuario_id=usuario_id, activa=True).order_by('tipo'):
+        valor = EVALUADORES[meta.tipo](usuario_id, fecha)
+        progreso.append({
+            'id': meta.pk,
+            'tipo': meta.tipo,
+            'nombre': meta.get_tipo_display(),
+            'objetivo': meta.objetivo,
+            'valor': valor,
+            'porcentaje': min(100, round(100 * valor / meta.objetivo)) if meta.objetivo else 100,
+            'cumplida': valor >= meta.objetivo,
+        })
+    return progreso
+
+
+def progreso_metas(usuario, fecha=None):
+    """Progreso del día de las metas activas del usuario, cacheado por usuario y día"""
+    fecha = fecha or timezone.localdate()
+    clave = clave_progreso(usuario.pk, fecha)
+    progreso = cache.get(clave)
+    if progreso is None:
+        progreso = calcular_progreso(usuario.pk, fecha)
+        cache.set(clave, progreso, getattr(settings, 'METAS_CACHE_SEGUNDOS', 60))
+    return progreso
+
+
+def invalidar_progreso(usuario_id, fecha=None):
+    cache.delete(clave_progreso(usuario_id, fecha or timezone.localdate()))
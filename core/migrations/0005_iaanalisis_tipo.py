@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:55
+
+from django.db import migrations, models
+
+
+def poblar_tipo(apps, schema_editor):
+    """Copia patrones_detectados['tipo'] a la nueva columna indexada"""
+    IAAnalisis = apps.get_model('core', 'IAAnalisis')
+    pendientes = []
+    for analisis in IAAnalisis.objects.only('pk', 'patrones_detectados').iterator(chunk_size=2000):
+        patrones = analisis.patrones_detectados
+        if isinstance(patrones, dict) and patrones.get('tipo'):
+            analisis.tipo = str(patrones['tipo'])[:50]
+            pendientes.append(analisis)
+        if len(pendientes) >= 2000:
+            IAAnalisis.objects.bulk_update(pendientes, ['tipo'])
+            pendientes = []
+    if pendientes:
+        IAAnalisis.objects.bulk_update(pendientes, ['tipo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_resumendiario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='iaanalisis',
+            name='tipo',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.RunPython(poblar_tipo, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='iaanalisis',
+            index=models.Index(fields=['usuario', '-fecha_analisis'], name='iaanalisis_usuario_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='iaanalisis',
+            index=models.Index(fields=['usuario', 'tipo', '-fecha_analisis'], name='iaanalisis_usuario_tipo_fecha'),
+        ),
+    ]
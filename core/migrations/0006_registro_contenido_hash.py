@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+
+def poblar_contenido_hash(apps, schema_editor):
+    """Calcula el hash del contenido normalizado de los registros existentes"""
+    from core.validacion import hash_contenido
+
+    Registro = apps.get_model('core', 'Registro')
+    pendientes = []
+    for registro in Registro.objects.only('pk', 'contenido').iterator(chunk_size=2000):
+        registro.contenido_hash = hash_contenido(registro.contenido)
+        pendientes.append(registro)
+        if len(pendientes) >= 2000:
+            Registro.objects.bulk_update(pendientes, ['contenido_hash'])
+            pendientes = []
+    if pendientes:
+        Registro.objects.bulk_update(pendientes, ['contenido_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_iaanalisis_tipo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registro',
+            name='contenido_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(poblar_contenido_hash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='registro',
+            index=models.Index(fields=['usuario', 'contenido_hash'], name='registro_usuario_hash'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_registro_contenido_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actividadusuario',
+            name='seq',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='actividadusuario',
+            constraint=models.UniqueConstraint(condition=models.Q(('seq__isnull', False)), fields=('machine_id', 'seq'), name='actividad_maquina_seq'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_actividadusuario_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntervaloActividad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('machine_id', models.CharField(max_length=100)),
+                ('ventana_activa', models.CharField(max_length=200)),
+                ('productividad', models.CharField(choices=[('productive', 'Productivo'), ('unproductive', 'No Productivo'), ('gaming', 'Jugando'), ('neutral', 'Neutral')], max_length=20)),
+                ('inicio', models.DateTimeField()),
+                ('fin', models.DateTimeField()),
+                ('duracion', models.FloatField(default=0)),
+                ('muestras', models.PositiveIntegerField(default=1)),
+                ('ultima_muestra', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Intervalo de Actividad',
+                'verbose_name_plural': 'Intervalos de Actividad',
+            },
+        ),
+        migrations.CreateModel(
+            name='MarcaSesiones',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('timestamp', models.DateTimeField()),
+                ('actividad_id', models.BigIntegerField()),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Marca de Sesiones',
+                'verbose_name_plural': 'Marcas de Sesiones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='actividadusuario',
+            index=models.Index(fields=['usuario', 'timestamp', 'id'], name='actividad_usuario_ts'),
+        ),
+        migrations.AddField(
+            model_name='intervaloactividad',
+            name='usuario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='intervaloactividad',
+            index=models.Index(fields=['usuario', 'inicio'], name='intervalo_usuario_inicio'),
+        ),
+    ]
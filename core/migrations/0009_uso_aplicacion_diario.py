@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_intervalos_actividad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsoAplicacionDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('aplicacion', models.CharField(max_length=100)),
+                ('segundos', models.PositiveIntegerField(default=0)),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Uso de Aplicación Diario',
+                'verbose_name_plural': 'Usos de Aplicaciones Diarios',
+                'indexes': [models.Index(fields=['usuario', 'fecha', '-segundos'], name='uso_aplicacion_ranking')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'fecha', 'aplicacion'), name='uso_aplicacion_usuario_fecha')],
+            },
+        ),
+    ]
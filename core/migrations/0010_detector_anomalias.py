@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_uso_aplicacion_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoAnomalias',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('hora', models.DateTimeField(blank=True, null=True)),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('productivas', models.PositiveIntegerField(default=0)),
+                ('rafagas', models.PositiveIntegerField(default=0)),
+                ('incidente_productividad', models.BooleanField(default=False)),
+                ('incidente_rafagas', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Estado de Anomalías',
+                'verbose_name_plural': 'Estados de Anomalías',
+            },
+        ),
+        migrations.CreateModel(
+            name='PerfilHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora_semana', models.PositiveSmallIntegerField()),
+                ('horas', models.PositiveIntegerField(default=0)),
+                ('media_productiva', models.FloatField(default=0)),
+                ('m2_productiva', models.FloatField(default=0)),
+                ('media_rafagas', models.FloatField(default=0)),
+                ('m2_rafagas', models.FloatField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Perfil Horario',
+                'verbose_name_plural': 'Perfiles Horarios',
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'hora_semana'), name='perfil_horario_usuario_hora')],
+            },
+        ),
+    ]
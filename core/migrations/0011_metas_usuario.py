@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_detector_anomalias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetaUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('minutos_productivos', 'Minutos productivos'), ('registros_sin_errores', 'Registros sin errores'), ('pausas', 'Pausas')], max_length=30)),
+                ('objetivo', models.PositiveIntegerField()),
+                ('activa', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Meta de Usuario',
+                'verbose_name_plural': 'Metas de Usuarios',
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'tipo'), name='meta_usuario_tipo')],
+            },
+        ),
+    ]
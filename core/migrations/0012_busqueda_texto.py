@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:20
+
+from django.conf import settings
+from django.db import migrations
+
+# El esquema de búsqueda de esta versión, escrito aquí y no importado de
+# core.busqueda: los cambios posteriores del módulo no cambian lo que hace la
+# migración. (tabla, modelo, campo con el texto)
+TABLAS = (
+    ('core_registro', 'Registro', 'contenido'),
+    ('core_iaanalisis', 'IAAnalisis', 'recomendacion'),
+)
+LOTE = 1000
+
+
+def texto_contenido(valor):
+    """Texto de los valores de un JSON, sin las claves"""
+    if isinstance(valor, dict):
+        valor = list(valor.values())
+    if isinstance(valor, (list, tuple)):
+        return ' '.join(filter(None, (texto_contenido(v) for v in valor)))
+    if valor is None or isinstance(valor, bool):
+        return ''
+    return str(valor)
+
+
+def _indexar(cursor, vendor, tabla, filas):
+    if vendor == 'postgresql':
+        configuracion = getattr(settings, 'BUSQUEDA_CONFIGURACION', 'spanish')
+        cursor.executemany(
+            f'UPDATE {tabla} SET busqueda = to_tsvector(%s, %s) WHERE id = %s',
+            [(configuracion, texto, pk) for pk, texto in filas],
+        )
+    else:
+        cursor.executemany(f'INSERT INTO {tabla}_fts (rowid, texto) VALUES (%s, %s)', filas)
+
+
+def crear_indices(apps, schema_editor):
+    """tsvector + GIN en PostgreSQL o tablas FTS5 en SQLite, con las filas existentes"""
+    conexion = schema_editor.connection
+    if conexion.vendor not in ('postgresql', 'sqlite'):
+        return
+    with conexion.cursor() as cursor:
+        for tabla, _, _ in TABLAS:
+            if conexion.vendor == 'postgresql':
+                cursor.execute(f'ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS busqueda tsvector')
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS {tabla}_busqueda_gin ON {tabla} USING gin (busqueda)')
+            else:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabla}_fts "
+                    f"USING fts5(texto, tokenize='unicode61 remove_diacritics 2')"
+                )
+
+        for tabla, modelo, campo in TABLAS:
+            filas = apps.get_model('core', modelo).objects.using(conexion.alias).order_by('pk')
+            lote = []
+            for pk, valor in filas.values_list('pk', campo).iterator(chunk_size=LOTE):
+                lote.append((pk, texto_contenido(valor) if campo == 'contenido' else valor or ''))
+                if len(lote) >= LOTE:
+                    _indexar(cursor, conexion.vendor, tabla, lote)
+                    lote = []
+            if lote:
+                _indexar(cursor, conexion.vendor, tabla, lote)
+
+
+def eliminar_indices(apps, schema_editor):
+    conexion = schema_editor.connection
+    with conexion.cursor() as cursor:
+        for tabla, _, _ in TABLAS:
+            if conexion.vendor == 'postgresql':
+                cursor.execute(f'ALTER TABLE {tabla} DROP COLUMN IF EXISTS busqueda')
+            elif conexion.vendor == 'sqlite':
+                cursor.execute(f'DROP TABLE IF EXISTS {tabla}_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_metas_usuario'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_busqueda_texto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensajeChat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('hash_mensaje', models.CharField(max_length=64)),
+                ('intencion', models.CharField(max_length=40)),
+                ('manejador', models.CharField(max_length=80)),
+                ('latencia_ms', models.FloatField()),
+                ('consultas', models.PositiveIntegerField(default=0)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Mensaje de Chat',
+                'verbose_name_plural': 'Mensajes de Chat',
+                'indexes': [models.Index(fields=['fecha', 'intencion'], name='mensaje_chat_fecha_intencion')],
+            },
+        ),
+    ]
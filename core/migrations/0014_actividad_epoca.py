@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_mensaje_chat'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='actividadusuario',
+            name='actividad_maquina_seq',
+        ),
+        migrations.AddField(
+            model_name='actividadusuario',
+            name='epoca',
+            field=models.CharField(blank=True, default='', max_length=36),
+        ),
+        migrations.AddConstraint(
+            model_name='actividadusuario',
+            constraint=models.UniqueConstraint(condition=models.Q(('seq__isnull', False)), fields=('machine_id', 'epoca', 'seq'), name='actividad_maquina_epoca_seq'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_actividad_epoca'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actividadusuario',
+            index=models.Index(fields=['usuario', 'id'], name='actividad_usuario_id'),
+        ),
+        migrations.AddIndex(
+            model_name='intervaloactividad',
+            index=models.Index(fields=['usuario', 'ultima_muestra'], name='intervalo_usuario_ultima'),
+        ),
+    ]
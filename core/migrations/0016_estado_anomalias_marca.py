@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:15
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def marcar_observadas(apps, schema_editor):
+    """Los estados existentes ya observaron, en la ingesta, todas las muestras guardadas de su usuario"""
+    ActividadUsuario = apps.get_model('core', 'ActividadUsuario')
+    EstadoAnomalias = apps.get_model('core', 'EstadoAnomalias')
+    maximo = (
+        ActividadUsuario.objects.filter(usuario_id=OuterRef('usuario_id'))
+        .order_by().values('usuario_id').annotate(maximo=Max('id')).values('maximo')
+    )
+    EstadoAnomalias.objects.using(schema_editor.connection.alias).filter(
+        usuario_id__in=ActividadUsuario.objects.values('usuario_id')
+    ).update(actividad_id=Subquery(maximo))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_sesionizador_por_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadoanomalias',
+            name='actividad_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(marcar_observadas, migrations.RunPython.noop),
+    ]
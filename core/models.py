@@ -15,21 +15,79 @@ class Usuario(AbstractUser):
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
 
+class VisiblePorRolQuerySet(models.QuerySet):
+    """QuerySet de modelos con dueño: alcance por rol y proyección para los listados"""
+    # Columnas que usan las plantillas de listado (las subclases las definen)
+    campos_listado = ()
+
+    def visible_para(self, usuario):
+        """Admin y supervisor ven todo; el empleado sólo lo propio"""
+        if usuario.rol in ['admin', 'supervisor']:
+            return self
+        return self.filter(usuario=usuario)
+
+    def para_listado(self):
+        """Trae el usuario en la misma consulta y sólo las columnas del listado"""
+        return self.select_related('usuario').only(*self.campos_listado)
+
+
+class RegistroQuerySet(VisiblePorRolQuerySet):
+    campos_listado = ('fecha', 'contenido', 'errores', 'usuario__username')
+
+
+class EstadisticaQuerySet(VisiblePorRolQuerySet):
+    campos_listado = ('puntaje', 'mejoras', 'fecha_actualizacion', 'usuario__username')
+
+
+class IAAnalisisQuerySet(VisiblePorRolQuerySet):
+    campos_listado = ('recomendacion', 'patrones_detectados', 'fecha_analisis', 'usuario__username')
+
+
+class MetaUsuarioQuerySet(VisiblePorRolQuerySet):
+    campos_listado = ('tipo', 'objetivo', 'activa', 'usuario__username')
+
+
+class ActividadUsuarioQuerySet(VisiblePorRolQuerySet):
+    campos_listado = (
+        'timestamp', 'ventana_activa', 'productividad', 'procesos_activos', 'carga_sistema',
+        'usuario__username', 'usuario__first_name', 'usuario__last_name',
+    )
+
+
 class Registro(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     fecha = models.DateField()
     contenido = models.JSONField()
     errores = models.JSONField(default=list)
+    # Hash del contenido normalizado para detectar duplicados por índice
+    contenido_hash = models.CharField(max_length=64, blank=True, default='')
+
+    objects = RegistroQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'contenido_hash'], name='registro_usuario_hash'),
+        ]
 
     def __str__(self):
         return f'Registro de {self.usuario} - {self.fecha}'
 
+    def save(self, *args, **kwargs):
+        from .validacion import hash_contenido
+        self.contenido_hash = hash_contenido(self.contenido)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'contenido' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'contenido_hash'}
+        super().save(*args, **kwargs)
+
 class Estadistica(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     puntaje = models.IntegerField(default=0)
     mejoras = models.IntegerField(default=0)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    objects = EstadisticaQuerySet.as_manager()
+
     def __str__(self):
         return f'Estadísticas de {self.usuario}'
 
@@ -37,11 +95,42 @@ class IAAnalisis(models.Model):
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     recomendacion = models.TextField()
     patrones_detectados = models.JSONField(default=list)
+    # Copia indexada de patrones_detectados['tipo'], sincronizada en save()
+    tipo = models.CharField(max_length=50, blank=True, default='')
     fecha_analisis = models.DateTimeField(default=timezone.now)
 
+    objects = IAAnalisisQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', '-fecha_analisis'], name='iaanalisis_usuario_fecha'),
+            models.Index(fields=['usuario', 'tipo', '-fecha_analisis'], name='iaanalisis_usuario_tipo_fecha'),
+        ]
+
     def __str__(self):
         return f'Análisis IA para {self.usuario}'
 
+    @staticmethod
+    def extraer_tipo(patrones):
+        """Tipo declarado en patrones_detectados ('' si no es un objeto con 'tipo')"""
+        if isinstance(patrones, dict):
+            return str(patrones.get('tipo') or '')[:50]
+        return ''
+
+    def save(self, *args, **kwargs):
+        self.tipo = self.extraer_tipo(self.patrones_detectados)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'patrones_detectados' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'tipo'}
+        super().save(*args, **kwargs)
+
+PRODUCTIVIDAD_CHOICES = [
+    ('productive', 'Productivo'),
+    ('unproductive', 'No Productivo'),
+    ('gaming', 'Jugando'),
+    ('neutral', 'Neutral'),
+]
+
 class ActividadUsuario(models.Model):
     """Modelo para almacenar la actividad monitoreada del usuario"""
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, null=True, blank=True)
@@ -50,18 +139,212 @@ class ActividadUsuario(models.Model):
     ventana_activa = models.CharField(max_length=200)
     procesos_activos = models.JSONField(default=list)
     carga_sistema = models.JSONField(default=dict)
-    productividad = models.CharField(max_length=20, choices=[
-        ('productive', 'Productivo'),
-        ('unproductive', 'No Productivo'),
-        ('gaming', 'Jugando'),
-        ('neutral', 'Neutral'),
-    ])
+    productividad = models.CharField(max_length=20, choices=PRODUCTIVIDAD_CHOICES)
+    # Número de secuencia creciente por máquina que asigna el agente
+    seq = models.BigIntegerField(null=True, blank=True)
+    # Identificador de la secuencia: el agente genera uno nuevo cuando la reinicia
+    epoca = models.CharField(max_length=36, blank=True, default='')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
 
+    objects = ActividadUsuarioQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Actividad de Usuario'
         verbose_name_plural = 'Actividades de Usuarios'
         ordering = ['-timestamp']
+        indexes = [
+            # Muestras del usuario en orden de tiempo (intervalos que rehace el sesionizador)
+            models.Index(fields=['usuario', 'timestamp', 'id'], name='actividad_usuario_ts'),
+            # Muestras del usuario guardadas después de la marca del sesionizador
+            models.Index(fields=['usuario', 'id'], name='actividad_usuario_id'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['machine_id', 'epoca', 'seq'],
+                condition=models.Q(seq__isnull=False),
+                name='actividad_maquina_epoca_seq',
+            ),
+        ]
 
     def __str__(self):
         return f'Actividad de {self.machine_id} - {self.timestamp}'
+
+class IntervaloActividad(models.Model):
+    """Tramo continuo con la misma ventana y productividad, reconstruido a partir de las muestras"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    machine_id = models.CharField(max_length=100)
+    ventana_activa = models.CharField(max_length=200)
+    productividad = models.CharField(max_length=20, choices=PRODUCTIVIDAD_CHOICES)
+    inicio = models.DateTimeField()
+    fin = models.DateTimeField()
+    # Segundos entre inicio y fin, para sumar por rango sin aritmética de fechas
+    duracion = models.FloatField(default=0)
+    muestras = models.PositiveIntegerField(default=1)
+    # Timestamp de la última muestra: el intervalo sigue abierto si la próxima llega antes del umbral de inactividad
+    ultima_muestra = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Intervalo de Actividad'
+        verbose_name_plural = 'Intervalos de Actividad'
+        indexes = [
+            models.Index(fields=['usuario', 'inicio'], name='intervalo_usuario_inicio'),
+            # Intervalo abierto y los que rehacen las muestras atrasadas
+            models.Index(fields=['usuario', 'ultima_muestra'], name='intervalo_usuario_ultima'),
+        ]
+
+    def __str__(self):
+        return f'{self.usuario} - {self.ventana_activa} ({self.inicio} - {self.fin})'
+
+class MarcaSesiones(models.Model):
+    """Mayor id de ActividadUsuario ya convertido en intervalos (y el timestamp más reciente), por usuario"""
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True)
+    timestamp = models.DateTimeField()
+    actividad_id = models.BigIntegerField()
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Marca de Sesiones'
+        verbose_name_plural = 'Marcas de Sesiones'
+
+    def __str__(self):
+        return f'Sesiones de {self.usuario} hasta {self.timestamp}'
+
+class UsoAplicacionDiario(models.Model):
+    """Segundos de uso por usuario, día y aplicación, acumulados al ingerir las muestras"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    fecha = models.DateField()
+    # Clave normalizada de la aplicación (ver core/uso_aplicaciones.py), no el título de la ventana
+    aplicacion = models.CharField(max_length=100)
+    segundos = models.PositiveIntegerField(default=0)
+    muestras = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Uso de Aplicación Diario'
+        verbose_name_plural = 'Usos de Aplicaciones Diarios'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'fecha', 'aplicacion'], name='uso_aplicacion_usuario_fecha'),
+        ]
+        indexes = [
+            # Ranking de aplicaciones de un día sin ordenar en memoria
+            models.Index(fields=['usuario', 'fecha', '-segundos'], name='uso_aplicacion_ranking'),
+        ]
+
+    def __str__(self):
+        return f'{self.usuario} - {self.aplicacion} ({self.fecha})'
+
+class PerfilHorario(models.Model):
+    """Media y varianza acumuladas (Welford) de cada hora de la semana del usuario"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    # 0 = lunes de 00 a 01 h ... 167 = domingo de 23 a 24 h
+    hora_semana = models.PositiveSmallIntegerField()
+    horas = models.PositiveIntegerField(default=0)
+    # Proporción de muestras productivas de la hora
+    media_productiva = models.FloatField(default=0)
+    m2_productiva = models.FloatField(default=0)
+    # Muestras improductivas o de juego de la hora
+    media_rafagas = models.FloatField(default=0)
+    m2_rafagas = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = 'Perfil Horario'
+        verbose_name_plural = 'Perfiles Horarios'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'hora_semana'], name='perfil_horario_usuario_hora'),
+        ]
+
+    def __str__(self):
+        return f'{self.usuario} - hora {self.hora_semana} ({self.horas} h observadas)'
+
+class EstadoAnomalias(models.Model):
+    """Hora en curso del detector de anomalías y los incidentes abiertos, por usuario"""
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, primary_key=True)
+    hora = models.DateTimeField(null=True, blank=True)
+    muestras = models.PositiveIntegerField(default=0)
+    productivas = models.PositiveIntegerField(default=0)
+    rafagas = models.PositiveIntegerField(default=0)
+    # Un incidente abierto no genera más alertas hasta que cierra una hora normal
+    incidente_productividad = models.BooleanField(default=False)
+    incidente_rafagas = models.BooleanField(default=False)
+    # Mayor id de ActividadUsuario ya observado
+    actividad_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Estado de Anomalías'
+        verbose_name_plural = 'Estados de Anomalías'
+
+    def __str__(self):
+        return f'Anomalías de {self.usuario} ({self.hora})'
+
+class MetaUsuario(models.Model):
+    """Meta diaria medible del usuario; el progreso lo calcula core/metas.py"""
+    TIPO_CHOICES = [
+        ('minutos_productivos', 'Minutos productivos'),
+        ('registros_sin_errores', 'Registros sin errores'),
+        ('pausas', 'Pausas'),
+    ]
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    objetivo = models.PositiveIntegerField()
+    activa = models.BooleanField(default=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    objects = MetaUsuarioQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Meta de Usuario'
+        verbose_name_plural = 'Metas de Usuarios'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'tipo'], name='meta_usuario_tipo'),
+        ]
+
+    def __str__(self):
+        return f'{self.usuario} - {self.get_tipo_display()}: {self.objetivo}'
+
+class MensajeChat(models.Model):
+    """Mensaje del chat del asistente para analítica: hash del texto, intención, manejador y costo"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+    # HMAC del texto normalizado: el mensaje no se guarda
+    hash_mensaje = models.CharField(max_length=64)
+    intencion = models.CharField(max_length=40)
+    manejador = models.CharField(max_length=80)
+    latencia_ms = models.FloatField()
+    consultas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Mensaje de Chat'
+        verbose_name_plural = 'Mensajes de Chat'
+        indexes = [
+            models.Index(fields=['fecha', 'intencion'], name='mensaje_chat_fecha_intencion'),
+        ]
+
+    def __str__(self):
+        return f'{self.intencion} ({self.manejador}) - {self.fecha}'
+
+class ResumenDiario(models.Model):
+    """Resumen desnormalizado por usuario y día para el dashboard del empleado"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    fecha = models.DateField()
+    estadistica = models.ForeignKey(Estadistica, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    analisis = models.ForeignKey(IAAnalisis, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    consejos = models.JSONField(default=list)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumen Diario'
+        verbose_name_plural = 'Resúmenes Diarios'
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'fecha'], name='resumen_diario_usuario_fecha'),
+        ]
+
+    def __str__(self):
+        return f'Resumen de {self.usuario} - {self.fecha}'
+
+    @property
+    def consejos_recientes(self):
+        """Consejos del agente personal con la fecha como datetime para las plantillas"""
+        from django.utils.dateparse import parse_datetime
+        return [
+            dict(consejo, fecha_analisis=parse_datetime(consejo['fecha_analisis']))
+            for consejo in self.consejos
+        ]
@@ -0,0 +1,210 @@
+"""
+Registro de los mensajes del chat del asistente para analítica fuera de línea.
+
+Por cada mensaje se guarda un MensajeChat con el HMAC del texto normalizado
+(el texto no se almacena), la intención, el manejador `generar_respuesta_*`
+que respondió, la latencia y la cantidad de consultas (a todas las bases).
+
+La petición sólo pone el registro en una cola: el logger `core.chat` tiene un
+QueueHandler y un QueueListener del worker lo entrega en su propio hilo a
+ManejadorLoteChat, que escribe con bulk_create cada CHAT_LOG_LOTE registros o
+cuando el más antiguo lleva CHAT_LOG_INTERVALO segundos esperando. Si la
+escritura falla el lote se descarta: es analítica, no datos del negocio.
+`resumen_chat` agrega los registros por intención.
+"""
+import atexit
+import hashlib
+import hmac
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_LOGGER = 'core.chat'
+
+
+def hash_mensaje(mensaje):
+    """HMAC-SHA256 con la SECRET_KEY: agrupa mensajes repetidos sin poder revertirse con un diccionario"""
+    normalizado = ' '.join(mensaje.lower().split())
+    return hmac.new(settings.SECRET_KEY.encode(), normalizado.encode(), hashlib.sha256).hexdigest()
+
+
+class ContadorConsultas:
+    """execute_wrapper que cuenta las consultas ejecutadas (también con DEBUG desactivado)"""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+class ManejadorLoteChat(logging.Handler):
+    """Acumula los registros de chat y los escribe en lotes"""
+
+    def __init__(self, tamano=100, intervalo=5.0):
+        super().__init__()
+        self.tamano = tamano
+        self.intervalo = intervalo
+        self._pendientes = []
+        self._primero = None
+        self.escritos = 0
+        self.descartados = 0
+
+    def emit(self, record):
+        datos = getattr(record, 'chat', None)
+        if datos is None:
+            return
+        if not self._pendientes:
+            self._primero = time.monotonic()
+        self._pendientes.append(datos)
+        if len(self._pendientes) >= self.tamano:
+            self.flush()
+
+    def vencido(self):
+        with self.lock:
+            return bool(self._pendientes) and time.monotonic() - self._primero >= self.intervalo
+
+    def flush(self):
+        from .models import MensajeChat
+
+        with self.lock:
+            pendientes, self._pendientes, self._primero = self._pendientes, [], None
+            if not pendientes:
+                return
+            close_old_connections()
+            try:
+                MensajeChat.objects.bulk_create([MensajeChat(**datos) for datos in pendientes])
+                self.escritos += len(pendientes)
+            except Exception:
+                self.descartados += len(pendientes)
+                logger.exception('No se pudieron guardar %s mensajes de chat', len(pendientes))
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class _Escucha(QueueListener):
+    """QueueListener que además vacía el lote vencido mientras la cola está quieta"""
+
+    def __init__(self, cola, manejador):
+        super().__init__(cola, manejador)
+        self.manejador = manejador
+
+    def dequeue(self, block):
+        while True:
+            try:
+                registro = self.queue.get(timeout=self.manejador.intervalo / 2)
+            except queue.Empty:
+                if self.manejador.vencido():
+                    self.manejador.flush()
+                continue
+            if registro is self._sentinel:
+                # El hilo termina: el lote pendiente lo escribe detener()
+                connections.close_all()
+            return registro
+
+
+_escucha = None
+_lock_escucha = threading.Lock()
+
+
+def iniciar(manejador=None):
+    """Conecta el logger del chat a la cola e inicia el hilo que escribe; una vez por worker"""
+    global _escucha
+    with _lock_escucha:
+        if _escucha is None:
+            manejador = manejador or ManejadorLoteChat(
+                tamano=getattr(settings, 'CHAT_LOG_LOTE', 100),
+                intervalo=getattr(settings, 'CHAT_LOG_INTERVALO', 5.0),
+            )
+            cola = queue.SimpleQueue()
+            registro = logging.getLogger(NOMBRE_LOGGER)
+            registro.setLevel(logging.INFO)
+            registro.propagate = False
+            registro.addHandler(QueueHandler(cola))
+            _escucha = _Escucha(cola, manejador)
+            _escucha.start()
+            atexit.register(detener)
+        return _escucha
+
+
+def detener():
+    """Entrega lo que queda en la cola, escribe el último lote y desconecta el logger"""
+    global _escucha
+    with _lock_escucha:
+        if _escucha is None:
+            return
+        registro = logging.getLogger(NOMBRE_LOGGER)
+        for manejador in [m for m in registro.handlers if isinstance(m, QueueHandler)]:
+            registro.removeHandler(manejador)
+        _escucha.stop()
+        _escucha.manejador.close()
+        _escucha = None
+
+
+def registrar_mensaje(usuario, mensaje, intencion, manejador, latencia_ms, consultas):
+    """Encola el registro del mensaje; no toca la base en la petición"""
+    if not getattr(settings, 'CHAT_LOG', True):
+        return
+    if _escucha is None:
+        iniciar()
+    logging.getLogger(NOMBRE_LOGGER).info(
+        'chat %s %s %.1f ms %s consultas', intencion, manejador, latencia_ms, consultas,
+        extra={'chat': {
+            'usuario_id': getattr(usuario, 'pk', None),
+            'fecha': timezone.now(),
+            'hash_mensaje': hash_mensaje(mensaje),
+            'intencion': intencion,
+            'manejador': manejador,
+            'latencia_ms': round(latencia_ms, 3),
+            'consultas': consultas,
+        }},
+    )
+
+
+def resumir(desde, hasta=None):
+    """[{'intencion', 'mensajes', 'usuarios', 'repetidos', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'consultas_media'}]
+    de los mensajes en [desde, hasta), de la intención más usada a la menos usada"""
+    import pandas as pd
+    from .models import MensajeChat
+
+    mensajes = MensajeChat.objects.filter(fecha__gte=desde)
+    if hasta is not None:
+        mensajes = mensajes.filter(fecha__lt=hasta)
+    columnas = ['intencion', 'usuario_id', 'hash_mensaje', 'latencia_ms', 'consultas']
+    filas = pd.DataFrame(list(mensajes.values_list(*columnas)), columns=columnas)
+    if filas.empty:
+        return []
+
+    grupos = filas.groupby('intencion')
+    latencias = grupos['latencia_ms'].quantile([0.5, 0.95, 0.99]).unstack()
+    resumen = pd.DataFrame({
+        'mensajes': grupos.size(),
+        'usuarios': grupos['usuario_id'].nunique(),
+        # Mensajes cuyo texto ya se había enviado (mismo hash) en el período
+        'repetidos': grupos.size() - grupos['hash_mensaje'].nunique(),
+        'p50_ms': latencias[0.5],
+        'p95_ms': latencias[0.95],
+        'p99_ms': latencias[0.99],
+        'max_ms': grupos['latencia_ms'].max(),
+        'consultas_media': grupos['consultas'].mean(),
+    }).sort_values(['mensajes', 'p95_ms'], ascending=False)
+
+    return [
+        {
+            'intencion': intencion,
+            **{clave: int(valor) for clave, valor in fila[['mensajes', 'usuarios', 'repetidos']].items()},
+            **{clave: round(float(valor), 2) for clave, valor in fila.drop(['mensajes', 'usuarios', 'repetidos']).items()},
+        }
+        for intencion, fila in resumen.iterrows()
+    ]
@@ -0,0 +1,350 @@
+"""
+Reportes periódicos de actividad (diario, semanal, mensual) en CSV, JSON, XLSX y PDF.
+
+Los datos salen de las tablas acumuladas: IntervaloActividad para el tiempo
+por productividad y día, y UsoAplicacionDiario para las aplicaciones. Armarlos
+cuesta unas pocas consultas por rango. El archivo se renderiza en un pool de
+procesos (REPORTES_PROCESOS) para no ocupar el worker web, y queda en disco en
+
+    REPORTES_DIR/<usuario_id>/<período>/<versión>.<formato>
+
+La versión es un hash de los datos: mientras no lleguen muestras nuevas del
+período, todas las descargas sirven el mismo archivo sin volver a generarlo.
+Las versiones anteriores se borran REPORTES_GRACIA segundos después de ser
+reemplazadas, para no cortar las descargas que ya las estaban sirviendo.
+XLSX y PDF se escriben con la biblioteca estándar (zipfile y PDF de texto).
+
+El módulo sólo importa la biblioteca estándar al cargarse: los procesos del
+pool lo importan para renderizar sin configurar Django.
+"""
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+PERIODOS = ('diario', 'semanal', 'mensual')
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+}
+CLASES = {'productive': 'Productivo', 'unproductive': 'No productivo', 'gaming': 'Juegos', 'neutral': 'Neutral'}
+# Cambiarla invalida todos los archivos generados (p. ej. al cambiar el diseño)
+VERSION_FORMATO = 1
+LIMITE_APLICACIONES = 20
+
+
+def rango_periodo(periodo, fecha):
+    """(desde, hasta, clave) del período que contiene `fecha`; la clave nombra el directorio de la cache"""
+    if periodo == 'diario':
+        return fecha, fecha, f'diario-{fecha.isoformat()}'
+    if periodo == 'semanal':
+        desde = fecha - timedelta(days=fecha.weekday())
+        anio, semana, _ = fecha.isocalendar()
+        return desde, desde + timedelta(days=6), f'semanal-{anio}-W{semana:02d}'
+    if periodo == 'mensual':
+        desde = fecha.replace(day=1)
+        hasta = (desde + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return desde, hasta, f'mensual-{desde:%Y-%m}'
+    raise ValueError(f'Período no soportado: {periodo}')
+
+
+def datos_reporte(usuario, periodo, fecha):
+    """Datos del reporte como tipos JSON: tiempo por día y productividad, y aplicaciones más usadas"""
+    from django.db.models import Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+
+    from .models import IntervaloActividad
+    from .uso_aplicaciones import aplicaciones_mas_usadas
+
+    desde, hasta, clave = rango_periodo(periodo, fecha)
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    filas = (
+        IntervaloActividad.objects.filter(usuario=usuario, inicio__gte=inicio, inicio__lt=fin)
+        .annotate(dia=TruncDate('inicio'))
+        .values('dia', 'productividad')
+        .annotate(segundos=Sum('duracion'))
+    )
+    dias = {}
+    for fila in filas:
+        dias.setdefault(fila['dia'], dict.fromkeys(CLASES, 0))[fila['productividad']] = round(fila['segundos'])
+
+    return {
+        'usuario': usuario.username,
+        'nombre': usuario.get_full_name() or usuario.username,
+        'periodo': periodo,
+        'clave': clave,
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'dias': [{'fecha': dia.isoformat(), **segundos} for dia, segundos in sorted(dias.items())],
+        'totales': {clase: sum(segundos[clase] for segundos in dias.values()) for clase in CLASES},
+        'aplicaciones': [
+            {'aplicacion': app['aplicacion'], 'segundos': app['segundos']}
+            for app in aplicaciones_mas_usadas(usuario, desde, hasta, limite=LIMITE_APLICACIONES)
+        ],
+    }
+
+
+def version_datos(datos):
+    serializado = json.dumps([VERSION_FORMATO, datos], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()[:16]
+
+
+def _horas(segundos):
+    return round(segundos / 3600, 2)
+
+
+def _tablas(datos):
+    """Filas de las tablas por día y por aplicación (encabezado incluido), en horas"""
+    dias = [['Fecha', *CLASES.values(), 'Total']]
+    for dia in datos['dias']:
+        valores = [dia[clase] for clase in CLASES]
+        dias.append([dia['fecha'], *map(_horas, valores), _horas(sum(valores))])
+    totales = [datos['totales'][clase] for clase in CLASES]
+    dias.append(['Total', *map(_horas, totales), _horas(sum(totales))])
+    aplicaciones = [['Aplicación', 'Horas']] + [
+        [app['aplicacion'], _horas(app['segundos'])] for app in datos['aplicaciones']
+    ]
+    return dias, aplicaciones
+
+
+def renderizar_csv(datos):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    dias, aplicaciones = _tablas(datos)
+    escritor.writerows(dias)
+    escritor.writerow([])
+    escritor.writerows(aplicaciones)
+    return salida.getvalue().encode('utf-8-sig')
+
+
+def renderizar_json(datos):
+    return json.dumps(datos, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def _columna(indice):
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _hoja_xlsx(filas):
+    celdas = []
+    for numero, fila in enumerate(filas, start=1):
+        valores = []
+        for indice, valor in enumerate(fila):
+            referencia = f'{_columna(indice)}{numero}'
+            if isinstance(valor, (int, float)):
+                valores.append(f'<c r="{referencia}"><v>{valor}</v></c>')
+            else:
+                valores.append(f'<c r="{referencia}" t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>')
+        celdas.append(f'<row r="{numero}">{"".join(valores)}</row>')
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        f'<sheetData>{"".join(celdas)}</sheetData></worksheet>'
+    )
+
+
+def renderizar_xlsx(datos):
+    """Libro SpreadsheetML mínimo con las hojas Días y Aplicaciones (cadenas en línea, sin estilos)"""
+    hojas = list(zip(('Días', 'Aplicaciones'), _tablas(datos)))
+    tipos = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for i in range(1, len(hojas) + 1)
+    )
+    archivos = {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{tipos}</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(f'<sheet name="{nombre}" sheetId="{i}" r:id="rId{i}"/>'
+                      for i, (nombre, _) in enumerate(hojas, start=1))
+            + '</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{i}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{i}.xml"/>'
+                for i in range(1, len(hojas) + 1)
+            )
+            + '</Relationships>'
+        ),
+    }
+    for i, (_, filas) in enumerate(hojas, start=1):
+        archivos[f'xl/worksheets/sheet{i}.xml'] = _hoja_xlsx(filas)
+
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in archivos.items():
+            libro.writestr(nombre, contenido)
+    return salida.getvalue()
+
+
+def _texto_pdf(texto):
+    # WinAnsiEncoding cubre los acentos del español
+    codificado = texto.encode('cp1252', errors='replace')
+    return codificado.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def renderizar_pdf(datos, lineas_por_pagina=50):
+    """PDF 1.4 de texto en Courier (monoespaciada para alinear las tablas): encabezado, días y aplicaciones"""
+    dias, aplicaciones = _tablas(datos)
+    lineas = [
+        f"Reporte {datos['periodo']} de actividad - {datos['nombre']}",
+        f"Período: {datos['desde']} a {datos['hasta']}",
+        '',
+        'Horas por día y productividad',
+    ]
+    lineas += ['  '.join(f'{str(valor):>13}' for valor in fila) for fila in dias]
+    lineas += ['', 'Aplicaciones más usadas (horas)']
+    lineas += [f'{str(nombre)[:60]:<60} {horas:>8}' for nombre, horas in aplicaciones[1:]]
+    paginas = [lineas[i:i + lineas_por_pagina] for i in range(0, len(lineas), lineas_por_pagina)] or [[]]
+
+    # Objetos: 1 catálogo, 2 páginas, 3 fuente, y un par (página, contenido) por página
+    objetos = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+    }
+    hijos = []
+    for numero, pagina in enumerate(paginas):
+        id_pagina, id_contenido = 4 + numero * 2, 5 + numero * 2
+        hijos.append(f'{id_pagina} 0 R'.encode())
+        flujo = b'BT /F1 9 Tf 11 TL 40 800 Td ' + b''.join(b'(' + _texto_pdf(linea) + b') Tj T* ' for linea in pagina) + b'ET'
+        objetos[id_pagina] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {id_contenido} 0 R >>'
+        ).encode()
+        objetos[id_contenido] = b'<< /Length %d >>\nstream\n' % len(flujo) + flujo + b'\nendstream'
+    objetos[2] = b'<< /Type /Pages /Kids [' + b' '.join(hijos) + b'] /Count %d >>' % len(paginas)
+
+    salida = io.BytesIO()
+    salida.write(b'%PDF-1.4\n')
+    posiciones = {}
+    for numero in sorted(objetos):
+        posiciones[numero] = salida.tell()
+        salida.write(b'%d 0 obj\n' % numero + objetos[numero] + b'\nendobj\n')
+    inicio_xref = salida.tell()
+    salida.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1))
+    for numero in sorted(objetos):
+        salida.write(b'%010d 00000 n \n' % posiciones[numero])
+    salida.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref))
+    return salida.getvalue()
+
+
+RENDERIZADORES = {
+    'csv': renderizar_csv,
+    'json': renderizar_json,
+    'xlsx': renderizar_xlsx,
+    'pdf': renderizar_pdf,
+}
+
+
+def renderizar(datos, formato):
+    return RENDERIZADORES[formato](datos)
+
+
+_pool = None
+_lock_pool = threading.Lock()
+
+
+def _renderizar_en_pool(datos, formato):
+    """Renderiza en el pool de procesos (o en este proceso con REPORTES_PROCESOS = 0)"""
+    from django.conf import settings
+
+    procesos = getattr(settings, 'REPORTES_PROCESOS', 2)
+    if procesos <= 0:
+        return renderizar(datos, formato)
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            # spawn: los workers web pueden tener hilos (gthread) y fork sólo copiaría el actual
+            _pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn'))
+    return _pool.submit(renderizar, datos, formato).result(timeout=getattr(settings, 'REPORTES_TIMEOUT', 60))
+
+
+def generar_reporte(usuario, periodo, fecha, formato):
+    """Ruta del reporte en la cache de disco; lo renderiza sólo si cambió la versión de los datos"""
+    from django.conf import settings
+
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato no soportado: {formato}')
+    datos = datos_reporte(usuario, periodo, fecha)
+    directorio = Path(settings.REPORTES_DIR) / str(usuario.pk) / datos['clave']
+    ruta = directorio / f'{version_datos(datos)}.{formato}'
+    if ruta.exists():
+        return ruta
+
+    contenido = _renderizar_en_pool(datos, formato)
+    directorio.mkdir(parents=True, exist_ok=True)
+    # Escritura atómica: otra descarga simultánea nunca ve un archivo a medias
+    temporal = directorio / f'.{ruta.name}.{os.getpid()}.{threading.get_ident()}'
+    temporal.write_bytes(contenido)
+    os.replace(temporal, ruta)
+    borrar_versiones_vencidas(directorio, formato, getattr(settings, 'REPORTES_GRACIA', 600))
+    return ruta
+
+
+def borrar_versiones_vencidas(directorio, formato, gracia):
+    """Borra las versiones reemplazadas hace más de `gracia` segundos.
+
+    Una versión queda reemplazada cuando se escribe la siguiente, así que cuenta
+    el mtime de la siguiente: las descargas en curso (nginx con X-Accel-Redirect
+    abre el archivo después de que responde la vista) tienen ese margen.
+    """
+    fechas = []
+    for archivo in directorio.glob(f'*.{formato}'):
+        try:
+            fechas.append((archivo.stat().st_mtime, archivo))
+        except FileNotFoundError:
+            continue
+    fechas.sort()
+    limite = datetime.now().timestamp() - gracia
+    for (_, anterior), (reemplazo, _) in zip(fechas, fechas[1:]):
+        if reemplazo <= limite:
+            anterior.unlink(missing_ok=True)
+
+
+def nombre_descarga(usuario, periodo, fecha, formato):
+    return f'reporte-{usuario.username}-{rango_periodo(periodo, fecha)[2]}.{formato}'
+
+
+def fecha_reporte(texto):
+    """Fecha ISO del parámetro ?fecha= (hoy si no viene); ValueError si es inválida"""
+    from django.utils import timezone
+
+    return date.fromisoformat(texto) if texto else timezone.localdate()
@@ -0,0 +1,58 @@
+"""
+Mantenimiento del resumen diario por usuario (ResumenDiario).
+
+El dashboard del empleado y `dashboard_api` leen una única fila por usuario y
+día con la última estadística, el último análisis y los consejos recientes del
+agente personal. Las señales de Estadistica e IAAnalisis la recalculan cuando
+cambian sus fuentes; la primera lectura del día la crea.
+"""
+from django.utils import timezone
+
+from .models import Estadistica, IAAnalisis, ResumenDiario
+
+CONSEJOS_POR_RESUMEN = 3
+
+
+def calcular_resumen(usuario_id):
+    """Campos del resumen calculados a partir de las tablas fuente"""
+    estadistica = Estadistica.objects.filter(usuario_id=usuario_id).order_by('-pk').first()
+    analisis = IAAnalisis.objects.filter(usuario_id=usuario_id).order_by('-fecha_analisis', '-pk').first()
+
+    consejos = IAAnalisis.objects.filter(
+        usuario_id=usuario_id,
+        tipo="agente_personal"
+    ).order_by('-fecha_analisis').values('pk', 'recomendacion', 'fecha_analisis')[:CONSEJOS_POR_RESUMEN]
+
+    return {
+        'estadistica': estadistica,
+        'analisis': analisis,
+        'consejos': [
+            dict(consejo, fecha_analisis=consejo['fecha_analisis'].isoformat())
+            for consejo in consejos
+        ],
+    }
+
+
+def obtener_resumen_diario(usuario):
+    """Resumen del día para el usuario: una consulta por la clave única (usuario, fecha)"""
+    hoy = timezone.localdate()
+    resumen = ResumenDiario.objects.select_related('estadistica', 'analisis').filter(
+        usuario=usuario, fecha=hoy
+    ).first()
+    if resumen is None:
+        resumen, _ = ResumenDiario.objects.get_or_create(
+            usuario=usuario, fecha=hoy, defaults=calcular_resumen(usuario.pk)
+        )
+    return resumen
+
+
+def refrescar_resumen_diario(usuario_id):
+    """Recalcula el resumen de hoy si ya existe; si no, lo creará la próxima lectura.
+
+    Nunca crea filas: las señales también se disparan durante el borrado en
+    cascada de un usuario, cuando ya no debe quedar nada que apunte a él.
+    """
+    resumenes = ResumenDiario.objects.filter(usuario_id=usuario_id, fecha=timezone.localdate())
+    if resumenes.exists():
+        valores = calcular_resumen(usuario_id)
+        resumenes.update(fecha_actualizacion=timezone.now(), **valores)
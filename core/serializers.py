@@ -1,6 +1,6 @@
 
 from rest_framework import serializers
-from .models import Registro, Estadistica, IAAnalisis, ActividadUsuario
+from .models import Registro, Estadistica, IAAnalisis, ActividadUsuario, MetaUsuario
 
 class RegistroSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,3 +21,25 @@ class ActividadUsuarioSerializer(serializers.ModelSerializer):
     class Meta:
         model = ActividadUsuario
         fields = '__all__'
+
+class MetaUsuarioSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MetaUsuario
+        fields = ('id', 'usuario', 'tipo', 'objetivo', 'activa', 'fecha_creacion')
+        read_only_fields = ('usuario', 'fecha_creacion')
+
+    def validate_objetivo(self, valor):
+        if valor < 1:
+            raise serializers.ValidationError('El objetivo debe ser mayor que cero')
+        return valor
+
+    def validate(self, datos):
+        # Una meta por tipo: la restricción única incluye el usuario, que no viene en los datos
+        usuario = self.instance.usuario if self.instance else self.context['request'].user
+        tipo = datos.get('tipo', getattr(self.instance, 'tipo', None))
+        otras = MetaUsuario.objects.filter(usuario=usuario, tipo=tipo)
+        if self.instance:
+            otras = otras.exclude(pk=self.instance.pk)
+        if otras.exists():
+            raise serializers.ValidationError({'tipo': 'Ya tienes una meta de este tipo'})
+        return datos
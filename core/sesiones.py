@@ -0,0 +1,194 @@
+"""
+Reconstrucción de intervalos de actividad a partir de las muestras de los agentes.
+
+sara-monitor envía una muestra cada SESIONES_PASO_MUESTRA segundos. El
+sesionizador recorre las muestras de cada usuario en orden de tiempo y une las
+consecutivas con la misma máquina, ventana y productividad en un
+IntervaloActividad con inicio, fin y duración:
+
+- mientras llegan muestras iguales, el intervalo se extiende hasta la última
+  muestra más un paso;
+- si cambia la ventana o la productividad sin pausa, el intervalo termina
+  donde empieza el siguiente;
+- si entre dos muestras pasan más de SESIONES_UMBRAL_INACTIVIDAD segundos, el
+  usuario estuvo inactivo y el intervalo termina un paso después de su última
+  muestra.
+
+El proceso es incremental en el orden en que el servidor guardó las muestras,
+no en el de sus timestamps: MarcaSesiones guarda por usuario el mayor id ya
+procesado. Si todas las muestras nuevas son posteriores a lo procesado, el
+intervalo más reciente sigue abierto y se extiende. Si llegan muestras
+atrasadas (un agente que reenvía lo que acumuló sin conexión), se borran y
+se rehacen los intervalos desde el primero que esas muestras pueden cambiar.
+Las muestras recibidas en los últimos SESIONES_RETRASO segundos se dejan para
+la siguiente pasada, para no saltear ids de transacciones que todavía no
+confirmaron.
+
+La pasada no se hace en la ingesta, que es el camino de escritura más
+cargado (y de todas formas dejaría el envío recién guardado para la pasada
+siguiente por SESIONES_RETRASO): la hace `manage.py sesionizar --cada N`, un
+proceso aparte (el servicio `sesionizador` de docker-compose). Las vistas sólo
+leen los intervalos. Con ellos, el tiempo por productividad, por aplicación o en foco
+es una suma por rango sobre el índice (usuario, inicio).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import ExtractHour
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOTE_LECTURA = 2000
+LOTE_ESCRITURA = 500
+
+
+def _segundos(nombre, defecto):
+    return timedelta(seconds=getattr(settings, nombre, defecto))
+
+
+def _cerrar(intervalo, fin):
+    intervalo.fin = fin
+    intervalo.duracion = (fin - intervalo.inicio).total_seconds()
+
+
+def sesionizar_usuario(usuario_id, hasta=None):
+    """Convierte en intervalos las muestras del usuario guardadas después de su marca; devuelve cuántas eran nuevas.
+
+    `hasta` es el último momento de recepción que se procesa (por defecto, ahora menos SESIONES_RETRASO).
+    """
+    from .models import ActividadUsuario, IntervaloActividad, MarcaSesiones
+
+    paso = _segundos('SESIONES_PASO_MUESTRA', 5)
+    umbral = _segundos('SESIONES_UMBRAL_INACTIVIDAD', 120)
+    if hasta is None:
+        hasta = timezone.now() - _segundos('SESIONES_RETRASO', 30)
+
+    with transaction.atomic():
+        # Dos pasadas simultáneas del mismo usuario se serializan en la marca
+        marca = MarcaSesiones.objects.select_for_update().filter(usuario_id=usuario_id).first()
+        desde_id = marca.actividad_id if marca is not None else 0
+        del_usuario = ActividadUsuario.objects.filter(usuario_id=usuario_id)
+        hasta_id = del_usuario.filter(id__gt=desde_id, fecha_creacion__lte=hasta).aggregate(maximo=Max('id'))['maximo']
+        if hasta_id is None:
+            return 0
+        nuevas = del_usuario.filter(id__gt=desde_id, id__lte=hasta_id)
+        rango = nuevas.aggregate(desde=Min('timestamp'), cantidad=Count('id'))
+
+        ultimo = IntervaloActividad.objects.filter(usuario_id=usuario_id).order_by('-ultima_muestra').first()
+        if ultimo is None or rango['desde'] >= ultimo.ultima_muestra:
+            # Todas las muestras nuevas son posteriores a lo procesado: se sigue desde el intervalo abierto
+            abierto = ultimo
+            muestras = nuevas
+        else:
+            # Muestras atrasadas: se rehacen los intervalos que pueden absorberlas o partirse
+            afectados = IntervaloActividad.objects.filter(
+                usuario_id=usuario_id, ultima_muestra__gte=rango['desde'] - umbral,
+            )
+            inicio = min(afectados.aggregate(inicio=Min('inicio'))['inicio'] or rango['desde'], rango['desde'])
+            afectados.delete()
+            abierto = None
+            muestras = del_usuario.filter(timestamp__gte=inicio, id__lte=hasta_id)
+        existente = abierto
+        estado_existente = (existente.fin, existente.muestras) if existente else None
+
+        nuevos = []
+        ultima = None
+        filas = muestras.order_by('timestamp', 'id').values_list(
+            'timestamp', 'machine_id', 'ventana_activa', 'productividad'
+        )
+        for momento, machine_id, ventana, productividad in filas.iterator(chunk_size=LOTE_LECTURA):
+            ultima = momento
+            if abierto is not None and momento - abierto.ultima_muestra <= umbral:
+                if (abierto.machine_id, abierto.ventana_activa, abierto.productividad) == (machine_id, ventana, productividad):
+                    abierto.ultima_muestra = momento
+                    abierto.muestras += 1
+                    _cerrar(abierto, momento + paso)
+                    continue
+                # Cambio sin pausa: el intervalo anterior llega hasta esta muestra
+                _cerrar(abierto, momento)
+            abierto = IntervaloActividad(
+                usuario_id=usuario_id, machine_id=machine_id, ventana_activa=ventana,
+                productividad=productividad, inicio=momento, ultima_muestra=momento, muestras=1,
+            )
+            _cerrar(abierto, momento + paso)
+            nuevos.append(abierto)
+            if len(nuevos) > LOTE_ESCRITURA:
+                # El último puede seguir creciendo; los anteriores ya están cerrados
+                IntervaloActividad.objects.bulk_create(nuevos[:-1])
+                nuevos = nuevos[-1:]
+
+        if existente is not None and (existente.fin, existente.muestras) != estado_existente:
+            existente.save(update_fields=['fin', 'duracion', 'muestras', 'ultima_muestra'])
+        IntervaloActividad.objects.bulk_create(nuevos)
+        ultima = max(ultima, marca.timestamp) if marca is not None else ultima
+        MarcaSesiones.objects.update_or_create(
+            usuario_id=usuario_id, defaults={'timestamp': ultima, 'actividad_id': hasta_id}
+        )
+    return rango['cantidad']
+
+
+def sesionizar_todos(hasta=None):
+    """Pasada incremental para todos los usuarios; devuelve {usuario_id: muestras procesadas} de los que tenían nuevas"""
+    from .models import Usuario
+
+    resultado = {}
+    for usuario_id in Usuario.objects.order_by('pk').values_list('pk', flat=True):
+        try:
+            procesadas = sesionizar_usuario(usuario_id, hasta)
+        except Exception:
+            # Un usuario con datos problemáticos no frena la pasada de los demás
+            logger.exception('No se pudieron sesionizar las muestras del usuario %s', usuario_id)
+            continue
+        if procesadas:
+            resultado[usuario_id] = procesadas
+    return resultado
+
+
+def intervalos_en_rango(usuario, desde, hasta):
+    """Intervalos del usuario que empiezan en [desde, hasta)"""
+    from .models import IntervaloActividad
+
+    return IntervaloActividad.objects.filter(usuario=usuario, inicio__gte=desde, inicio__lt=hasta)
+
+
+def tiempo_por_productividad(usuario, desde, hasta):
+    """Segundos por clase de productividad"""
+    filas = intervalos_en_rango(usuario, desde, hasta).values('productividad').annotate(segundos=Sum('duracion'))
+    return {fila['productividad']: fila['segundos'] for fila in filas}
+
+
+def tiempo_por_hora(usuario, desde, hasta):
+    """{hora local: {productividad: segundos}} según la hora de inicio de cada intervalo"""
+    filas = (
+        intervalos_en_rango(usuario, desde, hasta)
+        .annotate(hora=ExtractHour('inicio'))
+        .values('hora', 'productividad')
+        .annotate(segundos=Sum('duracion'))
+    )
+    resultado = {}
+    for fila in filas:
+        resultado.setdefault(fila['hora'], {})[fila['productividad']] = fila['segundos']
+    return resultado
+
+
+def tiempo_por_aplicacion(usuario, desde, hasta, limite=10):
+    """[(ventana, segundos)] de las aplicaciones con más tiempo"""
+    filas = (
+        intervalos_en_rango(usuario, desde, hasta)
+        .values('ventana_activa')
+        .annotate(segundos=Sum('duracion'))
+        .order_by('-segundos')[:limite]
+    )
+    return [(fila['ventana_activa'], fila['segundos']) for fila in filas]
+
+
+def tiempo_de_foco(usuario, desde, hasta):
+    """Segundos en intervalos productivos de al menos SESIONES_MINIMO_FOCO segundos sin cambiar de ventana"""
+    minimo = getattr(settings, 'SESIONES_MINIMO_FOCO', 600)
+    return intervalos_en_rango(usuario, desde, hasta).filter(
+        productividad='productive', duracion__gte=minimo
+    ).aggregate(segundos=Sum('duracion'))['segundos'] or 0
@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .autenticacion import olvidar_estado
+from .busqueda import desindexar, indexar
+from .directorio import invalidar_directorio
+from .metas import invalidar_progreso
+from .models import Estadistica, IAAnalisis, MetaUsuario, Registro, Usuario
+from .resumen_diario import refrescar_resumen_diario
+
+
+@receiver([post_save, post_delete], sender=Estadistica)
+@receiver([post_save, post_delete], sender=IAAnalisis)
+def actualizar_resumen_diario(sender, instance, **kwargs):
+    """Mantiene al día el resumen diario cuando cambian sus fuentes"""
+    refrescar_resumen_diario(instance.usuario_id)
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+def actualizar_directorio(sender, instance, update_fields=None, **kwargs):
+    """Invalida el directorio de usuarios; el último login no cambia sus datos"""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidar_directorio()
+    olvidar_estado(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=MetaUsuario)
+@receiver([post_save, post_delete], sender=Registro)
+def actualizar_progreso_metas(sender, instance, **kwargs):
+    """El progreso cacheado deja de valer si cambian las metas (hoy) o los registros (su fecha)"""
+    if sender is Registro:
+        invalidar_progreso(instance.usuario_id, Registro._meta.get_field('fecha').to_python(instance.fecha))
+    else:
+        invalidar_progreso(instance.usuario_id)
+
+
+@receiver(post_save, sender=Registro)
+@receiver(post_save, sender=IAAnalisis)
+def indexar_texto(sender, instance, update_fields=None, **kwargs):
+    """Actualiza el índice de texto completo si cambió el texto buscable"""
+    tipo, campo = ('registros', 'contenido') if sender is Registro else ('analisis', 'recomendacion')
+    if update_fields is not None and campo not in update_fields:
+        return
+    indexar(tipo, [instance])
+
+
+@receiver(post_delete, sender=Registro)
+@receiver(post_delete, sender=IAAnalisis)
+def desindexar_texto(sender, instance, **kwargs):
+    desindexar('registros' if sender is Registro else 'analisis', [instance.pk])
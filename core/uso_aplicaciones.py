@@ -0,0 +1,136 @@
+"""
+Tiempo por aplicación, acumulado al ingerir.
+
+El título de la ventana cambia con cada documento ("Informe.xlsx - Excel",
+"Presupuesto.xlsx - Excel"), así que agrupar por ventana_activa reparte el
+tiempo de una aplicación en cientos de filas. Cada muestra se reduce a una
+clave de aplicación (`clave_aplicacion`) y suma a la fila (usuario, día,
+aplicación) de UsoAplicacionDiario, en la misma transacción que la inserta, el
+tiempo desde la muestra anterior de la misma máquina: los agentes no envían
+todos con la misma frecuencia (sara-monitor cada 5 s, el asistente virtual
+cada 30 s). Como en el sesionizador, si el hueco supera
+SESIONES_UMBRAL_INACTIVIDAD el usuario estuvo inactivo y la muestra suma sólo
+SESIONES_PASO_MUESTRA segundos. Sólo suman las muestras que efectivamente se
+insertaron (ver `ingesta.insertar_nuevas`): los reenvíos de un agente o de un
+spool que ya estaban guardados no cuentan dos veces. Los rankings de
+aplicaciones leen esa tabla por índice en lugar de agrupar las muestras.
+"""
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+# Títulos genéricos que envía sara-monitor cuando no detecta la ventana
+VENTANAS_GENERICAS = {'', 'desconocido', 'sistema', 'unknown'}
+
+# Nombres de proceso y de producto -> clave común
+ALIAS = {
+    'microsoft excel': 'excel',
+    'microsoft word': 'word',
+    'winword': 'word',
+    'microsoft powerpoint': 'powerpoint',
+    'powerpnt': 'powerpoint',
+    'microsoft outlook': 'outlook',
+    'microsoft teams': 'teams',
+    'ms-teams': 'teams',
+    'microsoft edge': 'edge',
+    'msedge': 'edge',
+    'google chrome': 'chrome',
+    'mozilla firefox': 'firefox',
+    'visual studio code': 'code',
+    'code helper': 'code',
+}
+
+# "Documento - Aplicación", "Documento — Aplicación", "Documento | Aplicación"
+_SEPARADOR = re.compile(r'\s+[-–—|]\s+')
+_EXTENSION = re.compile(r'\.(exe|app|bin)$', re.IGNORECASE)
+_PARENTESIS = re.compile(r'\s*\(.*\)$')
+
+
+def clave_aplicacion(ventana_activa, procesos_activos=None):
+    """Clave estable de la aplicación: 'excel' para 'Informe.xlsx - Excel', 'EXCEL.EXE' o 'Microsoft Excel'"""
+    texto = (ventana_activa or '').strip()
+    if texto.lower() in VENTANAS_GENERICAS and procesos_activos:
+        # Sin ventana: el proceso con más CPU
+        primero = procesos_activos[0]
+        texto = str((primero.get('name') if isinstance(primero, dict) else primero) or '').strip()
+    # El nombre de la aplicación va al final del título
+    nombre = _SEPARADOR.split(texto)[-1].strip()
+    nombre = _PARENTESIS.sub('', _EXTENSION.sub('', nombre)).strip().lower()
+    nombre = ALIAS.get(nombre, nombre)
+    return nombre[:100] if nombre not in VENTANAS_GENERICAS else 'desconocido'
+
+
+def acumular_uso(actividades):
+    """Suma el tiempo de las actividades a UsoAplicacionDiario (dentro de la transacción que las inserta)"""
+    from .models import ActividadUsuario, UsoAplicacionDiario
+
+    paso = getattr(settings, 'SESIONES_PASO_MUESTRA', 5)
+    umbral = getattr(settings, 'SESIONES_UMBRAL_INACTIVIDAD', 120)
+    por_maquina = defaultdict(list)
+    for actividad in actividades:
+        if actividad.usuario_id is not None:
+            por_maquina[(actividad.usuario_id, actividad.machine_id)].append(actividad)
+
+    totales = defaultdict(lambda: [0, 0])
+    for (usuario_id, machine_id), muestras in por_maquina.items():
+        muestras.sort(key=lambda actividad: actividad.timestamp)
+        # Última muestra ya guardada de la máquina antes del envío
+        anterior = (
+            ActividadUsuario.objects.filter(usuario_id=usuario_id, machine_id=machine_id,
+                                            timestamp__lt=muestras[0].timestamp)
+            .order_by('-timestamp').values_list('timestamp', flat=True).first()
+        )
+        for actividad in muestras:
+            # Como en el sesionizador: el hueco con la muestra anterior, o un paso después de una inactividad
+            hueco = (actividad.timestamp - anterior).total_seconds() if anterior is not None else None
+            anterior = actividad.timestamp
+            clave = (
+                usuario_id,
+                timezone.localdate(actividad.timestamp),
+                clave_aplicacion(actividad.ventana_activa, actividad.procesos_activos),
+            )
+            totales[clave][0] += hueco if hueco is not None and hueco <= umbral else paso
+            totales[clave][1] += 1
+
+    # Orden fijo de claves: dos envíos concurrentes bloquean las filas en el mismo orden
+    for (usuario_id, fecha, aplicacion), (segundos, muestras) in sorted(totales.items()):
+        segundos = round(segundos)
+        filas = UsoAplicacionDiario.objects.filter(usuario_id=usuario_id, fecha=fecha, aplicacion=aplicacion)
+        incremento = {'segundos': F('segundos') + segundos, 'muestras': F('muestras') + muestras}
+        if filas.update(**incremento):
+            continue
+        try:
+            with transaction.atomic():
+                UsoAplicacionDiario.objects.create(
+                    usuario_id=usuario_id, fecha=fecha, aplicacion=aplicacion, segundos=segundos, muestras=muestras
+                )
+        except IntegrityError:
+            # Otro envío creó la fila entre el update y el create
+            filas.update(**incremento)
+
+
+def aplicaciones_mas_usadas(usuario, desde, hasta=None, limite=10):
+    """[{'aplicacion', 'segundos', 'muestras'}] de los días [desde, hasta], de mayor a menor tiempo"""
+    from .models import UsoAplicacionDiario
+
+    return list(
+        UsoAplicacionDiario.objects.filter(usuario=usuario, fecha__gte=desde, fecha__lte=hasta or desde)
+        .values('aplicacion')
+        .annotate(segundos=Sum('segundos'), muestras=Sum('muestras'))
+        .order_by('-segundos', 'aplicacion')[:limite]
+    )
+
+
+def formatear_duracion(segundos):
+    """'1 h 05 min', '12 min' o '40 s'"""
+    segundos = int(segundos)
+    if segundos < 60:
+        return f'{segundos} s'
+    horas, minutos = divmod(segundos // 60, 60)
+    if horas:
+        return f'{horas} h {minutos:02d} min'
+    return f'{minutos} min'
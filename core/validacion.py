@@ -0,0 +1,229 @@
+"""
+Motor de validación de Registro.contenido.
+
+Un esquema asocia cada campo del contenido con sus reglas ('fecha', 'monto',
+'formato'). El esquema se compila una sola vez en un MotorValidacion, que
+valida lotes de contenidos regla por regla (cada regla recibe todos los
+valores de su campo de una vez) y acumula contadores de tiempo por regla.
+
+Los duplicados se detectan con un hash del contenido normalizado, guardado en
+la columna indexada Registro.contenido_hash, en lugar de recorrer la tabla.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime
+
+FORMATO_FECHA = '%d/%m/%Y'
+TAMANO_CONSULTA_HASHES = 500
+
+
+class Regla:
+    """Regla de validación de un valor del contenido"""
+    tipo = ''
+    mensaje = ''
+
+    def validar(self, valor):
+        raise NotImplementedError
+
+    def validar_lote(self, valores):
+        """Lista de booleanos (True = válido) para los valores dados"""
+        return [self.validar(valor) for valor in valores]
+
+    @property
+    def nombre(self):
+        return self.tipo
+
+
+class ReglaFecha(Regla):
+    """Fecha en formato DD/MM/AAAA"""
+    tipo = 'fecha'
+    mensaje = 'Formato de fecha incorrecto (DD/MM/AAAA)'
+
+    def validar(self, valor):
+        try:
+            datetime.strptime(valor, FORMATO_FECHA)
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    def validar_lote(self, valores):
+        # Pocas fechas: strptime es más barato que construir una Series
+        if len(valores) < 64:
+            return super().validar_lote(valores)
+        import pandas as pd
+        serie = pd.Series(valores, dtype=object)
+        es_texto = serie.map(lambda valor: isinstance(valor, str))
+        fechas = pd.to_datetime(serie.where(es_texto).astype(str), format=FORMATO_FECHA, errors='coerce')
+        return (es_texto & fechas.notna()).tolist()
+
+
+class ReglaMonto(Regla):
+    """Importe numérico no negativo (admite coma decimal)"""
+    tipo = 'monto'
+    mensaje = 'Monto inválido: debe ser un número mayor o igual a cero'
+
+    def validar(self, valor):
+        if isinstance(valor, bool):
+            return False
+        if isinstance(valor, str):
+            valor = valor.strip().replace(',', '.')
+        try:
+            return float(valor) >= 0
+        except (TypeError, ValueError):
+            return False
+
+
+class ReglaFormato(Regla):
+    """Texto que cumple una expresión regular"""
+    tipo = 'formato'
+
+    def __init__(self, patron, descripcion):
+        self.patron = re.compile(patron)
+        self.descripcion = descripcion
+        self.mensaje = f'Formato incorrecto: se esperaba {descripcion}'
+
+    def validar(self, valor):
+        return isinstance(valor, str) and self.patron.fullmatch(valor.strip()) is not None
+
+    @property
+    def nombre(self):
+        return f'formato:{self.descripcion}'
+
+
+ESQUEMA_REGISTRO = {
+    'fecha': [ReglaFecha()],
+    'monto': [ReglaMonto()],
+    'importe': [ReglaMonto()],
+    'cuit': [ReglaFormato(r'\d{2}-?\d{8}-?\d', 'CUIT (XX-XXXXXXXX-X)')],
+    'email': [ReglaFormato(r'[^@\s]+@[^@\s]+\.[^@\s]+', 'un email válido')],
+}
+
+
+def normalizar_contenido(contenido):
+    """Forma canónica del contenido: claves ordenadas, textos sin espacios extremos y en minúsculas"""
+    def normalizar(valor):
+        if isinstance(valor, dict):
+            return {str(clave).strip().lower(): normalizar(v) for clave, v in valor.items()}
+        if isinstance(valor, list):
+            return [normalizar(v) for v in valor]
+        if isinstance(valor, str):
+            return ' '.join(valor.split()).lower()
+        return valor
+    return json.dumps(normalizar(contenido), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def hash_contenido(contenido):
+    return hashlib.sha256(normalizar_contenido(contenido).encode('utf-8')).hexdigest()
+
+
+def error_duplicado():
+    return {'campo': 'contenido', 'mensaje': 'Registro duplicado', 'tipo': 'duplicado'}
+
+
+class MotorValidacion:
+    """Esquema de reglas compilado una vez y aplicado a lotes de contenidos"""
+
+    def __init__(self, esquema):
+        # Compilación: lista plana (campo, regla) en el orden del esquema
+        self.reglas = [(campo, regla) for campo, reglas in esquema.items() for regla in reglas]
+        self._lock = threading.Lock()
+        self._contadores = {}
+
+    def validar(self, contenido, usuario_id=None, excluir_pk=None):
+        """Errores de un único contenido (con detección de duplicados si hay usuario)"""
+        errores = self.validar_lote([contenido])[0]
+        if usuario_id is not None and isinstance(contenido, dict):
+            if self.duplicados(usuario_id, [hash_contenido(contenido)], excluir_pk=excluir_pk):
+                errores.append(error_duplicado())
+        return errores
+
+    def validar_lote(self, contenidos, tiempos=None):
+        """Lista de errores por contenido; no accede a la base de datos.
+
+        Si se pasa `tiempos` (dict), además de acumular en el motor se anotan
+        ahí los tiempos de este lote, para reenviarlos desde otros procesos.
+        """
+        errores = [[] for _ in contenidos]
+        for campo, regla in self.reglas:
+            indices = [
+                i for i, contenido in enumerate(contenidos)
+                if isinstance(contenido, dict) and contenido.get(campo) is not None
+            ]
+            if not indices:
+                continue
+            inicio = time.perf_counter_ns()
+            resultados = regla.validar_lote([contenidos[i][campo] for i in indices])
+            transcurrido = time.perf_counter_ns() - inicio
+            self._acumular(regla.nombre, len(indices), transcurrido, tiempos)
+            for i, valido in zip(indices, resultados):
+                if not valido:
+                    errores[i].append({'campo': campo, 'mensaje': regla.mensaje, 'tipo': regla.tipo})
+        return errores
+
+    def duplicados(self, usuario_id, hashes, excluir_pk=None):
+        """Hashes que ya existen para el usuario, buscados en el índice (usuario, contenido_hash)"""
+        from .models import Registro
+
+        inicio = time.perf_counter_ns()
+        existentes = set()
+        hashes = list(set(hashes))
+        for i in range(0, len(hashes), TAMANO_CONSULTA_HASHES):
+            consulta = Registro.objects.filter(
+                usuario_id=usuario_id,
+                contenido_hash__in=hashes[i:i + TAMANO_CONSULTA_HASHES]
+            )
+            if excluir_pk is not None:
+                consulta = consulta.exclude(pk=excluir_pk)
+            existentes.update(consulta.values_list('contenido_hash', flat=True))
+        self._acumular('duplicado', len(hashes), time.perf_counter_ns() - inicio)
+        return existentes
+
+    def _acumular(self, nombre, valores, nanosegundos, tiempos=None):
+        with self._lock:
+            contador = self._contadores.setdefault(nombre, {'lotes': 0, 'valores': 0, 'ns': 0})
+            contador['lotes'] += 1
+            contador['valores'] += valores
+            contador['ns'] += nanosegundos
+        if tiempos is not None:
+            contador = tiempos.setdefault(nombre, {'lotes': 0, 'valores': 0, 'ns': 0})
+            contador['lotes'] += 1
+            contador['valores'] += valores
+            contador['ns'] += nanosegundos
+
+    def acumular_tiempos(self, tiempos):
+        """Incorpora los tiempos medidos en otro proceso"""
+        for nombre, contador in tiempos.items():
+            with self._lock:
+                propio = self._contadores.setdefault(nombre, {'lotes': 0, 'valores': 0, 'ns': 0})
+                for clave in propio:
+                    propio[clave] += contador[clave]
+
+    def estadisticas(self):
+        """Contadores por regla: lotes, valores validados y tiempo total/medio"""
+        with self._lock:
+            return {
+                nombre: dict(
+                    contador,
+                    ms_total=round(contador['ns'] / 1e6, 3),
+                    us_por_valor=round(contador['ns'] / 1e3 / contador['valores'], 3) if contador['valores'] else 0,
+                )
+                for nombre, contador in self._contadores.items()
+            }
+
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self._contadores.clear()
+
+
+_motor = None
+
+
+def obtener_motor():
+    """Motor compilado con ESQUEMA_REGISTRO, compartido por todo el proceso"""
+    global _motor
+    if _motor is None:
+        _motor = MotorValidacion(ESQUEMA_REGISTRO)
+    return _motor
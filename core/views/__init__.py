@@ -0,0 +1,60 @@
+"""
+Vistas de core, separadas por área y cargadas bajo demanda.
+
+- crud: listados y formularios de usuarios, registros, metas, estadísticas, análisis y actividad
+- dashboards: dashboards personal y administrativo, analítica del equipo
+- asistente: chat del asistente y generación de respuestas
+- api: login, ingesta de actividad, autocompletado, métricas, reportes y búsqueda
+
+`views.X` y `from core.views import X` importan sólo el submódulo que define
+X, así que los comandos de manage.py que no cargan las URLs no pagan el
+costo de importar las vistas.
+"""
+import sys
+
+SUBMODULOS = ('crud', 'dashboards', 'asistente', 'api')
+
+# Vistas publicadas en sara/urls.py -> submódulo
+_UBICACION = {
+    **dict.fromkeys((
+        'paginar', 'RegistroViewSet', 'MetaUsuarioViewSet', 'usuarios_list', 'usuario_create', 'usuario_edit', 'usuario_delete',
+        'registros_list', 'registro_create', 'registro_edit', 'registro_delete', 'estadisticas_list',
+        'estadistica_detail', 'analisis_list', 'analisis_detail', 'actividad_list', 'actividad_usuario_detail',
+    ), 'crud'),
+    **dict.fromkeys((
+        'dashboard_view', 'dashboard_authenticated', 'dashboard', 'dashboard_api', 'dashboard_admin',
+        'empleados_overview', 'analitica_equipo_api',
+    ), 'dashboards'),
+    **dict.fromkeys((
+        'asistente_chat', 'asistente_chat_api', 'consejos_proactivos_api', 'analizar_intencion_mensaje',
+        'generar_respuesta_asistente', 'responder_mensaje',
+    ), 'asistente'),
+    **dict.fromkeys((
+        'usuarios_autocompletar_api', 'login_api', 'activity_api', 'cache_metricas_api', 'ingesta_metricas_api',
+        'reporte_api', 'busqueda_api',
+    ), 'api'),
+}
+
+
+def _submodulo(nombre):
+    # __import__ y no importlib.import_module: sólo el primero aparece en python -X importtime
+    __import__(f'{__name__}.{nombre}')
+    return sys.modules[f'{__name__}.{nombre}']
+
+
+def __getattr__(nombre):
+    if nombre in SUBMODULOS:
+        return _submodulo(nombre)
+    submodulos = (_UBICACION[nombre],) if nombre in _UBICACION else SUBMODULOS
+    # Funciones auxiliares fuera del índice: se buscan en cada submódulo
+    for submodulo in submodulos:
+        modulo = _submodulo(submodulo)
+        if hasattr(modulo, nombre):
+            valor = getattr(modulo, nombre)
+            globals()[nombre] = valor
+            return valor
+    raise AttributeError(f'module {__name__!r} has no attribute {nombre!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_UBICACION) | set(SUBMODULOS))
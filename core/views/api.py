@@ -0,0 +1,224 @@
+"""APIs de login, ingesta de actividad, autocompletado, métricas y reportes"""
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import transaction
+from django.http import FileResponse, HttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.decorators import api_view, parser_classes, permission_classes, throttle_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from ..autenticacion import emitir_tokens
+from ..buffer_ingesta import BufferLleno, buffer_activo, encolar_muestras, obtener_buffer
+from ..busqueda import TIPOS, buscar, palabras
+from ..cache_backends import metricas_caches
+from ..directorio import obtener_directorio
+from ..enrutador_bd import solo_lectura
+from ..ingesta import (
+    MuestrasNDJSONParser, construir_actividad, extraer_muestras, guardar_muestras, olvidar_ultima_actividad,
+)
+from ..limites import LimiteActividad, LimiteMaquina
+from ..models import IAAnalisis, Registro, Usuario
+from ..reportes import FORMATOS, PERIODOS, fecha_reporte, generar_reporte, nombre_descarga
+from ..uso_aplicaciones import acumular_uso
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@solo_lectura
+def usuarios_autocompletar_api(request):
+    """Autocompletado de usuarios por username, nombre o apellido (admin/supervisor)"""
+    if request.user.rol not in ['admin', 'supervisor']:
+        return Response({'error': 'No tienes permisos para buscar usuarios'}, status=status.HTTP_403_FORBIDDEN)
+
+    usuarios = obtener_directorio().buscar(request.query_params.get('q', ''))
+    return Response({'resultados': [
+        {'id': usuario['id'], 'username': usuario['username'], 'nombre': usuario['nombre'], 'rol': usuario['rol']}
+        for usuario in usuarios
+    ]})
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def login_api(request):
+    """API endpoint para login de usuarios; devuelve tokens JWT access y refresh"""
+    try:
+        username = request.data.get('username')
+        password = request.data.get('password')
+
+        if not username or not password:
+            return Response({
+                'error': 'Usuario y contraseña son requeridos'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        user = authenticate(username=username, password=password)
+
+        if user is not None:
+            # Tokens JWT en lugar de sesión: los agentes no crean filas de sesión
+            return Response({
+                **emitir_tokens(user),
+                'user': {
+                    'id': user.id,
+                    'username': user.username,
+                    'first_name': user.first_name,
+                    'last_name': user.last_name,
+                    'email': user.email,
+                    'rol': user.rol,
+                    'is_active': user.is_active
+                },
+                'message': 'Login exitoso'
+            })
+        else:
+            return Response({
+                'error': 'Credenciales inválidas'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+    except Exception as e:
+        return Response({
+            'error': f'Error interno del servidor: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([LimiteActividad, LimiteMaquina])
+@parser_classes(api_settings.DEFAULT_PARSER_CLASSES + [MuestrasNDJSONParser])
+def activity_api(request):
+    """API para registrar actividad del usuario (una muestra, un lote o NDJSON delta)"""
+    try:
+        user = request.user
+        muestras = extraer_muestras(request.data)
+
+        if buffer_activo():
+            # Escritura diferida: las muestras se insertan en el próximo vaciado del buffer
+            try:
+                resultado = encolar_muestras(muestras, user)
+            except BufferLleno as e:
+                # El agente conserva las muestras y reintenta pasado el Retry-After
+                return Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                headers={'Retry-After': '30'})
+            return Response({
+                'message': 'Actividad recibida',
+                **resultado,
+            }, status=status.HTTP_202_ACCEPTED)
+
+        if isinstance(muestras, list) and len(muestras) == 1 and 'seq' not in muestras[0]:
+            # Una sola muestra sin secuencia: se responde con el registro creado
+            actividad = construir_actividad(muestras[0], user)
+            with transaction.atomic():
+                actividad.save()
+                acumular_uso([actividad])
+            olvidar_ultima_actividad([user.pk])
+            return Response({
+                'message': 'Actividad registrada exitosamente',
+                'actividad_id': actividad.id,
+                'timestamp': actividad.timestamp.isoformat()
+            })
+
+        resultado = guardar_muestras(muestras, user)
+        return Response({
+            'message': 'Actividad registrada exitosamente',
+            **resultado,
+        })
+
+    except ParseError as e:
+        return Response({'error': str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cache_metricas_api(request):
+    """Aciertos y fallos de cada cache con nombre en este worker (solo admin)"""
+    if request.user.rol != 'admin':
+        return Response({'error': 'No tienes permisos para ver las métricas'}, status=status.HTTP_403_FORBIDDEN)
+    return Response(metricas_caches())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def ingesta_metricas_api(request):
+    """Métricas del buffer de ingesta de este worker (solo admin)"""
+    if request.user.rol != 'admin':
+        return Response({'error': 'No tienes permisos para ver las métricas'}, status=status.HTTP_403_FORBIDDEN)
+    if not buffer_activo():
+        return Response({'buffer_activo': False})
+    return Response({'buffer_activo': True, **obtener_buffer().metricas()})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def reporte_api(request, periodo):
+    """Reporte diario, semanal o mensual en ?formato=csv|json|xlsx|pdf, servido desde la cache en disco.
+
+    Admin y supervisor pueden pedir el de otro usuario con ?usuario=<id>.
+    """
+    formato = request.query_params.get('formato', 'pdf')
+    if periodo not in PERIODOS or formato not in FORMATOS:
+        return Response({
+            'error': f'Use un período ({", ".join(PERIODOS)}) y un formato ({", ".join(FORMATOS)}) válidos'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fecha = fecha_reporte(request.query_params.get('fecha'))
+    except ValueError:
+        return Response({'error': 'Fecha inválida, use AAAA-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+    usuario = request.user
+    usuario_id = request.query_params.get('usuario')
+    if usuario_id and usuario_id != str(request.user.pk):
+        if request.user.rol not in ['admin', 'supervisor']:
+            return Response({'error': 'No tienes permisos para ver reportes de otros usuarios'},
+                            status=status.HTTP_403_FORBIDDEN)
+        usuario = get_object_or_404(Usuario, pk=usuario_id)
+
+    ruta = generar_reporte(usuario, periodo, fecha, formato)
+    nombre = nombre_descarga(usuario, periodo, fecha, formato)
+    if settings.REPORTES_X_ACCEL:
+        # nginx envía el archivo; el worker sólo responde las cabeceras
+        respuesta = HttpResponse(content_type=FORMATOS[formato])
+        respuesta['X-Accel-Redirect'] = settings.REPORTES_X_ACCEL.rstrip('/') + '/' + ruta.relative_to(settings.REPORTES_DIR).as_posix()
+        respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return respuesta
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=nombre, content_type=FORMATOS[formato])
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def busqueda_api(request):
+    """Búsqueda de texto completo en ?tipo=registros|analisis, ordenada por relevancia y paginada.
+
+    El empleado sólo busca en lo propio; admin y supervisor en todo.
+    """
+    tipo = request.query_params.get('tipo', 'registros')
+    consulta = request.query_params.get('q', '')
+    if tipo not in TIPOS or not palabras(consulta):
+        return Response({'error': f'Use ?q= con alguna palabra y un tipo válido ({", ".join(TIPOS)})'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    pagina = request.query_params.get('page', '1')
+    if not pagina.isdigit() or int(pagina) < 1:
+        return Response({'error': 'Página inválida'}, status=status.HTTP_400_BAD_REQUEST)
+    pagina = int(pagina)
+
+    por_pagina = settings.BUSQUEDA_POR_PAGINA
+    usuario_id = None if request.user.rol in ['admin', 'supervisor'] else request.user.pk
+    total, filas = buscar(tipo, consulta, usuario_id, pagina, por_pagina)
+
+    # Fecha y usuario de las filas de la página, en una consulta
+    modelo, _, campo_fecha, _ = TIPOS[tipo]
+    objetos = (Registro if modelo == 'Registro' else IAAnalisis).objects.select_related('usuario').only(
+        campo_fecha, 'usuario__username'
+    ).in_bulk([fila[0] for fila in filas])
+    url = request.build_absolute_uri()
+    return Response({
+        'count': total,
+        'next': replace_query_param(url, 'page', pagina + 1) if pagina * por_pagina < total else None,
+        'previous': replace_query_param(url, 'page', pagina - 1) if pagina > 1 else None,
+        'results': [
+            {
+                'tipo': tipo,
+                'id': pk,
+                'usuario': objetos[pk].usuario.username,
+                'fecha': getattr(objetos[pk], campo_fecha).isoformat(),
+                'rango': round(rango, 4),
+                'fragmento': fragmento,
+            }
+            for pk, rango, fragmento in filas if pk in objetos
+        ],
+    })
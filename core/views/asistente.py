@@ -1,615 +1,26 @@
-from django.shortcuts import render, redirect, get_object_or_404
+"""Asistente IA: chat, consejos proactivos y generación de respuestas"""
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.contrib import messages
-from django.contrib.auth.models import User
-from django.contrib.auth import authenticate, login
-from django.http import JsonResponse
 from django.utils import timezone
-from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import Registro, Estadistica, IAAnalisis, ActividadUsuario, Usuario
-from .serializers import RegistroSerializer, EstadisticaSerializer, IAAnalisisSerializer, ActividadUsuarioSerializer
-from django.db.models import Count
-
-try:
-    from .ia_module import analizar_errores
-except ImportError:
-    analizar_errores = None
-
-def dashboard_view(request):
-    """Vista principal del dashboard - redirige según rol del usuario"""
-    if not request.user.is_authenticated:
-        return redirect('login')
-
-    # Admin y supervisor van al dashboard administrativo
-    if request.user.rol in ['admin', 'supervisor']:
-        return redirect('dashboard_admin')
-
-    # Empleados van al dashboard personal
-    return dashboard_authenticated(request)
-
-@login_required
-def dashboard_authenticated(request):
-    """Vista del dashboard para usuarios autenticados"""
-    user = request.user
-    estadisticas = Estadistica.objects.filter(usuario=user).last()
-    analisis = IAAnalisis.objects.filter(usuario=user).last()
-
-    # Consejos recientes del agente personal
-    consejos_recientes = IAAnalisis.objects.filter(
-        usuario=user,
-        patrones_detectados__tipo="agente_personal"
-    ).order_by('-fecha_analisis')[:3]
-
-    return render(request, 'core/dashboard.html', {
-        'user': user,
-        'estadisticas': estadisticas,
-        'analisis': analisis,
-        'consejos_recientes': consejos_recientes,
-    })
-
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def dashboard(request):
-    user = request.user
-    estadisticas = Estadistica.objects.filter(usuario=user).last()
-    analisis = IAAnalisis.objects.filter(usuario=user).last()
-
-    # Si es una petición AJAX o API, devolver JSON
-    if request.META.get('HTTP_ACCEPT', '').find('application/json') != -1 or request.GET.get('format') == 'json':
-        data = {
-            'estadisticas': EstadisticaSerializer(estadisticas).data if estadisticas else None,
-            'analisis': IAAnalisisSerializer(analisis).data if analisis else None,
-        }
-        return Response(data)
-    else:
-        # Renderizar template HTML
-        return render(request, 'core/dashboard.html', {
-            'user': user,
-            'estadisticas': estadisticas,
-            'analisis': analisis,
-        })
-
-class RegistroViewSet(viewsets.ModelViewSet):
-    queryset = Registro.objects.all()
-    serializer_class = RegistroSerializer
-    permission_classes = [IsAuthenticated]
-
-    def perform_create(self, serializer):
-        registro = serializer.save(usuario=self.request.user)
-        errores = self.validar_registro(registro.contenido)
-        registro.errores = errores
-        registro.save()
-        if analizar_errores and errores:
-            analizar_errores(self.request.user)
-
-    def validar_registro(self, contenido):
-        errores = []
-        if 'fecha' in contenido and not self.es_fecha_valida(contenido['fecha']):
-            errores.append({'campo': 'fecha', 'mensaje': 'Formato de fecha incorrecto (DD/MM/AAAA)'})
-        return errores
-
-    def es_fecha_valida(self, fecha_str):
-        try:
-            from datetime import datetime
-            datetime.strptime(fecha_str, '%d/%m/%Y')
-            return True
-        except ValueError:
-            return False
-
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def dashboard_api(request):
-    """API endpoint del dashboard - solo JSON"""
-    user = request.user
-    estadisticas = Estadistica.objects.filter(usuario=user).last()
-    analisis = IAAnalisis.objects.filter(usuario=user).last()
-
-    data = {
-        'estadisticas': EstadisticaSerializer(estadisticas).data if estadisticas else None,
-        'analisis': IAAnalisisSerializer(analisis).data if analisis else None,
-    }
-    return Response(data)
-
-# Gestión de Usuarios
-@login_required
-def usuarios_list(request):
-    """Lista todos los usuarios - solo para administradores"""
-    if request.user.rol != 'admin':
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('home')
-
-    usuarios = Usuario.objects.all().order_by('username')
-    return render(request, 'core/usuarios_list.html', {'usuarios': usuarios})
-
-@login_required
-def usuario_create(request):
-    """Crear nuevo usuario - solo para administradores"""
-    if request.user.rol != 'admin':
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('home')
-
-    if request.method == 'POST':
-        username = request.POST.get('username')
-        email = request.POST.get('email')
-        password = request.POST.get('password')
-        first_name = request.POST.get('first_name')
-        last_name = request.POST.get('last_name')
-        rol = request.POST.get('rol')
-
-        if Usuario.objects.filter(username=username).exists():
-            messages.error(request, 'El nombre de usuario ya existe.')
-            return redirect('usuario_create')
-
-        try:
-            usuario = Usuario.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                first_name=first_name,
-                last_name=last_name,
-                rol=rol
-            )
-            messages.success(request, f'Usuario {username} creado exitosamente.')
-            return redirect('usuarios_list')
-        except Exception as e:
-            messages.error(request, f'Error al crear usuario: {str(e)}')
-            return redirect('usuario_create')
-
-    return render(request, 'core/usuario_form.html', {'action': 'create'})
-
-@login_required
-def usuario_edit(request, pk):
-    """Editar usuario - solo para administradores"""
-    if request.user.rol != 'admin':
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('home')
-
-    usuario = get_object_or_404(Usuario, pk=pk)
-
-    if request.method == 'POST':
-        usuario.email = request.POST.get('email')
-        usuario.first_name = request.POST.get('first_name')
-        usuario.last_name = request.POST.get('last_name')
-        usuario.rol = request.POST.get('rol')
-        usuario.is_active = request.POST.get('is_active') == 'on'
-
-        # Cambiar contraseña solo si se proporciona
-        password = request.POST.get('password')
-        if password:
-            usuario.set_password(password)
-
-        try:
-            usuario.save()
-            messages.success(request, f'Usuario {usuario.username} actualizado exitosamente.')
-            return redirect('usuarios_list')
-        except Exception as e:
-            messages.error(request, f'Error al actualizar usuario: {str(e)}')
-            return redirect('usuario_edit', pk=pk)
-
-    return render(request, 'core/usuario_form.html', {
-        'usuario': usuario,
-        'action': 'edit'
-    })
-
-@login_required
-def usuario_delete(request, pk):
-    """Eliminar usuario - solo para administradores"""
-    if request.user.rol != 'admin':
-        messages.error(request, 'No tienes permisos para acceder a esta sección.')
-        return redirect('home')
-
-    usuario = get_object_or_404(Usuario, pk=pk)
-
-    if request.method == 'POST':
-        try:
-            username = usuario.username
-            usuario.delete()
-            messages.success(request, f'Usuario {username} eliminado exitosamente.')
-            return redirect('usuarios_list')
-        except Exception as e:
-            messages.error(request, f'Error al eliminar usuario: {str(e)}')
-            return redirect('usuarios_list')
-
-    return render(request, 'core/usuario_confirm_delete.html', {'usuario': usuario})
-
-# Gestión de Registros
-@login_required
-def registros_list(request):
-    """Lista todos los registros - según permisos del usuario"""
-    if request.user.rol == 'admin':
-        registros = Registro.objects.all().order_by('-fecha')
-    elif request.user.rol == 'supervisor':
-        registros = Registro.objects.all().order_by('-fecha')
-    else:  # empleado
-        registros = Registro.objects.filter(usuario=request.user).order_by('-fecha')
-
-    return render(request, 'core/registros_list.html', {'registros': registros})
-
-@login_required
-def registro_create(request):
-    """Crear nuevo registro"""
-    if request.method == 'POST':
-        fecha = request.POST.get('fecha')
-        contenido = request.POST.get('contenido')
-
-        try:
-            # Parsear contenido JSON
-            import json
-            contenido_data = json.loads(contenido) if contenido else {}
-
-            registro = Registro.objects.create(
-                usuario=request.user,
-                fecha=fecha,
-                contenido=contenido_data
-            )
-
-            # Validar y analizar errores
-            errores = RegistroViewSet.validar_registro(None, contenido_data)
-            registro.errores = errores
-            registro.save()
-
-            if analizar_errores and errores:
-                analizar_errores(request.user)
-
-            messages.success(request, 'Registro creado exitosamente.')
-            return redirect('registros_list')
-        except json.JSONDecodeError:
-            messages.error(request, 'El contenido debe ser un JSON válido.')
-            return redirect('registro_create')
-        except Exception as e:
-            messages.error(request, f'Error al crear registro: {str(e)}')
-            return redirect('registro_create')
-
-    return render(request, 'core/registro_form.html', {'action': 'create'})
-
-@login_required
-def registro_edit(request, pk):
-    """Editar registro - solo el propietario o admin/supervisor"""
-    registro = get_object_or_404(Registro, pk=pk)
-
-    if not (request.user.rol in ['admin', 'supervisor'] or registro.usuario == request.user):
-        messages.error(request, 'No tienes permisos para editar este registro.')
-        return redirect('registros_list')
-
-    if request.method == 'POST':
-        fecha = request.POST.get('fecha')
-        contenido = request.POST.get('contenido')
-
-        try:
-            # Parsear contenido JSON
-            import json
-            contenido_data = json.loads(contenido) if contenido else {}
-
-            registro.fecha = fecha
-            registro.contenido = contenido_data
-
-            # Revalidar errores
-            errores = RegistroViewSet.validar_registro(None, contenido_data)
-            registro.errores = errores
-            registro.save()
-
-            messages.success(request, 'Registro actualizado exitosamente.')
-            return redirect('registros_list')
-        except json.JSONDecodeError:
-            messages.error(request, 'El contenido debe ser un JSON válido.')
-            return redirect('registro_edit', pk=pk)
-        except Exception as e:
-            messages.error(request, f'Error al actualizar registro: {str(e)}')
-            return redirect('registro_edit', pk=pk)
-
-    return render(request, 'core/registro_form.html', {
-        'registro': registro,
-        'action': 'edit'
-    })
-
-@login_required
-def registro_delete(request, pk):
-    """Eliminar registro - solo el propietario o admin/supervisor"""
-    registro = get_object_or_404(Registro, pk=pk)
-
-    if not (request.user.rol in ['admin', 'supervisor'] or registro.usuario == request.user):
-        messages.error(request, 'No tienes permisos para eliminar este registro.')
-        return redirect('registros_list')
-
-    if request.method == 'POST':
-        try:
-            registro.delete()
-            messages.success(request, 'Registro eliminado exitosamente.')
-            return redirect('registros_list')
-        except Exception as e:
-            messages.error(request, f'Error al eliminar registro: {str(e)}')
-            return redirect('registros_list')
-
-    return render(request, 'core/registro_confirm_delete.html', {'registro': registro})
-
-# Gestión de Estadísticas
-@login_required
-def estadisticas_list(request):
-    """Lista estadísticas - según permisos del usuario"""
-    if request.user.rol == 'admin':
-        estadisticas = Estadistica.objects.all().order_by('-fecha_actualizacion')
-    elif request.user.rol == 'supervisor':
-        estadisticas = Estadistica.objects.all().order_by('-fecha_actualizacion')
-    else:  # empleado
-        estadisticas = Estadistica.objects.filter(usuario=request.user).order_by('-fecha_actualizacion')
-
-    return render(request, 'core/estadisticas_list.html', {'estadisticas': estadisticas})
-
-@login_required
-def estadistica_detail(request, pk):
-    """Ver detalle de estadística"""
-    estadistica = get_object_or_404(Estadistica, pk=pk)
-
-    if not (request.user.rol in ['admin', 'supervisor'] or estadistica.usuario == request.user):
-        messages.error(request, 'No tienes permisos para ver esta estadística.')
-        return redirect('estadisticas_list')
-
-    return render(request, 'core/estadistica_detail.html', {'estadistica': estadistica})
-
-# Gestión de Análisis IA
-@login_required
-def analisis_list(request):
-    """Lista análisis IA - según permisos del usuario"""
-    if request.user.rol == 'admin':
-        analisis = IAAnalisis.objects.all().order_by('-fecha_analisis')
-    elif request.user.rol == 'supervisor':
-        analisis = IAAnalisis.objects.all().order_by('-fecha_analisis')
-    else:  # empleado
-        analisis = IAAnalisis.objects.filter(usuario=request.user).order_by('-fecha_analisis')
-
-    return render(request, 'core/analisis_list.html', {'analisis_list': analisis})
-
-@login_required
-def analisis_detail(request, pk):
-    """Ver detalle de análisis IA"""
-    analisis = get_object_or_404(IAAnalisis, pk=pk)
-
-    if not (request.user.rol in ['admin', 'supervisor'] or analisis.usuario == request.user):
-        messages.error(request, 'No tienes permisos para ver este análisis.')
-        return redirect('analisis_list')
-
-    # Calcular estadísticas adicionales
-    registros_con_errores = analisis.usuario.registro_set.filter(errores__isnull=False).count()
-
-    context = {
-        'analisis': analisis,
-        'registros_con_errores': registros_con_errores,
-    }
-
-    return render(request, 'core/analisis_detail.html', context)
-
-# Gestión de Actividad de Usuario (Monitoreo en tiempo real)
-@login_required
-def actividad_list(request):
-    """Lista actividad de usuarios - según permisos del usuario"""
-    # Inicializar variables
-    usuario_id = request.GET.get('usuario')
-
-    if request.user.rol in ['admin', 'supervisor']:
-        # Admin y supervisor ven actividad de todos los usuarios
-        actividades = ActividadUsuario.objects.select_related('usuario').all().order_by('-timestamp')
-        # Filtrar por usuario si se especifica
-        if usuario_id:
-            actividades = actividades.filter(usuario_id=usuario_id)
-    else:
-        # Empleados solo ven su propia actividad
-        actividades = ActividadUsuario.objects.filter(usuario=request.user).order_by('-timestamp')
-
-    # Filtrar por fecha si se especifica
-    fecha_desde = request.GET.get('fecha_desde')
-    fecha_hasta = request.GET.get('fecha_hasta')
-
-    if fecha_desde:
-        actividades = actividades.filter(timestamp__date__gte=fecha_desde)
-    if fecha_hasta:
-        actividades = actividades.filter(timestamp__date__lte=fecha_hasta)
-
-    # Paginación
-    from django.core.paginator import Paginator
-    paginator = Paginator(actividades, 50)  # 50 actividades por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    # Obtener lista de usuarios para el filtro (solo para admin/supervisor)
-    usuarios = []
-    if request.user.rol in ['admin', 'supervisor']:
-        usuarios = Usuario.objects.all().order_by('username')
-
-    context = {
-        'page_obj': page_obj,
-        'usuarios': usuarios,
-        'fecha_desde': fecha_desde,
-        'fecha_hasta': fecha_hasta,
-        'usuario_filtro': usuario_id,
-    }
-
-    return render(request, 'core/actividad_list.html', context)
-
-@login_required
-def actividad_usuario_detail(request, usuario_id):
-    """Ver actividad detallada de un usuario específico - solo admin/supervisor"""
-    if request.user.rol not in ['admin', 'supervisor']:
-        messages.error(request, 'No tienes permisos para acceder a esta información.')
-        return redirect('home')
-
-    usuario = get_object_or_404(Usuario, id=usuario_id)
-
-    # Estadísticas de actividad del usuario
-    actividades_recientes = ActividadUsuario.objects.filter(
-        usuario=usuario,
-        timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
-    )
-
-    # Contar tipos de actividad
-    productiva = actividades_recientes.filter(productividad='productive').count()
-    improductiva = actividades_recientes.filter(productividad='unproductive').count()
-    gaming = actividades_recientes.filter(productividad='gaming').count()
-    neutral = actividades_recientes.filter(productividad='neutral').count()
-
-    total_actividades = actividades_recientes.count()
-
-    # Aplicaciones más usadas
-    from django.db.models import Count
-    aplicaciones_mas_usadas = actividades_recientes.values('ventana_activa').annotate(
-        count=Count('ventana_activa')
-    ).order_by('-count')[:10]
-
-    # Calcular porcentajes para las aplicaciones más usadas
-    aplicaciones_con_porcentaje = []
-    if aplicaciones_mas_usadas:
-        max_count = aplicaciones_mas_usadas[0]['count']
-        for app in aplicaciones_mas_usadas:
-            porcentaje = round((app['count'] / max_count) * 100, 1) if max_count > 0 else 0
-            aplicaciones_con_porcentaje.append({
-                'ventana_activa': app['ventana_activa'],
-                'count': app['count'],
-                'porcentaje': porcentaje
-            })
-
-    # Estadísticas del usuario
-    estadisticas = Estadistica.objects.filter(usuario=usuario).last()
-    analisis_reciente = IAAnalisis.objects.filter(usuario=usuario).last()
-
-    context = {
-        'usuario': usuario,
-        'actividades_recientes': actividades_recientes.order_by('-timestamp')[:20],
-        'estadisticas': {
-            'productiva': productiva,
-            'improductiva': improductiva,
-            'gaming': gaming,
-            'neutral': neutral,
-            'total': total_actividades,
-        },
-        'aplicaciones_mas_usadas': aplicaciones_con_porcentaje,
-        'estadistica_usuario': estadisticas,
-        'analisis_reciente': analisis_reciente,
-    }
-
-    return render(request, 'core/actividad_usuario_detail.html', context)
-
-@login_required
-def dashboard_admin(request):
-    """Dashboard administrativo para admin/supervisor"""
-    if request.user.rol not in ['admin', 'supervisor']:
-        messages.error(request, 'No tienes permisos para acceder al dashboard administrativo.')
-        return redirect('home')
-
-    # Estadísticas generales
-    total_usuarios = Usuario.objects.count()
-    usuarios_activos = Usuario.objects.filter(is_active=True).count()
-
-    # Actividad en las últimas 24 horas
-    actividades_24h = ActividadUsuario.objects.filter(
-        timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
-    )
-
-    # Estadísticas de productividad
-    productiva_total = actividades_24h.filter(productividad='productive').count()
-    improductiva_total = actividades_24h.filter(productividad='unproductive').count()
-    gaming_total = actividades_24h.filter(productividad='gaming').count()
-
-    total_actividades_24h = actividades_24h.count()
-
-    # Usuarios con más actividad
-    usuarios_mas_activos = actividades_24h.values('usuario__id', 'usuario__username', 'usuario__first_name', 'usuario__last_name').annotate(
-        count=Count('usuario')
-    ).order_by('-count')[:10]
-
-    # Alertas recientes (análisis IA de las últimas horas)
-    alertas_recientes = IAAnalisis.objects.filter(
-        fecha_analisis__gte=timezone.now() - timezone.timedelta(hours=24)
-    ).select_related('usuario').order_by('-fecha_analisis')[:10]
-
-    context = {
-        'total_usuarios': total_usuarios,
-        'usuarios_activos': usuarios_activos,
-        'estadisticas_24h': {
-            'productiva': productiva_total,
-            'improductiva': improductiva_total,
-            'gaming': gaming_total,
-            'total': total_actividades_24h,
-        },
-        'usuarios_mas_activos': usuarios_mas_activos,
-        'alertas_recientes': alertas_recientes,
-    }
-
-    return render(request, 'core/dashboard_admin.html', context)
-
-@login_required
-def empleados_overview(request):
-    """Vista completa de todos los empleados para admin/supervisor"""
-    if request.user.rol not in ['admin', 'supervisor']:
-        messages.error(request, 'No tienes permisos para acceder a esta información.')
-        return redirect('home')
-
-    # Obtener todos los empleados
-    empleados = Usuario.objects.filter(rol='empleado').order_by('username')
-
-    empleados_data = []
-
-    for empleado in empleados:
-        # Actividad en las últimas 24 horas
-        actividades_24h = ActividadUsuario.objects.filter(
-            usuario=empleado,
-            timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
-        )
-
-        # Calcular productividad
-        productiva = actividades_24h.filter(productividad='productive').count()
-        improductiva = actividades_24h.filter(productividad='unproductive').count()
-        gaming = actividades_24h.filter(productividad='gaming').count()
-        neutral = actividades_24h.filter(productividad='neutral').count()
-        total_actividades = actividades_24h.count()
-
-        # Calcular porcentaje de productividad
-        if total_actividades > 0:
-            productividad_porcentaje = round((productiva / total_actividades) * 100, 1)
-        else:
-            productividad_porcentaje = 0
-
-        # Última actividad
-        ultima_actividad = actividades_24h.order_by('-timestamp').first()
-
-        # Análisis IA más reciente
-        analisis_reciente = IAAnalisis.objects.filter(
-            usuario=empleado
-        ).order_by('-fecha_analisis').first()
-
-        # Estadísticas del empleado
-        estadistica = Estadistica.objects.filter(usuario=empleado).last()
-
-        # Estado actual (basado en actividad reciente)
-        if ultima_actividad and (timezone.now() - ultima_actividad.timestamp).seconds < 300:  # 5 minutos
-            estado = 'activo'
-        elif actividades_24h.exists():
-            estado = 'inactivo_hoy'
-        else:
-            estado = 'sin_actividad'
-
-        empleados_data.append({
-            'usuario': empleado,
-            'estado': estado,
-            'ultima_actividad': ultima_actividad,
-            'estadisticas_24h': {
-                'productiva': productiva,
-                'improductiva': improductiva,
-                'gaming': gaming,
-                'neutral': neutral,
-                'total': total_actividades,
-                'productividad_porcentaje': productividad_porcentaje,
-            },
-            'analisis_reciente': analisis_reciente,
-            'estadistica': estadistica,
-        })
-
-    context = {
-        'empleados_data': empleados_data,
-    }
-
-    return render(request, 'core/empleados_overview.html', context)
+from ..models import Registro, Estadistica, IAAnalisis, ActividadUsuario
+from ..analitica_equipo import analitica_equipo
+from ..directorio import obtener_directorio
+from ..enrutador_bd import solo_lectura
+from ..ingesta import ultima_actividad
+from ..intenciones import clasificar
+from ..limites import LimiteChat, LimiteConsejos
+from ..metas import progreso_metas
+from ..registro_chat import ContadorConsultas, registrar_mensaje
+from ..sesiones import tiempo_de_foco, tiempo_por_hora
+from ..uso_aplicaciones import aplicaciones_mas_usadas, formatear_duracion
 
 # Asistente IA Interactivo
 @login_required
@@ -617,47 +28,10 @@ def asistente_chat(request):
     """Interfaz de chat con el asistente IA"""
     return render(request, 'core/asistente_chat.html')
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def login_api(request):
-    """API endpoint para login de usuarios"""
-    try:
-        username = request.data.get('username')
-        password = request.data.get('password')
-
-        if not username or not password:
-            return Response({
-                'error': 'Usuario y contraseña son requeridos'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        user = authenticate(username=username, password=password)
-
-        if user is not None:
-            login(request, user)
-            return Response({
-                'user': {
-                    'id': user.id,
-                    'username': user.username,
-                    'first_name': user.first_name,
-                    'last_name': user.last_name,
-                    'email': user.email,
-                    'rol': user.rol,
-                    'is_active': user.is_active
-                },
-                'message': 'Login exitoso'
-            })
-        else:
-            return Response({
-                'error': 'Credenciales inválidas'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-
-    except Exception as e:
-        return Response({
-            'error': f'Error interno del servidor: {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([LimiteChat])
+@solo_lectura
 def asistente_chat_api(request):
     """API para interactuar con el asistente IA"""
     try:
@@ -667,8 +41,16 @@ def asistente_chat_api(request):
         if not mensaje_usuario:
             return Response({'error': 'Mensaje requerido'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Generar respuesta del asistente
-        respuesta_asistente = generar_respuesta_asistente(request.user, mensaje_usuario, contexto)
+        # Generar respuesta del asistente midiendo su costo para el registro del chat
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            # Todas las bases: con réplica, las lecturas de esta vista van a `replica`
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(contador))
+            intencion, manejador, respuesta_asistente = responder_mensaje(request.user, mensaje_usuario, contexto)
+        registrar_mensaje(request.user, mensaje_usuario, intencion, manejador,
+                          (time.perf_counter() - inicio) * 1000, contador.total)
 
         return Response({
             'respuesta': respuesta_asistente,
@@ -680,15 +62,15 @@ def asistente_chat_api(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([LimiteConsejos])
+@solo_lectura
 def consejos_proactivos_api(request):
     """API para obtener consejos proactivos basados en la actividad del usuario"""
     try:
         user = request.user
 
         # Obtener actividad reciente
-        actividad_reciente = ActividadUsuario.objects.filter(
-            usuario=user
-        ).order_by('-timestamp').first()
+        actividad_reciente = ultima_actividad(user)
 
         # Obtener estadísticas recientes
         estadisticas = Estadistica.objects.filter(usuario=user).last()
@@ -742,136 +124,20 @@ def consejos_proactivos_api(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def activity_api(request):
-    """API para registrar actividad del usuario"""
-    try:
-        user = request.user
-        data = request.data
-
-        # Crear registro de actividad
-        actividad = ActividadUsuario.objects.create(
-            usuario=user,
-            machine_id=data.get('machine_id', 'unknown'),
-            timestamp=timezone.now(),
-            ventana_activa=data.get('ventana_activa', ''),
-            procesos_activos=data.get('procesos_activos', []),
-            carga_sistema=data.get('carga_sistema', {}),
-            productividad=data.get('productividad', 'unproductive')
-        )
-
-        return Response({
-            'message': 'Actividad registrada exitosamente',
-            'actividad_id': actividad.id,
-            'timestamp': actividad.timestamp.isoformat()
-        })
-
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
 def analizar_intencion_mensaje(mensaje):
-    """Analiza la intención del mensaje del usuario"""
-    mensaje_lower = mensaje.lower()
-
-    # Patrones de saludo
-    saludos = ['hola', 'buenos', 'buenas', 'saludos', 'hey', 'hi', 'hello', 'buen dia', 'buenas tardes', 'buenas noches']
-    if any(saludo in mensaje_lower for saludo in saludos):
-        return 'saludo'
-
-    # Preguntas personales
-    preguntas_personales = ['como te llamas', 'quien eres', 'qué eres', 'que eres', 'tu nombre']
-    if any(pregunta in mensaje_lower for pregunta in preguntas_personales):
-        return 'pregunta_personal'
-
-    # Peticiones de ayuda
-    ayuda_palabras = ['ayuda', 'help', 'ayudame', 'necesito ayuda', 'puedes ayudarme']
-    if any(ayuda in mensaje_lower for ayuda in ayuda_palabras):
-        return 'ayuda'
-
-    # Temas de productividad
-    productividad_palabras = ['productividad', 'productivo', 'eficiencia', 'rendimiento', 'trabajo']
-    if any(prod in mensaje_lower for prod in productividad_palabras):
-        return 'productividad'
-
-    # Errores y problemas
-    error_palabras = ['error', 'problema', 'issue', 'bug', 'falla', 'no funciona']
-    if any(error in mensaje_lower for error in error_palabras):
-        return 'errores'
-
-    # Excel y hojas de cálculo
-    excel_palabras = ['excel', 'formula', 'fórmula', 'hoja', 'spreadsheet', 'calcul']
-    if any(excel in mensaje_lower for excel in excel_palabras):
-        return 'excel'
-
-    # Gestión del tiempo
-    tiempo_palabras = ['tiempo', 'horas', 'trabajo', 'horario', 'agenda', 'calendario']
-    if any(tiempo in mensaje_lower for tiempo in tiempo_palabras):
-        return 'tiempo'
-
-    # Consejos y recomendaciones
-    consejo_palabras = ['consejo', 'tip', 'recomendacion', 'sugerencia', 'mejorar']
-    if any(consejo in mensaje_lower for consejo in consejo_palabras):
-        return 'consejos'
-
-    # Ortografía y escritura
-    ortografia_palabras = ['escribir', 'escribe', 'ortografía', 'ortografia', 'palabra', 'palabras', 'se escribe', 'como se escribe']
-    if any(orto in mensaje_lower for orto in ortografia_palabras):
-        return 'ortografia'
-
-    # Estado y situación actual
-    estado_palabras = ['estado', 'status', 'situación', 'situacion', 'como estas', 'que haces']
-    if any(estado in mensaje_lower for estado in estado_palabras):
-        return 'estado'
-
-    # Operaciones matemáticas simples
-    if any(op in mensaje_lower for op in ['+', '-', '*', '/', '=', 'mas', 'menos', 'por', 'entre']):
-        return 'matematicas'
-
-    # Preguntas (contienen signos de interrogación)
-    if '?' in mensaje or mensaje_lower.startswith(('como', 'qué', 'que', 'cuando', 'donde', 'por qué', 'porque', 'para qué', 'quién', 'quien')):
-        return 'pregunta_general'
-
-    # Preguntas sobre documentación o manuales
-    documentacion_palabras = ['manual', 'documentacion', 'documentación', 'guia', 'guía', 'tutorial', 'como usar', 'instrucciones', 'ayuda con']
-    if any(doc in mensaje_lower for doc in documentacion_palabras):
-        return 'documentacion'
-
-    # Preguntas sobre configuración o setup
-    config_palabras = ['configurar', 'configuracion', 'configuración', 'instalar', 'setup', 'set up', 'como configurar']
-    if any(config in mensaje_lower for config in config_palabras):
-        return 'configuracion'
-
-    # Preguntas sobre reportes o estadísticas
-    reporte_palabras = ['reporte', 'estadistica', 'estadística', 'grafico', 'gráfico', 'analisis', 'análisis', 'dashboard']
-    if any(rep in mensaje_lower for rep in reporte_palabras):
-        return 'reportes'
-
-    # Preguntas sobre equipo o colaboración
-    equipo_palabras = ['equipo', 'compañeros', 'compañeros', 'colaboracion', 'colaboración', 'trabajo en equipo']
-    if any(equipo in mensaje_lower for equipo in equipo_palabras):
-        return 'equipo'
-
-    # Preguntas sobre salud o bienestar
-    salud_palabras = ['salud', 'bienestar', 'estres', 'estrés', 'cansado', 'agotado', 'descanso', 'pausa']
-    if any(salud in mensaje_lower for salud in salud_palabras):
-        return 'salud'
-
-    # Preguntas sobre metas o objetivos
-    metas_palabras = ['meta', 'objetivo', 'goal', 'logro', 'progreso', 'avance', 'mejora']
-    if any(meta in mensaje_lower for meta in metas_palabras):
-        return 'metas'
-
-    return 'general'
+    """Analiza la intención del mensaje del usuario (modelo entrenado con respaldo de reglas)"""
+    return clasificar([mensaje])[0]
 
 def generar_respuesta_asistente(usuario, mensaje, contexto):
     """Genera respuesta inteligente del asistente basada en el contexto del usuario"""
+    return responder_mensaje(usuario, mensaje, contexto)[2]
+
+def responder_mensaje(usuario, mensaje, contexto):
+    """(intención, nombre del manejador, respuesta) del mensaje"""
     mensaje_lower = mensaje.lower().strip()
 
     # Obtener actividad reciente del usuario para contexto
-    actividad_reciente = ActividadUsuario.objects.filter(
-        usuario=usuario
-    ).order_by('-timestamp').first()
+    actividad_reciente = ultima_actividad(usuario)
 
     ventana_activa = ""
     if actividad_reciente:
@@ -880,61 +146,31 @@ def generar_respuesta_asistente(usuario, mensaje, contexto):
     # Análisis de intención del mensaje con mejor precisión
     intencion = analizar_intencion_mensaje(mensaje_lower)
 
-    # Respuestas específicas basadas en intención detectada
-    if intencion == 'saludo':
-        return generar_respuesta_saludo(usuario, contexto)
-
-    elif intencion == 'pregunta_personal':
-        return generar_respuesta_pregunta_personal(mensaje_lower, usuario)
-
-    elif intencion == 'ayuda':
-        return generar_respuesta_ayuda_contextual(usuario, contexto, ventana_activa)
-
-    elif intencion == 'productividad':
-        return generar_respuesta_productividad_detallada(usuario, ventana_activa)
-
-    elif intencion == 'errores':
-        return generar_respuesta_errores_detallada(usuario)
-
-    elif intencion == 'excel':
-        return generar_respuesta_excel_contextual(ventana_activa)
-
-    elif intencion == 'tiempo':
-        return generar_respuesta_tiempo_detallada(usuario)
-
-    elif intencion == 'consejos':
-        return generar_respuesta_consejos_personalizados(usuario, ventana_activa)
-
-    elif intencion == 'ortografia':
-        return generar_respuesta_ortografia_detallada(mensaje_lower, usuario)
-
-    elif intencion == 'estado':
-        return generar_respuesta_estado_actual(usuario, actividad_reciente)
-
-    elif intencion == 'matematicas':
-        return generar_respuesta_matematicas(mensaje_lower)
-
-    elif intencion == 'documentacion':
-        return generar_respuesta_documentacion()
-
-    elif intencion == 'configuracion':
-        return generar_respuesta_configuracion()
-
-    elif intencion == 'reportes':
-        return generar_respuesta_reportes(usuario)
-
-    elif intencion == 'equipo':
-        return generar_respuesta_equipo(usuario)
-
-    elif intencion == 'salud':
-        return generar_respuesta_salud()
-
-    elif intencion == 'metas':
-        return generar_respuesta_metas(usuario)
-
-    else:
-        # Respuesta inteligente basada en contexto de actividad
-        return generar_respuesta_contextual_inteligente(mensaje_lower, usuario, ventana_activa, actividad_reciente)
+    # Manejador y argumentos de cada intención
+    manejadores = {
+        'saludo': (generar_respuesta_saludo, (usuario, contexto)),
+        'pregunta_personal': (generar_respuesta_pregunta_personal, (mensaje_lower, usuario)),
+        'ayuda': (generar_respuesta_ayuda_contextual, (usuario, contexto, ventana_activa)),
+        'productividad': (generar_respuesta_productividad_detallada, (usuario, ventana_activa)),
+        'errores': (generar_respuesta_errores_detallada, (usuario,)),
+        'excel': (generar_respuesta_excel_contextual, (ventana_activa,)),
+        'tiempo': (generar_respuesta_tiempo_detallada, (usuario,)),
+        'consejos': (generar_respuesta_consejos_personalizados, (usuario, ventana_activa)),
+        'ortografia': (generar_respuesta_ortografia_detallada, (mensaje_lower, usuario)),
+        'estado': (generar_respuesta_estado_actual, (usuario, actividad_reciente)),
+        'matematicas': (generar_respuesta_matematicas, (mensaje_lower,)),
+        'documentacion': (generar_respuesta_documentacion, ()),
+        'configuracion': (generar_respuesta_configuracion, ()),
+        'reportes': (generar_respuesta_reportes, (usuario,)),
+        'equipo': (generar_respuesta_equipo, (usuario,)),
+        'salud': (generar_respuesta_salud, ()),
+        'metas': (generar_respuesta_metas, (usuario,)),
+    }
+    # Sin intención específica: respuesta inteligente basada en contexto de actividad
+    manejador, argumentos = manejadores.get(intencion, (
+        generar_respuesta_contextual_inteligente, (mensaje_lower, usuario, ventana_activa, actividad_reciente)
+    ))
+    return intencion, manejador.__name__, manejador(*argumentos)
 
 def generar_respuesta_saludo(usuario, contexto):
     """Genera respuesta de saludo personalizada"""
@@ -1059,7 +295,7 @@ def generar_respuesta_productividad_detallada(usuario, ventana_activa):
 {chr(10).join(consejos_especificos)}
 
 🔍 Aplicaciones más usadas hoy:
-{generar_resumen_aplicaciones(actividades_hoy)}
+{generar_resumen_aplicaciones(usuario)}
 
 ¿Quieres que te ayude con alguna técnica específica de productividad?"""
     else:
@@ -1087,21 +323,15 @@ Aún no tengo suficientes datos para analizar tu productividad específica, pero
 
     return respuesta
 
-def generar_resumen_aplicaciones(actividades):
-    """Genera un resumen de las aplicaciones más usadas"""
-    if not actividades.exists():
+def generar_resumen_aplicaciones(usuario):
+    """Genera un resumen de las aplicaciones más usadas hoy (tiempo acumulado al ingerir)"""
+    apps_mas_usadas = aplicaciones_mas_usadas(usuario, timezone.localdate(), limite=5)
+    if not apps_mas_usadas:
         return "No hay datos de actividad aún."
 
-    # Contar aplicaciones más usadas
-    apps_mas_usadas = actividades.values('ventana_activa').annotate(
-        count=Count('ventana_activa')
-    ).order_by('-count')[:5]
-
     resumen = ""
     for app in apps_mas_usadas:
-        nombre_app = app['ventana_activa'] or 'Desconocido'
-        count = app['count']
-        resumen += f"• {nombre_app}: {count} actividades\n"
+        resumen += f"• {app['aplicacion']}: {formatear_duracion(app['segundos'])}\n"
 
     return resumen.strip()
 
@@ -1227,25 +457,23 @@ def generar_respuesta_excel_contextual(ventana_activa):
     return "\n".join(consejos)
 
 def generar_respuesta_tiempo_detallada(usuario):
-    """Análisis detallado de gestión del tiempo"""
-    # Calcular tiempo de actividad hoy
-    hoy = timezone.now().date()
-    actividades_hoy = ActividadUsuario.objects.filter(
-        usuario=usuario,
-        timestamp__date=hoy
-    )
+    """Análisis detallado de gestión del tiempo a partir de los intervalos de actividad"""
+    from datetime import timedelta
 
-    tiempo_trabajo_minutos = (actividades_hoy.count() * 30) // 60  # Estimación
+    # Duraciones reales de hoy según los intervalos que mantiene la ingesta
+    desde = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    hasta = desde + timedelta(days=1)
+    por_hora = tiempo_por_hora(usuario, desde, hasta)
+
+    tiempo_trabajo_minutos = int(sum(sum(clases.values()) for clases in por_hora.values()) // 60)
+    tiempo_foco_minutos = int(tiempo_de_foco(usuario, desde, hasta) // 60)
 
     # Análisis por horas
     horas_analisis = []
     for hora in range(9, 18):  # De 9 AM a 5 PM
-        actividades_hora = actividades_hoy.filter(
-            timestamp__hour=hora
-        )
-        productiva_hora = actividades_hora.filter(productividad='productive').count()
-        total_hora = actividades_hora.count()
-        ratio = (productiva_hora / total_hora * 100) if total_hora > 0 else 0
+        clases = por_hora.get(hora, {})
+        total_hora = sum(clases.values())
+        ratio = (clases.get('productive', 0) / total_hora * 100) if total_hora > 0 else 0
         horas_analisis.append((hora, ratio, total_hora))
 
     # Encontrar hora más productiva
@@ -1267,7 +495,8 @@ def generar_respuesta_tiempo_detallada(usuario):
 
     respuesta = f"""⏱️ Análisis Detallado de Gestión del Tiempo:
 
-📊 Tiempo estimado de trabajo hoy: {tiempo_trabajo_minutos} minutos
+📊 Tiempo de trabajo hoy: {tiempo_trabajo_minutos} minutos
+🧠 Tiempo en foco: {tiempo_foco_minutos} minutos
 🎯 Estado actual: {estado}
 
 📈 Análisis por horas de productividad:
@@ -1321,7 +550,7 @@ def generar_respuesta_consejos_personalizados(usuario, ventana_activa):
     # Obtener análisis recientes del agente personal
     consejos_recientes = IAAnalisis.objects.filter(
         usuario=usuario,
-        patrones_detectados__tipo="agente_personal"
+        tipo="agente_personal"
     ).order_by('-fecha_analisis')[:3]
 
     # Obtener estadísticas para consejos contextuales
@@ -1758,7 +987,6 @@ def generar_respuesta_reportes(usuario):
 • **Diario:** Actividad del día actual
 • **Semanal:** Tendencias de la semana
 • **Mensual:** Análisis completo del mes
-• **Personalizado:** Rangos de fecha específicos
 
 📊 **Tipos de Gráficos:**
 • **Barras:** Comparación de productividad por día
@@ -1778,11 +1006,11 @@ def generar_respuesta_reportes(usuario):
 • **Objetivos cumplidos:** Metas alcanzadas
 • **Recomendaciones:** Sugerencias basadas en datos
 
-💾 **Exportación:**
-• **PDF:** Reportes formateados para impresión
-• **Excel:** Datos crudos para análisis adicional
-• **CSV:** Exportación para otras herramientas
-• **JSON:** Para integraciones técnicas
+💾 **Exportación** (/api/reportes/<diario|semanal|mensual>/?formato=...):
+• **PDF:** Reportes formateados para impresión (formato=pdf)
+• **Excel:** Datos por día y aplicación para análisis adicional (formato=xlsx)
+• **CSV:** Exportación para otras herramientas (formato=csv)
+• **JSON:** Para integraciones técnicas (formato=json)
 
 """
 
@@ -1806,11 +1034,22 @@ def generar_respuesta_equipo(usuario):
     # Verificar si el usuario es supervisor/admin
     if usuario.rol in ['admin', 'supervisor']:
         # Obtener métricas del equipo
-        equipo_count = Usuario.objects.filter(rol='empleado').count()
+        equipo_count = obtener_directorio().contar(rol='empleado')
+        analitica = analitica_equipo()
+        resumen = analitica['resumen']['porcentaje_productivo']
+        destacados = ''.join(
+            f"\n• {fila['nombre']}: {fila['porcentaje_productivo']}% (P{fila['percentil']:.0f}, {fila['delta_porcentaje']:+} pp)"
+            for fila in analitica['empleados'][:3]
+        ) or '\n• Sin actividad registrada'
         respuesta = f"""👥 Gestión de Equipo - {usuario.get_full_name()}
 
 📊 **Vista de Equipo ({equipo_count} miembros):**
 
+📐 **Últimos {analitica['dias']} días:**
+• **Productividad media:** {resumen['media']}% (P25 {resumen['p25']}% · mediana {resumen['p50']}% · P75 {resumen['p75']}%)
+• **Variación media:** {analitica['resumen']['delta_porcentaje_medio']:+} pp respecto de los {analitica['dias']} días anteriores
+• **Mejores percentiles:**{destacados}
+
 🎯 **Funcionalidades de Supervisión:**
 • **Dashboard del equipo:** Métricas agregadas de productividad
 • **Monitoreo individual:** Seguimiento de cada miembro
@@ -1913,10 +1152,25 @@ def generar_respuesta_metas(usuario):
     """Ayuda con establecimiento y seguimiento de metas"""
     # Obtener estadísticas actuales para contextualizar
     estadisticas = Estadistica.objects.filter(usuario=usuario).last()
+    metas = progreso_metas(usuario)
 
     respuesta = """🎯 Metas y Objetivos Personales
 
-📋 **Tipos de Metas Recomendadas:**
+"""
+    if metas:
+        respuesta += "📌 **Tus Metas de Hoy:**\n"
+        for meta in metas:
+            barra = '█' * (meta['porcentaje'] // 10) + '░' * (10 - meta['porcentaje'] // 10)
+            estado = '✅' if meta['cumplida'] else f"{meta['porcentaje']}%"
+            respuesta += f"• **{meta['nombre']}:** {meta['valor']}/{meta['objetivo']} {barra} {estado}\n"
+        respuesta += "\n"
+    else:
+        respuesta += """📌 **Aún no tienes metas medibles.** Puedes crear metas diarias de minutos productivos,
+registros sin errores o pausas en /api/metas/ y verás aquí su progreso.
+
+"""
+
+    respuesta += """📋 **Tipos de Metas Recomendadas:**
 
 🔥 **Metas Diarias:**
 • **Productividad:** Alcanzar X horas de trabajo efectivo
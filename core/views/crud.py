@@ -0,0 +1,476 @@
+"""Listados y formularios: usuarios, registros, metas, estadísticas, análisis y actividad"""
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from ..models import Registro, Estadistica, IAAnalisis, ActividadUsuario, MetaUsuario, Usuario
+from ..serializers import MetaUsuarioSerializer, RegistroSerializer
+from ..metas import progreso_metas
+from ..directorio import obtener_directorio
+from ..uso_aplicaciones import aplicaciones_mas_usadas, formatear_duracion
+from ..validacion import ReglaFecha, obtener_motor
+from ..enrutador_bd import solo_lectura
+
+# Con más usuarios, el filtro de actividad usa autocompletado en lugar de un desplegable
+MAX_USUARIOS_DESPLEGABLE = 200
+
+def analizar_errores(usuario):
+    """Análisis de IA de los errores del usuario; sin scikit-learn instalado no hace nada"""
+    from ..ia_module import analizar_errores as analizar
+    try:
+        analizar(usuario)
+    except ImportError:
+        pass
+
+def paginar(request, queryset, por_pagina=50):
+    """Página pedida en ?page= del queryset (50 elementos por página)"""
+    from django.core.paginator import Paginator
+    return Paginator(queryset, por_pagina).get_page(request.GET.get('page'))
+
+class RegistroViewSet(viewsets.ModelViewSet):
+    queryset = Registro.objects.all()
+    serializer_class = RegistroSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Registro.objects.visible_para(self.request.user).order_by('-fecha', '-pk')
+
+    def perform_create(self, serializer):
+        # Validar antes de guardar para escribir el registro una sola vez
+        errores = self.validar_registro(serializer.validated_data.get('contenido') or {}, self.request.user)
+        serializer.save(usuario=self.request.user, errores=errores)
+        if errores:
+            analizar_errores(self.request.user)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """Importación masiva de registros desde un archivo CSV o JSONL"""
+        from ..importacion import abrir_texto, detectar_formato, importar_registros
+
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'error': 'Archivo requerido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            formato = detectar_formato(archivo.name, request.data.get('formato'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        archivo.open()
+        resultado = importar_registros(abrir_texto(archivo.file), formato, request.user)
+        return Response(resultado, status=status.HTTP_201_CREATED)
+
+    def validar_registro(self, contenido, usuario=None, excluir_pk=None):
+        """Errores del contenido según el motor de validación (duplicados si hay usuario)"""
+        usuario_id = usuario.pk if usuario is not None else None
+        return obtener_motor().validar(contenido, usuario_id=usuario_id, excluir_pk=excluir_pk)
+
+    def es_fecha_valida(self, fecha_str):
+        return ReglaFecha().validar(fecha_str)
+
+class MetaUsuarioViewSet(viewsets.ModelViewSet):
+    queryset = MetaUsuario.objects.all()
+    serializer_class = MetaUsuarioSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return MetaUsuario.objects.visible_para(self.request.user).order_by('usuario_id', 'tipo')
+
+    def guardar(self, serializer, **campos):
+        # Dos pedidos simultáneos pasan los dos la validación: el segundo choca con la restricción única
+        try:
+            with transaction.atomic():
+                serializer.save(**campos)
+        except IntegrityError:
+            raise ValidationError({'tipo': 'Ya tienes una meta de este tipo'})
+
+    def perform_create(self, serializer):
+        self.guardar(serializer, usuario=self.request.user)
+
+    def perform_update(self, serializer):
+        self.guardar(serializer)
+
+    @action(detail=False, methods=['get'])
+    def progreso(self, request):
+        """Progreso de hoy de las metas activas del usuario"""
+        return Response(progreso_metas(request.user))
+
+# Gestión de Usuarios
+@login_required
+@solo_lectura
+def usuarios_list(request):
+    """Lista todos los usuarios - solo para administradores"""
+    if request.user.rol != 'admin':
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('home')
+
+    usuarios = Usuario.objects.only(
+        'username', 'first_name', 'last_name', 'email', 'rol', 'is_active', 'last_login'
+    ).order_by('username')
+    page_obj = paginar(request, usuarios)
+    return render(request, 'core/usuarios_list.html', {'usuarios': page_obj, 'page_obj': page_obj})
+
+@login_required
+def usuario_create(request):
+    """Crear nuevo usuario - solo para administradores"""
+    if request.user.rol != 'admin':
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('home')
+
+    if request.method == 'POST':
+        username = request.POST.get('username')
+        email = request.POST.get('email')
+        password = request.POST.get('password')
+        first_name = request.POST.get('first_name')
+        last_name = request.POST.get('last_name')
+        rol = request.POST.get('rol')
+
+        if Usuario.objects.filter(username=username).exists():
+            messages.error(request, 'El nombre de usuario ya existe.')
+            return redirect('usuario_create')
+
+        try:
+            usuario = Usuario.objects.create_user(
+                username=username,
+                email=email,
+                password=password,
+                first_name=first_name,
+                last_name=last_name,
+                rol=rol
+            )
+            messages.success(request, f'Usuario {username} creado exitosamente.')
+            return redirect('usuarios_list')
+        except Exception as e:
+            messages.error(request, f'Error al crear usuario: {str(e)}')
+            return redirect('usuario_create')
+
+    return render(request, 'core/usuario_form.html', {'action': 'create'})
+
+@login_required
+def usuario_edit(request, pk):
+    """Editar usuario - solo para administradores"""
+    if request.user.rol != 'admin':
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('home')
+
+    usuario = get_object_or_404(Usuario, pk=pk)
+
+    if request.method == 'POST':
+        usuario.email = request.POST.get('email')
+        usuario.first_name = request.POST.get('first_name')
+        usuario.last_name = request.POST.get('last_name')
+        usuario.rol = request.POST.get('rol')
+        usuario.is_active = request.POST.get('is_active') == 'on'
+
+        # Cambiar contraseña solo si se proporciona
+        password = request.POST.get('password')
+        if password:
+            usuario.set_password(password)
+
+        try:
+            usuario.save()
+            messages.success(request, f'Usuario {usuario.username} actualizado exitosamente.')
+            return redirect('usuarios_list')
+        except Exception as e:
+            messages.error(request, f'Error al actualizar usuario: {str(e)}')
+            return redirect('usuario_edit', pk=pk)
+
+    return render(request, 'core/usuario_form.html', {
+        'usuario': usuario,
+        'action': 'edit'
+    })
+
+@login_required
+def usuario_delete(request, pk):
+    """Eliminar usuario - solo para administradores"""
+    if request.user.rol != 'admin':
+        messages.error(request, 'No tienes permisos para acceder a esta sección.')
+        return redirect('home')
+
+    usuario = get_object_or_404(Usuario, pk=pk)
+
+    if request.method == 'POST':
+        try:
+            username = usuario.username
+            usuario.delete()
+            messages.success(request, f'Usuario {username} eliminado exitosamente.')
+            return redirect('usuarios_list')
+        except Exception as e:
+            messages.error(request, f'Error al eliminar usuario: {str(e)}')
+            return redirect('usuarios_list')
+
+    return render(request, 'core/usuario_confirm_delete.html', {'usuario': usuario})
+
+# Gestión de Registros
+@login_required
+@solo_lectura
+def registros_list(request):
+    """Lista todos los registros - según permisos del usuario"""
+    registros = Registro.objects.visible_para(request.user).para_listado().order_by('-fecha', '-pk')
+    page_obj = paginar(request, registros)
+    return render(request, 'core/registros_list.html', {'registros': page_obj, 'page_obj': page_obj})
+
+@login_required
+def registro_create(request):
+    """Crear nuevo registro"""
+    if request.method == 'POST':
+        fecha = request.POST.get('fecha')
+        contenido = request.POST.get('contenido')
+
+        try:
+            # Parsear contenido JSON
+            import json
+            contenido_data = json.loads(contenido) if contenido else {}
+
+            # Validar antes de guardar para escribir el registro una sola vez
+            errores = RegistroViewSet.validar_registro(None, contenido_data, request.user)
+
+            Registro.objects.create(
+                usuario=request.user,
+                fecha=fecha,
+                contenido=contenido_data,
+                errores=errores
+            )
+
+            if errores:
+                analizar_errores(request.user)
+
+            messages.success(request, 'Registro creado exitosamente.')
+            return redirect('registros_list')
+        except json.JSONDecodeError:
+            messages.error(request, 'El contenido debe ser un JSON válido.')
+            return redirect('registro_create')
+        except Exception as e:
+            messages.error(request, f'Error al crear registro: {str(e)}')
+            return redirect('registro_create')
+
+    return render(request, 'core/registro_form.html', {'action': 'create'})
+
+@login_required
+def registro_edit(request, pk):
+    """Editar registro - solo el propietario o admin/supervisor"""
+    registro = get_object_or_404(Registro, pk=pk)
+
+    if not (request.user.rol in ['admin', 'supervisor'] or registro.usuario == request.user):
+        messages.error(request, 'No tienes permisos para editar este registro.')
+        return redirect('registros_list')
+
+    if request.method == 'POST':
+        fecha = request.POST.get('fecha')
+        contenido = request.POST.get('contenido')
+
+        try:
+            # Parsear contenido JSON
+            import json
+            contenido_data = json.loads(contenido) if contenido else {}
+
+            registro.fecha = fecha
+            registro.contenido = contenido_data
+
+            # Revalidar errores
+            errores = RegistroViewSet.validar_registro(None, contenido_data, registro.usuario, excluir_pk=registro.pk)
+            registro.errores = errores
+            registro.save()
+
+            messages.success(request, 'Registro actualizado exitosamente.')
+            return redirect('registros_list')
+        except json.JSONDecodeError:
+            messages.error(request, 'El contenido debe ser un JSON válido.')
+            return redirect('registro_edit', pk=pk)
+        except Exception as e:
+            messages.error(request, f'Error al actualizar registro: {str(e)}')
+            return redirect('registro_edit', pk=pk)
+
+    return render(request, 'core/registro_form.html', {
+        'registro': registro,
+        'action': 'edit'
+    })
+
+@login_required
+def registro_delete(request, pk):
+    """Eliminar registro - solo el propietario o admin/supervisor"""
+    registro = get_object_or_404(Registro, pk=pk)
+
+    if not (request.user.rol in ['admin', 'supervisor'] or registro.usuario == request.user):
+        messages.error(request, 'No tienes permisos para eliminar este registro.')
+        return redirect('registros_list')
+
+    if request.method == 'POST':
+        try:
+            registro.delete()
+            messages.success(request, 'Registro eliminado exitosamente.')
+            return redirect('registros_list')
+        except Exception as e:
+            messages.error(request, f'Error al eliminar registro: {str(e)}')
+            return redirect('registros_list')
+
+    return render(request, 'core/registro_confirm_delete.html', {'registro': registro})
+
+# Gestión de Estadísticas
+@login_required
+@solo_lectura
+def estadisticas_list(request):
+    """Lista estadísticas - según permisos del usuario"""
+    estadisticas = Estadistica.objects.visible_para(request.user).para_listado().order_by('-fecha_actualizacion', '-pk')
+    page_obj = paginar(request, estadisticas)
+    return render(request, 'core/estadisticas_list.html', {'estadisticas': page_obj, 'page_obj': page_obj})
+
+@login_required
+@solo_lectura
+def estadistica_detail(request, pk):
+    """Ver detalle de estadística"""
+    estadistica = get_object_or_404(Estadistica, pk=pk)
+
+    if not (request.user.rol in ['admin', 'supervisor'] or estadistica.usuario == request.user):
+        messages.error(request, 'No tienes permisos para ver esta estadística.')
+        return redirect('estadisticas_list')
+
+    return render(request, 'core/estadistica_detail.html', {'estadistica': estadistica})
+
+# Gestión de Análisis IA
+@login_required
+@solo_lectura
+def analisis_list(request):
+    """Lista análisis IA - según permisos del usuario"""
+    analisis = IAAnalisis.objects.visible_para(request.user).para_listado().order_by('-fecha_analisis', '-pk')
+    page_obj = paginar(request, analisis)
+    return render(request, 'core/analisis_list.html', {'analisis_list': page_obj, 'page_obj': page_obj})
+
+@login_required
+@solo_lectura
+def analisis_detail(request, pk):
+    """Ver detalle de análisis IA"""
+    analisis = get_object_or_404(IAAnalisis, pk=pk)
+
+    if not (request.user.rol in ['admin', 'supervisor'] or analisis.usuario == request.user):
+        messages.error(request, 'No tienes permisos para ver este análisis.')
+        return redirect('analisis_list')
+
+    # Calcular estadísticas adicionales
+    registros_con_errores = analisis.usuario.registro_set.filter(errores__isnull=False).count()
+
+    context = {
+        'analisis': analisis,
+        'registros_con_errores': registros_con_errores,
+    }
+
+    return render(request, 'core/analisis_detail.html', context)
+
+# Gestión de Actividad de Usuario (Monitoreo en tiempo real)
+@login_required
+@solo_lectura
+def actividad_list(request):
+    """Lista actividad de usuarios - según permisos del usuario"""
+    # Inicializar variables
+    usuario_id = request.GET.get('usuario')
+
+    # Admin y supervisor ven actividad de todos los usuarios; empleados solo la propia
+    actividades = ActividadUsuario.objects.visible_para(request.user).para_listado().order_by('-timestamp')
+    if usuario_id and request.user.rol in ['admin', 'supervisor']:
+        actividades = actividades.filter(usuario_id=usuario_id)
+
+    # Filtrar por fecha si se especifica
+    fecha_desde = request.GET.get('fecha_desde')
+    fecha_hasta = request.GET.get('fecha_hasta')
+
+    if fecha_desde:
+        actividades = actividades.filter(timestamp__date__gte=fecha_desde)
+    if fecha_hasta:
+        actividades = actividades.filter(timestamp__date__lte=fecha_hasta)
+
+    page_obj = paginar(request, actividades)
+
+    # Usuarios para el filtro (solo para admin/supervisor): un desplegable o,
+    # con muchos usuarios, un campo con autocompletado
+    usuarios = []
+    usar_autocompletar = False
+    usuario_filtro_nombre = ''
+    total_usuarios_activos = 0
+    if request.user.rol in ['admin', 'supervisor']:
+        directorio = obtener_directorio()
+        total_usuarios_activos = directorio.contar(activos=True)
+        usar_autocompletar = len(directorio.usuarios) > MAX_USUARIOS_DESPLEGABLE
+        if not usar_autocompletar:
+            usuarios = directorio.usuarios
+        if usuario_id and usuario_id.isdigit() and directorio.obtener(int(usuario_id)):
+            usuario_filtro_nombre = directorio.obtener(int(usuario_id))['username']
+
+    context = {
+        'page_obj': page_obj,
+        'usuarios': usuarios,
+        'usar_autocompletar': usar_autocompletar,
+        'usuario_filtro_nombre': usuario_filtro_nombre,
+        'total_usuarios_activos': total_usuarios_activos,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'usuario_filtro': usuario_id,
+    }
+
+    return render(request, 'core/actividad_list.html', context)
+
+@login_required
+@solo_lectura
+def actividad_usuario_detail(request, usuario_id):
+    """Ver actividad detallada de un usuario específico - solo admin/supervisor"""
+    if request.user.rol not in ['admin', 'supervisor']:
+        messages.error(request, 'No tienes permisos para acceder a esta información.')
+        return redirect('home')
+
+    usuario = get_object_or_404(Usuario, id=usuario_id)
+
+    # Estadísticas de actividad del usuario
+    actividades_recientes = ActividadUsuario.objects.filter(
+        usuario=usuario,
+        timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
+    )
+
+    # Contar tipos de actividad
+    productiva = actividades_recientes.filter(productividad='productive').count()
+    improductiva = actividades_recientes.filter(productividad='unproductive').count()
+    gaming = actividades_recientes.filter(productividad='gaming').count()
+    neutral = actividades_recientes.filter(productividad='neutral').count()
+
+    total_actividades = actividades_recientes.count()
+
+    # Aplicaciones más usadas hoy, por tiempo acumulado al ingerir
+    aplicaciones = aplicaciones_mas_usadas(usuario, timezone.localdate())
+
+    # Calcular porcentajes para las aplicaciones más usadas
+    aplicaciones_con_porcentaje = []
+    if aplicaciones:
+        max_segundos = aplicaciones[0]['segundos']
+        for app in aplicaciones:
+            porcentaje = round((app['segundos'] / max_segundos) * 100, 1) if max_segundos > 0 else 0
+            aplicaciones_con_porcentaje.append({
+                'aplicacion': app['aplicacion'],
+                'tiempo': formatear_duracion(app['segundos']),
+                'porcentaje': porcentaje
+            })
+
+    # Estadísticas del usuario
+    estadisticas = Estadistica.objects.filter(usuario=usuario).last()
+    analisis_reciente = IAAnalisis.objects.filter(usuario=usuario).last()
+
+    context = {
+        'usuario': usuario,
+        'actividades_recientes': actividades_recientes.order_by('-timestamp')[:20],
+        'estadisticas': {
+            'productiva': productiva,
+            'improductiva': improductiva,
+            'gaming': gaming,
+            'neutral': neutral,
+            'total': total_actividades,
+        },
+        'aplicaciones_mas_usadas': aplicaciones_con_porcentaje,
+        'estadistica_usuario': estadisticas,
+        'analisis_reciente': analisis_reciente,
+    }
+
+    return render(request, 'core/actividad_usuario_detail.html', context)
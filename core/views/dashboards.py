@@ -0,0 +1,233 @@
+"""Dashboards personal y administrativo, y resumen de empleados"""
+from django.shortcuts import render, redirect
+from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from ..models import Estadistica, IAAnalisis, ActividadUsuario, Usuario
+from ..serializers import EstadisticaSerializer, IAAnalisisSerializer
+from django.db.models import Count
+from ..analitica_equipo import analitica_equipo, ventanas
+from ..cache_agregados import obtener_agregado
+from ..directorio import obtener_directorio
+from ..enrutador_bd import solo_lectura
+from ..metas import progreso_metas
+from ..resumen_diario import obtener_resumen_diario
+
+def dashboard_view(request):
+    """Vista principal del dashboard - redirige según rol del usuario"""
+    if not request.user.is_authenticated:
+        return redirect('login')
+
+    # Admin y supervisor van al dashboard administrativo
+    if request.user.rol in ['admin', 'supervisor']:
+        return redirect('dashboard_admin')
+
+    # Empleados van al dashboard personal
+    return dashboard_authenticated(request)
+
+@login_required
+@solo_lectura
+def dashboard_authenticated(request):
+    """Vista del dashboard para usuarios autenticados"""
+    user = request.user
+    resumen = obtener_resumen_diario(user)
+
+    return render(request, 'core/dashboard.html', {
+        'user': user,
+        'estadisticas': resumen.estadistica,
+        'analisis': resumen.analisis,
+        'consejos_recientes': resumen.consejos_recientes,
+        'metas': progreso_metas(user),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@solo_lectura
+def dashboard(request):
+    user = request.user
+    resumen = obtener_resumen_diario(user)
+    estadisticas = resumen.estadistica
+    analisis = resumen.analisis
+
+    # Si es una petición AJAX o API, devolver JSON
+    if request.META.get('HTTP_ACCEPT', '').find('application/json') != -1 or request.GET.get('format') == 'json':
+        data = {
+            'estadisticas': EstadisticaSerializer(estadisticas).data if estadisticas else None,
+            'analisis': IAAnalisisSerializer(analisis).data if analisis else None,
+        }
+        return Response(data)
+    else:
+        # Renderizar template HTML
+        return render(request, 'core/dashboard.html', {
+            'user': user,
+            'estadisticas': estadisticas,
+            'analisis': analisis,
+        })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@solo_lectura
+def dashboard_api(request):
+    """API endpoint del dashboard - solo JSON"""
+    resumen = obtener_resumen_diario(request.user)
+    estadisticas = resumen.estadistica
+    analisis = resumen.analisis
+
+    data = {
+        'estadisticas': EstadisticaSerializer(estadisticas).data if estadisticas else None,
+        'analisis': IAAnalisisSerializer(analisis).data if analisis else None,
+    }
+    return Response(data)
+
+def _calcular_agregados_admin():
+    """Agregados de 24 horas del dashboard administrativo"""
+    # Estadísticas generales
+    directorio = obtener_directorio()
+    total_usuarios = len(directorio.usuarios)
+    usuarios_activos = directorio.contar(activos=True)
+
+    # Actividad en las últimas 24 horas
+    actividades_24h = ActividadUsuario.objects.filter(
+        timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
+    )
+
+    # Estadísticas de productividad
+    productiva_total = actividades_24h.filter(productividad='productive').count()
+    improductiva_total = actividades_24h.filter(productividad='unproductive').count()
+    gaming_total = actividades_24h.filter(productividad='gaming').count()
+
+    total_actividades_24h = actividades_24h.count()
+
+    # Usuarios con más actividad
+    usuarios_mas_activos = actividades_24h.values('usuario__id', 'usuario__username', 'usuario__first_name', 'usuario__last_name').annotate(
+        count=Count('usuario')
+    ).order_by('-count')[:10]
+
+    return {
+        'total_usuarios': total_usuarios,
+        'usuarios_activos': usuarios_activos,
+        'estadisticas_24h': {
+            'productiva': productiva_total,
+            'improductiva': improductiva_total,
+            'gaming': gaming_total,
+            'total': total_actividades_24h,
+        },
+        'usuarios_mas_activos': list(usuarios_mas_activos),
+    }
+
+@login_required
+@solo_lectura
+def dashboard_admin(request):
+    """Dashboard administrativo para admin/supervisor"""
+    if request.user.rol not in ['admin', 'supervisor']:
+        messages.error(request, 'No tienes permisos para acceder al dashboard administrativo.')
+        return redirect('home')
+
+    context = obtener_agregado('dashboard_admin', request.user.rol, _calcular_agregados_admin)
+
+    # Alertas recientes (análisis IA de las últimas horas), siempre al día
+    context = dict(context, alertas_recientes=IAAnalisis.objects.filter(
+        fecha_analisis__gte=timezone.now() - timezone.timedelta(hours=24)
+    ).select_related('usuario').order_by('-fecha_analisis')[:10])
+
+    return render(request, 'core/dashboard_admin.html', context)
+
+def _calcular_empleados_overview():
+    """Resumen de 24 horas por empleado para la vista general"""
+    # Obtener todos los empleados
+    empleados = Usuario.objects.filter(rol='empleado').order_by('username')
+
+    empleados_data = []
+
+    for empleado in empleados:
+        # Actividad en las últimas 24 horas
+        actividades_24h = ActividadUsuario.objects.filter(
+            usuario=empleado,
+            timestamp__gte=timezone.now() - timezone.timedelta(hours=24)
+        )
+
+        # Calcular productividad
+        productiva = actividades_24h.filter(productividad='productive').count()
+        improductiva = actividades_24h.filter(productividad='unproductive').count()
+        gaming = actividades_24h.filter(productividad='gaming').count()
+        neutral = actividades_24h.filter(productividad='neutral').count()
+        total_actividades = actividades_24h.count()
+
+        # Calcular porcentaje de productividad
+        if total_actividades > 0:
+            productividad_porcentaje = round((productiva / total_actividades) * 100, 1)
+        else:
+            productividad_porcentaje = 0
+
+        # Última actividad
+        ultima_actividad = actividades_24h.order_by('-timestamp').first()
+
+        # Análisis IA más reciente
+        analisis_reciente = IAAnalisis.objects.filter(
+            usuario=empleado
+        ).order_by('-fecha_analisis').first()
+
+        # Estadísticas del empleado
+        estadistica = Estadistica.objects.filter(usuario=empleado).last()
+
+        # Estado actual (basado en actividad reciente)
+        if ultima_actividad and (timezone.now() - ultima_actividad.timestamp).seconds < 300:  # 5 minutos
+            estado = 'activo'
+        elif actividades_24h.exists():
+            estado = 'inactivo_hoy'
+        else:
+            estado = 'sin_actividad'
+
+        empleados_data.append({
+            'usuario': empleado,
+            'estado': estado,
+            'ultima_actividad': ultima_actividad,
+            'estadisticas_24h': {
+                'productiva': productiva,
+                'improductiva': improductiva,
+                'gaming': gaming,
+                'neutral': neutral,
+                'total': total_actividades,
+                'productividad_porcentaje': productividad_porcentaje,
+            },
+            'analisis_reciente': analisis_reciente,
+            'estadistica': estadistica,
+        })
+
+    return empleados_data
+
+@login_required
+@solo_lectura
+def empleados_overview(request):
+    """Vista completa de todos los empleados para admin/supervisor"""
+    if request.user.rol not in ['admin', 'supervisor']:
+        messages.error(request, 'No tienes permisos para acceder a esta información.')
+        return redirect('home')
+
+    # Ventana del panel comparativo; una no permitida vuelve a la predeterminada
+    dias = request.GET.get('dias', '')
+    dias = int(dias) if dias.isdigit() and int(dias) in ventanas() else ventanas()[0]
+
+    context = {
+        'empleados_data': obtener_agregado('empleados_overview', request.user.rol, _calcular_empleados_overview),
+        'analitica': analitica_equipo(dias),
+        'ventanas': ventanas(),
+    }
+
+    return render(request, 'core/empleados_overview.html', context)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@solo_lectura
+def analitica_equipo_api(request):
+    """Percentiles, z-scores y variaciones del equipo en una ventana de días (?dias=7)"""
+    if request.user.rol not in ['admin', 'supervisor']:
+        return Response({'error': 'No tienes permisos para ver la analítica del equipo'}, status=status.HTTP_403_FORBIDDEN)
+    dias = request.GET.get('dias') or str(ventanas()[0])
+    if not dias.isdigit() or int(dias) not in ventanas():
+        return Response({'error': f'Ventana no válida. Opciones: {ventanas()}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(analitica_equipo(int(dias)))
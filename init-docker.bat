@@ -82,6 +82,19 @@ REM Función para ejecutar comandos en el backend
 docker-compose exec backend %*
 goto :eof
 
+REM Función para reentrenar el clasificador de intenciones del chat
+:train_model
+call :print_info "Entrenando el clasificador de intenciones..."
+docker-compose exec backend python manage.py entrenar_intenciones
+if errorlevel 1 (
+    call :print_error "Error al entrenar el clasificador"
+    exit /b 1
+)
+REM Cada worker carga el modelo una sola vez
+docker-compose restart backend
+call :print_success "Modelo entrenado y backend reiniciado"
+goto :eof
+
 REM Función para crear superusuario
 :create_superuser
 call :print_info "Creando superusuario..."
@@ -186,6 +199,7 @@ if "%1"=="manage" (
 )
 if "%1"=="superuser" goto create_superuser
 if "%1"=="populate" goto populate_db
+if "%1"=="train" goto train_model
 if "%1"=="status" goto show_status
 if "%1"=="clean" goto clean_all
 if "%1"=="full-setup" goto full_setup
@@ -233,6 +247,7 @@ echo   shell       Abrir shell en el contenedor backend
 echo   manage      Ejecutar comando de Django ^(ej: migrate, shell^)
 echo   superuser   Crear superusuario
 echo   populate    Poblar DB con datos de ejemplo
+echo   train       Reentrenar el clasificador de intenciones del chat
 echo   status      Mostrar estado y URLs
 echo   clean       Limpiar contenedores e imágenes
 echo   full-setup  Configuración completa desde cero
@@ -77,6 +77,15 @@ create_superuser() {
     print_warning "Recuerda cambiar la contraseña después del primer login"
 }
 
+# Función para reentrenar el clasificador de intenciones del chat
+train_model() {
+    print_info "Entrenando el clasificador de intenciones..."
+    docker-compose exec backend python manage.py entrenar_intenciones
+    # Cada worker carga el modelo una sola vez
+    docker-compose restart backend
+    print_success "Modelo entrenado y backend reiniciado"
+}
+
 # Función para poblar la base de datos con datos de ejemplo
 populate_db() {
     print_info "Poblando la base de datos con datos de ejemplo..."
@@ -178,6 +187,9 @@ main() {
         "populate")
             populate_db
             ;;
+        "train")
+            train_model
+            ;;
         "status")
             show_status
             ;;
@@ -211,6 +223,7 @@ main() {
             echo "  manage      Ejecutar comando de Django (ej: migrate, shell)"
             echo "  superuser   Crear superusuario"
             echo "  populate    Poblar DB con datos de ejemplo"
+            echo "  train       Reentrenar el clasificador de intenciones del chat"
             echo "  status      Mostrar estado y URLs"
             echo "  clean       Limpiar contenedores e imágenes"
             echo "  full-setup  Configuración completa desde cero"
@@ -220,6 +233,7 @@ main() {
             echo "  $0 full-setup          # Primera vez"
             echo "  $0 start               # Iniciar servicios"
             echo "  $0 manage migrate      # Ejecutar migraciones"
+            echo "  $0 train               # Reentrenar el clasificador del chat"
             echo "  $0 manage shell        # Abrir shell de Django"
             ;;
     esac
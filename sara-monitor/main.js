@@ -1,5 +1,6 @@
 const { app, BrowserWindow, ipcMain, Tray, Menu, Notification } = require('electron');
 const path = require('path');
+const zlib = require('zlib');
 const si = require('systeminformation');
 const axios = require('axios');
 const machineId = require('node-machine-id').machineIdSync();
@@ -12,6 +13,7 @@ let monitoringInterval;
 // Configuración del servidor Django
 const DJANGO_SERVER = 'http://127.0.0.1:8000';
 let currentUser = null; // Usuario autenticado
+let tokens = null; // Tokens JWT { access, refresh }
 
 // Función de login
 async function loginUser(username, password) {
@@ -23,6 +25,7 @@ async function loginUser(username, password) {
 
     if (response.data && response.data.user) {
       currentUser = response.data.user;
+      tokens = { access: response.data.access, refresh: response.data.refresh };
       console.log('Usuario autenticado:', currentUser.username);
       return { success: true, user: currentUser };
     } else {
@@ -44,6 +47,41 @@ async function loginUser(username, password) {
   }
 }
 const API_ENDPOINT = '/api/activity/';
+// Muestras pendientes que se reintentan antes de guardarlas en disco (30 minutos)
+const MAX_PENDING_SAMPLES = 360;
+// Tras un 429 o un 503 no se envía hasta este momento (Retry-After del servidor)
+let backoffUntil = 0;
+
+// Número de secuencia por máquina; se persiste para que no se reinicie con la app.
+// La época identifica la secuencia: si se pierde el archivo se genera una
+// nueva, y el servidor no confunde las muestras que vuelven a empezar en 0
+// con reenvíos de muestras ya guardadas.
+function sequenceFile() {
+  return path.join(app.getPath('userData'), 'activity_seq.json');
+}
+
+let sequence = null;
+function nextSeq() {
+  const fs = require('fs');
+  if (sequence === null) {
+    try {
+      const saved = JSON.parse(fs.readFileSync(sequenceFile(), 'utf8'));
+      if (!Number.isInteger(saved.seq)) {
+        throw new Error('secuencia inválida');
+      }
+      sequence = { epoch: saved.epoch || require('crypto').randomUUID(), seq: saved.seq };
+    } catch (error) {
+      sequence = { epoch: require('crypto').randomUUID(), seq: -1 };
+    }
+  }
+  sequence.seq += 1;
+  try {
+    fs.writeFileSync(sequenceFile(), JSON.stringify(sequence));
+  } catch (error) {
+    console.log('No se pudo guardar la secuencia:', error.message);
+  }
+  return { ...sequence };
+}
 
 // Crear ventana principal
 function createWindow() {
@@ -242,7 +280,10 @@ async function captureActivity() {
     console.log('No se pudo detectar ventana activa');
   }
 
+  const { epoch, seq } = nextSeq();
   return {
+    epoch,
+    seq,
     timestamp,
     machineId,
     activeWindow,
@@ -285,30 +326,98 @@ function analyzeProductivity(activeWindow, processes) {
   }
 }
 
+// Codificar muestras como NDJSON delta: la primera línea completa y las
+// siguientes sólo con los campos que cambiaron respecto de la anterior
+function encodeDeltaNdjson(activities) {
+  const fields = ['epoca', 'ventana_activa', 'procesos_activos', 'carga_sistema', 'productividad'];
+  let previous = null;
+
+  return activities.map(activity => {
+    const sample = {
+      machine_id: activity.machineId,
+      epoca: activity.epoch,
+      seq: activity.seq,
+      ts: Date.parse(activity.timestamp),
+      ventana_activa: activity.activeWindow,
+      procesos_activos: activity.topProcesses,
+      carga_sistema: activity.systemLoad,
+      productividad: activity.productivity
+    };
+
+    let line = sample;
+    if (previous) {
+      line = { dt: sample.ts - previous.ts };
+      // La secuencia se omite cuando es la siguiente a la anterior
+      if (sample.seq !== previous.seq + 1) {
+        line.seq = sample.seq;
+      }
+      fields.forEach(field => {
+        if (JSON.stringify(sample[field]) !== JSON.stringify(previous[field])) {
+          line[field] = sample[field];
+        }
+      });
+    }
+    previous = sample;
+    return JSON.stringify(line);
+  }).join('\n') + '\n';
+}
+
+// Renovar el token de acceso con el refresh token
+async function refreshAccessToken() {
+  if (!tokens || !tokens.refresh) return false;
+  try {
+    const response = await axios.post(`${DJANGO_SERVER}/api/token/refresh/`, { refresh: tokens.refresh });
+    tokens = { access: response.data.access, refresh: response.data.refresh || tokens.refresh };
+    return true;
+  } catch (error) {
+    console.error('Error renovando el token:', error.message);
+    return false;
+  }
+}
+
 // Enviar datos de actividad al servidor Django
 async function sendActivityData() {
-  if (activityData.length === 0 || !currentUser) return;
+  if (activityData.length === 0 || !currentUser || !tokens) return;
+  if (Date.now() < backoffUntil) return;
 
   try {
-    const response = await axios.post(`${DJANGO_SERVER}${API_ENDPOINT}`, {
-      machineId,
-      userId: currentUser.id,
-      activities: activityData
-    }, {
+    const body = zlib.gzipSync(encodeDeltaNdjson(activityData));
+    const post = () => axios.post(`${DJANGO_SERVER}${API_ENDPOINT}`, body, {
       headers: {
-        'Content-Type': 'application/json',
-        // Aquí iría autenticación JWT si fuera necesario
+        'Content-Type': 'application/x-ndjson',
+        'Content-Encoding': 'gzip',
+        'X-Machine-Id': machineId,
+        'Authorization': `Bearer ${tokens.access}`
       }
     });
 
-    console.log('Datos enviados al servidor:', response.status);
+    let response;
+    try {
+      response = await post();
+    } catch (error) {
+      // Token de acceso expirado: renovarlo una vez y reintentar
+      if (!(error.response && error.response.status === 401 && await refreshAccessToken())) {
+        throw error;
+      }
+      response = await post();
+    }
+
+    console.log('Datos enviados al servidor:', response.status, response.data.duplicadas || 0, 'duplicadas');
     activityData = []; // Limpiar datos enviados
 
   } catch (error) {
     console.error('Error enviando datos:', error.message);
-    // Guardar localmente si falla el envío
-    saveLocalData(activityData);
-    activityData = [];
+    if (error.response && [429, 503].includes(error.response.status)) {
+      const retryAfter = parseInt(error.response.headers['retry-after'], 10) || 60;
+      backoffUntil = Date.now() + retryAfter * 1000;
+    }
+    // Las muestras se reintentan en el próximo envío: el servidor descarta
+    // por secuencia las que ya había guardado. Si se acumulan demasiadas,
+    // se guardan localmente.
+    if (activityData.length >= MAX_PENDING_SAMPLES) {
+      saveLocalData(activityData);
+      activityData = [];
+    }
   }
 }
 
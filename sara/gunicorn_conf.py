@@ -0,0 +1,110 @@
+"""
+Configuración de gunicorn para producción.
+
+    gunicorn -c sara/gunicorn_conf.py
+
+El perfil se elige con SERVIDOR_PERFIL:
+
+- sync:    un proceso por petición en curso; 2 * CPU + 1 workers.
+- gthread: CPU + 1 workers con GUNICORN_THREADS hilos cada uno (por defecto).
+           Las vistas pasan gran parte del tiempo esperando a la base, así
+           que los hilos multiplican la concurrencia sin multiplicar la
+           memoria de pandas/scikit-learn.
+- uvicorn: CPU workers de uvicorn sirviendo sara.asgi (requiere el paquete
+           `uvicorn`, que no está en requirements.txt).
+
+WEB_CONCURRENCY fija la cantidad de workers en cualquier perfil. Con más de
+un worker, las caches 'default' y 'limites' (limitación de tasa, directorio,
+marcas de agua) tienen que ser compartidas: si alguna es 'locmem' gunicorn no
+arranca. CACHE_BACKEND=redis lo resuelve; SERVIDOR_CACHE_LOCAL=1 arranca igual
+con un aviso (p. ej. para probar el perfil en una máquina de desarrollo).
+"""
+import multiprocessing
+import os
+
+PERFILES = ('sync', 'gthread', 'uvicorn')
+
+perfil = os.environ.get('SERVIDOR_PERFIL', 'gthread')
+if perfil not in PERFILES:
+    raise RuntimeError(f'SERVIDOR_PERFIL inválido: {perfil} (opciones: {", ".join(PERFILES)})')
+
+cpus = multiprocessing.cpu_count()
+
+
+def workers_por_defecto(perfil, cpus):
+    if perfil == 'sync':
+        return 2 * cpus + 1
+    if perfil == 'gthread':
+        return cpus + 1
+    return cpus
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', workers_por_defecto(perfil, cpus)))
+
+if perfil == 'sync':
+    worker_class = 'sync'
+    wsgi_app = 'sara.wsgi:application'
+elif perfil == 'gthread':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    wsgi_app = 'sara.wsgi:application'
+else:
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'sara.asgi:application'
+
+# Django, la configuración y las apps se cargan una vez en el master y los
+# workers heredan esas páginas (copy-on-write); un error de configuración
+# detiene el master en lugar de reiniciar workers en bucle. pandas,
+# scikit-learn y el clasificador de intenciones no se importan al arrancar
+# (ver medir_importacion): cada worker los carga la primera vez que los usa
+preload_app = True
+
+# Reciclar workers cada ~N peticiones acota fugas de memoria; el jitter evita
+# que todos se reinicien a la vez
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# Conexiones keep-alive desde nginx; los agentes envían cada 30 s
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Heartbeat de los workers en memoria: en Docker /tmp puede estar en disco
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# GUNICORN_ACCESSLOG vacío desactiva el log de accesos
+accesslog = os.environ.get('GUNICORN_ACCESSLOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOGLEVEL', 'info')
+
+
+def on_starting(server):
+    if server.cfg.workers <= 1:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sara.settings')
+    from core.cache_backends import caches_por_proceso
+
+    locales = caches_por_proceso()
+    if not locales:
+        return
+    mensaje = (f"Caches locmem ({', '.join(locales)}) con {server.cfg.workers} workers: cada proceso "
+               'tendría sus propios límites de tasa, directorio y marcas de agua. Usar CACHE_BACKEND=redis')
+    if os.environ.get('SERVIDOR_CACHE_LOCAL') == '1':
+        server.log.warning(mensaje)
+        return
+    # gunicorn muestra el RuntimeError y termina con código 1
+    raise RuntimeError(f'{mensaje} (o SERVIDOR_CACHE_LOCAL=1 para arrancar igual)')
+
+
+def post_fork(server, worker):
+    # Con preload_app una conexión abierta en el master quedaría compartida
+    # entre workers; cada worker abre las suyas
+    from django.db import connections
+    connections.close_all()
+    # Un pool de psycopg (DATABASE_POOL) creado en el master no sirve en el
+    # worker: sus hilos no sobreviven al fork y sus sockets son del master. Se
+    # descarta sin cerrarlo y cada worker crea el suyo en la primera consulta
+    for conexion in connections.all(initialized_only=True):
+        getattr(type(conexion), '_connection_pools', {}).pop(conexion.alias, None)
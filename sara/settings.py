@@ -84,14 +84,38 @@ WSGI_APPLICATION = 'sara.wsgi.application'
 
 import dj_database_url
 
+# Pool de conexiones de Django 5 (sólo PostgreSQL con psycopg 3): reemplaza las conexiones persistentes
+DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+DATABASE_POOL_MIN = config('DATABASE_POOL_MIN', default=2, cast=int)
+DATABASE_POOL_MAX = config('DATABASE_POOL_MAX', default=10, cast=int)
+DATABASE_POOL_TIMEOUT = config('DATABASE_POOL_TIMEOUT', default=10.0, cast=float)
+
+
+def _base_de_datos(url):
+    base = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    if DATABASE_POOL and base['ENGINE'] == 'django.db.backends.postgresql':
+        # Con pool cada petición devuelve su conexión al terminar
+        base['CONN_MAX_AGE'] = 0
+        base.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DATABASE_POOL_MIN,
+            'max_size': DATABASE_POOL_MAX,
+            'timeout': DATABASE_POOL_TIMEOUT,
+        }
+    return base
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=config('DATABASE_URL', default='sqlite:///db.sqlite3'),
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    'default': _base_de_datos(config('DATABASE_URL', default='sqlite:///db.sqlite3')),
 }
 
+# Réplica de lectura para las vistas de sólo lectura (core/enrutador_bd.py); sin URL todo va a default
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default='')
+if DATABASE_REPLICA_URL:
+    # En los tests la réplica es la misma base de prueba que default
+    DATABASES['replica'] = {**_base_de_datos(DATABASE_REPLICA_URL), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['core.enrutador_bd.EnrutadorReplica']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,7 +182,8 @@ CORS_ALLOWED_ORIGINS = [
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT con el usuario resuelto desde el directorio en memoria
+        'core.autenticacion.JWTAutenticacionDirectorio',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -169,6 +194,13 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Tasas de core.limites: peticiones por período, medidas en una ventana deslizante
+    'DEFAULT_THROTTLE_RATES': {
+        'chat': config('LIMITE_CHAT', default='30/min'),
+        'consejos': config('LIMITE_CONSEJOS', default='12/min'),
+        'actividad': config('LIMITE_ACTIVIDAD', default='60/min'),
+        'actividad_maquina': config('LIMITE_ACTIVIDAD_MAQUINA', default='30/min'),
+    },
 }
 
 # JWT settings
@@ -180,6 +212,8 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+# Segundos que cada worker reutiliza el is_active leído de la base al autenticar un JWT
+JWT_ESTADO_SEGUNDOS = config('JWT_ESTADO_SEGUNDOS', default=30, cast=int)
 
 # Logging
 LOGGING = {
@@ -209,3 +243,125 @@ LOGGING = {
         'level': 'INFO',
     },
 }
+
+
+# Cache de agregados de los dashboards de supervisión
+# Duración (segundos) de cada bucket de tiempo; el bucket anterior se sirve
+# mientras se recalcula el actual en segundo plano.
+DASHBOARD_CACHE_BUCKET = config('DASHBOARD_CACHE_BUCKET', default=60, cast=int)
+
+# Buffer de escritura diferida para la ingesta de actividad (desactivado por defecto)
+# Las muestras se escriben en lotes al llegar a INGESTA_BUFFER_TAMANO o tras
+# INGESTA_BUFFER_INTERVALO segundos; con INGESTA_BUFFER_SPOOL (directorio) se
+# anexan antes a un archivo local que se reprocesa al reiniciar. Tras
+# INGESTA_BUFFER_REINTENTOS fallos seguidos el lote se escribe por partes y se
+# apartan las filas inválidas; con INGESTA_BUFFER_MAXIMO pendientes la API
+# responde 503.
+INGESTA_BUFFER = config('INGESTA_BUFFER', default=False, cast=bool)
+INGESTA_BUFFER_TAMANO = config('INGESTA_BUFFER_TAMANO', default=500, cast=int)
+INGESTA_BUFFER_INTERVALO = config('INGESTA_BUFFER_INTERVALO', default=2.0, cast=float)
+INGESTA_BUFFER_SPOOL = config('INGESTA_BUFFER_SPOOL', default='')
+INGESTA_BUFFER_MAXIMO = config('INGESTA_BUFFER_MAXIMO', default=50000, cast=int)
+INGESTA_BUFFER_REINTENTOS = config('INGESTA_BUFFER_REINTENTOS', default=3, cast=int)
+
+# Caches con nombre (core.cache_backends cuenta aciertos y fallos de cada una)
+# Backend por cache: CACHE_<NOMBRE>_BACKEND, o CACHE_BACKEND para todas:
+# - locmem: memoria del proceso, desalojo LRU al llegar a MAX_ENTRIES
+# - file: archivos en CACHE_DIR compartidos entre procesos; al llegar a
+#   MAX_ENTRIES se borra 1/CULL_FREQUENCY de las entradas
+# - redis: CACHE_REDIS_URL (Redis o compatible, requiere el paquete redis);
+#   el desalojo lo define maxmemory-policy del servidor
+# locmem sólo sirve con un proceso: 'default' y 'limites' tienen que ser
+# compartidas entre workers (`check --deploy` avisa, gunicorn no arranca).
+CACHE_DIR = config('CACHE_DIR', default=str(BASE_DIR / 'cache'))
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='redis://127.0.0.1:6379/1')
+_BACKENDS_CACHE = {
+    'locmem': 'core.cache_backends.LocMemCacheMedida',
+    'file': 'core.cache_backends.FileBasedCacheMedida',
+    'redis': 'core.cache_backends.RedisCacheMedida',
+}
+
+
+def _cache(nombre, max_entradas, cull_frecuencia=3, timeout=300):
+    backend = config(f'CACHE_{nombre.upper()}_BACKEND', default=config('CACHE_BACKEND', default='locmem'))
+    configuracion = {
+        'BACKEND': _BACKENDS_CACHE[backend],
+        'NOMBRE': nombre,
+        'KEY_PREFIX': nombre,
+        'TIMEOUT': timeout,
+    }
+    if backend == 'redis':
+        configuracion['LOCATION'] = CACHE_REDIS_URL
+    else:
+        configuracion['LOCATION'] = os.path.join(CACHE_DIR, nombre) if backend == 'file' else nombre
+        configuracion['OPTIONS'] = {
+            'MAX_ENTRIES': config(f'CACHE_{nombre.upper()}_MAX_ENTRIES', default=max_entradas, cast=int),
+            'CULL_FREQUENCY': cull_frecuencia,
+        }
+    return configuracion
+
+
+CACHES = {
+    # Directorio de usuarios, marcas de agua de ingesta y usos generales
+    'default': _cache('default', 5000),
+    'sesiones': _cache('sesiones', 20000, timeout=60 * 60 * 24 * 14),
+    'dashboard': _cache('dashboard', 500),
+    # Contexto del asistente por usuario (última actividad)
+    'chat': _cache('chat', 5000, timeout=60),
+    # Contadores de limitación de tasa: muchas claves de vida corta
+    'limites': _cache('limites', 50000, cull_frecuencia=4, timeout=120),
+}
+
+# Sesiones en cache con respaldo en la base
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sesiones'
+
+# Reconstrucción de intervalos de actividad (core/sesiones.py), en segundos
+SESIONES_PASO_MUESTRA = config('SESIONES_PASO_MUESTRA', default=5, cast=int)
+SESIONES_UMBRAL_INACTIVIDAD = config('SESIONES_UMBRAL_INACTIVIDAD', default=120, cast=int)
+# Muestras recibidas hace menos de SESIONES_RETRASO segundos esperan a la próxima pasada
+SESIONES_RETRASO = config('SESIONES_RETRASO', default=30, cast=int)
+SESIONES_MINIMO_FOCO = config('SESIONES_MINIMO_FOCO', default=600, cast=int)
+
+# Reportes periódicos (core/reportes.py)
+REPORTES_DIR = config('REPORTES_DIR', default=str(BASE_DIR / 'reportes'))
+REPORTES_PROCESOS = config('REPORTES_PROCESOS', default=2, cast=int)
+REPORTES_TIMEOUT = config('REPORTES_TIMEOUT', default=60, cast=int)
+# Segundos que se conserva una versión reemplazada: las descargas en curso la siguen leyendo
+REPORTES_GRACIA = config('REPORTES_GRACIA', default=600, cast=int)
+# Prefijo de una location `internal` de nginx que apunta a REPORTES_DIR; vacío sirve el archivo desde Django
+REPORTES_X_ACCEL = config('REPORTES_X_ACCEL', default='')
+
+# Directorio de usuarios en memoria (core/directorio.py): segundos tras los que cada
+# worker lo reconstruye aunque no haya visto un cambio de versión
+DIRECTORIO_EDAD_MAXIMA = config('DIRECTORIO_EDAD_MAXIMA', default=300, cast=int)
+
+# Analítica comparativa del equipo (core/analitica_equipo.py): ventanas en días, la primera es la predeterminada
+ANALITICA_EQUIPO_VENTANAS = config(
+    'ANALITICA_EQUIPO_VENTANAS', default='7,14,30', cast=lambda valor: [int(dias) for dias in valor.split(',')]
+)
+
+# Detector de anomalías en línea (core/anomalias.py)
+ANOMALIAS_UMBRAL_Z = config('ANOMALIAS_UMBRAL_Z', default=3.0, cast=float)
+# Horas observadas de una franja antes de compararla, y muestras para que una hora cuente
+ANOMALIAS_MINIMO_HISTORIA = config('ANOMALIAS_MINIMO_HISTORIA', default=4, cast=int)
+ANOMALIAS_MINIMO_MUESTRAS = config('ANOMALIAS_MINIMO_MUESTRAS', default=60, cast=int)
+
+# Metas diarias (core/metas.py): pausa mínima entre intervalos y vida del progreso cacheado, en segundos
+METAS_PAUSA_MINIMA = config('METAS_PAUSA_MINIMA', default=300, cast=int)
+METAS_CACHE_SEGUNDOS = config('METAS_CACHE_SEGUNDOS', default=60, cast=int)
+
+# Búsqueda de texto completo (core/busqueda.py): configuración de PostgreSQL y resultados por página
+BUSQUEDA_CONFIGURACION = config('BUSQUEDA_CONFIGURACION', default='spanish')
+BUSQUEDA_POR_PAGINA = config('BUSQUEDA_POR_PAGINA', default=20, cast=int)
+
+# Clasificador de intenciones del chat (core/intenciones.py): artefacto de `entrenar_intenciones`
+# y probabilidad mínima para usar su predicción en lugar de las reglas de palabras clave
+INTENCIONES_MODELO = config('INTENCIONES_MODELO', default=str(BASE_DIR / 'modelos' / 'intenciones.joblib'))
+INTENCIONES_UMBRAL = config('INTENCIONES_UMBRAL', default=0.5, cast=float)
+
+# Registro de mensajes del chat (core/registro_chat.py): escritura en lotes de CHAT_LOG_LOTE
+# registros o cada CHAT_LOG_INTERVALO segundos desde un hilo del worker
+CHAT_LOG = config('CHAT_LOG', default=True, cast=bool)
+CHAT_LOG_LOTE = config('CHAT_LOG_LOTE', default=100, cast=int)
+CHAT_LOG_INTERVALO = config('CHAT_LOG_INTERVALO', default=5.0, cast=float)
@@ -4,6 +4,7 @@ from django.contrib.auth import views as auth_views
 from django.shortcuts import redirect
 from django.http import JsonResponse
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenRefreshView
 from core import views
 
 # Health check endpoint
@@ -12,6 +13,7 @@ def health_check(request):
 
 router = DefaultRouter()
 router.register(r'registros', views.RegistroViewSet)
+router.register(r'metas', views.MetaUsuarioViewSet)
 
 urlpatterns = [
     path('', views.dashboard_view, name='home'),
@@ -58,9 +60,16 @@ urlpatterns = [
 
     # API endpoints adicionales
     path('api/login/', views.login_api, name='login_api'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/usuarios/autocompletar/', views.usuarios_autocompletar_api, name='usuarios_autocompletar_api'),
     path('api/asistente/chat/', views.asistente_chat_api, name='asistente_chat_api'),
     path('api/consejos-proactivos/', views.consejos_proactivos_api, name='consejos_proactivos_api'),
     path('api/activity/', views.activity_api, name='activity_api'),
+    path('api/ingesta/metricas/', views.ingesta_metricas_api, name='ingesta_metricas_api'),
+    path('api/cache/metricas/', views.cache_metricas_api, name='cache_metricas_api'),
+    path('api/reportes/<str:periodo>/', views.reporte_api, name='reporte_api'),
+    path('api/busqueda/', views.busqueda_api, name='busqueda_api'),
+    path('api/equipo/analitica/', views.analitica_equipo_api, name='analitica_equipo_api'),
 
     path('api/', include(router.urls)),
     path('api/dashboard/', views.dashboard_api, name='dashboard'),
@@ -2,6 +2,7 @@ import os
 import django
 from django.conf import settings
 from django.test import TestCase, Client
+from django.core.cache import cache, caches
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 import json
@@ -11,6 +12,10 @@ from unittest.mock import patch, MagicMock
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sara.settings')
 django.setup()
 
+# El registro del chat escribe desde un hilo propio, fuera de la transacción de cada test:
+# se desactiva aquí y TestRegistroChat lo prueba de forma síncrona
+settings.CHAT_LOG = False
+
 from core.models import Registro, Estadistica, IAAnalisis, ActividadUsuario, Usuario
 from core.views import (
     analizar_intencion_mensaje,
@@ -424,6 +429,2258 @@ class TestIntegracion(TestCase):
         self.assertIn('respuesta', data)
 
 
+class TestCacheAgregados(TestCase):
+    """Tests para la cache de agregados con coalescencia de peticiones"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        from core import cache_agregados
+        cache_agregados.cache.clear()
+        cache_agregados._en_vuelo.clear()
+
+    def test_peticiones_concurrentes_calculan_una_vez(self):
+        """Test que peticiones concurrentes para la misma clave esperan un único cálculo"""
+        import threading
+        import time
+        from core.cache_agregados import obtener_agregado
+
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.2)
+            return {'total': 42}
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(obtener_agregado('vista_test', 'admin', calcular)))
+            for _ in range(8)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [{'total': 42}] * 8)
+
+    def test_alcances_distintos_no_comparten_valor(self):
+        """Test que el alcance de rol forma parte de la clave"""
+        from core.cache_agregados import obtener_agregado
+
+        self.assertEqual(obtener_agregado('vista_test', 'admin', lambda: 'admin'), 'admin')
+        self.assertEqual(obtener_agregado('vista_test', 'supervisor', lambda: 'supervisor'), 'supervisor')
+        self.assertEqual(obtener_agregado('vista_test', 'admin', lambda: 'otro'), 'admin')
+
+    def test_sirve_bucket_anterior_mientras_refresca(self):
+        """Test stale-while-revalidate con el valor del bucket anterior"""
+        import time
+        from core.cache_agregados import cache, obtener_agregado, clave_agregado, segundos_bucket
+
+        bucket = int(time.time() // segundos_bucket())
+        cache.set(clave_agregado('vista_test', 'admin', bucket - 1), 'viejo')
+
+        with patch('core.cache_agregados.threading.Thread') as thread_mock:
+            valor = obtener_agregado('vista_test', 'admin', lambda: 'nuevo')
+
+        self.assertEqual(valor, 'viejo')
+        thread_mock.return_value.start.assert_called_once()
+
+
+class TestResumenDiario(TestCase):
+    """Tests para el resumen diario desnormalizado"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123',
+            rol='empleado'
+        )
+
+    def test_primera_lectura_crea_resumen(self):
+        """Test que la primera lectura del día crea el resumen con los datos más recientes"""
+        from core.models import ResumenDiario
+        from core.resumen_diario import obtener_resumen_diario
+
+        estadistica = Estadistica.objects.create(usuario=self.user, puntaje=70)
+        resumen = obtener_resumen_diario(self.user)
+
+        self.assertEqual(resumen.estadistica, estadistica)
+        self.assertIsNone(resumen.analisis)
+        self.assertEqual(ResumenDiario.objects.filter(usuario=self.user).count(), 1)
+
+    def test_se_actualiza_cuando_cambian_las_fuentes(self):
+        """Test que guardar un análisis refresca el resumen existente"""
+        from core.resumen_diario import obtener_resumen_diario
+
+        obtener_resumen_diario(self.user)
+        consejo = IAAnalisis.objects.create(
+            usuario=self.user,
+            recomendacion='Toma un descanso',
+            patrones_detectados={'tipo': 'agente_personal'}
+        )
+
+        resumen = obtener_resumen_diario(self.user)
+        self.assertEqual(resumen.analisis, consejo)
+        self.assertEqual(resumen.consejos_recientes[0]['pk'], consejo.pk)
+        self.assertEqual(resumen.consejos_recientes[0]['recomendacion'], 'Toma un descanso')
+
+    def test_lectura_con_una_consulta(self):
+        """Test que el resumen existente se lee con una sola consulta"""
+        from core.resumen_diario import obtener_resumen_diario
+
+        Estadistica.objects.create(usuario=self.user, puntaje=70)
+        IAAnalisis.objects.create(usuario=self.user, recomendacion='Revisar fechas')
+        obtener_resumen_diario(self.user)
+
+        with self.assertNumQueries(1):
+            resumen = obtener_resumen_diario(self.user)
+            self.assertEqual(resumen.estadistica.puntaje, 70)
+            self.assertEqual(resumen.analisis.recomendacion, 'Revisar fechas')
+
+    def test_borrar_usuario_con_resumen(self):
+        """Test que borrar el usuario no deja resúmenes huérfanos"""
+        from core.models import ResumenDiario
+        from core.resumen_diario import obtener_resumen_diario
+
+        Estadistica.objects.create(usuario=self.user, puntaje=70)
+        obtener_resumen_diario(self.user)
+        self.user.delete()
+
+        self.assertFalse(ResumenDiario.objects.exists())
+
+
+class TestTipoAnalisis(TestCase):
+    """Tests para la columna indexada IAAnalisis.tipo"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def test_tipo_sincronizado_al_guardar(self):
+        """Test que tipo se copia de patrones_detectados al guardar"""
+        analisis = IAAnalisis.objects.create(
+            usuario=self.user,
+            recomendacion='Consejo',
+            patrones_detectados={'tipo': 'agente_personal', 'ventana_activa': 'Excel'}
+        )
+        self.assertEqual(analisis.tipo, 'agente_personal')
+
+        analisis.patrones_detectados = {'tipo': 'fecha'}
+        analisis.save(update_fields=['patrones_detectados'])
+        analisis.refresh_from_db()
+        self.assertEqual(analisis.tipo, 'fecha')
+
+    def test_patrones_en_lista_sin_tipo(self):
+        """Test que los patrones en forma de lista dejan tipo vacío"""
+        analisis = IAAnalisis.objects.create(usuario=self.user, recomendacion='Consejo')
+        self.assertEqual(analisis.tipo, '')
+
+
+class TestImportacionRegistros(TestCase):
+    """Tests para la importación masiva de registros"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = Client()
+        self.admin_user = User.objects.create_user(username='admin', password='admin123', rol='admin')
+        self.empleado = User.objects.create_user(username='empleado1', password='testpass123', rol='empleado')
+
+    def test_importar_csv_por_api(self):
+        """Test importación CSV: filas válidas, con errores y rechazadas"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        csv_data = (
+            'fecha,usuario,monto\n'
+            '15/01/2025,,100\n'
+            '16/01/2025,empleado1,200\n'
+            '2025-01-17,,300\n'
+        ).encode()
+        self.client.force_login(self.admin_user)
+        response = self.client.post('/api/registros/importar/', {
+            'archivo': SimpleUploadedFile('registros.csv', csv_data, content_type='text/csv'),
+        })
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['creados'], 2)
+        self.assertEqual(data['rechazados'], 1)
+        self.assertEqual(data['detalle_rechazos'][0]['linea'], 4)
+        self.assertEqual(Registro.objects.filter(usuario=self.empleado).get().contenido, {'monto': '200'})
+
+    def test_importar_jsonl_con_errores_de_contenido(self):
+        """Test que las filas con contenido inválido se guardan con sus errores"""
+        import io
+        from core.importacion import importar_registros
+
+        jsonl = io.StringIO(
+            '{"fecha": "01/02/2025", "contenido": {"fecha": "2025/02/01"}}\n'
+            '{"fecha": "02/02/2025", "contenido": {"fecha": "02/02/2025"}}\n'
+            'no es json\n'
+        )
+        resultado = importar_registros(jsonl, 'jsonl', self.empleado, tamano_lote=2)
+
+        self.assertEqual(resultado['creados'], 2)
+        self.assertEqual(resultado['con_errores'], 1)
+        self.assertEqual(resultado['rechazados'], 1)
+        con_error = Registro.objects.get(contenido__fecha='2025/02/01')
+        self.assertEqual(con_error.errores[0]['campo'], 'fecha')
+
+    def test_empleado_no_importa_para_otros(self):
+        """Test que un empleado no puede asignar registros a otro usuario"""
+        import io
+        from core.importacion import importar_registros
+
+        jsonl = io.StringIO('{"fecha": "01/02/2025", "usuario": "admin", "contenido": {}}\n')
+        resultado = importar_registros(jsonl, 'jsonl', self.empleado)
+
+        self.assertEqual(resultado['creados'], 0)
+        self.assertEqual(resultado['rechazados'], 1)
+
+    def test_comando_con_pool_de_procesos(self):
+        """Test del management command validando en un pool de procesos"""
+        import os
+        import tempfile
+        from django.core.management import call_command
+
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as archivo:
+            for dia in range(1, 21):
+                archivo.write(json.dumps({'fecha': f'{dia:02d}/03/2025', 'contenido': {'n': dia}}) + '\n')
+        try:
+            call_command('importar_registros', archivo.name, usuario='admin', lote=5, procesos=2, stdout=open(os.devnull, 'w'))
+        finally:
+            os.unlink(archivo.name)
+
+        self.assertEqual(Registro.objects.filter(usuario=self.admin_user).count(), 20)
+
+
+class TestMotorValidacion(TestCase):
+    """Tests para el motor de validación de Registro.contenido"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def test_reglas_por_campo(self):
+        """Test de las reglas de fecha, monto y formato"""
+        from core.validacion import obtener_motor
+
+        errores = obtener_motor().validar({
+            'fecha': '2025-01-15',
+            'monto': '-10',
+            'cuit': '20-12345678-9',
+            'email': 'no-es-un-email',
+        })
+        tipos = sorted(error['tipo'] for error in errores)
+        self.assertEqual(tipos, ['fecha', 'formato', 'monto'])
+        self.assertEqual(obtener_motor().validar({'fecha': '15/01/2025', 'monto': '1234,5'}), [])
+
+    def test_lote_vectorizado_igual_que_individual(self):
+        """Test que la validación por lote coincide con la validación individual"""
+        from core.validacion import ReglaFecha
+
+        valores = ['15/01/2025', '1/2/2025', '31/02/2025', '2025-01-15', 5, ''] * 20
+        regla = ReglaFecha()
+        self.assertEqual(regla.validar_lote(valores), [regla.validar(valor) for valor in valores])
+
+    def test_duplicado_por_hash_normalizado(self):
+        """Test que un contenido equivalente ya guardado se detecta como duplicado"""
+        from core.validacion import obtener_motor
+
+        registro = Registro.objects.create(usuario=self.user, fecha='2025-01-15', contenido={'Cliente': 'ACME ', 'monto': 10})
+        errores = obtener_motor().validar({'monto': 10, 'cliente': 'acme'}, usuario_id=self.user.pk)
+        self.assertEqual(errores[0]['tipo'], 'duplicado')
+
+        # Al editar, el propio registro no cuenta como duplicado
+        self.assertEqual(obtener_motor().validar(registro.contenido, usuario_id=self.user.pk, excluir_pk=registro.pk), [])
+
+    def test_importacion_marca_duplicados(self):
+        """Test que la importación marca duplicados del archivo y de la base"""
+        import io
+        from core.importacion import importar_registros
+
+        Registro.objects.create(usuario=self.user, fecha='2025-01-15', contenido={'n': 1})
+        jsonl = io.StringIO(
+            '{"fecha": "01/02/2025", "contenido": {"n": 1}}\n'
+            '{"fecha": "01/02/2025", "contenido": {"n": 2}}\n'
+            '{"fecha": "02/02/2025", "contenido": {"n": 2}}\n'
+        )
+        resultado = importar_registros(jsonl, 'jsonl', self.user)
+
+        self.assertEqual(resultado['con_errores'], 2)
+        self.assertEqual(Registro.objects.filter(errores__0__tipo='duplicado').count(), 2)
+
+    def test_contadores_por_regla(self):
+        """Test que el motor acumula tiempos por regla"""
+        from core.validacion import MotorValidacion, ESQUEMA_REGISTRO
+
+        motor = MotorValidacion(ESQUEMA_REGISTRO)
+        motor.validar_lote([{'fecha': '15/01/2025'}, {'fecha': 'x', 'monto': 3}])
+        estadisticas = motor.estadisticas()
+        self.assertEqual(estadisticas['fecha']['valores'], 2)
+        self.assertEqual(estadisticas['monto']['valores'], 1)
+        self.assertNotIn('formato:un email válido', estadisticas)
+
+
+class TestIngestaActividad(TestCase):
+    """Tests para los formatos de ingesta de actividad"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def muestras(self, cantidad=4):
+        from django.utils import timezone
+        ts = int(timezone.now().timestamp() * 1000) - 60000
+        return [{
+            'machine_id': 'pc-01',
+            'ts': ts + i * 5000,
+            'ventana_activa': 'Microsoft Excel' if i < 2 else 'Google Chrome',
+            'procesos_activos': [{'name': 'excel.exe', 'cpu': 3.5}],
+            'carga_sistema': {'cpu': 10 + i, 'cpus': 8},
+            'productividad': 'productive',
+        } for i in range(cantidad)]
+
+    def test_delta_ida_y_vuelta(self):
+        """Test que decodificar el delta reconstruye las muestras completas"""
+        from core.ingesta import codificar_delta, decodificar_delta
+
+        muestras = self.muestras()
+        lineas = list(codificar_delta(muestras))
+        self.assertNotIn('procesos_activos', json.loads(lineas[1]))
+        self.assertEqual(list(decodificar_delta(lineas)), muestras)
+
+    def test_ndjson_gzip(self):
+        """Test de envío NDJSON delta comprimido con gzip"""
+        import gzip
+        from core.ingesta import codificar_delta
+
+        cuerpo = gzip.compress(''.join(codificar_delta(self.muestras())).encode())
+        response = self.client.post(
+            reverse('activity_api'), cuerpo,
+            content_type='application/x-ndjson',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['registradas'], 4)
+        actividades = ActividadUsuario.objects.filter(usuario=self.user).order_by('timestamp')
+        self.assertEqual([a.ventana_activa for a in actividades], ['Microsoft Excel'] * 2 + ['Google Chrome'] * 2)
+        self.assertEqual(actividades[3].carga_sistema, {'cpu': 13, 'cpus': 8})
+        self.assertEqual((actividades[3].timestamp - actividades[0].timestamp).seconds, 15)
+
+    def test_ndjson_mal_formado(self):
+        """Test que una línea inválida devuelve 400 sin guardar nada"""
+        from core.ingesta import codificar_delta
+
+        cuerpo = ''.join(codificar_delta(self.muestras())) + 'no es json\n'
+        response = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ActividadUsuario.objects.exists())
+
+    def test_gzip_corrupto_devuelve_400(self):
+        """Test que un cuerpo que no es gzip, o está cortado, es un error del cliente"""
+        import gzip
+        from core.ingesta import codificar_delta
+
+        completo = gzip.compress(''.join(codificar_delta(self.muestras())).encode())
+        for cuerpo in (b'esto no es gzip', completo[:len(completo) // 2]):
+            with self.subTest(largo=len(cuerpo)):
+                response = self.client.post(
+                    reverse('activity_api'), cuerpo,
+                    content_type='application/x-ndjson',
+                    HTTP_CONTENT_ENCODING='gzip'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(ActividadUsuario.objects.exists())
+
+    def test_ts_no_numerico_o_fuera_de_rango_devuelve_400(self):
+        """Test que un ts NaN, infinito o fuera de rango es un error del cliente y no un 500"""
+        from core.ingesta import codificar_delta
+
+        primera = next(codificar_delta(self.muestras(1)))
+        for linea in ('{"machine_id": "pc-01", "ts": NaN}', '{"machine_id": "pc-01", "ts": Infinity}',
+                      '{"machine_id": "pc-01", "ts": "ayer"}', '{"machine_id": "pc-01", "ts": 1e300}',
+                      '{"machine_id": "pc-01", "ts": -99999999999999999}'):
+            with self.subTest(linea=linea):
+                response = self.client.post(reverse('activity_api'), primera + linea + '\n',
+                                            content_type='application/x-ndjson')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(ActividadUsuario.objects.exists())
+
+    def test_dt_no_numerico_devuelve_400(self):
+        """Test que un dt que no es un número finito devuelve 400 sin guardar nada"""
+        from core.ingesta import codificar_delta
+
+        primera = next(codificar_delta(self.muestras(1)))
+        for dt in ('"5s"', 'null', 'NaN', 'true', '1e300'):
+            with self.subTest(dt=dt):
+                cuerpo = primera + '{"dt": %s}\n' % dt
+                response = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(ActividadUsuario.objects.exists())
+
+    def test_lote_json_de_sara_monitor(self):
+        """Test del lote JSON que envía sara-monitor"""
+        response = self.client.post(reverse('activity_api'), {
+            'machineId': 'pc-02',
+            'activities': [
+                {'timestamp': '2025-01-15T12:00:00.000Z', 'activeWindow': 'code', 'topProcesses': [], 'systemLoad': {'cpu': 5}, 'productivity': 'productive'},
+                {'timestamp': '2025-01-15T12:00:05.000Z', 'activeWindow': 'steam', 'topProcesses': [], 'systemLoad': {'cpu': 50}, 'productivity': 'gaming'},
+            ],
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ActividadUsuario.objects.filter(machine_id='pc-02', productividad='gaming').count(), 1)
+
+    def test_muestra_unica_json(self):
+        """Test del formato JSON de una muestra"""
+        response = self.client.post(reverse('activity_api'), {
+            'machine_id': 'pc-03',
+            'ventana_activa': 'Word',
+            'productividad': 'productive',
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('actividad_id', response.json())
+
+
+class TestIngestaIdempotente(TestCase):
+    """Tests para la deduplicación de muestras por número de secuencia"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def enviar(self, secuencias, machine_id='pc-01', **extra):
+        from core.ingesta import codificar_delta
+        muestras = [{'machine_id': machine_id, 'seq': seq, 'ts': 1736942400000 + seq * 5000,
+                     'ventana_activa': 'Excel', 'productividad': 'productive', **extra} for seq in secuencias]
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('activity_api'), ''.join(codificar_delta(muestras)),
+                                    content_type='application/x-ndjson')
+
+    def test_secuencia_implicita_en_delta(self):
+        """Test que el delta omite la secuencia consecutiva y el decodificador la reconstruye"""
+        from core.ingesta import codificar_delta, decodificar_delta
+
+        muestras = [{'machine_id': 'pc-01', 'seq': seq, 'ts': seq} for seq in (3, 4, 5, 9)]
+        lineas = list(codificar_delta(muestras))
+        self.assertNotIn('seq', json.loads(lineas[1]))
+        self.assertEqual(json.loads(lineas[3])['seq'], 9)
+        self.assertEqual([m['seq'] for m in decodificar_delta(lineas)], [3, 4, 5, 9])
+
+    def test_reintento_no_duplica(self):
+        """Test que reenviar un lote (reintento tras timeout) no crea filas duplicadas"""
+        self.assertEqual(self.enviar(range(6)).json()['registradas'], 6)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.enviar(range(6))
+        # La marca de agua sale de cache: el reintento no toca la tabla de actividad
+        self.assertFalse([c for c in consultas if 'core_actividadusuario' in c['sql']])
+        self.assertEqual(response.json(), {'message': 'Actividad registrada exitosamente', 'registradas': 0, 'duplicadas': 6})
+
+        response = self.enviar(range(3, 9))
+        self.assertEqual((response.json()['registradas'], response.json()['duplicadas']), (3, 3))
+        self.assertEqual(ActividadUsuario.objects.filter(machine_id='pc-01').count(), 9)
+
+    def test_marca_agua_se_recupera_de_la_base(self):
+        """Test que sin cache la marca de agua se lee de la base"""
+        self.enviar(range(4))
+        cache.clear()
+
+        response = self.enviar(range(2, 6))
+        self.assertEqual(response.json()['duplicadas'], 2)
+        self.assertEqual(ActividadUsuario.objects.count(), 6)
+
+    def test_secuencias_por_maquina(self):
+        """Test que las secuencias son independientes por máquina"""
+        self.enviar(range(3), machine_id='pc-01')
+        response = self.enviar(range(3), machine_id='pc-02')
+
+        self.assertEqual(response.json()['registradas'], 3)
+
+    def test_conflicto_no_cuenta_como_registrada(self):
+        """Test que una secuencia ya guardada que la marca de agua no conocía cuenta como duplicada"""
+        from core.ingesta import clave_marca_agua, construir_actividad
+
+        construir_actividad({'machine_id': 'pc-01', 'seq': 2}, self.user).save()
+        cache.set(clave_marca_agua('pc-01'), -1)
+
+        response = self.enviar(range(4))
+        self.assertEqual((response.json()['registradas'], response.json()['duplicadas']), (3, 1))
+        self.assertEqual(ActividadUsuario.objects.count(), 4)
+
+    def test_insertar_nuevas_devuelve_solo_insertadas(self):
+        """Test que insertar_nuevas devuelve con pk sólo las filas que escribió"""
+        from core.ingesta import construir_actividad, insertar_nuevas
+
+        construir_actividad({'machine_id': 'pc-01', 'seq': 1}, self.user).save()
+        actividades = [construir_actividad(muestra, self.user) for muestra in (
+            {'machine_id': 'pc-01', 'seq': 1}, {'machine_id': 'pc-01', 'seq': 2}, {'machine_id': 'pc-01'},
+        )]
+
+        insertadas = insertar_nuevas(actividades)
+        self.assertEqual([a.seq for a in insertadas], [2, None])
+        self.assertTrue(ActividadUsuario.objects.filter(pk=insertadas[0].pk, seq=2).exists())
+        self.assertEqual(ActividadUsuario.objects.filter(seq__isnull=True).count(), 1)
+        self.assertIsNone(actividades[0].pk)
+
+    def test_insertar_nuevas_repetidas_y_spool(self):
+        """Test que una secuencia repetida en el lote o reenviada tal cual desde el spool no cuenta como insertada"""
+        from core.buffer_ingesta import deserializar, serializar
+        from core.ingesta import construir_actividad, insertar_nuevas
+
+        guardada = construir_actividad({'machine_id': 'pc-01', 'seq': 1}, self.user)
+        guardada.save()
+        actividades = [deserializar(serializar(guardada))]
+        actividades += [construir_actividad({'machine_id': 'pc-01', 'seq': seq}, self.user) for seq in (2, 2)]
+        insertadas = insertar_nuevas(actividades)
+
+        self.assertEqual([a.seq for a in insertadas], [2])
+        self.assertEqual(ActividadUsuario.objects.count(), 2)
+
+    def test_epoca_nueva_reinicia_secuencia(self):
+        """Test que un agente que perdió su secuencia y empieza otra época no se descarta como reenvío"""
+        self.enviar(range(5), epoca='epoca-a')
+        response = self.enviar(range(3), epoca='epoca-b')
+
+        self.assertEqual(response.json()['registradas'], 3)
+        self.assertEqual(ActividadUsuario.objects.filter(epoca='epoca-b').count(), 3)
+        self.assertEqual(self.enviar(range(3), epoca='epoca-b').json()['duplicadas'], 3)
+
+    def test_retroceso_grande_reinicia_marca(self):
+        """Test que un agente sin época que vuelve a empezar su secuencia no pierde las muestras"""
+        from core.ingesta import marca_agua
+
+        self.enviar([20000, 20001])
+        with self.assertLogs('core.ingesta', 'WARNING'):
+            response = self.enviar(range(3))
+
+        self.assertEqual(response.json()['registradas'], 3)
+        self.assertEqual(marca_agua('pc-01'), 2)
+        # Un reenvío viejo, cercano a la marca, sigue siendo duplicado
+        self.assertEqual(self.enviar([1]).json()['duplicadas'], 1)
+
+    def test_restriccion_unica(self):
+        """Test que bulk_create ignora conflictos aunque la marca de agua no los detecte"""
+        from core.ingesta import construir_actividad
+
+        ActividadUsuario.objects.bulk_create([
+            construir_actividad({'machine_id': 'pc-01', 'seq': 1}, self.user),
+            construir_actividad({'machine_id': 'pc-01', 'seq': 1}, self.user),
+            construir_actividad({'machine_id': 'pc-01'}, self.user),
+            construir_actividad({'machine_id': 'pc-01'}, self.user),
+        ], ignore_conflicts=True)
+
+        self.assertEqual(ActividadUsuario.objects.count(), 3)
+
+
+class TestBufferIngesta(TestCase):
+    """Tests para el buffer de escritura diferida de la ingesta"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def actividades(self, secuencias):
+        from core.ingesta import construir_actividad
+        return [construir_actividad({'machine_id': 'pc-01', 'seq': seq, 'ventana_activa': 'Excel'}, self.user)
+                for seq in secuencias]
+
+    def test_vaciar_escribe_en_lote(self):
+        """Test que el vaciado escribe las actividades encoladas y registra métricas"""
+        from core.buffer_ingesta import BufferIngesta
+
+        buffer = BufferIngesta(iniciar_hilo=False)
+        buffer.encolar(self.actividades(range(5)))
+        self.assertEqual(buffer.metricas()['profundidad'], 5)
+        self.assertFalse(ActividadUsuario.objects.exists())
+
+        self.assertEqual(buffer.vaciar(), 5)
+        metricas = buffer.metricas()
+        self.assertEqual(ActividadUsuario.objects.count(), 5)
+        self.assertEqual((metricas['profundidad'], metricas['vaciados'], metricas['escritas']), (0, 1, 5))
+
+    def test_error_conserva_pendientes(self):
+        """Test que si falla la escritura las actividades vuelven a la cola"""
+        from core.buffer_ingesta import BufferIngesta
+
+        buffer = BufferIngesta(iniciar_hilo=False)
+        buffer.encolar(self.actividades(range(3)))
+        with patch('core.ingesta.insertar_nuevas', side_effect=RuntimeError('db caída')):
+            with self.assertRaises(RuntimeError):
+                buffer.vaciar()
+
+        self.assertEqual(buffer.metricas()['profundidad'], 3)
+        self.assertEqual(buffer.metricas()['errores'], 1)
+        buffer.vaciar()
+        self.assertEqual(ActividadUsuario.objects.count(), 3)
+
+    def test_fila_invalida_se_aparta_tras_reintentos(self):
+        """Test que tras los reintentos el lote se escribe por partes y la fila que falla se aparta"""
+        import tempfile
+        from core.buffer_ingesta import BufferIngesta
+        from core.ingesta import insertar_nuevas
+
+        def insertar(actividades):
+            if any(actividad.seq == 3 for actividad in actividades):
+                raise ValueError('fila inválida')
+            return insertar_nuevas(actividades)
+
+        with tempfile.TemporaryDirectory() as directorio:
+            buffer = BufferIngesta(directorio_spool=directorio, iniciar_hilo=False, reintentos=2)
+            buffer.encolar(self.actividades(range(6)))
+            with patch('core.ingesta.insertar_nuevas', side_effect=insertar):
+                with self.assertRaises(ValueError):
+                    buffer.vaciar()
+                self.assertEqual(buffer.metricas()['fallos_seguidos'], 1)
+                self.assertEqual(buffer.vaciar(), 5)
+
+            metricas = buffer.metricas()
+            self.assertEqual((metricas['profundidad'], metricas['descartadas'], metricas['fallos_seguidos']), (0, 1, 0))
+            self.assertEqual(sorted(ActividadUsuario.objects.values_list('seq', flat=True)), [0, 1, 2, 4, 5])
+            with open(os.path.join(directorio, f'descartadas-{os.getpid()}.jsonl')) as archivo:
+                self.assertEqual([json.loads(linea)['seq'] for linea in archivo], [3])
+            buffer._spool.close()
+
+    def test_caida_de_la_base_no_aparta_filas(self):
+        """Test que un error de conexión conserva el lote aunque se agoten los reintentos"""
+        from django.db import OperationalError
+        from core.buffer_ingesta import BufferIngesta
+
+        buffer = BufferIngesta(iniciar_hilo=False, reintentos=1)
+        buffer.encolar(self.actividades(range(3)))
+        with patch('core.ingesta.insertar_nuevas', side_effect=OperationalError('sin conexión')):
+            with self.assertRaises(OperationalError):
+                buffer.vaciar()
+
+        self.assertEqual((buffer.metricas()['profundidad'], buffer.metricas()['descartadas']), (3, 0))
+        buffer.vaciar()
+        self.assertEqual(ActividadUsuario.objects.count(), 3)
+
+    def test_buffer_lleno_responde_503(self):
+        """Test que con la cola llena la API rechaza el envío sin avanzar la marca de agua"""
+        from core import buffer_ingesta
+        from core.ingesta import codificar_delta
+
+        buffer = buffer_ingesta.BufferIngesta(iniciar_hilo=False, capacidad=2)
+        muestras = [{'machine_id': 'pc-01', 'seq': seq, 'ts': 1736942400000 + seq} for seq in range(3)]
+        cuerpo = ''.join(codificar_delta(muestras))
+        with self.settings(INGESTA_BUFFER=True), patch.object(buffer_ingesta, '_buffer', buffer):
+            response = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+            buffer.capacidad = 10
+            reintento = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(buffer.metricas()['rechazadas'], 3)
+        self.assertEqual(reintento.json()['encoladas'], 3)
+
+    def test_spool_se_reprocesa_al_reiniciar(self):
+        """Test que el spool de un proceso terminado se escribe al crear el buffer"""
+        import tempfile
+        from core.buffer_ingesta import BufferIngesta, serializar
+
+        with tempfile.TemporaryDirectory() as directorio:
+            # Spool de un proceso que murió sin vaciar el buffer
+            with open(os.path.join(directorio, 'actividad-4194305.jsonl'), 'w') as archivo:
+                for actividad in self.actividades(range(4)):
+                    archivo.write(json.dumps(serializar(actividad)) + '\n')
+                archivo.write('{"usuario_id": 1, "mach')
+
+            buffer = BufferIngesta(directorio_spool=directorio, iniciar_hilo=False)
+            self.assertEqual(ActividadUsuario.objects.count(), 4)
+
+            buffer.encolar(self.actividades(range(4, 6)))
+            buffer.vaciar()
+            buffer._spool.close()
+            self.assertEqual(os.listdir(directorio), [f'actividad-{os.getpid()}.jsonl'])
+            self.assertEqual(ActividadUsuario.objects.count(), 6)
+
+    def test_api_con_buffer_responde_202(self):
+        """Test que con el buffer activo la API encola y responde 202"""
+        from core import buffer_ingesta
+        from core.ingesta import codificar_delta
+
+        buffer = buffer_ingesta.BufferIngesta(iniciar_hilo=False)
+        muestras = [{'machine_id': 'pc-01', 'seq': seq, 'ts': 1736942400000 + seq} for seq in range(3)]
+        cuerpo = ''.join(codificar_delta(muestras))
+        with self.settings(INGESTA_BUFFER=True), patch.object(buffer_ingesta, '_buffer', buffer):
+            response = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+            reintento = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['encoladas'], 3)
+        self.assertEqual(reintento.json()['duplicadas'], 3)
+        self.assertFalse(ActividadUsuario.objects.exists())
+        buffer.vaciar()
+        self.assertEqual(ActividadUsuario.objects.count(), 3)
+
+    def test_metricas_solo_admin(self):
+        """Test que las métricas del buffer son solo para admin"""
+        response = self.client.get(reverse('ingesta_metricas_api'))
+        self.assertEqual(response.status_code, 403)
+
+        admin = User.objects.create_user(username='admin', password='testpass123', rol='admin')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('ingesta_metricas_api'))
+        self.assertEqual(response.json(), {'buffer_activo': False})
+
+
+class TestLimitesTasa(TestCase):
+    """Tests para la limitación de tasa de las APIs"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        caches['limites'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def tasas(self, **tasas):
+        return self.settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': tasas})
+
+    def test_limite_por_usuario(self):
+        """Test que al agotar la ventana se responde 429 con Retry-After"""
+        with self.tasas(consejos='2/min'):
+            respuestas = [self.client.get(reverse('consejos_proactivos_api')) for _ in range(3)]
+            otro = User.objects.create_user(username='otro', password='testpass123')
+            self.client.force_login(otro)
+            respuesta_otro = self.client.get(reverse('consejos_proactivos_api'))
+
+        self.assertEqual([r.status_code for r in respuestas], [200, 200, 429])
+        # La ventana actual ya está llena: hay que esperar a que deje de contar como la anterior
+        self.assertTrue(30 <= int(respuestas[2]['Retry-After']) <= 120)
+        self.assertEqual(respuesta_otro.status_code, 200)
+
+    def test_limite_por_maquina(self):
+        """Test que el límite por máquina se aplica aunque cambie el usuario"""
+        otro = User.objects.create_user(username='otro', password='testpass123')
+        with self.tasas(actividad='100/min', actividad_maquina='2/min'):
+            codigos = []
+            for usuario in (self.user, otro, self.user):
+                self.client.force_login(usuario)
+                codigos.append(self.client.post(reverse('activity_api'), {'ventana_activa': 'Excel'},
+                                                content_type='application/json',
+                                                HTTP_X_MACHINE_ID='pc-01').status_code)
+            otra_maquina = self.client.post(reverse('activity_api'), {'machine_id': 'pc-02'},
+                                            content_type='application/json')
+
+        self.assertEqual(codigos, [200, 200, 429])
+        self.assertEqual(otra_maquina.status_code, 200)
+        self.assertEqual(ActividadUsuario.objects.count(), 3)
+
+    def chat(self, instante):
+        with patch('core.limites.time.time', return_value=instante):
+            return self.client.post(reverse('asistente_chat_api'), {'mensaje': 'hola'}, content_type='application/json')
+
+    def test_ventana_deslizante_en_el_borde(self):
+        """Test que el cambio de ventana no habilita otras N peticiones y que Retry-After es el tiempo real de espera"""
+        with self.tasas(chat='4/min'):
+            # Cuatro peticiones al final de la ventana [1200, 1260)
+            codigos = [self.chat(1250.0).status_code for _ in range(5)]
+            # Diez segundos después del borde todavía cuentan 4 * 5/6 de la ventana anterior
+            rechazada = self.chat(1270.0)
+            admitida = self.chat(1275.0)
+            nueva = self.chat(1275.0)
+
+        self.assertEqual(codigos, [200, 200, 200, 200, 429])
+        self.assertEqual(rechazada.status_code, 429)
+        self.assertEqual(rechazada['Retry-After'], '5')
+        self.assertEqual((admitida.status_code, nueva.status_code), (200, 429))
+
+    def test_ventana_siguiente_se_permite(self):
+        """Test que las peticiones de una ventana dejan de contar a medida que pasa la siguiente"""
+        with self.tasas(chat='2/min'):
+            primeros = [self.chat(1200.0) for _ in range(3)]
+            # En 1290 la ventana anterior cuenta la mitad: 2 * 1/2 + 1 <= 2
+            despues = self.chat(1290.0)
+
+        self.assertEqual([r.status_code for r in primeros], [200, 200, 429])
+        self.assertEqual(primeros[2]['Retry-After'], '90')
+        self.assertEqual(despues.status_code, 200)
+
+
+class TestListadosPorRol(TestCase):
+    """Tests para los querysets con alcance por rol y los listados paginados"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123', rol='admin')
+        self.empleados = [
+            User.objects.create_user(username=f'empleado{i}', password='testpass123') for i in range(3)
+        ]
+        Registro.objects.bulk_create([
+            Registro(usuario=self.empleados[i % 3], fecha='2025-01-15', contenido={'n': i}, errores=[])
+            for i in range(60)
+        ])
+
+    def test_visible_para(self):
+        """Test que el empleado sólo ve lo propio y admin/supervisor todo"""
+        self.assertEqual(Registro.objects.visible_para(self.admin).count(), 60)
+        self.assertEqual(Registro.objects.visible_para(self.empleados[0]).count(), 20)
+
+    def test_para_listado_proyecta_columnas(self):
+        """Test que el listado no trae columnas que la plantilla no usa"""
+        registro = Registro.objects.para_listado().first()
+        self.assertIn('contenido_hash', registro.get_deferred_fields())
+        with self.assertNumQueries(0):
+            registro.usuario.username
+
+    def test_listado_paginado_sin_n_mas_1(self):
+        """Test que el listado pagina y no consulta el usuario de cada fila"""
+        self.client.force_login(self.admin)
+        # usuario, conteo del paginador y la página (la sesión sale de cache)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('registros_list'), {'page': 2})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['registros']), 10)
+        self.assertContains(response, 'page=1')
+
+    def test_listados_empleado(self):
+        """Test que cada listado del empleado sólo incluye lo propio"""
+        self.client.force_login(self.empleados[1])
+        response = self.client.get(reverse('registros_list'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 20)
+
+        for nombre in ('estadisticas_list', 'analisis_list', 'actividad_list'):
+            self.assertEqual(self.client.get(reverse(nombre)).status_code, 200)
+
+    def test_api_registros_con_alcance(self):
+        """Test que la API de registros no expone registros ajenos"""
+        ajeno = Registro.objects.filter(usuario=self.empleados[0]).first()
+        self.client.force_login(self.empleados[1])
+
+        self.assertEqual(self.client.get(f'/api/registros/{ajeno.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/registros/').json()['count'], 20)
+
+
+class TestDirectorioUsuarios(TestCase):
+    """Tests para el directorio de usuarios en memoria"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123', rol='admin')
+        self.ana = User.objects.create_user(username='agarcia', password='testpass123', first_name='Ana', last_name='García')
+        self.user = User.objects.create_user(username='bperez', password='testpass123', first_name='Bruno', last_name='Pérez')
+
+    def test_directorio_sin_consultas(self):
+        """Test que el directorio construido no vuelve a consultar la base"""
+        from core.directorio import obtener_directorio
+
+        obtener_directorio()
+        with self.assertNumQueries(0):
+            directorio = obtener_directorio()
+        self.assertEqual(directorio.contar(rol='empleado'), 2)
+        self.assertEqual(directorio.obtener(self.ana.pk)['nombre'], 'Ana García')
+
+    def test_signals_invalidan(self):
+        """Test que crear, modificar o borrar usuarios invalida el directorio"""
+        from core.directorio import obtener_directorio
+
+        obtener_directorio()
+        nuevo = User.objects.create_user(username='cruiz', password='testpass123')
+        self.assertEqual(obtener_directorio().contar(rol='empleado'), 3)
+
+        nuevo.rol = 'supervisor'
+        nuevo.save()
+        self.assertEqual(obtener_directorio().obtener(nuevo.pk)['rol'], 'supervisor')
+
+        nuevo.delete()
+        self.assertIsNone(obtener_directorio().obtener(nuevo.pk))
+
+    def test_copia_local_vence(self):
+        """Test que la copia local se reconstruye tras la edad máxima aunque no cambie la versión"""
+        from core import directorio
+
+        with patch('core.directorio.time.monotonic', return_value=10000.0):
+            directorio.obtener_directorio()
+        # Un cambio cuyo incremento de versión no llegó a este proceso
+        User.objects.filter(pk=self.ana.pk).update(rol='supervisor')
+        with patch('core.directorio.time.monotonic', return_value=10000.0 + 299):
+            self.assertEqual(directorio.obtener_directorio().obtener(self.ana.pk)['rol'], 'empleado')
+        with patch('core.directorio.time.monotonic', return_value=10000.0 + 300):
+            self.assertEqual(directorio.obtener_directorio().obtener(self.ana.pk)['rol'], 'supervisor')
+
+    def test_login_no_invalida(self):
+        """Test que actualizar el último login no invalida el directorio"""
+        from core.directorio import obtener_directorio
+
+        obtener_directorio()
+        self.client.login(username='agarcia', password='testpass123')
+        with self.assertNumQueries(0):
+            obtener_directorio()
+
+    def test_buscar_por_prefijo(self):
+        """Test del autocompletado por username, nombre o apellido"""
+        from core.directorio import obtener_directorio
+
+        directorio = obtener_directorio()
+        self.assertEqual([u['username'] for u in directorio.buscar('pé')], ['bperez'])
+        self.assertEqual([u['username'] for u in directorio.buscar('a')], ['admin', 'agarcia'])
+        self.assertEqual(directorio.buscar('zz'), [])
+
+    def test_api_autocompletar(self):
+        """Test de la API de autocompletado"""
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('usuarios_autocompletar_api'), {'q': 'an'}).status_code, 403)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('usuarios_autocompletar_api'), {'q': 'an'})
+        self.assertEqual(response.json()['resultados'], [
+            {'id': self.ana.pk, 'username': 'agarcia', 'nombre': 'Ana García', 'rol': 'empleado'}
+        ])
+
+    def test_filtro_actividad_con_muchos_usuarios(self):
+        """Test que con muchos usuarios el filtro usa autocompletado"""
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('actividad_list'))
+        self.assertEqual(len(response.context['usuarios']), 3)
+
+        with patch('core.views.crud.MAX_USUARIOS_DESPLEGABLE', 2):
+            response = self.client.get(reverse('actividad_list'), {'usuario': self.ana.pk})
+        self.assertEqual(response.context['usuarios'], [])
+        self.assertEqual(response.context['usuario_filtro_nombre'], 'agarcia')
+        self.assertContains(response, 'usuario-sugerencias')
+
+
+class TestAutenticacionJWT(TestCase):
+    """Tests para el login con JWT y la autenticación sin consultas"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123', first_name='Test')
+
+    def login(self):
+        response = self.client.post(reverse('login_api'), {'username': 'testuser', 'password': 'testpass123'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_login_emite_tokens_sin_sesion(self):
+        """Test que login_api devuelve tokens y no crea sesión"""
+        from django.contrib.sessions.models import Session
+
+        response = self.login()
+        data = response.json()
+        self.assertIn('access', data)
+        self.assertIn('refresh', data)
+        self.assertEqual(data['user']['username'], 'testuser')
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_autenticacion_sin_consultas(self):
+        """Test que autenticar con el token no consulta la base"""
+        from django.test import RequestFactory
+        from rest_framework.request import Request
+        from core.autenticacion import JWTAutenticacionDirectorio
+
+        access = self.login().json()['access']
+        peticion = Request(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}'))
+        JWTAutenticacionDirectorio().authenticate(peticion)
+
+        with self.assertNumQueries(0):
+            usuario, _ = JWTAutenticacionDirectorio().authenticate(peticion)
+        self.assertEqual((usuario.pk, usuario.username, usuario.rol), (self.user.pk, 'testuser', 'empleado'))
+
+    def test_heartbeat_con_bearer(self):
+        """Test que el agente registra actividad con el token de acceso"""
+        access = self.login().json()['access']
+        client = Client()
+
+        response = client.post(reverse('activity_api'), {'machine_id': 'pc-01', 'ventana_activa': 'Excel'},
+                               content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ActividadUsuario.objects.get().usuario, self.user)
+
+    def test_usuario_inactivo_rechazado(self):
+        """Test que un usuario desactivado no se autentica con un token vigente"""
+        access = self.login().json()['access']
+        self.user.is_active = False
+        self.user.save()
+
+        response = Client().get(reverse('consejos_proactivos_api'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_desactivado_en_otro_worker(self):
+        """Test que una desactivación que no pasó por los signals se ve al vencer el estado leído"""
+        from core.autenticacion import olvidar_estado
+
+        access = self.login().json()['access']
+        olvidar_estado(self.user.pk)
+        with patch('core.autenticacion.time.monotonic', return_value=5000.0):
+            primera = Client().get(reverse('consejos_proactivos_api'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with patch('core.autenticacion.time.monotonic', return_value=5000.0 + 30):
+            segunda = Client().get(reverse('consejos_proactivos_api'), HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        self.assertEqual((primera.status_code, segunda.status_code), (200, 401))
+
+    def test_usuario_del_directorio_no_se_guarda(self):
+        """Test que el usuario parcial del directorio no puede pisar la fila real"""
+        from core.autenticacion import usuario_desde_directorio
+
+        usuario = usuario_desde_directorio(self.user.pk)
+        with self.assertRaises(NotImplementedError):
+            usuario.save()
+        with self.assertRaises(NotImplementedError):
+            usuario.delete()
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('testpass123'))
+
+    def test_refresh(self):
+        """Test de renovación del token de acceso"""
+        refresh = self.login().json()['refresh']
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+
+
+class TestCachesConNombre(TestCase):
+    """Tests para las caches con nombre y sus métricas"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        from core.cache_backends import reiniciar_metricas
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        reiniciar_metricas()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def test_caches_separadas_con_limites(self):
+        """Test que cada cache tiene su espacio y su tamaño máximo"""
+        caches['chat'].set('clave', 'chat')
+        self.assertIsNone(caches['dashboard'].get('clave'))
+        self.assertEqual(caches['limites']._max_entries, settings.CACHES['limites']['OPTIONS']['MAX_ENTRIES'])
+        self.assertNotEqual(caches['limites']._max_entries, caches['dashboard']._max_entries)
+
+    def test_contadores_aciertos_fallos(self):
+        """Test de los contadores de aciertos y fallos"""
+        from core.cache_backends import metricas_caches
+
+        cache_chat = caches['chat']
+        cache_chat.get('a')
+        cache_chat.set('a', 1)
+        cache_chat.get('a')
+        cache_chat.get_many(['a', 'b'])
+
+        metricas = metricas_caches()['chat']
+        self.assertEqual((metricas['aciertos'], metricas['fallos'], metricas['entradas']), (2, 2, 1))
+        self.assertEqual(metricas['tasa_aciertos'], 0.5)
+
+    def test_check_caches_por_proceso(self):
+        """Test que el check de deploy avisa si 'default' o 'limites' son locmem"""
+        from core.cache_backends import revisar_caches_compartidas
+
+        self.assertEqual([a.id for a in revisar_caches_compartidas(None)], ['core.W001', 'core.W001'])
+        compartidas = {
+            **settings.CACHES,
+            'default': {**settings.CACHES['default'], 'BACKEND': 'core.cache_backends.FileBasedCacheMedida'},
+            'limites': {**settings.CACHES['limites'], 'BACKEND': 'core.cache_backends.RedisCacheMedida'},
+        }
+        with self.settings(CACHES=compartidas):
+            self.assertEqual(revisar_caches_compartidas(None), [])
+
+    def test_gunicorn_no_arranca_con_locmem(self):
+        """Test que gunicorn se niega a arrancar varios workers con caches locmem"""
+        import importlib.util
+        from types import SimpleNamespace
+
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', settings.BASE_DIR / 'sara' / 'gunicorn_conf.py')
+        conf = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(conf)
+
+        servidor = SimpleNamespace(cfg=SimpleNamespace(workers=1), log=MagicMock())
+        conf.on_starting(servidor)
+        servidor.cfg.workers = 3
+        with patch.dict(os.environ, {'SERVIDOR_CACHE_LOCAL': ''}):
+            with self.assertRaisesMessage(RuntimeError, 'default, limites'):
+                conf.on_starting(servidor)
+        with patch.dict(os.environ, {'SERVIDOR_CACHE_LOCAL': '1'}):
+            conf.on_starting(servidor)
+        servidor.log.warning.assert_called_once()
+
+    def test_backend_archivos(self):
+        """Test del backend de archivos con desalojo al superar MAX_ENTRIES"""
+        import tempfile
+        from core.cache_backends import FileBasedCacheMedida
+
+        with tempfile.TemporaryDirectory() as directorio:
+            cache_archivos = FileBasedCacheMedida(directorio, {
+                'NOMBRE': 'prueba', 'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}
+            })
+            for i in range(10):
+                cache_archivos.set(f'clave{i}', i)
+            self.assertLessEqual(cache_archivos.entradas(), 4)
+            self.assertEqual(cache_archivos.get('clave9'), 9)
+
+    def test_ultima_actividad_en_cache_chat(self):
+        """Test que el contexto del asistente se cachea y se invalida al registrar actividad"""
+        from core.ingesta import ultima_actividad
+
+        self.assertIsNone(ultima_actividad(self.user))
+        with self.assertNumQueries(0):
+            self.assertIsNone(ultima_actividad(self.user))
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('activity_api'), {'machine_id': 'pc-01', 'ventana_activa': 'Excel'},
+                         content_type='application/json')
+        self.assertEqual(ultima_actividad(self.user).ventana_activa, 'Excel')
+
+    def test_api_metricas_solo_admin(self):
+        """Test de la API de métricas de cache"""
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('cache_metricas_api')).status_code, 403)
+
+        admin = User.objects.create_user(username='admin', password='testpass123', rol='admin')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('cache_metricas_api'))
+        self.assertEqual(set(response.json()), {'default', 'sesiones', 'dashboard', 'chat', 'limites'})
+
+
+class TestArranqueEnFrio(TestCase):
+    """Vistas cargadas bajo demanda y presupuesto de importación del arranque"""
+
+    def test_submodulo_de_vistas_se_importa_solo(self):
+        from core.management.commands.medir_importacion import medir
+        nombres = {nombre for _, _, _, nombre in medir('import django; django.setup(); from core.views import login_api')}
+        self.assertIn('core.views.api', nombres)
+        self.assertNotIn('core.views.asistente', nombres)
+        self.assertNotIn('sklearn', nombres)
+        self.assertNotIn('pandas', nombres)
+
+    def test_atributos_de_vistas(self):
+        import core.views as views
+        from core.views import asistente
+        self.assertIs(views.generar_respuesta_metas, asistente.generar_respuesta_metas)
+        with self.assertRaises(AttributeError):
+            views.no_existe
+
+    def test_presupuesto_excedido_falla(self):
+        import io
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        salida = io.StringIO()
+        call_command('medir_importacion', repeticiones=1, presupuesto_ms=60000, stdout=salida)
+        self.assertIn('Dentro del presupuesto', salida.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('medir_importacion', repeticiones=1, presupuesto_ms=1, stdout=io.StringIO())
+
+
+class TestSesionizador(TestCase):
+    """Tests para la reconstrucción de intervalos a partir de las muestras"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        from datetime import timedelta
+        from django.utils import timezone
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.base = timezone.now().replace(microsecond=0) - timedelta(hours=2)
+        # Las muestras recién guardadas ya cuentan para la pasada
+        configuracion = self.settings(SESIONES_RETRASO=0)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def muestras(self, segundos, ventana='Excel', productividad='productive'):
+        from datetime import timedelta
+        ActividadUsuario.objects.bulk_create([
+            ActividadUsuario(usuario=self.user, machine_id='pc-01', timestamp=self.base + timedelta(seconds=s),
+                             ventana_activa=ventana, productividad=productividad)
+            for s in segundos
+        ])
+
+    def intervalos(self):
+        from core.models import IntervaloActividad
+        return list(IntervaloActividad.objects.filter(usuario=self.user).order_by('inicio')
+                    .values_list('ventana_activa', 'duracion', 'muestras'))
+
+    def test_une_muestras_y_corta_por_cambio_e_inactividad(self):
+        """Test que las muestras iguales se unen, un cambio corta sin hueco y la inactividad cierra"""
+        from core.sesiones import sesionizar_usuario
+        self.muestras([0, 5, 10])
+        self.muestras([15, 20], ventana='Chrome', productividad='unproductive')
+        self.muestras([500])
+
+        self.assertEqual(sesionizar_usuario(self.user.pk), 6)
+        self.assertEqual(self.intervalos(), [('Excel', 15.0, 3), ('Chrome', 10.0, 2), ('Excel', 5.0, 1)])
+
+    def test_incremental_desde_la_marca(self):
+        """Test que una segunda pasada extiende el intervalo abierto sin reprocesar"""
+        from core.models import MarcaSesiones
+        from core.sesiones import sesionizar_usuario
+        self.muestras([0, 5])
+        sesionizar_usuario(self.user.pk)
+        self.muestras([10, 15])
+
+        self.assertEqual(sesionizar_usuario(self.user.pk), 2)
+        self.assertEqual(sesionizar_usuario(self.user.pk), 0)
+        self.assertEqual(self.intervalos(), [('Excel', 20.0, 4)])
+        self.assertEqual(MarcaSesiones.objects.get(usuario=self.user).timestamp.timestamp(), self.base.timestamp() + 15)
+
+    def test_muestras_atrasadas_rehacen_los_intervalos(self):
+        """Test que las muestras que llegan tarde (con timestamps ya pasados) se incorporan"""
+        from core.sesiones import sesionizar_usuario
+        self.muestras([0, 5, 10, 300])
+        sesionizar_usuario(self.user.pk)
+        self.assertEqual(self.intervalos(), [('Excel', 15.0, 3), ('Excel', 5.0, 1)])
+
+        # El agente reenvía lo que acumuló sin conexión
+        self.muestras(range(15, 300, 5))
+        self.muestras([12], ventana='Chrome', productividad='unproductive')
+
+        self.assertEqual(sesionizar_usuario(self.user.pk), 58)
+        self.assertEqual(self.intervalos(), [('Excel', 12.0, 3), ('Chrome', 3.0, 1), ('Excel', 290.0, 58)])
+        self.assertEqual(sesionizar_usuario(self.user.pk), 0)
+
+    def test_ingesta_no_sesioniza(self):
+        """Test que la ingesta sólo guarda las muestras y la pasada periódica las convierte en intervalos"""
+        import io
+        from django.core.management import call_command
+        from core.ingesta import codificar_delta
+        client = Client()
+        client.force_login(self.user)
+        inicio = int(self.base.timestamp() * 1000)
+        muestras = [{'machine_id': 'pc-01', 'seq': seq, 'ts': inicio + seq * 5000,
+                     'ventana_activa': 'Excel', 'productividad': 'productive'} for seq in range(4)]
+        with self.captureOnCommitCallbacks(execute=True), patch('core.sesiones.sesionizar_usuario') as sesionizar:
+            client.post(reverse('activity_api'), ''.join(codificar_delta(muestras)), content_type='application/x-ndjson')
+        sesionizar.assert_not_called()
+
+        call_command('sesionizar', stdout=io.StringIO())
+        self.assertEqual(self.intervalos(), [('Excel', 20.0, 4)])
+
+    def test_respuesta_de_tiempo_usa_duraciones(self):
+        """Test que el análisis de tiempo suma la duración de los intervalos"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.views import generar_respuesta_tiempo_detallada
+        mediodia = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.base = mediodia - timedelta(hours=2)
+        self.muestras(range(0, 15 * 60, 5))
+        from core.sesiones import sesionizar_usuario
+        sesionizar_usuario(self.user.pk)
+        with patch('django.utils.timezone.now', return_value=mediodia), \
+                patch('core.sesiones.sesionizar_usuario') as sesionizar:
+            respuesta = generar_respuesta_tiempo_detallada(self.user)
+        # La respuesta del chat sólo lee los intervalos
+        sesionizar.assert_not_called()
+        self.assertIn('Tiempo de trabajo hoy: 15 minutos', respuesta)
+        self.assertIn('Tiempo en foco: 15 minutos', respuesta)
+        self.assertIn('10:00 - 11:00: 100.0% productivo', respuesta)
+
+
+class TestUsoAplicaciones(TestCase):
+    """Tests para el tiempo por aplicación acumulado al ingerir"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def enviar(self, ventanas, paso=5):
+        """Muestras cada `paso` segundos a continuación de las ya enviadas"""
+        from datetime import timedelta
+        from django.utils import timezone
+        if not hasattr(self, 'siguiente'):
+            self.siguiente = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        actividades = []
+        for ventana in ventanas:
+            actividades.append({'timestamp': self.siguiente.isoformat(), 'activeWindow': ventana,
+                                'productivity': 'productive'})
+            self.siguiente += timedelta(seconds=paso)
+        return self.client.post(reverse('activity_api'), {'machineId': 'pc-01', 'activities': actividades},
+                                content_type='application/json')
+
+    def test_clave_aplicacion(self):
+        """Test que títulos y procesos de la misma aplicación comparten clave"""
+        from core.uso_aplicaciones import clave_aplicacion
+        self.assertEqual(clave_aplicacion('Informe.xlsx - Excel'), 'excel')
+        self.assertEqual(clave_aplicacion('EXCEL.EXE'), 'excel')
+        self.assertEqual(clave_aplicacion('Microsoft Excel'), 'excel')
+        self.assertEqual(clave_aplicacion('README.md — proyecto — Visual Studio Code'), 'code')
+        self.assertEqual(clave_aplicacion('Code Helper (Renderer)'), 'code')
+        self.assertEqual(clave_aplicacion('Desconocido', [{'name': 'chrome.exe', 'cpu': 9}]), 'chrome')
+        self.assertEqual(clave_aplicacion(''), 'desconocido')
+
+    def test_acumula_al_ingerir(self):
+        """Test que cada envío suma segundos por (usuario, día, aplicación)"""
+        from core.models import UsoAplicacionDiario
+        self.enviar(['Informe.xlsx - Excel', 'Presupuesto.xlsx - Excel', 'chrome.exe'])
+        self.enviar(['Notas.xlsx - Excel'])
+
+        filas = dict(UsoAplicacionDiario.objects.filter(usuario=self.user).values_list('aplicacion', 'segundos'))
+        self.assertEqual(filas, {'excel': 15, 'chrome': 5})
+
+    def test_muestras_cada_30_segundos(self):
+        """Test que cada muestra suma el hueco con la anterior de la máquina y una inactividad suma un paso"""
+        from datetime import timedelta
+        from core.models import UsoAplicacionDiario
+        # El asistente virtual envía una muestra cada 30 s
+        self.enviar(['Informe.xlsx - Excel'] * 4, paso=30)
+        self.enviar(['Informe.xlsx - Excel'], paso=30)
+        self.siguiente += timedelta(minutes=10)
+        self.enviar(['chrome.exe'])
+
+        filas = dict(UsoAplicacionDiario.objects.filter(usuario=self.user).values_list('aplicacion', 'segundos'))
+        self.assertEqual(filas, {'excel': 5 + 4 * 30, 'chrome': 5})
+
+    def test_reenvio_no_suma_dos_veces(self):
+        """Test que las muestras descartadas por la restricción única no suman tiempo"""
+        from core.buffer_ingesta import BufferIngesta, deserializar, serializar
+        from core.ingesta import codificar_delta
+        from core.models import UsoAplicacionDiario
+        muestras = [{'machine_id': 'pc-01', 'seq': seq, 'ts': 1736942400000 + seq * 5000,
+                     'ventana_activa': 'Informe.xlsx - Excel', 'productividad': 'productive'} for seq in range(3)]
+        cuerpo = ''.join(codificar_delta(muestras))
+        self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+        # Un envío concurrente que no vio la marca de agua del anterior
+        with patch('core.ingesta.marca_agua', return_value=-1):
+            response = self.client.post(reverse('activity_api'), cuerpo, content_type='application/x-ndjson')
+        self.assertEqual((response.json()['registradas'], response.json()['duplicadas']), (0, 3))
+        # Y el spool de un worker caído que ya se había escrito
+        buffer = BufferIngesta(iniciar_hilo=False)
+        buffer.encolar([deserializar(serializar(actividad)) for actividad in ActividadUsuario.objects.all()])
+        self.assertEqual(buffer.vaciar(), 0)
+
+        self.assertEqual(UsoAplicacionDiario.objects.get(usuario=self.user, aplicacion='excel').segundos, 15)
+
+    def test_rankings_desde_la_tabla(self):
+        """Test que el detalle de actividad y el asistente leen el tiempo acumulado"""
+        from core.views import generar_resumen_aplicaciones
+        self.enviar(['Informe.xlsx - Excel'] * 12 + ['chrome.exe'])
+        admin = User.objects.create_user(username='admin', password='x', rol='admin')
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('actividad_usuario_detail', args=[self.user.pk]))
+        self.assertEqual([(app['aplicacion'], app['tiempo']) for app in response.context['aplicaciones_mas_usadas']],
+                         [('excel', '1 min'), ('chrome', '5 s')])
+        self.assertEqual(generar_resumen_aplicaciones(self.user), '• excel: 1 min\n• chrome: 5 s')
+
+    def test_recalcular_desde_muestras(self):
+        """Test que el comando reconstruye la tabla a partir de las muestras guardadas"""
+        import io
+        from django.core.management import call_command
+        from core.models import UsoAplicacionDiario
+        self.enviar(['Informe.xlsx - Excel', 'chrome.exe'])
+        UsoAplicacionDiario.objects.all().delete()
+
+        call_command('recalcular_uso_aplicaciones', dias=1, stdout=io.StringIO())
+        filas = dict(UsoAplicacionDiario.objects.filter(usuario=self.user).values_list('aplicacion', 'segundos'))
+        self.assertEqual(filas, {'excel': 5, 'chrome': 5})
+
+
+class TestReportes(TestCase):
+    """Tests para los reportes periódicos con cache en disco"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        import tempfile
+        cache.clear()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        configuracion = self.settings(REPORTES_DIR=self.directorio.name, REPORTES_PROCESOS=0, REPORTES_X_ACCEL='',
+                                      REPORTES_GRACIA=0)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def enviar(self, ventanas):
+        from django.utils import timezone
+        return self.client.post(reverse('activity_api'), {
+            'machineId': 'pc-01',
+            'activities': [{'timestamp': timezone.now().isoformat(), 'activeWindow': ventana,
+                            'productivity': 'productive'} for ventana in ventanas],
+        }, content_type='application/json')
+
+    def descargar(self, periodo='semanal', **parametros):
+        return self.client.get(reverse('reporte_api', args=[periodo]), parametros)
+
+    def ruta_servida(self):
+        from django.utils import timezone
+        from core.reportes import generar_reporte
+        return generar_reporte(self.user, 'semanal', timezone.localdate(), 'json')
+
+    def test_cache_por_version_de_datos(self):
+        """Test que la misma versión de datos se sirve sin renderizar y una nueva reemplaza el archivo"""
+        import os
+        from core import reportes
+        self.enviar(['Informe.xlsx - Excel'])
+
+        with patch.object(reportes, 'renderizar', wraps=reportes.renderizar) as renderizar:
+            primera = b''.join(self.descargar(formato='csv').streaming_content)
+            segunda = b''.join(self.descargar(formato='csv').streaming_content)
+            self.assertEqual(renderizar.call_count, 1)
+            self.assertEqual(primera, segunda)
+            self.assertIn('excel', primera.decode('utf-8-sig'))
+
+            self.enviar(['chrome.exe'])
+            tercera = b''.join(self.descargar(formato='csv').streaming_content)
+            self.assertEqual(renderizar.call_count, 2)
+            self.assertIn('chrome', tercera.decode('utf-8-sig'))
+
+        archivos = [nombre for _, _, nombres in os.walk(self.directorio.name) for nombre in nombres]
+        self.assertEqual(len(archivos), 1)
+
+    def test_version_reemplazada_se_conserva_durante_la_gracia(self):
+        """Test que una versión reemplazada sigue en disco mientras una descarga puede estar leyéndola"""
+        import os
+        import time
+        self.enviar(['Informe.xlsx - Excel'])
+        with self.settings(REPORTES_GRACIA=600):
+            ruta_primera = self.ruta_servida()
+            self.enviar(['chrome.exe'])
+            ruta_segunda = self.ruta_servida()
+            self.assertNotEqual(ruta_primera, ruta_segunda)
+            self.assertTrue(os.path.exists(ruta_primera))
+
+            # Pasada la gracia desde el reemplazo, la próxima versión borra la primera
+            for ruta, segundos in ((ruta_primera, 7200), (ruta_segunda, 3600)):
+                os.utime(ruta, (time.time() - segundos, time.time() - segundos))
+            self.enviar(['notepad.exe'])
+            ruta_tercera = self.ruta_servida()
+        self.assertFalse(os.path.exists(ruta_primera))
+        self.assertTrue(os.path.exists(ruta_segunda))
+        self.assertTrue(os.path.exists(ruta_tercera))
+
+    def test_formatos(self):
+        """Test que XLSX es un libro con dos hojas y PDF un documento completo"""
+        import io
+        import zipfile
+        self.enviar(['Informe.xlsx - Excel'])
+
+        response = self.descargar('mensual', formato='xlsx')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        libro = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn('xl/worksheets/sheet2.xml', libro.namelist())
+        self.assertIn('excel', libro.read('xl/worksheets/sheet2.xml').decode())
+
+        pdf = b''.join(self.descargar('diario', formato='pdf').streaming_content)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+
+        self.assertEqual(self.descargar('anual').status_code, 400)
+        self.assertEqual(self.descargar(formato='doc').status_code, 400)
+        self.assertEqual(self.descargar(fecha='2025-13-01').status_code, 400)
+
+    def test_permisos_y_x_accel(self):
+        """Test que sólo admin/supervisor piden reportes ajenos y que nginx puede servir el archivo"""
+        otro = User.objects.create_user(username='otro', password='x')
+        self.assertEqual(self.descargar(usuario=otro.pk).status_code, 403)
+
+        supervisor = User.objects.create_user(username='super', password='x', rol='supervisor')
+        self.client.force_login(supervisor)
+        with self.settings(REPORTES_X_ACCEL='/reportes-internos/'):
+            response = self.descargar(formato='json', usuario=otro.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Accel-Redirect'].startswith(f'/reportes-internos/{otro.pk}/semanal-'))
+        self.assertEqual(response.content, b'')
+
+    def test_renderizado_en_pool_de_procesos(self):
+        """Test que el pool de procesos renderiza el mismo archivo que el proceso actual"""
+        from django.utils import timezone
+        from core.reportes import datos_reporte, renderizar, _renderizar_en_pool
+        datos = datos_reporte(self.user, 'semanal', timezone.localdate())
+        with self.settings(REPORTES_PROCESOS=1):
+            self.assertEqual(_renderizar_en_pool(datos, 'pdf'), renderizar(datos, 'pdf'))
+
+
+class TestAnaliticaEquipo(TestCase):
+    """Tests para la analítica comparativa del equipo"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.supervisor = User.objects.create_user(username='super', password='x', rol='supervisor')
+        self.ana = User.objects.create_user(username='ana', password='x', first_name='Ana')
+        self.beto = User.objects.create_user(username='beto', password='x', first_name='Beto')
+        self.ciro = User.objects.create_user(username='ciro', password='x', first_name='Ciro')
+        # Ventana actual: Ana 2 h productivas, Beto 1 h de 2; ventana anterior: Beto 100 %
+        self.intervalo(self.ana, 0, 7200, 'productive')
+        self.intervalo(self.beto, 0, 3600, 'productive')
+        self.intervalo(self.beto, 0, 3600, 'unproductive')
+        self.intervalo(self.beto, 8, 3600, 'productive')
+
+    def intervalo(self, usuario, dias_atras, segundos, productividad):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.models import IntervaloActividad
+        inicio = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=dias_atras)
+        IntervaloActividad.objects.create(
+            usuario=usuario, machine_id='pc-01', ventana_activa='Excel', productividad=productividad,
+            inicio=inicio, fin=inicio + timedelta(seconds=segundos), duracion=segundos,
+            muestras=segundos // 5, ultima_muestra=inicio,
+        )
+
+    def test_percentiles_zscores_y_variaciones(self):
+        """Test las métricas por empleado y del equipo de la ventana de 7 días"""
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('analitica_equipo_api'), {'dias': 7})
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos['miembros'], 3)
+
+        filas = {fila['username']: fila for fila in datos['empleados']}
+        self.assertEqual([fila['username'] for fila in datos['empleados']], ['ana', 'beto', 'ciro'])
+        self.assertEqual(filas['ana']['porcentaje_productivo'], 100.0)
+        self.assertEqual(filas['beto']['porcentaje_productivo'], 50.0)
+        self.assertEqual(filas['ciro']['horas'], 0.0)
+        self.assertEqual(filas['ana']['percentil'], 100.0)
+        self.assertEqual(filas['ciro']['percentil'], 33.33)
+        self.assertEqual(filas['beto']['z_porcentaje'], 0.0)
+        self.assertAlmostEqual(filas['ana']['z_porcentaje'], 1.22, places=2)
+        self.assertEqual(filas['beto']['delta_porcentaje'], -50.0)
+        self.assertEqual(filas['beto']['delta_horas'], 1.0)
+        self.assertEqual(datos['resumen']['porcentaje_productivo']['p50'], 50.0)
+
+    def test_cache_por_ventana_y_permisos(self):
+        """Test que cada ventana se calcula una vez por bucket y sólo la ven admin/supervisor"""
+        from core import analitica_equipo
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(reverse('analitica_equipo_api')).status_code, 403)
+
+        self.client.force_login(self.supervisor)
+        self.assertEqual(self.client.get(reverse('analitica_equipo_api'), {'dias': 5}).status_code, 400)
+        with patch.object(analitica_equipo, 'calcular_analitica', wraps=analitica_equipo.calcular_analitica) as calcular:
+            self.client.get(reverse('analitica_equipo_api'), {'dias': 7})
+            self.client.get(reverse('analitica_equipo_api'), {'dias': 7})
+            self.client.get(reverse('analitica_equipo_api'), {'dias': 30})
+        self.assertEqual([llamada.args[0] for llamada in calcular.call_args_list], [7, 30])
+
+    def test_panel_y_asistente(self):
+        """Test que la vista de empleados y el asistente muestran la comparativa"""
+        from core.views import generar_respuesta_equipo
+        self.client.force_login(self.supervisor)
+        response = self.client.get(reverse('empleados_overview'), {'dias': 14})
+        self.assertContains(response, 'Comparativa del Equipo')
+        self.assertContains(response, 'P100')
+        self.assertEqual(response.context['analitica']['dias'], 14)
+
+        respuesta = generar_respuesta_equipo(self.supervisor)
+        self.assertIn('Últimos 7 días', respuesta)
+        self.assertIn('Ana: 100.0% (P100, +100.0 pp)', respuesta)
+
+
+class TestDetectorAnomalias(TestCase):
+    """Tests para el detector de anomalías en línea"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        from datetime import timedelta
+        from django.utils import timezone
+        cache.clear()
+        # Las muestras recién guardadas ya cuentan para la pasada
+        configuracion = self.settings(ANOMALIAS_UMBRAL_Z=3.0, ANOMALIAS_MINIMO_HISTORIA=4, ANOMALIAS_MINIMO_MUESTRAS=10,
+                                      SESIONES_RETRASO=0)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        # Lunes de 10 a 11, diez semanas atrás
+        hoy = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.base = hoy - timedelta(days=hoy.weekday(), weeks=10)
+
+    def hora(self, semana, productivas, improductivas, clase='unproductive'):
+        """Muestras de la franja en la semana dada, más una en la hora siguiente que la cierra"""
+        from datetime import timedelta
+        from core.anomalias import observar_usuario
+        inicio = self.base + timedelta(weeks=semana)
+        clases = ['productive'] * productivas + [clase] * improductivas
+        actividades = [
+            ActividadUsuario(usuario=self.user, machine_id='pc-01', timestamp=inicio + timedelta(seconds=5 * i),
+                             productividad=p)
+            for i, p in enumerate(clases)
+        ]
+        actividades.append(ActividadUsuario(usuario=self.user, machine_id='pc-01', timestamp=inicio + timedelta(hours=1),
+                                            productividad='neutral'))
+        ActividadUsuario.objects.bulk_create(actividades)
+        return observar_usuario(self.user.pk)
+
+    def test_welford(self):
+        """Test que la media y la varianza acumuladas coinciden con las de la serie completa"""
+        import statistics
+        from core.anomalias import actualizar_welford, desviacion
+        valores = [0.9, 0.85, 0.95, 0.7, 0.88]
+        n, media, m2 = 0, 0.0, 0.0
+        for valor in valores:
+            n, media, m2 = actualizar_welford(n, media, m2, valor)
+        self.assertAlmostEqual(media, statistics.mean(valores))
+        self.assertAlmostEqual(desviacion(n, m2), statistics.stdev(valores))
+
+    def test_productividad_baja_con_antirrebote(self):
+        """Test que una caída alerta una vez por incidente y vuelve a alertar tras una hora normal"""
+        from core.models import PerfilHorario
+        for semana in range(4):
+            self.assertEqual(self.hora(semana, 18, 2), [])
+        perfil = PerfilHorario.objects.get(usuario=self.user, hora_semana=10)
+        self.assertEqual(perfil.horas, 4)
+        self.assertAlmostEqual(perfil.media_productiva, 0.9)
+
+        alertas = self.hora(4, 8, 12)
+        self.assertEqual(len(alertas), 1)
+        self.assertEqual(alertas[0].tipo, 'anomalia_productividad')
+        self.assertIn('lunes', alertas[0].recomendacion)
+        self.assertEqual(self.hora(5, 8, 12), [])
+        self.assertEqual(self.hora(6, 18, 2), [])
+        self.assertEqual(len(self.hora(7, 8, 12)), 1)
+
+    def test_rafaga_alerta_mientras_ocurre(self):
+        """Test que una ráfaga de juego alerta una sola vez en cuanto supera el umbral"""
+        for semana in range(4):
+            self.hora(semana, 18, 2)
+        # Umbral: media 2 + 3 desviaciones mínimas de 12 muestras
+        alertas = self.hora(4, 0, 60, clase='gaming')
+        self.assertEqual([alerta.tipo for alerta in alertas], ['anomalia_rafagas', 'anomalia_productividad'])
+        self.assertEqual(alertas[0].patrones_detectados['valor'], 39)
+
+    def test_alertas_desde_la_pasada_periodica(self):
+        """Test que la ingesta no toca el detector y la pasada periódica alerta hasta el dashboard"""
+        import io
+        from datetime import timedelta
+        from django.core.management import call_command
+        from core.models import EstadoAnomalias
+        for semana in range(4):
+            self.hora(semana, 18, 2)
+        inicio = self.base + timedelta(weeks=4)
+        client = Client()
+        client.force_login(self.user)
+        with patch('core.anomalias.observar_usuario') as observar:
+            client.post(reverse('activity_api'), {
+                'machineId': 'pc-01',
+                'activities': [{'timestamp': (inicio + timedelta(seconds=5 * i)).isoformat(), 'activeWindow': 'Steam',
+                                'productivity': 'gaming'} for i in range(45)],
+            }, content_type='application/json')
+        observar.assert_not_called()
+        self.assertEqual(EstadoAnomalias.objects.get(usuario=self.user).rafagas, 0)
+
+        salida = io.StringIO()
+        call_command('sesionizar', stdout=salida)
+        self.assertIn('1 alertas de anomalías', salida.getvalue())
+        estado = EstadoAnomalias.objects.get(usuario=self.user)
+        self.assertEqual((estado.muestras, estado.rafagas, estado.incidente_rafagas), (45, 45, True))
+        self.assertEqual(IAAnalisis.objects.filter(usuario=self.user, tipo='anomalia_rafagas').count(), 1)
+
+        admin = User.objects.create_user(username='admin', password='x', rol='admin')
+        client.force_login(admin)
+        self.assertContains(client.get(reverse('dashboard_admin')), 'Ráfaga de actividad improductiva')
+
+
+    def test_reenvio_no_cuenta_dos_veces(self):
+        """Test que las muestras que chocan con filas ya guardadas no vuelven a entrar al detector"""
+        from datetime import timedelta
+        from core.buffer_ingesta import BufferIngesta, deserializar, serializar
+        from core.models import EstadoAnomalias
+        client = Client()
+        client.force_login(self.user)
+        cuerpo = {'machineId': 'pc-01', 'activities': [
+            {'seq': seq, 'timestamp': (self.base + timedelta(seconds=5 * seq)).isoformat(),
+             'activeWindow': 'Steam', 'productivity': 'gaming'} for seq in range(1, 4)
+        ]}
+        client.post(reverse('activity_api'), cuerpo, content_type='application/json')
+        # Un envío concurrente que no vio la marca de agua del anterior
+        with patch('core.ingesta.marca_agua', return_value=-1):
+            client.post(reverse('activity_api'), cuerpo, content_type='application/json')
+        buffer = BufferIngesta(iniciar_hilo=False)
+        buffer.encolar([deserializar(serializar(actividad)) for actividad in ActividadUsuario.objects.all()])
+        buffer.vaciar()
+
+        from core.anomalias import observar_usuario
+        observar_usuario(self.user.pk)
+        observar_usuario(self.user.pk)
+        estado = EstadoAnomalias.objects.get(usuario=self.user)
+        self.assertEqual((estado.muestras, estado.rafagas), (3, 3))
+
+    def test_muestras_recientes_esperan_a_la_pasada_siguiente(self):
+        """Test que la marca avanza sólo sobre las muestras recibidas antes del retraso"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.anomalias import observar_usuario
+        from core.models import EstadoAnomalias
+        ActividadUsuario.objects.bulk_create([
+            ActividadUsuario(usuario=self.user, machine_id='pc-01', timestamp=self.base + timedelta(seconds=5 * i),
+                             productividad='productive')
+            for i in range(3)
+        ])
+        self.assertEqual(observar_usuario(self.user.pk, hasta=timezone.now() - timedelta(seconds=30)), [])
+        self.assertFalse(EstadoAnomalias.objects.filter(usuario=self.user).exists())
+
+        observar_usuario(self.user.pk, hasta=timezone.now())
+        estado = EstadoAnomalias.objects.get(usuario=self.user)
+        self.assertEqual((estado.muestras, estado.productivas), (3, 3))
+        self.assertEqual(estado.actividad_id, ActividadUsuario.objects.latest('id').id)
+
+
+class TestMetas(TestCase):
+    """Tests para las metas diarias y su progreso"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+
+    def crear_meta(self, tipo, objetivo):
+        return self.client.post('/api/metas/', {'tipo': tipo, 'objetivo': objetivo}, content_type='application/json')
+
+    def intervalo(self, minuto, minutos, productividad='productive'):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.models import IntervaloActividad
+        inicio = timezone.localtime().replace(hour=1, minute=0, second=0, microsecond=0) + timedelta(minutes=minuto)
+        IntervaloActividad.objects.create(
+            usuario=self.user, machine_id='pc-01', ventana_activa='Excel', productividad=productividad,
+            inicio=inicio, fin=inicio + timedelta(minutes=minutos), duracion=minutos * 60,
+            muestras=minutos * 12, ultima_muestra=inicio,
+        )
+
+    def registro(self, errores=()):
+        from django.utils import timezone
+        return Registro.objects.create(usuario=self.user, fecha=timezone.localdate(), contenido={}, errores=list(errores))
+
+    def test_crear_metas(self):
+        """Test que cada usuario tiene una meta por tipo con objetivo positivo y sólo ve las suyas"""
+        self.assertEqual(self.crear_meta('minutos_productivos', 240).status_code, 201)
+        self.assertEqual(self.crear_meta('minutos_productivos', 300).status_code, 400)
+        self.assertEqual(self.crear_meta('pausas', 0).status_code, 400)
+        self.assertEqual(self.crear_meta('dormir', 8).status_code, 400)
+
+        otro = User.objects.create_user(username='otro', password='x')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get('/api/metas/').json()['count'], 0)
+
+    def test_meta_por_tipo_al_editar_y_en_carrera(self):
+        """Test que editar una meta hacia un tipo ya usado y el choque con la restricción única responden 400"""
+        from core.serializers import MetaUsuarioSerializer
+        self.crear_meta('minutos_productivos', 240)
+        pausas = self.crear_meta('pausas', 2).json()['id']
+        url = f'/api/metas/{pausas}/'
+        self.assertEqual(self.client.patch(url, {'tipo': 'minutos_productivos'}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'objetivo': 3}, content_type='application/json').status_code, 200)
+
+        # Otro pedido insertó la misma meta entre la validación y el INSERT
+        with patch.object(MetaUsuarioSerializer, 'validate', lambda serializer, datos: datos):
+            response = self.crear_meta('minutos_productivos', 300)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tipo', response.json())
+
+    def test_registro_de_otro_dia_invalida_ese_dia(self):
+        """Test que un registro con fecha pasada invalida el progreso cacheado de esa fecha"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from core.metas import progreso_metas
+        self.crear_meta('registros_sin_errores', 1)
+        ayer = timezone.localdate() - timedelta(days=1)
+        self.assertFalse(progreso_metas(self.user, ayer)[0]['cumplida'])
+        Registro.objects.create(usuario=self.user, fecha=ayer.isoformat(), contenido={}, errores=[])
+        self.assertTrue(progreso_metas(self.user, ayer)[0]['cumplida'])
+
+    def test_progreso_desde_intervalos_y_registros(self):
+        """Test el progreso de cada tipo de meta, su cache y la invalidación al guardar un registro"""
+        self.crear_meta('minutos_productivos', 60)
+        self.crear_meta('registros_sin_errores', 2)
+        self.crear_meta('pausas', 1)
+        self.intervalo(0, 20)
+        self.intervalo(20, 15, productividad='neutral')
+        self.intervalo(45, 10)
+        self.registro()
+        self.registro(errores=[{'campo': 'fecha', 'mensaje': 'Fecha inválida'}])
+
+        progreso = {meta['tipo']: meta for meta in self.client.get('/api/metas/progreso/').json()}
+        self.assertEqual((progreso['minutos_productivos']['valor'], progreso['minutos_productivos']['porcentaje']), (30, 50))
+        self.assertEqual((progreso['registros_sin_errores']['valor'], progreso['registros_sin_errores']['cumplida']), (1, False))
+        self.assertEqual((progreso['pausas']['valor'], progreso['pausas']['cumplida']), (1, True))
+
+        from core.metas import progreso_metas
+        with self.assertNumQueries(0):
+            progreso_metas(self.user)
+        self.registro()
+        progreso = {meta['tipo']: meta for meta in progreso_metas(self.user)}
+        self.assertTrue(progreso['registros_sin_errores']['cumplida'])
+
+    def test_chat_y_dashboard_muestran_el_progreso(self):
+        """Test que el asistente y el dashboard muestran el progreso de hoy"""
+        from core.views import generar_respuesta_metas
+        self.assertIn('Aún no tienes metas medibles', generar_respuesta_metas(self.user))
+
+        self.crear_meta('minutos_productivos', 60)
+        self.intervalo(0, 45)
+        respuesta = generar_respuesta_metas(self.user)
+        self.assertIn('Minutos productivos:** 45/60', respuesta)
+        self.assertIn('75%', respuesta)
+
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Metas de Hoy')
+        self.assertContains(response, 'width: 75%')
+
+
+class TestBusquedaTexto(TestCase):
+    """Tests para la búsqueda de texto completo"""
+
+    def setUp(self):
+        """Configuración inicial"""
+        from django.utils import timezone
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.otro = User.objects.create_user(username='otro', password='x')
+        self.hoy = timezone.localdate()
+        self.client.force_login(self.user)
+
+    def registro(self, usuario, **contenido):
+        return Registro.objects.create(usuario=usuario, fecha=self.hoy, contenido=contenido)
+
+    def buscar(self, q, **parametros):
+        return self.client.get(reverse('busqueda_api'), {'q': q, **parametros})
+
+    def test_ranking_prefijos_y_acentos(self):
+        """Test que coincide por prefijo sin acentos y ordena por relevancia"""
+        from core.busqueda import texto_contenido
+        self.assertEqual(texto_contenido({'a': 'uno', 'b': [2, {'c': 'tres'}], 'd': None, 'e': True}), 'uno 2 tres')
+        poco = self.registro(self.user, titulo='Reunión de planificación', notas='producción')
+        mucho = self.registro(self.user, titulo='Producción', notas='Informe de producción y producción diaria')
+        self.registro(self.user, titulo='Vacaciones')
+
+        datos = self.buscar('PRODUCC').json()
+        self.assertEqual(datos['count'], 2)
+        self.assertEqual([r['id'] for r in datos['results']], [mucho.pk, poco.pk])
+        self.assertIn('[Producción]', datos['results'][0]['fragmento'])
+        self.assertEqual(self.buscar('reunion planif').json()['results'][0]['id'], poco.pk)
+        # Los operadores de FTS5 en la entrada se tratan como palabras
+        self.assertEqual(self.buscar('produccion OR vacaciones').json()['count'], 0)
+        self.assertEqual(self.buscar('"*').status_code, 400)
+
+    def test_indice_al_dia_y_visibilidad(self):
+        """Test que guardar y borrar actualizan el índice y el empleado sólo ve lo suyo"""
+        registro = self.registro(self.user, titulo='borrador')
+        self.registro(self.otro, titulo='borrador ajeno')
+        self.assertEqual(self.buscar('borrador').json()['count'], 1)
+
+        registro.contenido = {'titulo': 'definitivo'}
+        registro.save()
+        self.assertEqual(self.buscar('borrador').json()['count'], 0)
+        self.assertEqual(self.buscar('definitivo').json()['count'], 1)
+        registro.delete()
+        self.assertEqual(self.buscar('definitivo').json()['count'], 0)
+
+        IAAnalisis.objects.create(usuario=self.otro, recomendacion='Tomar pausas activas')
+        self.assertEqual(self.buscar('pausas', tipo='analisis').json()['count'], 0)
+        self.client.force_login(User.objects.create_user(username='super', password='x', rol='supervisor'))
+        self.assertEqual(self.buscar('borrador').json()['count'], 1)
+        self.assertEqual(self.buscar('pausas', tipo='analisis').json()['results'][0]['usuario'], 'otro')
+
+    def test_paginacion_importacion_y_admin(self):
+        """Test la paginación, la indexación de la importación masiva y la búsqueda del admin"""
+        import io
+        from core.importacion import importar_registros
+        lineas = ''.join(json.dumps({'fecha': self.hoy.strftime('%d/%m/%Y'), 'contenido': {'tarea': f'auditoria {i}'}}) + '\n'
+                         for i in range(5))
+        self.assertEqual(importar_registros(io.StringIO(lineas), 'jsonl', self.user)['creados'], 5)
+
+        with self.settings(BUSQUEDA_POR_PAGINA=2):
+            primera = self.buscar('auditoria').json()
+            self.assertEqual((primera['count'], len(primera['results']), primera['previous']), (5, 2, None))
+            ultima = self.client.get(primera['next'].replace('page=2', 'page=3')).json()
+            self.assertEqual((len(ultima['results']), ultima['next']), (1, None))
+        self.assertEqual(self.buscar('auditoria', page=0).status_code, 400)
+
+        self.registro(self.otro, tarea='inventario')
+        admin = User.objects.create_superuser(username='admin', password='x', email='a@a.com', rol='admin')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/admin/core/registro/', {'q': 'auditoria'}).context['cl'].result_count, 5)
+        self.assertEqual(self.client.get('/admin/core/registro/', {'q': 'otro'}).context['cl'].result_count, 1)
+
+
+    def test_admin_no_corta_las_coincidencias(self):
+        """Test que el admin filtra con una subconsulta y cuenta todas las coincidencias"""
+        from core.busqueda import indexar
+        registros = Registro.objects.bulk_create([
+            Registro(usuario=self.user, fecha=self.hoy, contenido={'tarea': f'conciliacion {i}'}) for i in range(1005)
+        ])
+        indexar('registros', registros)
+        admin = User.objects.create_superuser(username='admin', password='x', email='a@a.com', rol='admin')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/admin/core/registro/', {'q': 'conciliacion'}).context['cl'].result_count, 1005)
+
+class TestClasificadorIntenciones(TestCase):
+    """Modelo TF-IDF + lineal de intenciones con respaldo de reglas"""
+
+    def setUp(self):
+        import tempfile
+        from core import intenciones
+
+        self.directorio = tempfile.mkdtemp()
+        self.ruta = os.path.join(self.directorio, 'intenciones.joblib')
+        intenciones.descartar_modelo()
+        self.addCleanup(intenciones.descartar_modelo)
+
+    def test_reglas_trabajo_es_tiempo(self):
+        from core.intenciones import intencion_por_reglas
+
+        self.assertEqual(intencion_por_reglas('trabajo'), 'tiempo')
+        self.assertEqual(intencion_por_reglas('trabajo en equipo'), 'equipo')
+        self.assertEqual(intencion_por_reglas('mi productividad en el trabajo'), 'productividad')
+
+    def test_sin_artefacto_usa_reglas(self):
+        from core.intenciones import clasificar
+
+        with self.settings(INTENCIONES_MODELO=self.ruta):
+            # Un solo aviso por worker, en la primera clasificación
+            with self.assertLogs('core.intenciones', level='WARNING') as avisos:
+                self.assertEqual(clasificar(['hola', 'trabajo', 'ok']), ['saludo', 'tiempo', 'general'])
+                clasificar(['hola'])
+            self.assertEqual(len(avisos.records), 1)
+            self.assertIn('entrenar_intenciones', avisos.output[0])
+
+    def test_entrenar_si_falta(self):
+        import io
+        from django.core.management import call_command
+
+        call_command('entrenar_intenciones', salida=self.ruta, validacion=0, si_falta=True, stdout=io.StringIO())
+        modificado = os.path.getmtime(self.ruta)
+        salida = io.StringIO()
+        call_command('entrenar_intenciones', salida=self.ruta, validacion=0, si_falta=True, stdout=salida)
+        self.assertEqual(os.path.getmtime(self.ruta), modificado)
+        self.assertIn('ya existe', salida.getvalue())
+
+    def test_entrenar_guardar_y_clasificar_en_lote(self):
+        import io
+        import time
+        from django.core.management import call_command
+        from core.intenciones import clasificar, leer_ejemplos, obtener_modelo, predecir
+
+        salida = io.StringIO()
+        call_command('entrenar_intenciones', salida=self.ruta, validacion=0, stdout=salida)
+        self.assertTrue(os.path.exists(self.ruta))
+        self.assertLess(os.path.getsize(self.ruta), 1024 * 1024)
+
+        with self.settings(INTENCIONES_MODELO=self.ruta):
+            modelo = obtener_modelo()
+            self.assertIsNotNone(modelo)
+            # Una sola carga por proceso
+            self.assertIs(obtener_modelo(), modelo)
+            self.assertEqual(clasificar(['cuánto trabajé hoy', 'estoy muy cansado']), ['tiempo', 'salud'])
+
+            mensajes, _ = leer_ejemplos()
+            lote = mensajes * 3
+            duraciones = []
+            for _ in range(3):
+                inicio = time.perf_counter()
+                predecir(lote)
+                duraciones.append((time.perf_counter() - inicio) / len(lote))
+            self.assertLess(min(duraciones), 0.001)
+
+    def test_poca_confianza_usa_reglas(self):
+        import io
+        from django.core.management import call_command
+        from core.intenciones import clasificar, predecir
+
+        call_command('entrenar_intenciones', salida=self.ruta, validacion=0, stdout=io.StringIO())
+        with self.settings(INTENCIONES_MODELO=self.ruta, INTENCIONES_UMBRAL=1.01):
+            # Ninguna probabilidad llega al umbral: decide siempre la regla
+            self.assertEqual(clasificar(['estoy muy cansado', 'trabajo en equipo']), ['salud', 'equipo'])
+            self.assertTrue(all(probabilidad < 1.01 for _, probabilidad in predecir(['estoy muy cansado'])))
+
+    def test_artefacto_corrupto_usa_reglas(self):
+        from core.intenciones import clasificar, obtener_modelo
+
+        with open(self.ruta, 'wb') as archivo:
+            archivo.write(b'no es un modelo')
+        with self.settings(INTENCIONES_MODELO=self.ruta):
+            with self.assertLogs('core.intenciones', level='WARNING'):
+                self.assertIsNone(obtener_modelo())
+            self.assertEqual(clasificar(['trabajo']), ['tiempo'])
+
+    def test_leer_ejemplos_jsonl(self):
+        from core.intenciones import leer_ejemplos
+
+        ruta = os.path.join(self.directorio, 'ejemplos.jsonl')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(json.dumps({'mensaje': 'hola', 'intencion': 'saludo'}) + '\n\n')
+            archivo.write(json.dumps({'mensaje': ' ', 'intencion': 'general'}) + '\n')
+        self.assertEqual(leer_ejemplos(ruta), (['hola'], ['saludo']))
+
+
+class TestRegistroChat(TestCase):
+    """Registro de mensajes del chat por cola y lotes, y su resumen por intención"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='chatlog', password='testpass123')
+
+    def _registro(self, **datos):
+        import logging
+        from django.utils import timezone
+
+        registro = logging.makeLogRecord({'msg': 'chat'})
+        registro.chat = {
+            'usuario_id': self.user.pk, 'fecha': timezone.now(), 'hash_mensaje': 'a' * 64,
+            'intencion': 'saludo', 'manejador': 'generar_respuesta_saludo', 'latencia_ms': 1.0, 'consultas': 0,
+            **datos,
+        }
+        return registro
+
+    def test_hash_normaliza_y_no_guarda_el_texto(self):
+        from core.registro_chat import hash_mensaje
+
+        self.assertEqual(hash_mensaje('Hola  SARA'), hash_mensaje(' hola sara'))
+        self.assertNotEqual(hash_mensaje('hola'), hash_mensaje('chau'))
+        self.assertEqual(len(hash_mensaje('hola')), 64)
+
+    def test_manejador_escribe_por_lotes(self):
+        from core.models import MensajeChat
+        from core.registro_chat import ManejadorLoteChat
+
+        manejador = ManejadorLoteChat(tamano=3, intervalo=60)
+        manejador.handle(self._registro())
+        manejador.handle(self._registro())
+        self.assertEqual(MensajeChat.objects.count(), 0)
+        self.assertFalse(manejador.vencido())
+
+        with self.assertNumQueries(1):
+            manejador.handle(self._registro())
+        self.assertEqual(MensajeChat.objects.count(), 3)
+
+        manejador.handle(self._registro(intencion='tiempo'))
+        manejador.intervalo = 0
+        self.assertTrue(manejador.vencido())
+        manejador.close()
+        self.assertEqual(MensajeChat.objects.filter(intencion='tiempo').count(), 1)
+        self.assertEqual(manejador.escritos, 4)
+
+    def test_chat_api_registra_intencion_manejador_y_costo(self):
+        from core.models import MensajeChat
+
+        self.client.login(username='chatlog', password='testpass123')
+        with patch('core.views.asistente.registrar_mensaje') as registrar:
+            response = self.client.post(
+                reverse('asistente_chat_api'), data=json.dumps({'mensaje': 'Hola SARA'}), content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        usuario, mensaje, intencion, manejador, latencia_ms, consultas = registrar.call_args.args
+        self.assertEqual((usuario, mensaje), (self.user, 'Hola SARA'))
+        self.assertEqual((intencion, manejador), ('saludo', 'generar_respuesta_saludo'))
+        self.assertGreaterEqual(latencia_ms, 0)
+        self.assertIsInstance(consultas, int)
+        # La petición no escribe el registro
+        self.assertEqual(MensajeChat.objects.count(), 0)
+
+    def test_cola_entrega_al_manejador_y_vacia_al_detener(self):
+        import logging
+        from core import registro_chat
+
+        recibidos = []
+
+        class Memoria(logging.Handler):
+            intervalo = 0.05
+
+            def emit(self, registro):
+                recibidos.append(registro.chat['intencion'])
+
+            def vencido(self):
+                return False
+
+        with self.settings(CHAT_LOG=True):
+            registro_chat.iniciar(Memoria())
+            try:
+                registro_chat.registrar_mensaje(self.user, 'hola', 'saludo', 'generar_respuesta_saludo', 2.5, 1)
+                registro_chat.registrar_mensaje(self.user, 'horas', 'tiempo', 'generar_respuesta_tiempo_detallada', 9.0, 4)
+            finally:
+                registro_chat.detener()
+        self.assertEqual(recibidos, ['saludo', 'tiempo'])
+        self.assertFalse(logging.getLogger(registro_chat.NOMBRE_LOGGER).handlers)
+
+    def test_resumen_por_intencion(self):
+        import io
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.utils import timezone
+        from core.models import MensajeChat
+
+        ahora = timezone.now()
+        filas = [
+            MensajeChat(usuario=self.user, fecha=ahora, hash_mensaje=f'{i % 2:064d}', intencion='tiempo',
+                        manejador='generar_respuesta_tiempo_detallada', latencia_ms=float(i), consultas=4)
+            for i in range(1, 101)
+        ]
+        filas.append(MensajeChat(usuario=self.user, fecha=ahora, hash_mensaje='f' * 64, intencion='saludo',
+                                 manejador='generar_respuesta_saludo', latencia_ms=3.0, consultas=1))
+        filas.append(MensajeChat(usuario=self.user, fecha=ahora - timedelta(days=30), hash_mensaje='e' * 64,
+                                 intencion='salud', manejador='generar_respuesta_salud', latencia_ms=1.0, consultas=0))
+        MensajeChat.objects.bulk_create(filas)
+
+        salida = io.StringIO()
+        call_command('resumen_chat', dias=7, json=True, stdout=salida)
+        intenciones = json.loads(salida.getvalue())['intenciones']
+        self.assertEqual([fila['intencion'] for fila in intenciones], ['tiempo', 'saludo'])
+        tiempo = intenciones[0]
+        self.assertEqual(tiempo['mensajes'], 100)
+        self.assertEqual(tiempo['usuarios'], 1)
+        self.assertEqual(tiempo['repetidos'], 98)
+        self.assertAlmostEqual(tiempo['p50_ms'], 50.5)
+        self.assertAlmostEqual(tiempo['p95_ms'], 95.05)
+        self.assertEqual(tiempo['max_ms'], 100.0)
+        self.assertEqual(tiempo['consultas_media'], 4.0)
+
+        salida = io.StringIO()
+        call_command('resumen_chat', stdout=salida)
+        self.assertIn('101 mensajes en 2 intenciones', salida.getvalue())
+
+
+class TestEnrutadorReplica(TestCase):
+    """Vistas de sólo lectura en la réplica, escrituras en default"""
+
+    def _con_replica(self, en_transaccion=False):
+        self.enterContext(patch('core.enrutador_bd.replica_configurada', return_value=True))
+        self.enterContext(patch('core.enrutador_bd.transaccion_abierta', return_value=en_transaccion))
+
+    def test_sin_replica_no_interviene(self):
+        from core.enrutador_bd import EnrutadorReplica, en_replica
+
+        enrutador = EnrutadorReplica()
+        with en_replica():
+            self.assertIsNone(enrutador.db_for_read(Usuario))
+        self.assertEqual(enrutador.db_for_write(Usuario), 'default')
+        self.assertTrue(enrutador.allow_migrate('default', 'core'))
+        self.assertFalse(enrutador.allow_migrate('replica', 'core'))
+
+    def test_lecturas_en_replica_hasta_la_primera_escritura(self):
+        from core.enrutador_bd import EnrutadorReplica, en_replica
+
+        self._con_replica()
+        enrutador = EnrutadorReplica()
+        self.assertEqual(enrutador.db_for_read(Registro), 'default')
+        with en_replica():
+            self.assertEqual(enrutador.db_for_read(Registro), 'replica')
+            self.assertEqual(enrutador.db_for_write(Registro), 'default')
+            # Después de escribir se lee lo escrito
+            self.assertEqual(enrutador.db_for_read(Registro), 'default')
+        with en_replica():
+            self.assertEqual(enrutador.db_for_read(Registro), 'replica')
+        self.assertEqual(enrutador.db_for_read(Registro), 'default')
+
+    def test_transaccion_abierta_lee_de_default(self):
+        from core.enrutador_bd import EnrutadorReplica, en_replica
+
+        self._con_replica(en_transaccion=True)
+        with en_replica():
+            self.assertEqual(EnrutadorReplica().db_for_read(Registro), 'default')
+
+    def test_decorador_en_vistas_de_lectura(self):
+        from django.test import RequestFactory
+        from core.enrutador_bd import EnrutadorReplica
+        from core.views import dashboards
+
+        self._con_replica()
+        leidas = []
+
+        def analitica(dias=None):
+            leidas.append(EnrutadorReplica().db_for_read(Usuario))
+            return {}
+
+        request = RequestFactory().get('/api/equipo/analitica/')
+        request.user = User.objects.create_user(username='lector', password='x', rol='admin')
+        with patch.object(dashboards, 'analitica_equipo', side_effect=analitica):
+            response = dashboards.analitica_equipo_api(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(leidas, ['replica'])
+        self.assertEqual(EnrutadorReplica().db_for_read(Usuario), 'default')
+
+    def _dos_bases(self):
+        """Primaria migrada y réplica en dos archivos SQLite; devuelve (ejecutar manage.py, replicar)"""
+        import shutil
+        import subprocess
+        import sys
+        import tempfile
+
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, True)
+        primaria = os.path.join(directorio, 'primaria.sqlite3')
+        replica = os.path.join(directorio, 'replica.sqlite3')
+        entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'sara.settings',
+                   'DATABASE_URL': f'sqlite:///{primaria}', 'DATABASE_REPLICA_URL': f'sqlite:///{replica}'}
+
+        def ejecutar(*argumentos):
+            return subprocess.run([sys.executable, 'manage.py', *argumentos], cwd=settings.BASE_DIR, env=entorno,
+                                  capture_output=True, text=True, check=True).stdout
+
+        ejecutar('migrate', '--noinput', '-v', '0')
+        return ejecutar, lambda: shutil.copy(primaria, replica)
+
+    def test_dos_bases_sqlite(self):
+        """Primaria y réplica en dos archivos SQLite: la réplica es una copia anterior de la primaria"""
+        ejecutar, replicar = self._dos_bases()
+        # La réplica no recibe migraciones (allow_migrate): se "replica" copiando la primaria
+        self.assertIn('[ ]', ejecutar('showmigrations', 'core', '--database', 'replica'))
+        replicar()
+
+        salida = ejecutar('shell', '-c', '\n'.join([
+            'import json',
+            'from core.enrutador_bd import en_replica',
+            'from core.models import Usuario',
+            "Usuario.objects.create(username='sin_replicar')",
+            'resultado = {}',
+            'with en_replica():',
+            "    resultado['replica'] = Usuario.objects.filter(username='sin_replicar').exists()",
+            "    Usuario.objects.create(username='escrito_en_lectura')",
+            "    resultado['tras_escribir'] = Usuario.objects.filter(username='sin_replicar').exists()",
+            "resultado['fuera'] = Usuario.objects.filter(username='sin_replicar').exists()",
+            "resultado['en_replica'] = Usuario.objects.using('replica').filter(username='escrito_en_lectura').exists()",
+            'print(json.dumps(resultado))',
+        ]))
+        self.assertEqual(json.loads(salida.strip().splitlines()[-1]), {
+            'replica': False, 'tras_escribir': True, 'fuera': True, 'en_replica': False,
+        })
+
+    def test_chat_cuenta_consultas_de_la_replica(self):
+        """Las consultas del chat que van a la réplica también cuentan en el registro"""
+        ejecutar, replicar = self._dos_bases()
+        replicar()
+        salida = ejecutar('shell', '-c', '\n'.join([
+            'from unittest.mock import patch',
+            'from django.test import Client',
+            'from core.models import Usuario',
+            'from core.views import asistente',
+            "usuario = Usuario.objects.create_user(username='lector', password='x')",
+            'cliente = Client()',
+            'cliente.force_login(usuario)',
+            'def responder(usuario, mensaje, contexto):',
+            # Lectura enrutada a la réplica por @solo_lectura y otra explícita en default
+            '    list(Usuario.objects.all())',
+            "    Usuario.objects.using('default').count()",
+            "    return 'general', 'generar_respuesta_general', 'ok'",
+            'with patch.object(asistente, "responder_mensaje", responder), \\',
+            '        patch.object(asistente, "registrar_mensaje") as registrar:',
+            "    cliente.post('/api/asistente/chat/', {'mensaje': 'hola'}, content_type='application/json')",
+            'print(registrar.call_args.args[-1])',
+        ]))
+        self.assertEqual(salida.strip().splitlines()[-1], '2')
+
+
 if __name__ == '__main__':
     import unittest
     unittest.main()
\ No newline at end of file